@@ -0,0 +1,49 @@
+"""deployment idempotency
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+author = "auto"
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Collapse duplicates left by the old SELECT-then-INSERT check so the
+    # unique constraint can be created; the earliest deployment wins.
+    op.execute(
+        """
+        DELETE FROM deployments d
+        USING deployments keep
+        WHERE d.service_id = keep.service_id
+          AND d.environment_id = keep.environment_id
+          AND d.version = keep.version
+          AND d.id > keep.id
+        """
+    )
+    op.create_unique_constraint(
+        "uq_deployments_version", "deployments", ["service_id", "environment_id", "version"]
+    )
+    op.create_table(
+        "idempotency_keys",
+        sa.Column("key", sa.String(length=512), primary_key=True),
+        sa.Column("request_fingerprint", sa.String(length=64), nullable=False),
+        sa.Column("status_code", sa.Integer(), nullable=False),
+        sa.Column("response_body", sa.JSON(), server_default=sa.text("'{}'::jsonb")),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_idempotency_keys_created_at", "idempotency_keys", ["created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_idempotency_keys_created_at", table_name="idempotency_keys")
+    op.drop_table("idempotency_keys")
+    op.drop_constraint("uq_deployments_version", "deployments", type_="unique")
@@ -0,0 +1,26 @@
+"""deployment superseded status
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+
+
+author = "auto"
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ADD VALUE cannot run inside a transaction block on older Postgres.
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE deploymentstatus ADD VALUE IF NOT EXISTS 'superseded'")
+
+
+def downgrade():
+    # Postgres cannot drop enum values; retire superseded rows instead.
+    op.execute("UPDATE deployments SET status = 'failed' WHERE status = 'superseded'")
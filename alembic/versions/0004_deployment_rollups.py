@@ -0,0 +1,51 @@
+"""deployment rollups
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+author = "auto"
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "deployment_rollups",
+        sa.Column("bucket", sa.Date(), primary_key=True),
+        sa.Column("service_id", sa.Integer(), sa.ForeignKey("services.id"), primary_key=True),
+        sa.Column(
+            "tier",
+            postgresql.ENUM("dev", "staging", "prod", name="environmenttier", create_type=False),
+            primary_key=True,
+        ),
+        sa.Column("succeeded", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("failed", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("lead_time_seconds", sa.Float(), nullable=False, server_default="0"),
+    )
+    # Backfill from history; updated_at is the best available finish time.
+    op.execute(
+        """
+        INSERT INTO deployment_rollups (bucket, service_id, tier, succeeded, failed, lead_time_seconds)
+        SELECT d.updated_at::date, d.service_id, e.tier,
+               COUNT(*) FILTER (WHERE d.status = 'succeeded'),
+               COUNT(*) FILTER (WHERE d.status = 'failed'),
+               COALESCE(SUM(EXTRACT(EPOCH FROM d.updated_at - d.created_at))
+                        FILTER (WHERE d.status = 'succeeded'), 0)
+        FROM deployments d JOIN environments e ON e.id = d.environment_id
+        WHERE d.status IN ('succeeded', 'failed')
+        GROUP BY 1, 2, 3
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("deployment_rollups")
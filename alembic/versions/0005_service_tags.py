@@ -0,0 +1,40 @@
+"""service tag index
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+author = "auto"
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "service_tags",
+        sa.Column(
+            "service_id", sa.Integer(), sa.ForeignKey("services.id", ondelete="CASCADE"), primary_key=True
+        ),
+        sa.Column("key", sa.String(length=255), primary_key=True),
+        sa.Column("value", sa.String(length=255), nullable=False),
+    )
+    op.create_index("ix_service_tags_key_value", "service_tags", ["key", "value", "service_id"])
+    op.execute(
+        """
+        INSERT INTO service_tags (service_id, key, value)
+        SELECT s.id, t.key, t.value
+        FROM services s, json_each_text(s.tags) AS t(key, value)
+        """
+    )
+
+
+def downgrade():
+    op.drop_index("ix_service_tags_key_value", table_name="service_tags")
+    op.drop_table("service_tags")
@@ -0,0 +1,37 @@
+"""catalog change feed
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+author = "auto"
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "catalog_changes",
+        sa.Column("seq", sa.BigInteger(), sa.Identity(always=False), primary_key=True),
+        sa.Column("entity_type", sa.String(length=100), nullable=False),
+        sa.Column("entity_id", sa.String(length=100), nullable=False),
+        sa.Column(
+            "op",
+            postgresql.ENUM(name="auditaction", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("diff", sa.JSON(), server_default=sa.text("'{}'::jsonb")),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table("catalog_changes")
@@ -0,0 +1,70 @@
+"""partition audit_logs by month
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+
+
+author = "auto"
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The partition key must be part of the primary key and NOT NULL.
+    op.execute("UPDATE audit_logs SET created_at = now() WHERE created_at IS NULL")
+    op.execute("ALTER TABLE audit_logs RENAME TO audit_logs_unpartitioned")
+    op.execute(
+        """
+        CREATE TABLE audit_logs (
+            LIKE audit_logs_unpartitioned INCLUDING DEFAULTS,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute("ALTER TABLE audit_logs ALTER COLUMN created_at SET NOT NULL")
+    op.execute("CREATE INDEX ix_audit_logs_created_at ON audit_logs (created_at)")
+    # Catches rows outside every monthly partition; ensure_partitions
+    # creates months ahead of time so this stays empty.
+    op.execute("CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT")
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            month date;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', COALESCE((SELECT min(created_at) FROM audit_logs_unpartitioned), now())),
+                    date_trunc('month', now()) + interval '2 months',
+                    interval '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE audit_logs_%s PARTITION OF audit_logs FOR VALUES FROM (%L) TO (%L)',
+                    to_char(month, 'YYYYMM'), month, (month + interval '1 month')::date
+                );
+            END LOOP;
+        END
+        $$
+        """
+    )
+    op.execute("INSERT INTO audit_logs SELECT * FROM audit_logs_unpartitioned")
+    # The id sequence belongs to the old table; keep it alive.
+    op.execute("ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id")
+    op.execute("DROP TABLE audit_logs_unpartitioned")
+
+
+def downgrade():
+    op.execute("ALTER TABLE audit_logs RENAME TO audit_logs_partitioned")
+    op.execute(
+        "CREATE TABLE audit_logs (LIKE audit_logs_partitioned INCLUDING DEFAULTS, PRIMARY KEY (id))"
+    )
+    op.execute("INSERT INTO audit_logs SELECT * FROM audit_logs_partitioned")
+    op.execute("ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id")
+    op.execute("DROP TABLE audit_logs_partitioned CASCADE")
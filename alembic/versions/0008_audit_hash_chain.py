@@ -0,0 +1,48 @@
+"""audit hash chain and checkpoints
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+author = "auto"
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Columns and indexes on the partitioned parent cascade to partitions.
+    op.add_column("audit_logs", sa.Column("prev_hash", sa.String(length=64), nullable=True))
+    op.add_column("audit_logs", sa.Column("hash", sa.String(length=64), nullable=True))
+    op.add_column("audit_logs", sa.Column("checkpoint_id", sa.Integer(), nullable=True))
+    op.create_index("ix_audit_logs_checkpoint_id", "audit_logs", ["checkpoint_id"])
+    op.create_index(
+        "ix_audit_logs_unsealed", "audit_logs", ["id"], postgresql_where=sa.text("hash IS NULL")
+    )
+    op.create_table(
+        "audit_checkpoints",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("first_id", sa.Integer(), nullable=False),
+        sa.Column("last_id", sa.Integer(), nullable=False),
+        sa.Column("row_count", sa.Integer(), nullable=False),
+        sa.Column("prev_hash", sa.String(length=64), nullable=False),
+        sa.Column("last_hash", sa.String(length=64), nullable=False),
+        sa.Column("merkle_root", sa.String(length=64), nullable=False),
+        sa.Column("archived", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table("audit_checkpoints")
+    op.drop_index("ix_audit_logs_unsealed", table_name="audit_logs")
+    op.drop_index("ix_audit_logs_checkpoint_id", table_name="audit_logs")
+    op.drop_column("audit_logs", "checkpoint_id")
+    op.drop_column("audit_logs", "hash")
+    op.drop_column("audit_logs", "prev_hash")
@@ -0,0 +1,37 @@
+"""service dependency edges
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+author = "auto"
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "service_dependencies",
+        sa.Column(
+            "service_id", sa.Integer(), sa.ForeignKey("services.id", ondelete="CASCADE"), primary_key=True
+        ),
+        sa.Column(
+            "depends_on_id", sa.Integer(), sa.ForeignKey("services.id", ondelete="CASCADE"), primary_key=True
+        ),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index(
+        "ix_service_dependencies_depends_on", "service_dependencies", ["depends_on_id", "service_id"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_service_dependencies_depends_on", table_name="service_dependencies")
+    op.drop_table("service_dependencies")
@@ -0,0 +1,52 @@
+"""promotion pipelines
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+author = "auto"
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+promotion_status = sa.Enum("running", "succeeded", "failed", "blocked", "superseded", name="promotionstatus")
+
+
+def upgrade():
+    op.create_table(
+        "promotion_pipelines",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("service_id", sa.Integer(), sa.ForeignKey("services.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("version", sa.String(length=255), nullable=False),
+        sa.Column(
+            "current_tier",
+            postgresql.ENUM("dev", "staging", "prod", name="environmenttier", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("status", promotion_status, nullable=False),
+        sa.Column("approvals", sa.JSON(), nullable=True),
+        sa.Column("initiated_by", sa.String(length=255), nullable=False),
+        sa.Column("detail", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_promotion_pipelines_id", "promotion_pipelines", ["id"])
+    op.create_index(
+        "ix_promotion_pipelines_lookup",
+        "promotion_pipelines",
+        ["service_id", "version", "current_tier", "status"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_promotion_pipelines_lookup", table_name="promotion_pipelines")
+    op.drop_index("ix_promotion_pipelines_id", table_name="promotion_pipelines")
+    op.drop_table("promotion_pipelines")
+    promotion_status.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,60 @@
+"""deployment approvals and outbox
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+author = "auto"
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ALTER TYPE ... ADD VALUE cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE deploymentstatus ADD VALUE IF NOT EXISTS 'awaiting_approval' BEFORE 'pending'")
+    op.add_column("deployments", sa.Column("triggered_by", sa.String(length=255), nullable=True))
+    # Prod approvals are now recorded per deployment, not per pipeline.
+    op.drop_column("promotion_pipelines", "approvals")
+
+    op.create_table(
+        "deployment_approvals",
+        sa.Column(
+            "deployment_id", sa.Integer(), sa.ForeignKey("deployments.id", ondelete="CASCADE"), primary_key=True
+        ),
+        sa.Column("approver", sa.String(length=255), primary_key=True),
+        sa.Column("comment", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_table(
+        "outbox_events",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column("topic", sa.String(length=100), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("dispatched_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index(
+        "ix_outbox_events_undispatched",
+        "outbox_events",
+        ["id"],
+        postgresql_where=sa.text("dispatched_at IS NULL"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_outbox_events_undispatched", table_name="outbox_events")
+    op.drop_table("outbox_events")
+    op.drop_table("deployment_approvals")
+    op.add_column("promotion_pipelines", sa.Column("approvals", sa.JSON(), nullable=True))
+    op.drop_column("deployments", "triggered_by")
+    # Postgres cannot drop an enum value; awaiting_approval stays in the type.
@@ -0,0 +1,59 @@
+"""webhook endpoints and deliveries
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+author = "auto"
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+delivery_status = sa.Enum("pending", "delivered", "dead", name="webhookdeliverystatus")
+
+
+def upgrade():
+    op.create_table(
+        "webhook_endpoints",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("url", sa.String(length=2048), nullable=False),
+        sa.Column("secret", sa.String(length=255), nullable=False),
+        sa.Column("topics", sa.JSON(), nullable=True),
+        sa.Column("max_concurrency", sa.Integer(), nullable=False, server_default="4"),
+        sa.Column("active", sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column("created_by", sa.String(length=255), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_webhook_endpoints_id", "webhook_endpoints", ["id"])
+    op.create_table(
+        "webhook_deliveries",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column(
+            "endpoint_id", sa.Integer(), sa.ForeignKey("webhook_endpoints.id", ondelete="CASCADE"), nullable=False
+        ),
+        sa.Column(
+            "event_id", sa.BigInteger(), sa.ForeignKey("outbox_events.id", ondelete="CASCADE"), nullable=False
+        ),
+        sa.Column("status", delivery_status, nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("delivered_at", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+        sa.UniqueConstraint("endpoint_id", "event_id", name="uq_webhook_deliveries_event"),
+    )
+    op.create_index("ix_webhook_deliveries_due", "webhook_deliveries", ["status", "next_attempt_at"])
+
+
+def downgrade():
+    op.drop_index("ix_webhook_deliveries_due", table_name="webhook_deliveries")
+    op.drop_table("webhook_deliveries")
+    op.drop_index("ix_webhook_endpoints_id", table_name="webhook_endpoints")
+    op.drop_table("webhook_endpoints")
+    delivery_status.drop(op.get_bind(), checkfirst=True)
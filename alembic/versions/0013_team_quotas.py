@@ -0,0 +1,41 @@
+"""team quotas
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+author = "auto"
+revision = "0013"
+down_revision = "0012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "team_quotas",
+        sa.Column("team_id", sa.Integer(), sa.ForeignKey("teams.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("services", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("environments", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("max_services", sa.Integer(), nullable=True),
+        sa.Column("max_environments", sa.Integer(), nullable=True),
+    )
+    # Seed the counters once; from here on writes maintain them.
+    op.execute(
+        """
+        INSERT INTO team_quotas (team_id, services, environments)
+        SELECT t.id,
+               (SELECT count(*) FROM services s WHERE s.team_id = t.id),
+               (SELECT count(*) FROM environments e JOIN services s ON s.id = e.service_id WHERE s.team_id = t.id)
+        FROM teams t
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("team_quotas")
@@ -0,0 +1,80 @@
+"""content-addressed environment config versions
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-19
+"""
+
+import hashlib
+import json
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+author = "auto"
+revision = "0014"
+down_revision = "0013"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "config_blobs",
+        sa.Column("hash", sa.String(length=64), primary_key=True),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_table(
+        "environment_config_versions",
+        sa.Column(
+            "environment_id", sa.Integer(), sa.ForeignKey("environments.id", ondelete="CASCADE"), primary_key=True
+        ),
+        sa.Column("version", sa.Integer(), primary_key=True),
+        sa.Column("config_hash", sa.String(length=64), sa.ForeignKey("config_blobs.hash"), nullable=False),
+        sa.Column("created_by", sa.String(length=255), nullable=False),
+        sa.Column("rolled_back_from", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index(
+        "ix_environment_config_versions_config_hash", "environment_config_versions", ["config_hash"]
+    )
+    op.add_column(
+        "environments",
+        sa.Column("config_hash", sa.String(length=64), sa.ForeignKey("config_blobs.hash"), nullable=True),
+    )
+
+    # Each existing config becomes version 1 of its environment. Hashing
+    # must match app.services.config_layers.canonical, so it runs here
+    # rather than in SQL.
+    conn = op.get_bind()
+    blobs = {}
+    for env_id, config in conn.execute(sa.text("SELECT id, config FROM environments")):
+        if isinstance(config, str):
+            config = json.loads(config)
+        raw = json.dumps(config or {}, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest not in blobs:
+            blobs[digest] = raw
+            conn.execute(
+                sa.text("INSERT INTO config_blobs (hash, data, size) VALUES (:hash, :data, :size)"),
+                {"hash": digest, "data": zlib.compress(raw), "size": len(raw)},
+            )
+        conn.execute(
+            sa.text(
+                "INSERT INTO environment_config_versions (environment_id, version, config_hash, created_by)"
+                " VALUES (:id, 1, :hash, 'migration')"
+            ),
+            {"id": env_id, "hash": digest},
+        )
+        conn.execute(sa.text("UPDATE environments SET config_hash = :hash WHERE id = :id"), {"hash": digest, "id": env_id})
+
+
+def downgrade():
+    op.drop_column("environments", "config_hash")
+    op.drop_index("ix_environment_config_versions_config_hash", table_name="environment_config_versions")
+    op.drop_table("environment_config_versions")
+    op.drop_table("config_blobs")
@@ -0,0 +1,45 @@
+"""team config layer and layer hashes
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-19
+"""
+
+import hashlib
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+author = "auto"
+revision = "0015"
+down_revision = "0014"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("teams", sa.Column("config", sa.JSON(), nullable=False, server_default="{}"))
+    op.add_column("teams", sa.Column("config_hash", sa.String(length=64), nullable=True))
+    op.add_column("services", sa.Column("config_hash", sa.String(length=64), nullable=True))
+
+    # Must match app.services.config_layers.content_hash. Rows left NULL
+    # would still render correctly, just without the cheap cache hit.
+    conn = op.get_bind()
+    empty = hashlib.sha256(b"{}").hexdigest()
+    conn.execute(sa.text("UPDATE teams SET config_hash = :hash"), {"hash": empty})
+    for service_id, config in conn.execute(sa.text("SELECT id, config FROM services")):
+        if isinstance(config, str):
+            config = json.loads(config)
+        raw = json.dumps(config or {}, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+        conn.execute(
+            sa.text("UPDATE services SET config_hash = :hash WHERE id = :id"),
+            {"hash": hashlib.sha256(raw).hexdigest(), "id": service_id},
+        )
+
+
+def downgrade():
+    op.drop_column("services", "config_hash")
+    op.drop_column("teams", "config_hash")
+    op.drop_column("teams", "config")
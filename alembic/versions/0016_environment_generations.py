@@ -0,0 +1,34 @@
+"""environment generations for the reconciler
+
+Revision ID: 0016
+Revises: 0015
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+author = "auto"
+revision = "0016"
+down_revision = "0015"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 1 vs 0: every existing environment is reconciled once.
+    op.add_column("environments", sa.Column("generation", sa.Integer(), nullable=False, server_default="1"))
+    op.add_column("environments", sa.Column("observed_generation", sa.Integer(), nullable=False, server_default="0"))
+    op.create_index(
+        "ix_environments_unreconciled",
+        "environments",
+        ["id"],
+        postgresql_where=sa.text("generation <> observed_generation"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_environments_unreconciled", table_name="environments")
+    op.drop_column("environments", "observed_generation")
+    op.drop_column("environments", "generation")
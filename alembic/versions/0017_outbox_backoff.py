@@ -0,0 +1,25 @@
+"""outbox retry backoff
+
+Revision ID: 0017
+Revises: 0016
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+author = "auto"
+revision = "0017"
+down_revision = "0016"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # NULL until an attempt fails: existing events stay due.
+    op.add_column("outbox_events", sa.Column("next_attempt_at", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("outbox_events", "next_attempt_at")
@@ -0,0 +1,44 @@
+"""approval notification deliveries
+
+Revision ID: 0018
+Revises: 0017
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+author = "auto"
+revision = "0018"
+down_revision = "0017"
+branch_labels = None
+depends_on = None
+
+# Created by 0012 for webhook deliveries; notifications share its states.
+delivery_status = postgresql.ENUM("pending", "delivered", "dead", name="webhookdeliverystatus", create_type=False)
+
+
+def upgrade():
+    op.create_table(
+        "notification_deliveries",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column("sink", sa.String(length=50), nullable=False),
+        sa.Column(
+            "event_id", sa.BigInteger(), sa.ForeignKey("outbox_events.id", ondelete="CASCADE"), nullable=False
+        ),
+        sa.Column("status", delivery_status, nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("delivered_at", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+        sa.UniqueConstraint("sink", "event_id", name="uq_notification_deliveries_event"),
+    )
+    op.create_index("ix_notification_deliveries_due", "notification_deliveries", ["status", "next_attempt_at"])
+
+
+def downgrade():
+    op.drop_index("ix_notification_deliveries_due", table_name="notification_deliveries")
+    op.drop_table("notification_deliveries")
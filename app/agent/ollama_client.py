@@ -14,6 +14,7 @@ from typing import Any, Dict, Optional
 import httpx
 
 from app.core.config import get_settings
+from app.core.tracing import tracer
 
 
 class OllamaUnavailable(RuntimeError):
@@ -49,7 +50,7 @@ def generate_json(
         payload["system"] = system
 
     try:
-        with httpx.Client(timeout=timeout) as client:
+        with tracer.span("ollama.generate", kind="client", model=model, url=url), httpx.Client(timeout=timeout) as client:
             resp = client.post(url, json=payload)
     except httpx.HTTPError as exc:
         raise OllamaUnavailable(f"cannot reach Ollama at {base}: {exc}") from exc
@@ -1,11 +1,20 @@
+import gzip
 import logging
 import uuid
+from typing import Optional
 
+import anyio
 from fastapi import Request
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.base import BaseHTTPMiddleware
 
 from app.core.request_context import set_request_id
 
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional; gzip is always available
+    brotli = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -16,3 +25,93 @@ class RequestIdMiddleware(BaseHTTPMiddleware):
         response = await call_next(request)
         response.headers["X-Request-ID"] = request_id
         return response
+
+
+class CompressionMiddleware:
+    """Compress responses for clients that accept it.
+
+    Brotli when the client accepts ``br`` and the ``brotli`` package is
+    installed, else gzip. Only complete bodies of at least ``min_size``
+    bytes and a textual content type are compressed; streamed responses
+    (the SSE change feed) pass through so each frame is flushed as it is
+    written. Large bodies are compressed on a worker thread, off the
+    event loop.
+    """
+
+    THREAD_MIN_SIZE = 256 * 1024
+    COMPRESSIBLE = (b"application/json", b"text/", b"application/problem+json")
+
+    def __init__(self, app, *, min_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            if (
+                message.get("more_body", False)
+                or len(body) < self.min_size
+                or "content-encoding" in headers
+                or not headers.get("content-type", "").encode().startswith(self.COMPRESSIBLE)
+            ):
+                passthrough = True
+                await send(start)
+                return await send(message)
+            if len(body) >= self.THREAD_MIN_SIZE:
+                body = await anyio.to_thread.run_sync(self._compress, encoding, body)
+            else:
+                body = self._compress(encoding, body)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """``br`` or ``gzip`` per ``Accept-Encoding`` (q-values honoured), or None."""
+    explicit = {}
+    star = 0.0
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name == "*":
+            star = q
+        else:
+            explicit[name] = q
+    offered = {name: explicit.get(name, star) for name in ("gzip", "br")}
+    if brotli is None:
+        offered["br"] = 0.0
+    best = max(offered, key=lambda key: (offered[key], key == "br"))
+    return best if offered[best] > 0 else None
@@ -1,27 +1,79 @@
-from typing import List
+from datetime import date, datetime
+from typing import Dict, List, Literal, Optional
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from prometheus_client import Counter, Histogram, generate_latest
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.api.projection import FIELDS_DESCRIPTION, Projection, rows_response
+from app.core.config import get_settings
+from app.core.profiling import profiler
+from app.core.ratelimit import rate_limited
 from app.core.security import Role, UserContext, get_current_user, require_roles
-from app.db.session import get_db
-from app.models.models import AuditLog, Deployment, Environment, Service, Team
+from app.db.session import get_db, get_read_db
+from app.models.models import Deployment, Environment, EnvironmentTier, Service, Team, WebhookDeliveryStatus
 from app.schemas.domain import (
+    ApprovalCreate,
+    ApprovalStatusRead,
     AuditLogRead,
+    ChangeRead,
+    ConfigDiffRead,
+    ConfigRollbackRequest,
+    ConfigUpdate,
+    ConfigVersionDetail,
+    ConfigVersionRead,
+    DeploymentMetricsRead,
     DeploymentRead,
+    DependencyCreate,
+    DependencyNodeRead,
     DeploymentTriggerRequest,
+    DeployOrderRead,
     EnvironmentProvisionRequest,
     EnvironmentRead,
+    JobStatusRead,
+    JobStepRead,
+    LayerConfigRead,
     PolicyRead,
+    ProfileSummaryRead,
+    ProfilingSettings,
+    PromotionBatchRequest,
+    PromotionBatchResult,
+    PromotionCreate,
+    PromotionRead,
+    RenderedConfigRead,
+    SearchHitRead,
     ServiceCreate,
+    ServiceDependencyRead,
     ServiceRead,
     ServiceUpdate,
     TeamCreate,
+    TeamQuotaRead,
+    TeamQuotaUpdate,
     TeamRead,
+    WebhookDeliveryRead,
+    WebhookEndpointCreate,
+    WebhookEndpointCreated,
+    WebhookEndpointRead,
 )
+from app.services import analytics
+from app.services import approvals as approval_service
+from app.services import audit_partitions
+from app.services import changes as change_feed
+from app.services import config_layers
+from app.services import config_versions
+from app.services import dependencies as dependency_service
 from app.services import deployment as deployment_service
+from app.services import idempotency
+from app.services import promotions
+from app.services import quotas
+from app.services import tags as tag_index
+from app.services import webhooks
+from app.services.dependencies import dependency_graph
+from app.services.jobs import registry
+from app.services.scheduler import deployment_scheduler
+from app.services.search import search_index
 from app.services import service as service_service
 
 router = APIRouter()
@@ -30,8 +82,12 @@ request_latency = Histogram("api_latency_seconds", "API latency", ["endpoint"])
 failed_operations = Counter("api_failed_operations_total", "Failed operations", ["endpoint"])
 job_duration = Histogram("job_duration_seconds", "Async job duration", ["job_type"])
 
+service_fields = Projection(Service, ServiceRead)
+deployment_fields = Projection(Deployment, DeploymentRead)
+environment_fields = Projection(Environment, EnvironmentRead)
 
-@router.post("/teams", response_model=TeamRead)
+
+@router.post("/teams", response_model=TeamRead, dependencies=[Depends(rate_limited("create_team"))])
 async def create_team(
     payload: TeamCreate,
     db: AsyncSession = Depends(get_db),
@@ -41,7 +97,57 @@ async def create_team(
         return await service_service.create_team(db, payload.name, payload.description)
 
 
-@router.post("/services", response_model=ServiceRead, status_code=status.HTTP_201_CREATED)
+@router.get("/teams/{team_id}/quota", response_model=TeamQuotaRead)
+async def get_team_quota(team_id: int, db: AsyncSession = Depends(get_db), user: UserContext = Depends(get_current_user)):
+    return await quotas.get_quota(db, team_id)
+
+
+@router.put("/teams/{team_id}/quota", response_model=TeamQuotaRead)
+async def set_team_quota(
+    team_id: int,
+    payload: TeamQuotaUpdate,
+    db: AsyncSession = Depends(get_db),
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN)),
+):
+    with request_latency.labels("set_team_quota").time():
+        return await quotas.set_limits(
+            db,
+            team_id,
+            max_services=payload.max_services,
+            max_environments=payload.max_environments,
+            performed_by=user.username,
+        )
+
+
+@router.get("/teams/{team_id}/config", response_model=LayerConfigRead)
+async def get_team_config(
+    team_id: int, db: AsyncSession = Depends(get_read_db), user: UserContext = Depends(get_current_user)
+):
+    return await config_layers.get_layer(db, Team, team_id)
+
+
+@router.put(
+    "/teams/{team_id}/config",
+    response_model=LayerConfigRead,
+    dependencies=[Depends(rate_limited("update_layer_config"))],
+)
+async def set_team_config(
+    team_id: int,
+    payload: ConfigUpdate,
+    db: AsyncSession = Depends(get_db),
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN, Role.TEAM_ADMIN)),
+):
+    """Defaults for every environment of the team's services."""
+    with request_latency.labels("set_team_config").time():
+        return await config_layers.set_team_config(db, team_id, payload.config, performed_by=user.username)
+
+
+@router.post(
+    "/services",
+    response_model=ServiceRead,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limited("register_service"))],
+)
 async def register_service(
     payload: ServiceCreate,
     db: AsyncSession = Depends(get_db),
@@ -55,7 +161,11 @@ async def register_service(
             raise
 
 
-@router.patch("/services/{service_id}", response_model=ServiceRead)
+@router.patch(
+    "/services/{service_id}",
+    response_model=ServiceRead,
+    dependencies=[Depends(rate_limited("update_service"))],
+)
 async def update_service(
     service_id: int,
     payload: ServiceUpdate,
@@ -66,7 +176,11 @@ async def update_service(
         return await service_service.update_service(db, service_id, payload, performed_by=user.username)
 
 
-@router.post("/services/{service_id}/team", response_model=ServiceRead)
+@router.post(
+    "/services/{service_id}/team",
+    response_model=ServiceRead,
+    dependencies=[Depends(rate_limited("assign_team"))],
+)
 async def assign_team(
     service_id: int,
     team_id: int,
@@ -77,7 +191,35 @@ async def assign_team(
         return await service_service.assign_service_team(db, service_id, team_id, performed_by=user.username)
 
 
-@router.post("/services/{service_id}/environments", response_model=EnvironmentRead, status_code=status.HTTP_201_CREATED)
+@router.get("/services/{service_id}/config", response_model=LayerConfigRead)
+async def get_service_config(
+    service_id: int, db: AsyncSession = Depends(get_read_db), user: UserContext = Depends(get_current_user)
+):
+    return await config_layers.get_layer(db, Service, service_id)
+
+
+@router.put(
+    "/services/{service_id}/config",
+    response_model=LayerConfigRead,
+    dependencies=[Depends(rate_limited("update_layer_config"))],
+)
+async def set_service_config(
+    service_id: int,
+    payload: ConfigUpdate,
+    db: AsyncSession = Depends(get_db),
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN, Role.TEAM_ADMIN)),
+):
+    """Defaults for every environment of the service, over its team's."""
+    with request_latency.labels("set_service_config").time():
+        return await config_layers.set_service_config(db, service_id, payload.config, performed_by=user.username)
+
+
+@router.post(
+    "/services/{service_id}/environments",
+    response_model=EnvironmentRead,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limited("provision_environment"))],
+)
 async def provision_environment(
     service_id: int,
     payload: EnvironmentProvisionRequest,
@@ -88,48 +230,436 @@ async def provision_environment(
         return await service_service.provision_environment(db, service_id, payload, performed_by=user.username)
 
 
+@router.put(
+    "/services/{service_id}/environments/{environment_id}/config",
+    response_model=ConfigVersionRead,
+    dependencies=[Depends(rate_limited("update_environment_config"))],
+)
+async def update_environment_config(
+    service_id: int,
+    environment_id: int,
+    payload: ConfigUpdate,
+    db: AsyncSession = Depends(get_db),
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN, Role.TEAM_ADMIN)),
+):
+    """Store a new config version; unchanged content returns the current version."""
+    with request_latency.labels("update_environment_config").time():
+        return await config_versions.update_config(
+            db, service_id, environment_id, payload.config, performed_by=user.username
+        )
+
+
+@router.post(
+    "/services/{service_id}/environments/{environment_id}/config/rollback",
+    response_model=ConfigVersionRead,
+    dependencies=[Depends(rate_limited("update_environment_config"))],
+)
+async def rollback_environment_config(
+    service_id: int,
+    environment_id: int,
+    payload: ConfigRollbackRequest,
+    db: AsyncSession = Depends(get_db),
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN, Role.TEAM_ADMIN)),
+):
+    with request_latency.labels("rollback_environment_config").time():
+        return await config_versions.rollback(
+            db, service_id, environment_id, payload.version, performed_by=user.username
+        )
+
+
+@router.get(
+    "/services/{service_id}/environments/{environment_id}/config/versions",
+    response_model=List[ConfigVersionRead],
+)
+async def list_config_versions(
+    service_id: int,
+    environment_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(get_current_user),
+):
+    return await config_versions.list_versions(db, service_id, environment_id)
+
+
+@router.get(
+    "/services/{service_id}/environments/{environment_id}/config/versions/{version}",
+    response_model=ConfigVersionDetail,
+)
+async def get_config_version(
+    service_id: int,
+    environment_id: int,
+    version: int,
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(get_current_user),
+):
+    row, config = await config_versions.get_version(db, service_id, environment_id, version)
+    return ConfigVersionDetail(**ConfigVersionRead.model_validate(row).model_dump(), config=config)
+
+
+@router.get(
+    "/services/{service_id}/environments/{environment_id}/config/diff",
+    response_model=ConfigDiffRead,
+)
+async def diff_config_versions(
+    service_id: int,
+    environment_id: int,
+    from_version: int = Query(..., alias="from"),
+    to_version: Optional[int] = Query(None, alias="to", description="Defaults to the current version"),
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(get_current_user),
+):
+    return await config_versions.diff_versions(db, service_id, environment_id, from_version, to_version)
+
+
+@router.get(
+    "/services/{service_id}/environments/{environment_id}/config/rendered",
+    response_model=RenderedConfigRead,
+)
+async def render_environment_config(
+    service_id: int,
+    environment_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(get_current_user),
+):
+    """Platform defaults, then team, service and environment config, merged."""
+    return await config_layers.render(db, service_id, environment_id)
+
+
+@router.post(
+    "/services/{service_id}/dependencies",
+    response_model=ServiceDependencyRead,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limited("add_dependency"))],
+)
+async def add_dependency(
+    service_id: int,
+    payload: DependencyCreate,
+    db: AsyncSession = Depends(get_db),
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN, Role.DEVELOPER, Role.TEAM_ADMIN)),
+):
+    with request_latency.labels("add_dependency").time():
+        return await dependency_service.add_dependency(
+            db, service_id, payload.depends_on_id, performed_by=user.username
+        )
+
+
+@router.delete(
+    "/services/{service_id}/dependencies/{depends_on_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(rate_limited("remove_dependency"))],
+)
+async def remove_dependency(
+    service_id: int,
+    depends_on_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN, Role.DEVELOPER, Role.TEAM_ADMIN)),
+):
+    with request_latency.labels("remove_dependency").time():
+        await dependency_service.remove_dependency(db, service_id, depends_on_id, performed_by=user.username)
+
+
 @router.post(
     "/services/{service_id}/environments/{environment_id}/deployments",
     status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(rate_limited("trigger_deployment"))],
 )
 async def trigger_deployment(
     service_id: int,
     environment_id: int,
     payload: DeploymentTriggerRequest,
     background_tasks: BackgroundTasks,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: AsyncSession = Depends(get_db),
     user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN, Role.DEVELOPER, Role.TEAM_ADMIN)),
 ):
     with request_latency.labels("trigger_deployment").time():
-        job_id = await deployment_service.trigger_deployment(
+        if idempotency_key:
+            cache_key = idempotency.scoped_key(user.username, idempotency_key)
+            fingerprint = idempotency.fingerprint(
+                {"service_id": service_id, "environment_id": environment_id, **payload.model_dump()}
+            )
+            cached = await idempotency.get_cached_response(db, cache_key, fingerprint)
+            if cached:
+                status_code, body = cached
+                return JSONResponse(status_code=status_code, content=body, headers={"Idempotent-Replayed": "true"})
+
+        body = await deployment_service.trigger_deployment(
             db,
             service_id=service_id,
             environment_id=environment_id,
             payload=payload,
             background_tasks=background_tasks,
-            approvals=[user.username] if user.role == Role.PLATFORM_ADMIN else [],
             performed_by=user.username,
         )
-        return {"job_id": job_id}
+        if idempotency_key:
+            await idempotency.store_response(db, cache_key, fingerprint, status.HTTP_202_ACCEPTED, body)
+        return body
+
+
+@router.post(
+    "/deployments/{deployment_id}/approvals",
+    response_model=ApprovalStatusRead,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limited("approve_deployment"))],
+)
+async def approve_deployment(
+    deployment_id: int,
+    payload: ApprovalCreate,
+    db: AsyncSession = Depends(get_db),
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN, Role.TEAM_ADMIN)),
+):
+    with request_latency.labels("approve_deployment").time():
+        return await approval_service.approve(db, deployment_id, approver=user.username, comment=payload.comment)
+
+
+@router.get("/deployments/{deployment_id}/approvals", response_model=ApprovalStatusRead)
+async def get_deployment_approvals(
+    deployment_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(get_current_user),
+):
+    with request_latency.labels("get_deployment_approvals").time():
+        return await approval_service.get_approvals(db, deployment_id)
+
+
+@router.post(
+    "/webhooks",
+    response_model=WebhookEndpointCreated,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limited("create_webhook"))],
+)
+async def create_webhook(
+    payload: WebhookEndpointCreate,
+    db: AsyncSession = Depends(get_db),
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN)),
+):
+    with request_latency.labels("create_webhook").time():
+        return await webhooks.create_endpoint(
+            db,
+            url=payload.url,
+            topics=payload.topics,
+            max_concurrency=payload.max_concurrency,
+            secret=payload.secret,
+            performed_by=user.username,
+        )
+
+
+@router.get("/webhooks", response_model=List[WebhookEndpointRead])
+async def list_webhooks(
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN)),
+):
+    return await webhooks.list_endpoints(db)
+
+
+@router.delete(
+    "/webhooks/{endpoint_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(rate_limited("delete_webhook"))],
+)
+async def delete_webhook(
+    endpoint_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN)),
+):
+    with request_latency.labels("delete_webhook").time():
+        await webhooks.deactivate_endpoint(db, endpoint_id, performed_by=user.username)
+
+
+@router.get("/webhooks/{endpoint_id}/deliveries", response_model=List[WebhookDeliveryRead])
+async def list_webhook_deliveries(
+    endpoint_id: int,
+    status_filter: Optional[WebhookDeliveryStatus] = Query(None, alias="status"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN)),
+):
+    return await webhooks.list_deliveries(db, endpoint_id, delivery_status=status_filter, limit=limit)
+
+
+@router.post(
+    "/webhooks/{endpoint_id}/deliveries/redrive",
+    dependencies=[Depends(rate_limited("redrive_webhook_deliveries"))],
+)
+async def redrive_webhook_deliveries(
+    endpoint_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN)),
+):
+    with request_latency.labels("redrive_webhook_deliveries").time():
+        return {"redriven": await webhooks.redrive(db, endpoint_id, performed_by=user.username)}
+
+
+@router.post(
+    "/services/{service_id}/promotions",
+    response_model=PromotionRead,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(rate_limited("start_promotion"))],
+)
+async def start_promotion(
+    service_id: int,
+    payload: PromotionCreate,
+    db: AsyncSession = Depends(get_db),
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN, Role.DEVELOPER, Role.TEAM_ADMIN)),
+):
+    with request_latency.labels("start_promotion").time():
+        return await promotions.start_pipeline(
+            db,
+            service_id=service_id,
+            version=payload.version,
+            initiated_by=payload.initiated_by,
+            performed_by=user.username,
+        )
+
+
+@router.post(
+    "/promotions",
+    response_model=List[PromotionBatchResult],
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(rate_limited("start_promotions"))],
+)
+async def start_promotions(
+    payload: PromotionBatchRequest,
+    db: AsyncSession = Depends(get_db),
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN, Role.DEVELOPER, Role.TEAM_ADMIN)),
+):
+    with request_latency.labels("start_promotions").time():
+        return await promotions.start_pipelines(
+            db,
+            [item.model_dump() for item in payload.items],
+            performed_by=user.username,
+        )
+
+
+@router.get("/promotions/{promotion_id}", response_model=PromotionRead)
+async def get_promotion(
+    promotion_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(get_current_user),
+):
+    with request_latency.labels("get_promotion").time():
+        return await promotions.get_pipeline(db, promotion_id)
+
+
+def _job_status(job) -> JobStatusRead:
+    return JobStatusRead(
+        id=job.id,
+        type=job.type,
+        status=job.status,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+        detail=job.detail,
+        queue_position=deployment_scheduler.queue_position(job.id),
+        steps=[JobStepRead.model_validate(step) for step in job.steps],
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusRead)
+async def get_job_status(job_id: str, user: UserContext = Depends(get_current_user)):
+    job = registry.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return _job_status(job)
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=JobStatusRead, status_code=status.HTTP_202_ACCEPTED)
+async def cancel_job(
+    job_id: str,
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN, Role.DEVELOPER, Role.TEAM_ADMIN)),
+):
+    job = registry.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    if not registry.cancel(job_id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job.status}")
+    return _job_status(job)
 
 
 @router.get("/services/{service_id}/deployments", response_model=List[DeploymentRead])
 async def list_deployment_history(
     service_id: int,
-    db: AsyncSession = Depends(get_db),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(get_read_db),
     user: UserContext = Depends(get_current_user),
 ):
+    if fields is not None:
+        names = deployment_fields.parse(fields)
+        result = await db.execute(deployment_fields.select(names).where(Deployment.service_id == service_id))
+        return rows_response(names, result)
     deployments = await deployment_service.get_deployment_history(db, service_id)
     return deployments
 
 
+@router.get("/analytics/deployments", response_model=List[DeploymentMetricsRead])
+async def deployment_analytics(
+    group_by: Literal["service", "team", "tier", "none"] = "service",
+    bucket: Literal["day", "week", "month"] = "week",
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    tier: Optional[EnvironmentTier] = None,
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(get_current_user),
+):
+    with request_latency.labels("deployment_analytics").time():
+        return await analytics.deployment_metrics(
+            db, group_by=group_by, bucket=bucket, since=since, until=until, tier=tier
+        )
+
+
 @router.get("/audit", response_model=List[AuditLogRead])
 async def get_audit_logs(
-    db: AsyncSession = Depends(get_db),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    entity_type: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db),
     user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN, Role.TEAM_ADMIN)),
 ):
-    result = await db.execute(select(AuditLog).order_by(AuditLog.created_at.desc()))
-    return result.scalars().all()
+    with request_latency.labels("get_audit_logs").time():
+        return await audit_partitions.query_audit(
+            db, since=since, until=until, entity_type=entity_type, entity_id=entity_id, limit=limit
+        )
+
+
+@router.get("/changes", response_model=List[ChangeRead])
+async def list_changes(
+    after: int = Query(0, ge=0, description="Return changes with a greater seq"),
+    limit: int = Query(100, ge=1, le=1000),
+    entity_type: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(get_current_user),
+):
+    with request_latency.labels("list_changes").time():
+        return await change_feed.list_changes(db, after=after, limit=limit, entity_type=entity_type)
+
+
+@router.get("/changes/stream")
+async def stream_changes(
+    request: Request,
+    after: Optional[int] = Query(None, ge=0),
+    entity_type: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    user: UserContext = Depends(get_current_user),
+):
+    """Live tail of the change feed as server-sent events.
+
+    Reconnecting clients resume from ``Last-Event-ID`` when ``after`` is
+    not given.
+    """
+    if after is not None:
+        start = after
+    else:
+        start = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+
+    async def events():
+        async for frame in change_feed.stream_changes(
+            start, entity_type=entity_type, poll_interval=get_settings().change_feed_poll_seconds
+        ):
+            if await request.is_disconnected():
+                break
+            yield frame
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @router.get("/metrics")
@@ -137,19 +667,150 @@ async def metrics():
     return generate_latest()
 
 
+@router.get("/admin/profiling", response_model=ProfilingSettings)
+async def get_profiling(user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN))):
+    return ProfilingSettings(enabled=profiler.enabled, sample_rate=profiler.sample_rate)
+
+
+@router.put("/admin/profiling", response_model=ProfilingSettings)
+async def set_profiling(payload: ProfilingSettings, user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN))):
+    """Turn request profiling on or off for this app worker."""
+    profiler.configure(enabled=payload.enabled, sample_rate=payload.sample_rate)
+    return ProfilingSettings(enabled=profiler.enabled, sample_rate=profiler.sample_rate)
+
+
+@router.get("/admin/profiles", response_model=List[ProfileSummaryRead])
+async def list_profiles(
+    limit: int = Query(50, ge=1, le=1000),
+    user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN)),
+):
+    return profiler.recent(limit)
+
+
+@router.get("/admin/profiles/{request_id}", response_model=ProfileSummaryRead)
+async def get_profile(request_id: str, user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN))):
+    profile = profiler.get(request_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+
+@router.get("/admin/profiles/{request_id}/collapsed", response_class=PlainTextResponse)
+async def get_profile_stacks(request_id: str, user: UserContext = Depends(require_roles(Role.PLATFORM_ADMIN))):
+    """Collapsed stacks for flamegraph.pl or speedscope."""
+    profile = profiler.get(request_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.collapsed()
+
+
 @router.get("/services", response_model=List[ServiceRead])
-async def list_services(db: AsyncSession = Depends(get_db), user: UserContext = Depends(get_current_user)):
-    result = await db.execute(select(Service))
+async def list_services(
+    tag: List[str] = Query(default=[], description="key:value; repeat to combine"),
+    match: Literal["all", "any"] = "all",
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(get_current_user),
+):
+    names = service_fields.parse(fields) if fields is not None else None
+    stmt = service_fields.select(names) if names else select(Service)
+    filters = tag_index.parse_tag_filters(tag)
+    if filters:
+        stmt = stmt.where(Service.id.in_(tag_index.matching_service_ids(filters, match)))
+    result = await db.execute(stmt)
+    if names:
+        return rows_response(names, result)
     return result.scalars().all()
 
 
+@router.get("/search", response_model=List[SearchHitRead])
+async def search_catalog(
+    q: str = Query(..., min_length=1),
+    kind: List[Literal["service", "team", "environment"]] = Query(default=[]),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(get_current_user),
+):
+    with request_latency.labels("search_catalog").time():
+        await search_index.ensure_loaded(db)
+        return search_index.search(q, kinds=kind, limit=limit)
+
+
+@router.get("/services/{service_id}/dependencies", response_model=List[DependencyNodeRead])
+async def list_dependencies(
+    service_id: int,
+    max_depth: Optional[int] = Query(None, ge=1, description="1 for direct dependencies only"),
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(get_current_user),
+):
+    with request_latency.labels("list_dependencies").time():
+        await dependency_graph.ensure_loaded(db)
+        found = dependency_graph.dependencies(service_id, max_depth=max_depth)
+        return [DependencyNodeRead(service_id=node, depth=depth) for node, depth in sorted(found.items())]
+
+
+@router.get("/services/{service_id}/dependents", response_model=List[DependencyNodeRead])
+async def list_dependents(
+    service_id: int,
+    max_depth: Optional[int] = Query(None, ge=1, description="1 for direct dependents only"),
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(get_current_user),
+):
+    """Impact analysis: everything affected if ``service_id`` goes down."""
+    with request_latency.labels("list_dependents").time():
+        await dependency_graph.ensure_loaded(db)
+        found = dependency_graph.dependents(service_id, max_depth=max_depth)
+        return [DependencyNodeRead(service_id=node, depth=depth) for node, depth in sorted(found.items())]
+
+
+@router.get("/dependencies/cycles", response_model=List[List[int]])
+async def dependency_cycles(db: AsyncSession = Depends(get_read_db), user: UserContext = Depends(get_current_user)):
+    with request_latency.labels("dependency_cycles").time():
+        await dependency_graph.ensure_loaded(db)
+        return dependency_graph.cycles()
+
+
+@router.get("/dependencies/deploy-order", response_model=DeployOrderRead)
+async def deploy_order(
+    service_id: List[int] = Query(..., description="Services to deploy; repeat for several"),
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(get_current_user),
+):
+    with request_latency.labels("deploy_order").time():
+        await dependency_graph.ensure_loaded(db)
+        try:
+            return DeployOrderRead(waves=dependency_graph.deploy_waves(service_id))
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+
+
+@router.get("/services/facets", response_model=Dict[str, Dict[str, int]])
+async def service_tag_facets(
+    key: List[str] = Query(default=[], description="Restrict facets to these tag keys"),
+    tag: List[str] = Query(default=[], description="key:value; count only matching services"),
+    match: Literal["all", "any"] = "all",
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(get_current_user),
+):
+    return await tag_index.tag_facets(db, keys=key, filters=tag_index.parse_tag_filters(tag), match=match)
+
+
 @router.get("/teams", response_model=List[TeamRead])
-async def list_teams(db: AsyncSession = Depends(get_db), user: UserContext = Depends(get_current_user)):
+async def list_teams(db: AsyncSession = Depends(get_read_db), user: UserContext = Depends(get_current_user)):
     result = await db.execute(select(Team))
     return result.scalars().all()
 
 
 @router.get("/services/{service_id}/environments", response_model=List[EnvironmentRead])
-async def list_envs(service_id: int, db: AsyncSession = Depends(get_db), user: UserContext = Depends(get_current_user)):
+async def list_envs(
+    service_id: int,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(get_read_db),
+    user: UserContext = Depends(get_current_user),
+):
+    if fields is not None:
+        names = environment_fields.parse(fields)
+        result = await db.execute(environment_fields.select(names).where(Environment.service_id == service_id))
+        return rows_response(names, result)
     result = await db.execute(select(Environment).where(Environment.service_id == service_id))
     return result.scalars().all()
@@ -1,5 +1,5 @@
 from functools import lru_cache
-from typing import List
+from typing import Any, Dict, List
 
 from pydantic import Field
 from pydantic_settings import BaseSettings
@@ -11,11 +11,150 @@ class Settings(BaseSettings):
     database_url: str = Field(
         "postgresql+asyncpg://idp:idp@db:5432/idp", description="DB DSN"
     )
+    read_replica_urls: List[str] = Field(
+        default_factory=list, description="Read replica DSNs used by GET handlers"
+    )
+    read_your_writes_seconds: float = Field(
+        5.0, description="Pin a user to the primary for this long after a write"
+    )
+    replica_health_check_interval: float = Field(
+        10.0, description="Seconds between replica health checks"
+    )
+    idempotency_key_ttl_seconds: int = Field(
+        60 * 60 * 24, description="How long Idempotency-Key responses are replayed"
+    )
+    idempotency_purge_interval_seconds: float = Field(
+        3600.0, description="How often expired Idempotency-Key rows are deleted; 0 disables"
+    )
+    deployment_max_concurrency: int = Field(
+        8, description="Deployments allowed to run at once across all environments"
+    )
+    execution_executor: str = Field("fake", description="What running deployments do: fake, subprocess, script")
+    execution_commands: Dict[str, List[str]] = Field(
+        default_factory=dict, description="Steps of the subprocess executor: step name -> argv"
+    )
+    execution_script: str = Field("deploy.sh", description="Shell script the script executor runs")
+    execution_timeout_seconds: float = Field(1800.0, description="Longest a deployment may run, slot waits included; 0 disables")
+    execution_max_processes: int = Field(4, description="Executor child processes running at once at most")
+    execution_fake_step_seconds: float = Field(0.03, description="How long each fake executor step takes")
+    search_index_ttl_seconds: float = Field(
+        300.0, description="Full rebuild interval for the in-process search index"
+    )
+    dependency_graph_ttl_seconds: float = Field(
+        300.0, description="Full rebuild interval for the in-memory dependency graph"
+    )
+    change_feed_poll_seconds: float = Field(
+        1.0, description="How often /api/changes/stream polls for new changes"
+    )
+    audit_retention_months: int = Field(
+        12, description="Months of audit partitions kept online before archival"
+    )
+    audit_archive_dir: str = Field(
+        "var/audit-archive", description="Where archived audit partitions are written"
+    )
+    audit_seal_interval_seconds: float = Field(
+        5.0, description="How often pending audit rows are hash-chained; 0 disables"
+    )
+    audit_seal_batch_size: int = Field(10_000, description="Audit rows sealed per checkpoint at most")
+    prod_required_approvals: int = Field(
+        1, description="Approvals a prod deployment needs when no approval policy is set"
+    )
+    outbox_poll_seconds: float = Field(
+        1.0, description="How often the outbox dispatcher looks for new events; 0 disables"
+    )
+    outbox_batch_size: int = Field(500, description="Outbox events dispatched per batch at most")
+    outbox_max_attempts: int = Field(
+        5, description="Dispatch attempts before an outbox event is given up on"
+    )
+    outbox_backoff_base_seconds: float = Field(1.0, description="First outbox retry delay; doubles per attempt")
+    outbox_backoff_max_seconds: float = Field(300.0, description="Longest outbox retry delay")
+    notification_sinks: List[str] = Field(
+        default_factory=lambda: ["log"], description="Approval notification sinks: log, stub, webhook"
+    )
+    notification_webhook_url: str = Field(
+        "", description="Where the webhook notification sink POSTs"
+    )
+    notification_poll_seconds: float = Field(
+        1.0, description="How often the notifier looks for due approval notifications; 0 disables"
+    )
+    notification_claim_size: int = Field(500, description="Notifications the notifier leases per pass")
+    notification_max_attempts: int = Field(8, description="Attempts before a notification is dead-lettered")
+    notification_backoff_base_seconds: float = Field(
+        1.0, description="First notification retry delay; doubles per attempt"
+    )
+    notification_backoff_max_seconds: float = Field(600.0, description="Longest notification retry delay")
+    webhook_poll_seconds: float = Field(
+        1.0, description="How often the webhook worker looks for due deliveries; 0 disables"
+    )
+    webhook_claim_size: int = Field(2000, description="Deliveries a webhook worker leases per pass")
+    webhook_batch_size: int = Field(100, description="Events per webhook POST at most")
+    webhook_timeout_seconds: float = Field(5.0, description="Timeout for one webhook POST")
+    webhook_lease_seconds: float = Field(
+        60.0, description="How long leased deliveries are hidden from other workers"
+    )
+    webhook_max_attempts: int = Field(8, description="Attempts before a delivery is dead-lettered")
+    webhook_backoff_base_seconds: float = Field(1.0, description="First retry delay; doubles per attempt")
+    webhook_backoff_max_seconds: float = Field(600.0, description="Longest retry delay")
+    rate_limit_enabled: bool = Field(True, description="Apply token-bucket limits to write endpoints")
+    rate_limit_backend: str = Field(
+        "memory", description="Where rate limit buckets live: 'memory' (per worker) or 'redis' (shared)"
+    )
+    rate_limit_user: str = Field("20/s", description="Default per-user limit on each write route")
+    rate_limit_team: str = Field("100/s", description="Default per-team limit on each write route")
+    rate_limit_routes: Dict[str, Dict[str, str]] = Field(
+        default_factory=lambda: {"trigger_deployment": {"user": "10/s", "team": "30/s"}},
+        description="Per-route overrides of the 'user' and 'team' limits",
+    )
+    team_max_services: int = Field(100, description="Services a team may own unless its quota says otherwise")
+    team_max_environments: int = Field(
+        300, description="Environments across a team's services unless its quota says otherwise"
+    )
+    config_platform_defaults: Dict[str, Any] = Field(
+        default_factory=dict, description="Bottom layer of every environment's rendered config"
+    )
+    config_render_cache_size: int = Field(10_000, description="Rendered and partially merged configs kept per worker")
+    reconcile_provider: str = Field(
+        "none", description="Infrastructure the reconciler applies environments to: none, memory, filesystem"
+    )
+    reconcile_root: str = Field("var/infra", description="Where the filesystem reconcile provider writes objects")
+    reconcile_interval_seconds: float = Field(
+        5.0, description="How often the reconciler looks for changed environments; 0 disables"
+    )
+    reconcile_resync_seconds: float = Field(
+        600.0, description="How often every environment is re-checked for drift; 0 disables"
+    )
+    reconcile_workers: int = Field(4, description="Environments reconciled concurrently")
+    reconcile_rate: str = Field("50/s", description="Reconciles per second across all workers")
+    reconcile_backoff_base_seconds: float = Field(1.0, description="First retry delay; doubles per failure")
+    reconcile_backoff_max_seconds: float = Field(300.0, description="Longest reconcile retry delay")
+    reconcile_batch_size: int = Field(1000, description="Environment ids read per page when queueing")
+    compression_enabled: bool = Field(True, description="gzip/brotli responses for clients that accept them")
+    compression_min_size: int = Field(1024, description="Smallest response body, in bytes, worth compressing")
+    compression_gzip_level: int = Field(6, description="gzip level (1 fastest .. 9 smallest)")
+    compression_brotli_quality: int = Field(4, description="brotli quality (0 fastest .. 11 smallest)")
+    profiling_enabled: bool = Field(False, description="Profile sampled requests (toggled at runtime by admins)")
+    profiling_sample_rate: float = Field(
+        0.0, description="Fraction of requests profiled while enabled; X-IDP-Profile: 1 forces one"
+    )
+    profiling_interval_ms: float = Field(5.0, description="Stack sampling interval for profiled requests")
+    profiling_max_profiles: int = Field(200, description="Finished profiles kept in memory per worker")
+    tracing_enabled: bool = Field(False, description="Record spans for requests, services, SQL and agent calls")
+    tracing_sample_rate: float = Field(1.0, description="Fraction of new traces recorded")
+    tracing_exporter: str = Field("file", description="Where spans go: 'file', 'otlp' or 'none'")
+    tracing_file_path: str = Field("var/traces.jsonl", description="OTLP/JSON spans, one per line, for 'file'")
+    tracing_otlp_endpoint: str = Field(
+        "http://localhost:4318/v1/traces", description="OTLP/HTTP JSON traces endpoint for 'otlp'"
+    )
+    tracing_batch_size: int = Field(512, description="Most spans exported at once")
+    tracing_queue_size: int = Field(10_000, description="Spans buffered for export before new ones are dropped")
+    tracing_export_interval_seconds: float = Field(2.0, description="Longest a finished span waits for export")
     redis_url: str = Field("redis://redis:6379/0", description="Redis URL")
     jwt_secret: str = Field("changeme", description="JWT secret key")
     jwt_algorithm: str = "HS256"
     access_token_expire_minutes: int = 60 * 6
     log_level: str = "INFO"
+    log_debug_sample_rate: float = Field(1.0, description="Fraction of requests whose DEBUG logs are kept")
+    log_queue_size: int = Field(10_000, description="Log records buffered for the writer thread before dropping")
     mandatory_tags: List[str] = ["owner", "data_sensitivity"]
     allowed_data_sensitivity: List[str] = ["public", "internal", "confidential"]
 
@@ -1,44 +1,156 @@
+"""Structured JSON logs, written off the event loop.
+
+Loggers hand records to a ``QueueHandler``. The handler stamps each
+record with the request id and trace ids while it is still in the
+request's context, then enqueues it without blocking. A
+``QueueListener`` thread formats the records as JSON and writes them to
+stdout. If stdout stalls, the queue fills and new records are dropped
+and counted (``log_records_dropped_total``); request handling is never
+held up.
+
+DEBUG records can be sampled with ``log_debug_sample_rate``. The
+decision is made per request, so a sampled request keeps all of its
+debug lines. Records logged outside a request are sampled one by one.
+"""
+
+import atexit
+import json
 import logging
+import queue
+import random
 import sys
-from logging.config import dictConfig
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from prometheus_client import Counter
 
 from app.core.request_context import get_request_id
+from app.core.tracing import current_span
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+dropped_records = Counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+
+# Attributes every LogRecord has; anything else came in through ``extra``.
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
 
 
-def setup_logging(level: str = "INFO") -> None:
-    dictConfig(
-        {
-            "version": 1,
-            "disable_existing_loggers": False,
-            "formatters": {
-                "json": {
-                    "format": (
-                        '{"timestamp": "%(asctime)s", "level": "%(levelname)s", '
-                        '"logger": "%(name)s", "message": "%(message)s", '
-                        '"request_id": "%(request_id)s"}'
-                    )
-                }
-            },
-            "handlers": {
-                "console": {
-                    "class": "logging.StreamHandler",
-                    "level": level,
-                    "formatter": "json",
-                    "stream": sys.stdout,
-                }
-            },
-            "root": {
-                "handlers": ["console"],
-                "level": level,
-            },
+def dumps(payload: Dict[str, Any]) -> str:
+    if orjson is not None:
+        return orjson.dumps(payload, default=str).decode()
+    return json.dumps(payload, default=str, separators=(",", ":"))
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: the standard fields plus any ``extra``."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None) or get_request_id(),
         }
-    )
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        if record.stack_info:
+            payload["stack"] = self.formatStack(record.stack_info)
+        return dumps(payload)
 
 
 class RequestIdFilter(logging.Filter):
+    """Stamp records with the request and trace they were logged in."""
+
     def filter(self, record: logging.LogRecord) -> bool:
         record.request_id = getattr(record, "request_id", None) or get_request_id()
+        span = current_span()
+        if span is not None:
+            record.trace_id = span.trace_id
+            record.span_id = span.span_id
         return True
 
 
-logging.getLogger().addFilter(RequestIdFilter())
+class DebugSamplingFilter(logging.Filter):
+    """Keep a ``rate`` fraction of DEBUG records, chosen per request."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        request_id = getattr(record, "request_id", None) or get_request_id()
+        if request_id == "-":
+            return random.random() < self.rate
+        return zlib.crc32(request_id.encode()) / 2**32 < self.rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message and traceback now: args and frames may not
+        # survive until the listener thread gets to the record.
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records.inc()
+
+
+_installed: Optional[QueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(level: str = "INFO", *, debug_sample_rate: float = 1.0, queue_size: int = 10_000) -> None:
+    """Route the root logger through a queue to a JSON stdout handler.
+
+    Safe to call again: the previous pipeline is flushed and replaced.
+    """
+    global _installed, _listener
+    root = logging.getLogger()
+    if _installed is not None:
+        root.removeHandler(_installed)
+        _listener.stop()
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(JsonFormatter())
+    records: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+    handler = NonBlockingQueueHandler(records)
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(DebugSamplingFilter(debug_sample_rate))
+    _listener = QueueListener(records, console)
+    _listener.start()
+    _installed = handler
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def shutdown_logging() -> None:
+    """Write out queued records and stop the listener thread."""
+    global _installed, _listener
+    if _installed is not None:
+        logging.getLogger().removeHandler(_installed)
+        _listener.stop()
+        _installed = _listener = None
+
+
+atexit.register(shutdown_logging)
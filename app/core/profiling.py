@@ -0,0 +1,248 @@
+"""Opt-in sampling profiler for individual requests.
+
+Off by default. When an admin turns it on (``PUT /api/admin/profiling``
+or ``profiling_enabled``) a ``sample_rate`` fraction of requests, plus
+any sent with ``X-IDP-Profile: 1``, are profiled. While a profiled
+request is in flight a daemon thread wakes every ``profiling_interval_ms``
+and records the request's stack: the running stack when its task holds
+the event loop, otherwise the chain of coroutines it is suspended in.
+Samples are wall-clock, so time spent waiting on the database counts
+as well as time on the CPU.
+
+Each sample is also put into a phase: ``db``, ``guardrails``,
+``serialization``, ``audit`` or ``app``. The phase is decided by the
+outermost frame that matches a rule in ``PHASES``, so the audit log's
+own inserts count as ``audit``, not ``db``. Phase times are the
+request's wall time split by sample share.
+
+Finished profiles keep their collapsed stacks (``frame;frame;frame
+count``, as read by flamegraph.pl and speedscope). They are held in
+memory, newest ``profiling_max_profiles`` per app worker, and can be
+fetched from ``/api/admin/profiles``.
+
+When profiling is off the middleware checks one attribute and passes
+the request through, and no sampler thread runs.
+"""
+
+import asyncio
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import Settings, get_settings
+from app.core.request_context import get_request_id
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-idp-profile"
+
+# (phase, module prefixes, function names); the first rule matching the
+# outermost frame wins.
+PHASES: List[Tuple[str, Tuple[str, ...], Tuple[str, ...]]] = [
+    ("audit", ("app.services.audit",), ()),
+    ("guardrails", ("app.platform.guardrails",), ()),
+    ("serialization", ("fastapi.encoders", "pydantic", "json"), ("serialize_response", "render")),
+    ("db", ("sqlalchemy", "aiosqlite", "asyncpg", "app.db"), ()),
+]
+DEFAULT_PHASE = "app"
+
+
+@dataclass
+class Profile:
+    request_id: str
+    method: str
+    path: str
+    started_at: datetime
+    status_code: Optional[int] = None
+    duration_ms: float = 0.0
+    samples: int = 0
+    stacks: Counter = field(default_factory=Counter)
+    phase_samples: Counter = field(default_factory=Counter)
+
+    @property
+    def phases_ms(self) -> Dict[str, float]:
+        if not self.samples:
+            return {}
+        return {
+            phase: round(self.duration_ms * count / self.samples, 2) for phase, count in self.phase_samples.items()
+        }
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _label(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+def phase_of(frames: List) -> str:
+    """Phase of a stack, given outermost frame first."""
+    for frame in frames:
+        module = frame.f_globals.get("__name__", "")
+        name = frame.f_code.co_name
+        for phase, modules, functions in PHASES:
+            if name in functions or module.startswith(modules):
+                return phase
+    return DEFAULT_PHASE
+
+
+def _suspended_frames(task: asyncio.Task) -> Tuple[List, Optional[str]]:
+    """Frames of a suspended task, outermost first, and what it awaits."""
+    frames = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            frame = getattr(awaitable, "ag_frame", None)
+        if frame is None:
+            return frames, "[await]"
+        frames.append(frame)
+        awaitable = (
+            getattr(awaitable, "cr_await", None)
+            or getattr(awaitable, "gi_yieldfrom", None)
+            or getattr(awaitable, "ag_await", None)
+        )
+    return frames, None
+
+
+def _running_frames(thread_id: int, root) -> List:
+    """Frames of the stack running on ``thread_id``, from ``root`` down."""
+    frame = sys._current_frames().get(thread_id)
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        if frame is root:
+            break
+        frame = frame.f_back
+    else:
+        return []
+    frames.reverse()
+    return frames
+
+
+class Profiler:
+    def __init__(self, settings: Optional[Settings] = None):
+        settings = settings or get_settings()
+        self.enabled = settings.profiling_enabled
+        self.sample_rate = settings.profiling_sample_rate
+        self.interval = settings.profiling_interval_ms / 1000
+        self.profiles: "OrderedDict[str, Profile]" = OrderedDict()
+        self.max_profiles = settings.profiling_max_profiles
+        # task -> (profile, loop, thread id), for requests in flight
+        self._active: Dict[asyncio.Task, Tuple[Profile, asyncio.AbstractEventLoop, int]] = {}
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+
+    def configure(self, *, enabled: bool, sample_rate: Optional[float] = None) -> None:
+        self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        logger.info("Request profiling %s (sample rate %s)", "on" if enabled else "off", self.sample_rate)
+
+    def should_profile(self, headers) -> bool:
+        for name, value in headers:
+            if name == PROFILE_HEADER:
+                return value not in (b"0", b"false")
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def get(self, request_id: str) -> Optional[Profile]:
+        return self.profiles.get(request_id)
+
+    def recent(self, limit: int = 50) -> List[Profile]:
+        return list(reversed(self.profiles.values()))[:limit]
+
+    def clear(self) -> None:
+        self.profiles.clear()
+
+    # -- sampling -----------------------------------------------------------
+
+    def start(self, profile: Profile) -> None:
+        task = asyncio.current_task()
+        with self._lock:
+            self._active[task] = (profile, asyncio.get_running_loop(), threading.get_ident())
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+                self._sampler.start()
+
+    def finish(self, profile: Profile) -> None:
+        with self._lock:
+            self._active.pop(asyncio.current_task(), None)
+        self.profiles[profile.request_id] = profile
+        self.profiles.move_to_end(profile.request_id)
+        while len(self.profiles) > self.max_profiles:
+            self.profiles.popitem(last=False)
+
+    def _sample_loop(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            # Under the lock, so a profile gets no samples once finished.
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    return
+                for task, (profile, loop, thread_id) in self._active.items():
+                    self._sample(task, profile, loop, thread_id)
+
+    def _sample(self, task: asyncio.Task, profile: Profile, loop, thread_id: int) -> None:
+        root = task.get_coro().cr_frame
+        if root is None:
+            return
+        leaf = None
+        if asyncio.current_task(loop) is task:
+            frames = _running_frames(thread_id, root)
+        else:
+            frames, leaf = _suspended_frames(task)
+        if not frames:
+            return
+        labels = [_label(frame) for frame in frames]
+        if leaf:
+            labels.append(leaf)
+        profile.stacks[";".join(labels)] += 1
+        profile.phase_samples[phase_of(frames)] += 1
+        profile.samples += 1
+
+
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    """Profile sampled requests.
+
+    Plain ASGI rather than ``BaseHTTPMiddleware``: it is on every request
+    and must cost nothing when profiling is off. Install it inside
+    ``RequestIdMiddleware`` so the request id is set and the endpoint
+    runs in the task being sampled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not profiler.enabled or scope["type"] != "http" or not profiler.should_profile(scope["headers"]):
+            return await self.app(scope, receive, send)
+
+        profile = Profile(
+            request_id=get_request_id(),
+            method=scope["method"],
+            path=scope["path"],
+            started_at=datetime.utcnow(),
+        )
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        profiler.start(profile)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            profile.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+            profiler.finish(profile)
@@ -0,0 +1,198 @@
+"""Token-bucket rate limits for write endpoints.
+
+Every limited request takes one token from two buckets, one keyed by
+(user, route) and one by (team, route). It goes through only if both
+have a token; otherwise it gets ``429`` with ``Retry-After`` set to when
+the emptier bucket will have one. Limits are ``"<n>/<s|m|h>"``: a bucket
+holds ``n`` tokens and refills at ``n`` per period, so bursts of up to
+``n`` are allowed. ``rate_limit_user`` and ``rate_limit_team`` apply to
+every limited route unless ``rate_limit_routes`` overrides them.
+
+Buckets live in process memory by default, which limits per app worker.
+With ``rate_limit_backend = "redis"`` they live in Redis (``redis_url``)
+and are shared by every worker; the take is one Lua script, so it is
+atomic across workers. If Redis is unreachable the in-process buckets
+are used instead: a broken limiter should not take writes down with it.
+"""
+
+import logging
+import math
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Depends, HTTPException, status
+from prometheus_client import Counter
+
+from app.core.config import Settings, get_settings
+from app.core.security import UserContext, get_current_user
+
+logger = logging.getLogger(__name__)
+
+rate_limited_requests = Counter("api_rate_limited_total", "Requests rejected by rate limits", ["endpoint"])
+
+_PERIODS = {"s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+@dataclass(frozen=True)
+class Limit:
+    capacity: float
+    rate: float  # tokens per second
+
+
+@lru_cache(maxsize=None)
+def parse_limit(spec: str) -> Limit:
+    try:
+        count, period = spec.strip().split("/")
+        capacity = float(count)
+        seconds = _PERIODS[period.strip()]
+    except (KeyError, ValueError):
+        raise ValueError(f"Invalid rate limit {spec!r}; expected e.g. '10/s', '600/m'")
+    if capacity <= 0:
+        raise ValueError(f"Invalid rate limit {spec!r}; must be positive")
+    return Limit(capacity=capacity, rate=capacity / seconds)
+
+
+Bucket = Tuple[str, Limit]
+
+
+class MemoryBuckets:
+    """Buckets in a dict. Safe without locks: take() never awaits."""
+
+    def __init__(self, max_keys: int = 100_000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, updated)
+
+    def take(self, buckets: List[Bucket], cost: float = 1.0) -> float:
+        """Take ``cost`` from every bucket, or from none. Returns 0 or seconds to wait."""
+        now = self.clock()
+        levels = []
+        wait = 0.0
+        for key, limit in buckets:
+            tokens, updated = self._buckets.get(key, (limit.capacity, now))
+            tokens = min(limit.capacity, tokens + (now - updated) * limit.rate)
+            levels.append(tokens)
+            if tokens < cost:
+                wait = max(wait, (cost - tokens) / limit.rate)
+        if wait:
+            return wait
+        for (key, _limit), tokens in zip(buckets, levels):
+            self._buckets[key] = (tokens - cost, now)
+        if len(self._buckets) > self.max_keys:
+            self._prune(now)
+        return 0.0
+
+    def _prune(self, now: float) -> None:
+        # A bucket untouched for a while is full again, the same as no entry.
+        oldest = sorted(self._buckets.items(), key=lambda item: item[1][1])
+        for key, _ in oldest[: len(oldest) // 2]:
+            del self._buckets[key]
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+
+# KEYS: bucket keys. ARGV: cost, then rate and capacity per key.
+_TAKE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local cost = tonumber(ARGV[1])
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+  local rate = tonumber(ARGV[2 * i])
+  local capacity = tonumber(ARGV[2 * i + 1])
+  local bucket = redis.call('HMGET', key, 'tokens', 'updated')
+  local tokens = tonumber(bucket[1]) or capacity
+  local updated = tonumber(bucket[2]) or now
+  tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+  levels[i] = tokens
+  if tokens < cost then wait = math.max(wait, (cost - tokens) / rate) end
+end
+if wait > 0 then return tostring(wait) end
+for i, key in ipairs(KEYS) do
+  local rate = tonumber(ARGV[2 * i])
+  local capacity = tonumber(ARGV[2 * i + 1])
+  redis.call('HSET', key, 'tokens', tostring(levels[i] - cost), 'updated', tostring(now))
+  redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000))
+end
+return '0'
+"""
+
+
+class RedisBuckets:
+    """Buckets shared through Redis (or anything with ``register_script``)."""
+
+    def __init__(self, client):
+        self.client = client
+        self._take = client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, buckets: List[Bucket], cost: float = 1.0) -> float:
+        args: List[float] = [cost]
+        for _key, limit in buckets:
+            args += [limit.rate, limit.capacity]
+        return float(await self._take(keys=[key for key, _ in buckets], args=args))
+
+
+class RateLimiter:
+    def __init__(self, settings: Optional[Settings] = None, shared: Optional[RedisBuckets] = None):
+        self._settings = settings
+        self.local = MemoryBuckets()
+        self.shared = shared
+
+    @property
+    def settings(self) -> Settings:
+        return self._settings or get_settings()
+
+    def _shared(self) -> Optional[RedisBuckets]:
+        if self.shared is None and self.settings.rate_limit_backend == "redis":
+            from redis import asyncio as redis_asyncio
+
+            self.shared = RedisBuckets(redis_asyncio.from_url(self.settings.redis_url))
+        return self.shared
+
+    def buckets(self, route: str, user: UserContext) -> List[Bucket]:
+        settings = self.settings
+        overrides = settings.rate_limit_routes.get(route, {})
+        buckets = [
+            (f"ratelimit:user:{user.username}:{route}", parse_limit(overrides.get("user", settings.rate_limit_user)))
+        ]
+        if user.team_id is not None:
+            team_limit = parse_limit(overrides.get("team", settings.rate_limit_team))
+            buckets.append((f"ratelimit:team:{user.team_id}:{route}", team_limit))
+        return buckets
+
+    async def check(self, route: str, user: UserContext) -> None:
+        if not self.settings.rate_limit_enabled:
+            return
+        buckets = self.buckets(route, user)
+        shared = self._shared()
+        wait = None
+        if shared is not None:
+            try:
+                wait = await shared.take(buckets)
+            except Exception:  # noqa: BLE001
+                logger.warning("Shared rate limit store unavailable; limiting in-process", exc_info=True)
+        if wait is None:
+            wait = self.local.take(buckets)
+        if wait > 0:
+            rate_limited_requests.labels(route).inc()
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+
+
+limiter = RateLimiter()
+
+
+def rate_limited(route: str):
+    """Dependency that applies the write rate limits to ``route``."""
+
+    async def check(user: UserContext = Depends(get_current_user)) -> None:
+        await limiter.check(route, user)
+
+    return check
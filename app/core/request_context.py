@@ -1,6 +1,8 @@
 import contextvars
+from typing import Optional
 
 request_id_ctx = contextvars.ContextVar("request_id", default="-")
+principal_ctx: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("principal", default=None)
 
 
 def set_request_id(value: str) -> None:
@@ -9,3 +11,11 @@ def set_request_id(value: str) -> None:
 
 def get_request_id() -> str:
     return request_id_ctx.get()
+
+
+def set_principal(value: Optional[str]) -> None:
+    principal_ctx.set(value)
+
+
+def get_principal() -> Optional[str]:
+    return principal_ctx.get()
@@ -6,6 +6,7 @@ from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 
 from app.core.config import get_settings
+from app.core.request_context import set_principal
 
 
 bearer_scheme = HTTPBearer()
@@ -36,6 +37,7 @@ async def get_current_user(
         team_id: Optional[int] = payload.get("team_id")
         if username is None or role is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+        set_principal(username)
         return UserContext(username=username, role=role, team_id=team_id)
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
@@ -0,0 +1,491 @@
+"""In-process tracing spans, exported in batches off the request path.
+
+A span is opened for every HTTP request (``TracingMiddleware``), for
+service-layer functions decorated with ``@traced``, for each SQL
+statement and session commit (``instrument_engine`` and the session
+listeners below), for guardrail checks and for Ollama calls. The current
+span lives in a context variable, so spans started in background jobs
+(``jobs.spawn``, ``BackgroundTasks``) are children of the request that
+started them, even after it has finished.
+
+Requests join an incoming W3C ``traceparent`` and get one back naming
+their server span. New traces are sampled at ``tracing_sample_rate``.
+Spans in an unsampled trace are never created.
+
+Finished spans go onto a bounded queue. A daemon thread drains it in
+batches of ``tracing_batch_size`` to the exporter:
+
+* ``file``: OTLP/JSON spans, one per line, appended to ``tracing_file_path``;
+* ``otlp``: OTLP/HTTP JSON POSTed to ``tracing_otlp_endpoint`` (a
+  collector, Jaeger or Tempo);
+* ``none``: spans are dropped.
+
+When the queue is full, spans are dropped and counted instead of
+blocking a request. With ``tracing_enabled`` off, ``span`` returns a
+shared no-op and ``@traced`` calls straight through.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from prometheus_client import Counter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import Settings, get_settings
+from app.core.request_context import get_request_id
+
+logger = logging.getLogger(__name__)
+
+dropped_spans = Counter("tracing_dropped_spans_total", "Spans dropped because the export queue was full")
+
+TRACEPARENT_HEADER = b"traceparent"
+_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+class _Unsampled:
+    """Current-span marker for a trace that is not being recorded."""
+
+
+UNSAMPLED = _Unsampled()
+_current: ContextVar[Any] = ContextVar("trace_span", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    kind: str = "internal"
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": _KINDS[self.kind],
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """``(trace_id, parent span id, sampled)`` from a W3C traceparent."""
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def current_span() -> Optional[Span]:
+    span = _current.get()
+    return span if isinstance(span, Span) else None
+
+
+# -- export ---------------------------------------------------------------
+
+
+class FileExporter:
+    def __init__(self, path: str):
+        self.path = path
+
+    def __call__(self, spans: List[Span]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a") as handle:
+            handle.writelines(json.dumps(span.to_otlp()) + "\n" for span in spans)
+
+
+class OTLPExporter:
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self._client = httpx.Client(timeout=timeout)
+
+    def __call__(self, spans: List[Span]) -> None:
+        body = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                    "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": [s.to_otlp() for s in spans]}],
+                }
+            ]
+        }
+        self._client.post(self.endpoint, json=body).raise_for_status()
+
+
+class BatchExporter:
+    """Hand finished spans to ``export`` in batches, from a daemon thread."""
+
+    def __init__(
+        self,
+        export: Callable[[List[Span]], None],
+        *,
+        batch_size: int = 512,
+        queue_size: int = 10_000,
+        interval: float = 2.0,
+    ):
+        self.export = export
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            dropped_spans.inc()
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Export what is queued and stop the thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Span] = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if span is None:
+                    stopping = True
+                    break
+                batch.append(span)
+            if batch:
+                try:
+                    self.export(batch)
+                except Exception as exc:  # noqa: BLE001
+                    logger.warning("Dropped %s spans: export failed: %s", len(batch), exc)
+
+
+def make_exporter(settings: Settings) -> Optional[BatchExporter]:
+    if settings.tracing_exporter == "none":
+        return None
+    if settings.tracing_exporter == "otlp":
+        export: Callable[[List[Span]], None] = OTLPExporter(settings.tracing_otlp_endpoint, settings.app_name)
+    elif settings.tracing_exporter == "file":
+        export = FileExporter(settings.tracing_file_path)
+    else:
+        raise ValueError(f"Unknown tracing exporter {settings.tracing_exporter!r}; expected file, otlp or none")
+    return BatchExporter(
+        export,
+        batch_size=settings.tracing_batch_size,
+        queue_size=settings.tracing_queue_size,
+        interval=settings.tracing_export_interval_seconds,
+    )
+
+
+# -- spans ----------------------------------------------------------------
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _SpanScope:
+    def __init__(self, tracer: "Tracer", name: str, kind: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.span: Optional[Span] = None
+        self.token = None
+
+    def __enter__(self) -> Optional[Span]:
+        self.span = self.tracer.start_span(self.name, kind=self.kind, attributes=self.attributes)
+        self.token = _current.set(self.span if self.span is not None else UNSAMPLED)
+        return self.span
+
+    def __exit__(self, exc_type, exc, _tb):
+        _current.reset(self.token)
+        if self.span is not None:
+            self.tracer.end_span(self.span, error=f"{exc_type.__name__}: {exc}" if exc_type else None)
+        return False
+
+
+class Tracer:
+    def __init__(self, settings: Optional[Settings] = None):
+        settings = settings or get_settings()
+        self.enabled = settings.tracing_enabled
+        self.sample_rate = settings.tracing_sample_rate
+        self.exporter: Optional[BatchExporter] = make_exporter(settings) if self.enabled else None
+
+    def start_span(
+        self,
+        name: str,
+        *,
+        kind: str = "internal",
+        attributes: Optional[Dict[str, Any]] = None,
+        remote_parent: Optional[Tuple[str, str, bool]] = None,
+        child_only: bool = False,
+    ) -> Optional[Span]:
+        """A started span under the current one, or None when not sampled.
+
+        With ``child_only``, None as well when there is no current span.
+        Does not make the span current; ``span`` does.
+        """
+        if remote_parent is not None:
+            trace_id, parent_id, sampled = remote_parent
+        else:
+            parent = _current.get()
+            if parent is UNSAMPLED:
+                return None
+            if parent is None:
+                if child_only:
+                    return None
+                trace_id, parent_id = None, None
+                sampled = self.sample_rate >= 1 or random.random() < self.sample_rate
+            else:
+                trace_id, parent_id, sampled = parent.trace_id, parent.span_id, True
+        if not sampled:
+            return None
+        return Span(
+            name=name,
+            trace_id=trace_id or f"{random.getrandbits(128):032x}",
+            span_id=f"{random.getrandbits(64):016x}",
+            parent_id=parent_id,
+            kind=kind,
+            attributes=attributes or {},
+        )
+
+    def end_span(self, span: Span, error: Optional[str] = None) -> None:
+        span.end_ns = time.time_ns()
+        span.error = error
+        if self.exporter is not None:
+            self.exporter.submit(span)
+
+    def span(self, name: str, *, kind: str = "internal", **attributes: Any):
+        """Context manager running its block in a child span of the current one."""
+        if not self.enabled:
+            return _NOOP
+        return _SpanScope(self, name, kind, attributes)
+
+    def shutdown(self) -> None:
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+
+tracer = Tracer()
+
+
+def traced(name: Optional[str] = None, *, kind: str = "internal"):
+    """Run the decorated function (sync or async) in a span.
+
+    The span is named ``name`` or ``<module>.<function>`` without the
+    ``app.`` prefix, e.g. ``services.deployment.trigger_deployment``.
+    """
+
+    def decorate(fn):
+        span_name = name or f"{fn.__module__.removeprefix('app.')}.{fn.__qualname__}"
+        if asyncio.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not tracer.enabled:
+                    return await fn(*args, **kwargs)
+                with tracer.span(span_name, kind=kind):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with tracer.span(span_name, kind=kind):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+# -- database -------------------------------------------------------------
+
+
+def instrument_engine(engine) -> None:
+    """Open a client span around every SQL statement run on ``engine``.
+
+    Only within a trace: statements run outside any span (the outbox
+    dispatcher's polling, say) are not worth a trace each.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    system = sync_engine.dialect.name
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(_conn, _cursor, statement, _parameters, context, executemany):
+        if tracer.enabled and context is not None:
+            verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+            context._trace_span = tracer.start_span(
+                f"db {verb}",
+                kind="client",
+                attributes={"db.system": system, "db.statement": statement[:1000], "db.executemany": executemany},
+                child_only=True,
+            )
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(_conn, cursor, _statement, _parameters, context, _executemany):
+        span = getattr(context, "_trace_span", None)
+        if span is not None:
+            context._trace_span = None
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                span.attributes["db.rowcount"] = cursor.rowcount
+            tracer.end_span(span)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        context = exception_context.execution_context
+        span = getattr(context, "_trace_span", None)
+        if span is not None:
+            context._trace_span = None
+            error = exception_context.original_exception
+            tracer.end_span(span, error=f"{type(error).__name__}: {error}")
+
+
+# A commit span covers the flush and the COMMIT. It is not made current:
+# the flush's statements show up as its siblings, within its time. Like
+# statements, commits are only traced within a trace.
+@event.listens_for(Session, "before_commit")
+def _before_commit(session) -> None:
+    if tracer.enabled:
+        session.info["trace_commit"] = tracer.start_span("db.commit", kind="client", child_only=True)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session) -> None:
+    span = session.info.pop("trace_commit", None)
+    if span is not None:
+        tracer.end_span(span)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session) -> None:
+    span = session.info.pop("trace_commit", None)
+    if span is not None:
+        tracer.end_span(span, error="rolled back")
+
+
+# -- HTTP -----------------------------------------------------------------
+
+
+class TracingMiddleware:
+    """Open a server span per HTTP request.
+
+    Plain ASGI, like ``ProfilingMiddleware``, and installed inside
+    ``RequestIdMiddleware`` so spans carry the request id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not tracer.enabled or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        remote = None
+        for name, value in scope["headers"]:
+            if name == TRACEPARENT_HEADER:
+                remote = parse_traceparent(value.decode("latin-1"))
+                break
+        span = tracer.start_span(
+            f"{scope['method']} {scope['path']}",
+            kind="server",
+            attributes={"http.method": scope["method"], "http.target": scope["path"], "request_id": get_request_id()},
+            remote_parent=remote,
+        )
+        if span is None:
+            token = _current.set(UNSAMPLED)
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                _current.reset(token)
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                span.attributes["http.status_code"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (TRACEPARENT_HEADER, span.traceparent.encode())]
+            await send(message)
+
+        token = _current.set(span)
+        error = None
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except BaseException as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                span.name = f"{scope['method']} {route.path}"
+                span.attributes["http.route"] = route.path
+            if error is None and span.attributes.get("http.status_code", 200) >= 500:
+                error = f"HTTP {span.attributes['http.status_code']}"
+            tracer.end_span(span, error=error)
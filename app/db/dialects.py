@@ -0,0 +1,17 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def dialect_insert(db: AsyncSession, entity):
+    """INSERT construct for the session's dialect.
+
+    Postgres and sqlite both expose ``on_conflict_do_nothing`` /
+    ``on_conflict_do_update`` on their own ``insert``; the generic one
+    does not.
+    """
+    name = db.get_bind().dialect.name
+    if name == "postgresql":
+        return postgresql.insert(entity)
+    if name == "sqlite":
+        return sqlite.insert(entity)
+    raise NotImplementedError(f"ON CONFLICT inserts are not supported on {name}")
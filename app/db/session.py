@@ -1,18 +1,129 @@
+import itertools
+import logging
+import time
+from typing import Dict, List, Optional, Sequence
+
+from fastapi import Depends
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
 from app.core.config import get_settings
+from app.core.request_context import get_principal
+from app.core.security import UserContext, get_current_user
+from app.core.tracing import instrument_engine
+
+logger = logging.getLogger(__name__)
 
 
 settings = get_settings()
 engine = create_async_engine(settings.database_url, echo=False, future=True)
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+replica_engines = [
+    create_async_engine(url, echo=False, future=True) for url in settings.read_replica_urls
+]
+for _engine in (engine, *replica_engines):
+    instrument_engine(_engine)
 
 
 class Base(DeclarativeBase):
     pass
 
 
+class ReplicaRouter:
+    """Routes writes to the primary and reads to healthy replicas.
+
+    Replicas are picked round-robin. A principal that commits a write is
+    pinned to the primary for ``sticky_seconds`` so it reads its own
+    writes despite replication lag. Replica health is re-checked lazily,
+    at most once every ``health_check_interval`` seconds; with no healthy
+    replica, reads fall back to the primary.
+    """
+
+    def __init__(
+        self,
+        primary: async_sessionmaker,
+        replicas: Sequence[async_sessionmaker] = (),
+        *,
+        sticky_seconds: float = 5.0,
+        health_check_interval: float = 10.0,
+    ):
+        self.primary = primary
+        self.replicas: List[async_sessionmaker] = list(replicas)
+        self.sticky_seconds = sticky_seconds
+        self.health_check_interval = health_check_interval
+        self._healthy = [True] * len(self.replicas)
+        self._cursor = itertools.count()
+        self._pinned: Dict[str, float] = {}
+        self._last_health_check: Optional[float] = None
+
+    def mark_write(self, principal: Optional[str]) -> None:
+        if not principal or self.sticky_seconds <= 0:
+            return
+        now = time.monotonic()
+        if len(self._pinned) > 10_000:
+            self._pinned = {key: until for key, until in self._pinned.items() if until > now}
+        self._pinned[principal] = now + self.sticky_seconds
+
+    def is_pinned(self, principal: Optional[str]) -> bool:
+        until = self._pinned.get(principal) if principal else None
+        return until is not None and until > time.monotonic()
+
+    def pick(self, principal: Optional[str] = None) -> async_sessionmaker:
+        if not self.replicas or self.is_pinned(principal):
+            return self.primary
+        healthy = [replica for replica, ok in zip(self.replicas, self._healthy) if ok]
+        if not healthy:
+            return self.primary
+        return healthy[next(self._cursor) % len(healthy)]
+
+    async def check_health(self) -> None:
+        self._last_health_check = time.monotonic()
+        for idx, replica in enumerate(self.replicas):
+            try:
+                async with replica() as session:
+                    await session.execute(text("SELECT 1"))
+            except Exception as exc:  # noqa: BLE001
+                if self._healthy[idx]:
+                    logger.warning("Read replica %s marked unhealthy: %s", idx, exc)
+                self._healthy[idx] = False
+            else:
+                self._healthy[idx] = True
+
+    async def session(self):
+        async with self.primary() as session:
+            event.listen(session.sync_session, "after_commit", self._on_commit)
+            yield session
+
+    async def read_session(self, principal: Optional[str] = None):
+        if self.replicas and (
+            self._last_health_check is None
+            or time.monotonic() - self._last_health_check >= self.health_check_interval
+        ):
+            await self.check_health()
+        async with self.pick(principal)() as session:
+            yield session
+
+    def _on_commit(self, _session) -> None:
+        self.mark_write(get_principal())
+
+
+db_router = ReplicaRouter(
+    SessionLocal,
+    [
+        async_sessionmaker(replica, expire_on_commit=False, class_=AsyncSession)
+        for replica in replica_engines
+    ],
+    sticky_seconds=settings.read_your_writes_seconds,
+    health_check_interval=settings.replica_health_check_interval,
+)
+
+
 async def get_db():
-    async with SessionLocal() as session:
+    async for session in db_router.session():
+        yield session
+
+
+async def get_read_db(user: UserContext = Depends(get_current_user)):
+    async for session in db_router.read_session(user.username):
         yield session
@@ -1,20 +1,91 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from typing import Dict
 
 from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 
-from app.api.middleware import RequestIdMiddleware
+from app.api.middleware import CompressionMiddleware, RequestIdMiddleware
 from app.api.routes import router
 from app.core.config import get_settings
 from app.core.logging import setup_logging
+from app.core.profiling import ProfilingMiddleware
+from app.core.tracing import TracingMiddleware, tracer
 from app.core.request_context import get_request_id
+from app.platform.reconciler import run_reconciler
+from app.services import audit_chain, idempotency, notifications, outbox, webhooks
+from app.services.jobs import drain
 
 settings = get_settings()
-setup_logging(settings.log_level)
+setup_logging(
+    settings.log_level, debug_sample_rate=settings.log_debug_sample_rate, queue_size=settings.log_queue_size
+)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title=settings.app_name)
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Run background workers for the lifetime of the app."""
+    stop = asyncio.Event()
+    workers = []
+    if settings.audit_seal_interval_seconds > 0:
+        workers.append(
+            asyncio.create_task(
+                audit_chain.run_sealer(
+                    stop,
+                    interval=settings.audit_seal_interval_seconds,
+                    batch_size=settings.audit_seal_batch_size,
+                )
+            )
+        )
+    if settings.outbox_poll_seconds > 0:
+        workers.append(
+            asyncio.create_task(
+                outbox.run_dispatcher(
+                    stop,
+                    interval=settings.outbox_poll_seconds,
+                    batch_size=settings.outbox_batch_size,
+                    max_attempts=settings.outbox_max_attempts,
+                )
+            )
+        )
+    if settings.webhook_poll_seconds > 0:
+        workers.append(asyncio.create_task(webhooks.run_delivery_worker(stop, interval=settings.webhook_poll_seconds)))
+    if settings.notification_poll_seconds > 0:
+        workers.append(
+            asyncio.create_task(notifications.run_notifier(stop, interval=settings.notification_poll_seconds))
+        )
+    if settings.idempotency_purge_interval_seconds > 0:
+        workers.append(
+            asyncio.create_task(
+                idempotency.run_purger(stop, interval=settings.idempotency_purge_interval_seconds)
+            )
+        )
+    if settings.reconcile_interval_seconds > 0 and settings.reconcile_provider != "none":
+        workers.append(
+            asyncio.create_task(run_reconciler(stop, interval=settings.reconcile_interval_seconds))
+        )
+    yield
+    stop.set()
+    await asyncio.gather(*workers, return_exceptions=True)
+    # Let in-flight deployments and event handlers finish.
+    await drain()
+    tracer.shutdown()
+
+
+app = FastAPI(title=settings.app_name, lifespan=lifespan)
+if settings.compression_enabled:
+    # Innermost, so profiles and spans include the time spent compressing.
+    app.add_middleware(
+        CompressionMiddleware,
+        min_size=settings.compression_min_size,
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality,
+    )
+# Inside RequestIdMiddleware: profiles and spans carry the request id.
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(TracingMiddleware)
 app.add_middleware(RequestIdMiddleware)
 app.include_router(router, prefix="/api")
 
@@ -1,8 +1,8 @@
 import enum
-from datetime import datetime
+from datetime import date, datetime
 from typing import Any, Dict, Optional
 
-from sqlalchemy import JSON, Boolean, DateTime, Enum, ForeignKey, String, Text
+from sqlalchemy import JSON, BigInteger, Boolean, Date, DateTime, Enum, Float, ForeignKey, Index, Integer, LargeBinary, String, Text, UniqueConstraint, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.session import Base
@@ -15,10 +15,30 @@ class EnvironmentTier(str, enum.Enum):
 
 
 class DeploymentStatus(str, enum.Enum):
+    # Production only: waits for quorum (see app.services.approvals).
+    awaiting_approval = "awaiting_approval"
     pending = "pending"
     running = "running"
     succeeded = "succeeded"
     failed = "failed"
+    # Never ran: a newer version was queued for the same environment.
+    superseded = "superseded"
+
+
+class PromotionStatus(str, enum.Enum):
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+    # A guardrail refused the next tier's deployment (e.g. no approvals).
+    blocked = "blocked"
+    superseded = "superseded"
+
+
+class WebhookDeliveryStatus(str, enum.Enum):
+    pending = "pending"
+    delivered = "delivered"
+    # Gave up after webhook_max_attempts; redrive to try again.
+    dead = "dead"
 
 
 class AuditAction(str, enum.Enum):
@@ -34,11 +54,33 @@ class Team(Base):
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
     description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Defaults for every environment of the team's services; see
+    # app.services.config_layers.
+    config: Mapped[Dict[str, Any]] = mapped_column(JSON, default=dict)
+    config_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     services: Mapped[list["Service"]] = relationship(back_populates="team")
 
 
+class TeamQuota(Base):
+    """A team's resource limits and its running usage against them.
+
+    The counters are kept up to date in the same transaction as the
+    change they count, so enforcing a limit is one conditional UPDATE
+    rather than a COUNT(*) per request.
+    """
+
+    __tablename__ = "team_quotas"
+
+    team_id: Mapped[int] = mapped_column(ForeignKey("teams.id", ondelete="CASCADE"), primary_key=True)
+    services: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    environments: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # NULL means the team_max_* setting.
+    max_services: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    max_environments: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+
 class Service(Base):
     __tablename__ = "services"
 
@@ -47,6 +89,8 @@ class Service(Base):
     description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     team_id: Mapped[Optional[int]] = mapped_column(ForeignKey("teams.id"))
     config: Mapped[Dict[str, Any]] = mapped_column(JSON, default=dict)
+    # Content hash of ``config``, kept by its write path.
+    config_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     tags: Mapped[Dict[str, str]] = mapped_column(JSON, default=dict)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
@@ -59,14 +103,56 @@ class Service(Base):
     )
 
 
+class ServiceTag(Base):
+    """Normalized copy of ``Service.tags`` for indexed tag queries.
+
+    ``Service.tags`` stays the source of truth; rows here are rewritten
+    whenever a service's tags are.
+    """
+
+    __tablename__ = "service_tags"
+    __table_args__ = (Index("ix_service_tags_key_value", "key", "value", "service_id"),)
+
+    service_id: Mapped[int] = mapped_column(ForeignKey("services.id", ondelete="CASCADE"), primary_key=True)
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    value: Mapped[str] = mapped_column(String(255), nullable=False)
+
+
+class ServiceDependency(Base):
+    """``service_id`` depends on ``depends_on_id``."""
+
+    __tablename__ = "service_dependencies"
+    __table_args__ = (Index("ix_service_dependencies_depends_on", "depends_on_id", "service_id"),)
+
+    service_id: Mapped[int] = mapped_column(ForeignKey("services.id", ondelete="CASCADE"), primary_key=True)
+    depends_on_id: Mapped[int] = mapped_column(ForeignKey("services.id", ondelete="CASCADE"), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class Environment(Base):
     __tablename__ = "environments"
+    __table_args__ = (
+        Index(
+            "ix_environments_unreconciled",
+            "id",
+            postgresql_where=text("generation <> observed_generation"),
+            sqlite_where=text("generation <> observed_generation"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(50), nullable=False)
     tier: Mapped[EnvironmentTier] = mapped_column(Enum(EnvironmentTier), nullable=False)
     service_id: Mapped[int] = mapped_column(ForeignKey("services.id"))
+    # Working copy of the current version's config, for reads.
     config: Mapped[Dict[str, Any]] = mapped_column(JSON, default=dict)
+    # Current version's content hash; equal hashes mean equal configs.
+    config_hash: Mapped[Optional[str]] = mapped_column(ForeignKey("config_blobs.hash"), nullable=True)
+    # Bumped whenever desired state (rendered config, deployed version)
+    # changes; the reconciler copies it to observed_generation once the
+    # infrastructure matches. See app.platform.reconciler.
+    generation: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
+    observed_generation: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     service: Mapped[Service] = relationship(back_populates="environments")
@@ -75,8 +161,45 @@ class Environment(Base):
     )
 
 
+class ConfigBlob(Base):
+    """One distinct environment config, shared by every version that has it.
+
+    Addressed by the SHA-256 of its canonical JSON; see
+    ``app.services.config_versions``.
+    """
+
+    __tablename__ = "config_blobs"
+
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # zlib-compressed canonical JSON.
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    # Uncompressed size in bytes.
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class EnvironmentConfigVersion(Base):
+    """An environment's config history: version N pointed at this blob."""
+
+    __tablename__ = "environment_config_versions"
+
+    environment_id: Mapped[int] = mapped_column(
+        ForeignKey("environments.id", ondelete="CASCADE"), primary_key=True
+    )
+    version: Mapped[int] = mapped_column(Integer, primary_key=True)
+    config_hash: Mapped[str] = mapped_column(ForeignKey("config_blobs.hash"), nullable=False, index=True)
+    created_by: Mapped[str] = mapped_column(String(255), nullable=False)
+    # Set when this version was written by a rollback to that version.
+    rolled_back_from: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class Deployment(Base):
     __tablename__ = "deployments"
+    __table_args__ = (
+        # Idempotency key for triggers: one deployment per version per env.
+        UniqueConstraint("service_id", "environment_id", "version", name="uq_deployments_version"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     service_id: Mapped[int] = mapped_column(ForeignKey("services.id"))
@@ -86,6 +209,9 @@ class Deployment(Base):
         Enum(DeploymentStatus), default=DeploymentStatus.pending
     )
     initiated_by: Mapped[str] = mapped_column(String(255), nullable=False)
+    # Authenticated caller of the trigger (``initiated_by`` is free text);
+    # barred from approving their own prod deployment.
+    triggered_by: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
@@ -95,6 +221,40 @@ class Deployment(Base):
     environment: Mapped[Environment] = relationship(back_populates="deployments")
 
 
+class DeploymentApproval(Base):
+    __tablename__ = "deployment_approvals"
+
+    deployment_id: Mapped[int] = mapped_column(ForeignKey("deployments.id", ondelete="CASCADE"), primary_key=True)
+    approver: Mapped[str] = mapped_column(String(255), primary_key=True)
+    comment: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class PromotionPipeline(Base):
+    """One version's rollout through dev, staging and prod.
+
+    ``current_tier`` is the tier whose deployment the pipeline is waiting
+    on; ``app.services.promotions`` moves it up as deployments succeed.
+    """
+
+    __tablename__ = "promotion_pipelines"
+    __table_args__ = (Index("ix_promotion_pipelines_lookup", "service_id", "version", "current_tier", "status"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    service_id: Mapped[int] = mapped_column(ForeignKey("services.id", ondelete="CASCADE"), nullable=False)
+    version: Mapped[str] = mapped_column(String(255), nullable=False)
+    current_tier: Mapped[EnvironmentTier] = mapped_column(Enum(EnvironmentTier), nullable=False)
+    status: Mapped[PromotionStatus] = mapped_column(
+        Enum(PromotionStatus), default=PromotionStatus.running, nullable=False
+    )
+    initiated_by: Mapped[str] = mapped_column(String(255), nullable=False)
+    detail: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+
 class PlatformPolicy(Base):
     __tablename__ = "platform_policies"
 
@@ -107,7 +267,20 @@ class PlatformPolicy(Base):
 
 
 class AuditLog(Base):
+    """Head of the partitioned audit log; see ``app.services.audit_partitions``."""
+
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        Index("ix_audit_logs_created_at", "created_at"),
+        Index(
+            "ix_audit_logs_unsealed",
+            "id",
+            postgresql_where=text("hash IS NULL"),
+            sqlite_where=text("hash IS NULL"),
+        ),
+        # Rows are moved out to monthly tables on sqlite; ids must not be reused.
+        {"sqlite_autoincrement": True},
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     action: Mapped[AuditAction] = mapped_column(Enum(AuditAction), nullable=False)
@@ -118,3 +291,170 @@ class AuditLog(Base):
     # because "metadata" is reserved by SQLAlchemy's DeclarativeBase.
     details: Mapped[Dict[str, Any]] = mapped_column("metadata", JSON, default=dict)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Hash chain, filled in by the sealer (app.services.audit_chain);
+    # NULL until the row is sealed into a checkpoint.
+    prev_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    checkpoint_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, index=True)
+
+
+class AuditCheckpoint(Base):
+    """One sealed batch of audit rows.
+
+    Rows with this ``checkpoint_id`` form a hash chain in id order that
+    starts from ``prev_hash`` and ends at ``last_hash``; ``merkle_root``
+    covers their row hashes. Consecutive checkpoints link through
+    ``prev_hash``, so each one can be verified independently.
+    """
+
+    __tablename__ = "audit_checkpoints"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    first_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    last_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    row_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    prev_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    last_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    merkle_root: Mapped[str] = mapped_column(String(64), nullable=False)
+    # Rows were archived by retention; only the links are still checked.
+    archived: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class CatalogChange(Base):
+    """Append-only feed of catalog mutations for incremental consumers.
+
+    ``seq`` follows commit order (see ``app.services.changes``), so a
+    consumer that remembers the last ``seq`` it applied never misses one.
+    """
+
+    __tablename__ = "catalog_changes"
+    # Never reuse a seq, even after the newest rows are deleted.
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    entity_type: Mapped[str] = mapped_column(String(100), nullable=False)
+    entity_id: Mapped[str] = mapped_column(String(100), nullable=False)
+    op: Mapped[AuditAction] = mapped_column(Enum(AuditAction), nullable=False)
+    # {field: [old, new]} for the fields that changed.
+    diff: Mapped[Dict[str, Any]] = mapped_column(JSON, default=dict)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class OutboxEvent(Base):
+    """Event written in the transaction that caused it; see ``app.services.outbox``."""
+
+    __tablename__ = "outbox_events"
+    __table_args__ = (
+        Index(
+            "ix_outbox_events_undispatched",
+            "id",
+            postgresql_where=text("dispatched_at IS NULL"),
+            sqlite_where=text("dispatched_at IS NULL"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    topic: Mapped[str] = mapped_column(String(100), nullable=False)
+    payload: Mapped[Dict[str, Any]] = mapped_column(JSON, default=dict)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Set after a failed attempt: not retried before then.
+    next_attempt_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # Set once every consumer took the event, or it ran out of attempts.
+    dispatched_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+
+class WebhookEndpoint(Base):
+    __tablename__ = "webhook_endpoints"
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    url: Mapped[str] = mapped_column(String(2048), nullable=False)
+    # HMAC-SHA256 key for the X-IDP-Signature header.
+    secret: Mapped[str] = mapped_column(String(255), nullable=False)
+    # Topic prefixes to deliver; empty means every topic.
+    topics: Mapped[list] = mapped_column(JSON, default=list)
+    max_concurrency: Mapped[int] = mapped_column(Integer, default=4, nullable=False)
+    active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    created_by: Mapped[str] = mapped_column(String(255), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class WebhookDelivery(Base):
+    """One outbox event owed to one endpoint."""
+
+    __tablename__ = "webhook_deliveries"
+    __table_args__ = (
+        UniqueConstraint("endpoint_id", "event_id", name="uq_webhook_deliveries_event"),
+        Index("ix_webhook_deliveries_due", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    endpoint_id: Mapped[int] = mapped_column(ForeignKey("webhook_endpoints.id", ondelete="CASCADE"), nullable=False)
+    event_id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), ForeignKey("outbox_events.id", ondelete="CASCADE"), nullable=False
+    )
+    status: Mapped[WebhookDeliveryStatus] = mapped_column(
+        Enum(WebhookDeliveryStatus), default=WebhookDeliveryStatus.pending, nullable=False
+    )
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # Due time while pending; pushed out by a lease while a worker holds it.
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    delivered_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class NotificationDelivery(Base):
+    """One approval notification owed to one sink."""
+
+    __tablename__ = "notification_deliveries"
+    __table_args__ = (
+        UniqueConstraint("sink", "event_id", name="uq_notification_deliveries_event"),
+        Index("ix_notification_deliveries_due", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    sink: Mapped[str] = mapped_column(String(50), nullable=False)
+    event_id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), ForeignKey("outbox_events.id", ondelete="CASCADE"), nullable=False
+    )
+    status: Mapped[WebhookDeliveryStatus] = mapped_column(
+        Enum(WebhookDeliveryStatus), default=WebhookDeliveryStatus.pending, nullable=False
+    )
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # Due time while pending; pushed out by a lease while the notifier holds it.
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    delivered_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # "<principal>:<Idempotency-Key header>" so clients cannot collide.
+    key: Mapped[str] = mapped_column(String(512), primary_key=True)
+    request_fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)
+    status_code: Mapped[int] = mapped_column(Integer, nullable=False)
+    response_body: Mapped[Dict[str, Any]] = mapped_column(JSON, default=dict)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
+class DeploymentRollup(Base):
+    """Per-day deployment outcome counters, maintained on each transition.
+
+    Analytics read these instead of scanning ``deployments``, so a
+    dashboard query costs O(buckets) rather than O(deployments).
+    """
+
+    __tablename__ = "deployment_rollups"
+
+    bucket: Mapped[date] = mapped_column(Date, primary_key=True)
+    service_id: Mapped[int] = mapped_column(ForeignKey("services.id"), primary_key=True)
+    tier: Mapped[EnvironmentTier] = mapped_column(Enum(EnvironmentTier), primary_key=True)
+    succeeded: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    failed: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # Sum over succeeded deployments of (finished - triggered).
+    lead_time_seconds: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
@@ -3,6 +3,7 @@ from typing import Dict, List
 from fastapi import HTTPException, status
 
 from app.core.config import get_settings
+from app.core.tracing import traced
 from app.models.models import Deployment, EnvironmentTier, Service
 
 
@@ -10,6 +11,7 @@ class GuardrailEngine:
     def __init__(self):
         self.settings = get_settings()
 
+    @traced("guardrails.validate_service_tags")
     def validate_service_tags(self, tags: Dict[str, str]) -> None:
         missing = [tag for tag in self.settings.mandatory_tags if tag not in tags]
         if missing:
@@ -24,6 +26,7 @@ class GuardrailEngine:
                 detail="Invalid data_sensitivity tag value",
             )
 
+    @traced("guardrails.validate_environment_promotion")
     def validate_environment_promotion(self, environments: List[str], target: EnvironmentTier):
         order = [EnvironmentTier.dev, EnvironmentTier.staging, EnvironmentTier.prod]
         existing_set = {env.lower() for env in environments}
@@ -38,13 +41,15 @@ class GuardrailEngine:
                         )
                 break
 
-    def validate_production_deployment(self, deployment: Deployment, approvals: List[str]):
-        if deployment.environment.tier == EnvironmentTier.prod and not approvals:
+    @traced("guardrails.validate_production_deployment")
+    def validate_production_deployment(self, deployment: Deployment, approvals: List[str], required: int = 1):
+        if deployment.environment.tier == EnvironmentTier.prod and len(set(approvals)) < max(required, 1):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Production deployments require approvals",
             )
 
+    @traced("guardrails.validate_config")
     def validate_config(self, config: Dict[str, str]) -> None:
         banned_keys = {"password", "secret", "token"}
         for key in config.keys():
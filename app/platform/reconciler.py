@@ -0,0 +1,413 @@
+"""Reconcile environments' infrastructure with their desired state.
+
+Desired state is in the database: an environment's rendered config (see
+``app.services.config_layers``) and the version of its latest successful
+deployment. Actual state is behind a provider, the boundary to whatever
+runs the infrastructure. A provider has a ``name`` and two coroutines:
+``get(key)`` returns the document last applied for ``key``, or None, and
+``apply(key, document)`` creates or replaces it. ``reconcile_provider``
+picks one: ``memory`` and ``filesystem`` are fakes for local runs and
+tests.
+
+The work per poll is bounded by what changed, not by catalog size:
+
+* Every write that changes desired state bumps ``Environment.generation``.
+  A poll reads only rows whose generation differs from
+  ``observed_generation``, through a partial index. An idle catalog of
+  100k environments costs one index probe that finds nothing.
+* Every ``reconcile_resync_seconds`` a resync queues all environments,
+  page by page, to catch drift made outside the platform.
+* Keys go through a ``WorkQueue``. A key queued twice is processed once.
+  A key re-added while it is being processed is processed again
+  afterwards. Failures back off exponentially per key, and polls do
+  not queue a key again until its backoff is over. A token bucket
+  (``reconcile_rate``) caps reconciles per second across all workers.
+
+Reconciling compares fingerprints (rendered config hash and version) and
+calls ``apply`` only on a mismatch. It then records the generation it
+read as observed. If the generation moved on meanwhile, the next poll
+picks the environment up again. A mismatch on an environment whose
+generation was already observed is drift, counted in
+``reconcile_drift_total``.
+"""
+
+import asyncio
+import hashlib
+import heapq
+import json
+import logging
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from prometheus_client import Counter
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.ratelimit import MemoryBuckets, parse_limit
+from app.core.tracing import traced
+from app.db import session as db_session
+from app.models.models import Deployment, DeploymentStatus, Environment, Service
+from app.services import config_layers
+
+logger = logging.getLogger(__name__)
+
+reconciles = Counter("reconcile_total", "Environment reconciles by outcome", ["result"])
+drift = Counter("reconcile_drift_total", "Observed environments whose infrastructure had changed")
+
+
+def object_key(environment_id: int) -> str:
+    return f"environments/{environment_id}"
+
+
+# -- providers ------------------------------------------------------------
+
+
+class MemoryProvider:
+    """Objects in a dict; for tests."""
+
+    name = "memory"
+
+    def __init__(self):
+        self.objects: Dict[str, Dict[str, Any]] = {}
+        self.applied: List[str] = []
+        # Keys whose apply raises, to exercise backoff.
+        self.failing: Set[str] = set()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.objects.get(key)
+
+    async def apply(self, key: str, document: Dict[str, Any]) -> None:
+        if key in self.failing:
+            raise RuntimeError(f"apply failed for {key}")
+        self.objects[key] = document
+        self.applied.append(key)
+
+
+class FilesystemProvider:
+    """One JSON file per object under ``root``; for local runs."""
+
+    name = "filesystem"
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self._path(key).read_text())
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, document: Dict[str, Any]) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(document, sort_keys=True, indent=2))
+        os.replace(tmp, path)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._read, key)
+
+    async def apply(self, key: str, document: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._write, key, document)
+
+
+def provider_from_settings() -> Optional[Any]:
+    settings = get_settings()
+    available = {
+        "none": lambda: None,
+        "memory": MemoryProvider,
+        "filesystem": lambda: FilesystemProvider(settings.reconcile_root),
+    }
+    if settings.reconcile_provider not in available:
+        raise ValueError(f"Unknown reconcile provider: {settings.reconcile_provider}")
+    return available[settings.reconcile_provider]()
+
+
+# -- work queue -----------------------------------------------------------
+
+
+class WorkQueue:
+    """Deduplicating, rate-limited queue of keys with per-key backoff.
+
+    ``get`` hands out a key and marks it processing; the caller must call
+    ``done`` when finished, and ``forget`` on success or
+    ``add_rate_limited`` on failure.
+    """
+
+    def __init__(self, *, rate: str, backoff_base: float, backoff_max: float, clock=time.monotonic):
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self._limit = parse_limit(rate)
+        self._bucket = MemoryBuckets(clock=clock)
+        self._ready: Deque[Any] = deque()
+        self._queued: Set[Any] = set()
+        self._processing: Set[Any] = set()
+        # Re-added while processing: queue again on done().
+        self._dirty: Set[Any] = set()
+        self._delayed: List[Tuple[float, int, Any]] = []
+        # Keys backing off, and when they are due; add() leaves them be.
+        self._not_before: Dict[Any, float] = {}
+        self._seq = 0
+        self._failures: Dict[Any, int] = {}
+        self._wake = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._ready) + len(self._not_before)
+
+    def add(self, key: Any) -> None:
+        if key in self._not_before:
+            return
+        if key in self._processing:
+            self._dirty.add(key)
+        elif key not in self._queued:
+            self._queued.add(key)
+            self._ready.append(key)
+            self._wake.set()
+
+    def add_after(self, key: Any, delay: float) -> None:
+        due = self.clock() + delay
+        if self._not_before.get(key, due) < due:
+            return
+        self._not_before[key] = due
+        self._seq += 1
+        heapq.heappush(self._delayed, (due, self._seq, key))
+        self._wake.set()
+
+    def add_rate_limited(self, key: Any) -> float:
+        """Queue ``key`` again after its backoff; returns the delay."""
+        failures = self._failures.get(key, 0)
+        self._failures[key] = failures + 1
+        delay = min(self.backoff_base * 2**failures, self.backoff_max)
+        self.add_after(key, delay)
+        return delay
+
+    def forget(self, key: Any) -> None:
+        self._failures.pop(key, None)
+
+    def failures(self, key: Any) -> int:
+        return self._failures.get(key, 0)
+
+    def done(self, key: Any) -> None:
+        self._processing.discard(key)
+        if key in self._dirty:
+            self._dirty.discard(key)
+            self.add(key)
+
+    async def get(self) -> Any:
+        while True:
+            now = self.clock()
+            while self._delayed and self._delayed[0][0] <= now:
+                due, _seq, key = heapq.heappop(self._delayed)
+                # Skip entries the key was rescheduled away from.
+                if self._not_before.get(key) == due:
+                    del self._not_before[key]
+                    self.add(key)
+            timeout = self._delayed[0][0] - now if self._delayed else None
+            if self._ready:
+                wait = self._bucket.take([("reconcile", self._limit)])
+                if not wait:
+                    key = self._ready.popleft()
+                    self._queued.discard(key)
+                    self._processing.add(key)
+                    return key
+                timeout = wait if timeout is None else min(timeout, wait)
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+# -- controller -----------------------------------------------------------
+
+
+def fingerprint(config_hash: str, version: Optional[str]) -> str:
+    return hashlib.sha256(f"{config_hash}:{version or ''}".encode()).hexdigest()
+
+
+async def desired_state(db: AsyncSession, environment_id: int) -> Optional[Tuple[Any, Dict[str, Any]]]:
+    """The environment's generations and desired document, or None if it is gone."""
+    row = (
+        await db.execute(
+            select(
+                Environment.generation,
+                Environment.observed_generation,
+                Environment.name,
+                Environment.tier,
+                Service.id,
+                Service.name.label("service"),
+            )
+            .join(Service, Service.id == Environment.service_id)
+            .where(Environment.id == environment_id)
+        )
+    ).one_or_none()
+    if row is None:
+        return None
+    rendered = await config_layers.render(db, row.id, environment_id)
+    version = await db.scalar(
+        select(Deployment.version)
+        .where(Deployment.environment_id == environment_id, Deployment.status == DeploymentStatus.succeeded)
+        .order_by(Deployment.updated_at.desc(), Deployment.id.desc())
+        .limit(1)
+    )
+    return row, {
+        "kind": "environment",
+        "environment_id": environment_id,
+        "service": row.service,
+        "name": row.name,
+        "tier": row.tier.value,
+        "version": version,
+        "config": rendered["config"],
+        "fingerprint": fingerprint(rendered["config_hash"], version),
+    }
+
+
+class Reconciler:
+    def __init__(self, provider, queue: WorkQueue, *, batch_size: int = 1000):
+        self.provider = provider
+        self.queue = queue
+        self.batch_size = batch_size
+
+    @traced("reconciler.reconcile")
+    async def reconcile(self, environment_id: int) -> str:
+        """Make the provider match the environment; returns the outcome."""
+        async with db_session.db_router.primary() as db:
+            desired = await desired_state(db, environment_id)
+            if desired is None:
+                return "gone"
+            row, document = desired
+            key = object_key(environment_id)
+            actual = await self.provider.get(key)
+            if actual is not None and actual.get("fingerprint") == document["fingerprint"]:
+                result = "in_sync"
+            else:
+                await self.provider.apply(key, document)
+                result = "created" if actual is None else "updated"
+                if actual is not None and row.observed_generation == row.generation:
+                    drift.inc()
+            await db.execute(
+                update(Environment)
+                .where(Environment.id == environment_id, Environment.observed_generation < row.generation)
+                .values(observed_generation=row.generation)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        return result
+
+    async def enqueue_changed(self) -> int:
+        """Queue every environment whose generation is not yet observed."""
+        queued = 0
+        after = 0
+        async with db_session.db_router.primary() as db:
+            while True:
+                ids = (
+                    await db.scalars(
+                        select(Environment.id)
+                        .where(Environment.generation != Environment.observed_generation, Environment.id > after)
+                        .order_by(Environment.id)
+                        .limit(self.batch_size)
+                    )
+                ).all()
+                for environment_id in ids:
+                    self.queue.add(environment_id)
+                queued += len(ids)
+                if len(ids) < self.batch_size:
+                    return queued
+                after = ids[-1]
+
+    async def enqueue_all(self) -> int:
+        """Queue every environment, to catch drift made outside the platform."""
+        queued = 0
+        after = 0
+        while True:
+            async with db_session.db_router.primary() as db:
+                ids = (
+                    await db.scalars(
+                        select(Environment.id)
+                        .where(Environment.id > after)
+                        .order_by(Environment.id)
+                        .limit(self.batch_size)
+                    )
+                ).all()
+            for environment_id in ids:
+                self.queue.add(environment_id)
+            queued += len(ids)
+            if len(ids) < self.batch_size:
+                return queued
+            after = ids[-1]
+            # Let workers drain between pages.
+            await asyncio.sleep(0)
+
+    async def process_one(self) -> None:
+        environment_id = await self.queue.get()
+        try:
+            result = await self.reconcile(environment_id)
+        except Exception:  # noqa: BLE001
+            delay = self.queue.add_rate_limited(environment_id)
+            reconciles.labels("error").inc()
+            logger.exception("Reconciling environment %s failed; retrying in %.1fs", environment_id, delay)
+        else:
+            self.queue.forget(environment_id)
+            reconciles.labels(result).inc()
+        finally:
+            self.queue.done(environment_id)
+
+    async def run(self, stop: asyncio.Event, *, interval: float, resync: float, workers: int) -> None:
+        """Poll for changes every ``interval`` and resync every ``resync`` until ``stop`` is set."""
+
+        async def worker():
+            while True:
+                await self.process_one()
+
+        tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+        next_resync = time.monotonic()
+        try:
+            while not stop.is_set():
+                try:
+                    if resync > 0 and time.monotonic() >= next_resync:
+                        next_resync = time.monotonic() + resync
+                        await self.enqueue_all()
+                    else:
+                        await self.enqueue_changed()
+                except Exception:  # noqa: BLE001
+                    logger.exception("Reconciler poll failed")
+                try:
+                    await asyncio.wait_for(stop.wait(), interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def reconciler_from_settings() -> Optional[Reconciler]:
+    provider = provider_from_settings()
+    if provider is None:
+        return None
+    settings = get_settings()
+    queue = WorkQueue(
+        rate=settings.reconcile_rate,
+        backoff_base=settings.reconcile_backoff_base_seconds,
+        backoff_max=settings.reconcile_backoff_max_seconds,
+    )
+    return Reconciler(provider, queue, batch_size=settings.reconcile_batch_size)
+
+
+async def run_reconciler(stop: asyncio.Event, *, interval: float) -> None:
+    """Reconcile with the configured provider until ``stop`` is set."""
+    reconciler = reconciler_from_settings()
+    if reconciler is None:
+        return
+    settings = get_settings()
+    await reconciler.run(
+        stop, interval=interval, resync=settings.reconcile_resync_seconds, workers=settings.reconcile_workers
+    )
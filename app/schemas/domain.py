@@ -1,9 +1,9 @@
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from datetime import date, datetime
+from typing import Any, Dict, List, Literal, Optional, Union
 
 from pydantic import BaseModel, Field
 
-from app.models.models import AuditAction, DeploymentStatus, EnvironmentTier
+from app.models.models import AuditAction, DeploymentStatus, EnvironmentTier, PromotionStatus, WebhookDeliveryStatus
 
 
 class TeamCreate(BaseModel):
@@ -21,6 +21,21 @@ class TeamRead(BaseModel):
         from_attributes = True
 
 
+class TeamQuotaRead(BaseModel):
+    team_id: int
+    services: int
+    environments: int
+    max_services: int
+    max_environments: int
+
+
+class TeamQuotaUpdate(BaseModel):
+    """Omitted or null limits fall back to the platform defaults."""
+
+    max_services: Optional[int] = Field(None, ge=0)
+    max_environments: Optional[int] = Field(None, ge=0)
+
+
 class ServiceCreate(BaseModel):
     name: str
     description: Optional[str] = None
@@ -56,12 +71,72 @@ class EnvironmentRead(BaseModel):
     name: str
     tier: EnvironmentTier
     config: Dict[str, Any]
+    config_hash: Optional[str] = None
+    generation: int
+    observed_generation: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ConfigUpdate(BaseModel):
+    config: Dict[str, Any]
+
+
+class LayerConfigRead(BaseModel):
+    config: Dict[str, Any]
+    config_hash: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class RenderedConfigRead(BaseModel):
+    environment_id: int
+    config: Dict[str, Any]
+    config_hash: str
+    # Content hash of each layer the render was built from.
+    layers: Dict[str, str]
+
+
+class ConfigRollbackRequest(BaseModel):
+    version: int
+
+
+class ConfigVersionRead(BaseModel):
+    environment_id: int
+    version: int
+    config_hash: str
+    created_by: str
+    rolled_back_from: Optional[int] = None
     created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+class ConfigVersionDetail(ConfigVersionRead):
+    config: Dict[str, Any]
+
+
+class ConfigChangeRead(BaseModel):
+    # Dotted path into nested objects, e.g. "resources.cpu".
+    path: str
+    op: Literal["added", "removed", "changed"]
+    old: Any = None
+    new: Any = None
+
+
+class ConfigDiffRead(BaseModel):
+    from_version: int
+    to_version: int
+    from_hash: str
+    to_hash: str
+    identical: bool
+    changes: List[ConfigChangeRead]
+
+
 class DeploymentTriggerRequest(BaseModel):
     version: str
     initiated_by: str
@@ -81,6 +156,129 @@ class DeploymentRead(BaseModel):
         from_attributes = True
 
 
+class ApprovalCreate(BaseModel):
+    comment: Optional[str] = None
+
+
+class ApprovalStatusRead(BaseModel):
+    deployment_id: int
+    status: DeploymentStatus
+    required: int
+    approvers: List[str]
+
+
+class PromotionCreate(BaseModel):
+    version: str
+    initiated_by: str
+
+
+class PromotionBatchItem(PromotionCreate):
+    service_id: int
+
+
+class PromotionBatchRequest(BaseModel):
+    items: List[PromotionBatchItem]
+
+
+class PromotionRead(BaseModel):
+    id: int
+    service_id: int
+    version: str
+    current_tier: EnvironmentTier
+    status: PromotionStatus
+    initiated_by: str
+    detail: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class PromotionBatchResult(BaseModel):
+    service_id: int
+    promotion: Optional[PromotionRead] = None
+    error: Optional[str] = None
+
+
+class DeploymentMetricsRead(BaseModel):
+    group: Union[int, str, None]
+    bucket: date
+    deployment_frequency: int
+    succeeded: int
+    failed: int
+    change_failure_rate: float
+    mean_lead_time_seconds: Optional[float] = None
+
+
+class SearchHitRead(BaseModel):
+    kind: str
+    id: int
+    name: str
+    score: float
+    service_id: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+
+class JobStepRead(BaseModel):
+    name: str
+    status: str
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    detail: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class JobStatusRead(BaseModel):
+    id: str
+    type: str
+    status: str
+    created_at: datetime
+    updated_at: datetime
+    detail: Optional[str] = None
+    queue_position: Optional[int] = None
+    steps: List[JobStepRead] = []
+
+
+class DependencyCreate(BaseModel):
+    depends_on_id: int
+
+
+class ServiceDependencyRead(BaseModel):
+    service_id: int
+    depends_on_id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class DependencyNodeRead(BaseModel):
+    service_id: int
+    depth: int
+
+
+class DeployOrderRead(BaseModel):
+    # Services within a wave are independent of each other.
+    waves: List[List[int]]
+
+
+class ChangeRead(BaseModel):
+    seq: int
+    entity_type: str
+    entity_id: str
+    op: AuditAction
+    diff: Dict[str, Any]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 class AuditLogRead(BaseModel):
     id: int
     action: AuditAction
@@ -103,3 +301,62 @@ class PolicyRead(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class WebhookEndpointCreate(BaseModel):
+    url: str = Field(..., pattern=r"^https?://")
+    topics: List[str] = Field(default_factory=list, description="Topic prefixes; empty means every topic")
+    max_concurrency: int = Field(4, ge=1, le=64)
+    secret: Optional[str] = Field(None, min_length=16, description="Generated when omitted")
+
+
+class WebhookEndpointRead(BaseModel):
+    id: int
+    url: str
+    topics: List[str]
+    max_concurrency: int
+    active: bool
+    created_by: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class WebhookEndpointCreated(WebhookEndpointRead):
+    """Only returned on create: the signing secret is not shown again."""
+
+    secret: str
+
+
+class WebhookDeliveryRead(BaseModel):
+    id: int
+    endpoint_id: int
+    event_id: int
+    status: WebhookDeliveryStatus
+    attempts: int
+    next_attempt_at: datetime
+    last_error: Optional[str]
+    delivered_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
+class ProfilingSettings(BaseModel):
+    enabled: bool
+    sample_rate: float = Field(0.0, ge=0.0, le=1.0, description="Fraction of requests profiled while enabled")
+
+
+class ProfileSummaryRead(BaseModel):
+    request_id: str
+    method: str
+    path: str
+    started_at: datetime
+    status_code: Optional[int]
+    duration_ms: float
+    samples: int
+    phases_ms: Dict[str, float]
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,129 @@
+"""DORA-style deployment metrics from the ``deployment_rollups`` table.
+
+``record_outcome`` runs inside each terminal deployment transition and
+bumps one per-day counter row; ``deployment_metrics`` aggregates those
+rows in SQL. Lead time is measured from trigger to success, which is
+the part of the commit-to-production path this platform observes.
+"""
+
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.tracing import traced
+from app.db.dialects import dialect_insert
+from app.models.models import Deployment, DeploymentRollup, DeploymentStatus, Environment, Service
+
+GROUP_BY = ("service", "team", "tier", "none")
+BUCKETS = ("day", "week", "month")
+
+
+@traced()
+async def record_outcome(db: AsyncSession, deployment_id: int, outcome: DeploymentStatus) -> None:
+    """Fold a succeeded/failed deployment into today's rollup row. Does not commit."""
+    row = (
+        await db.execute(
+            select(Deployment.service_id, Deployment.created_at, Environment.tier)
+            .join(Environment, Environment.id == Deployment.environment_id)
+            .where(Deployment.id == deployment_id)
+        )
+    ).one()
+    now = datetime.utcnow()
+    succeeded = int(outcome == DeploymentStatus.succeeded)
+    failed = int(outcome == DeploymentStatus.failed)
+    lead_time = (now - row.created_at).total_seconds() if succeeded else 0.0
+
+    stmt = dialect_insert(db, DeploymentRollup).values(
+        bucket=now.date(),
+        service_id=row.service_id,
+        tier=row.tier,
+        succeeded=succeeded,
+        failed=failed,
+        lead_time_seconds=lead_time,
+    )
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["bucket", "service_id", "tier"],
+            set_={
+                "succeeded": DeploymentRollup.succeeded + stmt.excluded.succeeded,
+                "failed": DeploymentRollup.failed + stmt.excluded.failed,
+                "lead_time_seconds": DeploymentRollup.lead_time_seconds + stmt.excluded.lead_time_seconds,
+            },
+        )
+    )
+
+
+def _bucket_expr(dialect: str, bucket: str):
+    column = DeploymentRollup.bucket
+    if bucket == "day":
+        return column
+    if dialect == "postgresql":
+        return func.date_trunc(bucket, column)
+    if bucket == "week":
+        # Monday of the bucket's ISO week.
+        return func.date(column, "weekday 0", "-6 days")
+    return func.strftime("%Y-%m-01", column)
+
+
+def _group_expr(group_by: str):
+    return {
+        "service": Service.id,
+        "team": Service.team_id,
+        "tier": DeploymentRollup.tier,
+        "none": literal("all"),
+    }[group_by]
+
+
+async def deployment_metrics(
+    db: AsyncSession,
+    *,
+    group_by: str = "service",
+    bucket: str = "week",
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    tier: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    bucket_col = _bucket_expr(db.get_bind().dialect.name, bucket).label("bucket")
+    group_col = _group_expr(group_by).label("group")
+    stmt = (
+        select(
+            group_col,
+            bucket_col,
+            func.sum(DeploymentRollup.succeeded).label("succeeded"),
+            func.sum(DeploymentRollup.failed).label("failed"),
+            func.sum(DeploymentRollup.lead_time_seconds).label("lead_time_seconds"),
+        )
+        .join(Service, Service.id == DeploymentRollup.service_id)
+        .group_by(group_col, bucket_col)
+        .order_by(bucket_col, group_col)
+    )
+    if since is not None:
+        stmt = stmt.where(DeploymentRollup.bucket >= since)
+    if until is not None:
+        stmt = stmt.where(DeploymentRollup.bucket <= until)
+    if tier is not None:
+        stmt = stmt.where(DeploymentRollup.tier == tier)
+
+    metrics = []
+    for row in await db.execute(stmt):
+        total = row.succeeded + row.failed
+        bucket_value = row.bucket
+        if isinstance(bucket_value, datetime):
+            bucket_value = bucket_value.date()
+        elif isinstance(bucket_value, str):
+            bucket_value = date.fromisoformat(bucket_value)
+        group = row.group.value if hasattr(row.group, "value") else row.group
+        metrics.append(
+            {
+                "group": group,
+                "bucket": bucket_value,
+                "deployment_frequency": row.succeeded,
+                "succeeded": row.succeeded,
+                "failed": row.failed,
+                "change_failure_rate": row.failed / total if total else 0.0,
+                "mean_lead_time_seconds": row.lead_time_seconds / row.succeeded if row.succeeded else None,
+            }
+        )
+    return metrics
@@ -0,0 +1,163 @@
+"""Approval records and quorum for production deployments.
+
+Prod deployments are created ``awaiting_approval``. Each
+``POST /deployments/{id}/approvals`` records one approver; once the
+deployment has as many distinct approvals as the policy requires it is
+moved to ``pending`` and scheduled, in the request that reached quorum.
+
+The policy is the enforced ``PlatformPolicy`` named ``production-approvals``:
+
+    {"required": 2, "approvers": ["alice", "bob", "carol"]}
+
+Only platform and team admins may approve; ``approvers``, if present,
+narrows that to the listed users. Without the policy,
+``prod_required_approvals`` applies. The person who triggered a
+deployment cannot approve it.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Set
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.core.config import get_settings
+from app.core.tracing import traced
+from app.db.dialects import dialect_insert
+from app.models.models import AuditAction, Deployment, DeploymentApproval, DeploymentStatus, PlatformPolicy
+from app.platform.guardrails import GuardrailEngine
+from app.services import changes, outbox
+from app.services import deployment as deployment_service
+from app.services.audit import log_action
+
+POLICY_NAME = "production-approvals"
+
+guardrails = GuardrailEngine()
+
+
+@dataclass
+class ApprovalPolicy:
+    required: int
+    approvers: Optional[Set[str]] = None  # None: no narrowing
+
+    def allows(self, username: str) -> bool:
+        return self.approvers is None or username in self.approvers
+
+
+async def load_policy(db: AsyncSession) -> ApprovalPolicy:
+    policy = await db.scalar(
+        select(PlatformPolicy).where(PlatformPolicy.name == POLICY_NAME, PlatformPolicy.enforced.is_(True))
+    )
+    if policy is None:
+        return ApprovalPolicy(required=get_settings().prod_required_approvals)
+    config = policy.config or {}
+    approvers = config.get("approvers")
+    return ApprovalPolicy(
+        required=int(config.get("required", get_settings().prod_required_approvals)),
+        approvers=set(approvers) if approvers is not None else None,
+    )
+
+
+async def _approvers(db: AsyncSession, deployment_id: int) -> List[str]:
+    rows = await db.scalars(
+        select(DeploymentApproval.approver)
+        .where(DeploymentApproval.deployment_id == deployment_id)
+        .order_by(DeploymentApproval.created_at, DeploymentApproval.approver)
+    )
+    return list(rows)
+
+
+async def get_approvals(db: AsyncSession, deployment_id: int) -> dict:
+    deployment = await db.get(Deployment, deployment_id)
+    if not deployment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deployment not found")
+    policy = await load_policy(db)
+    return {
+        "deployment_id": deployment_id,
+        "status": deployment.status,
+        "required": policy.required,
+        "approvers": await _approvers(db, deployment_id),
+    }
+
+
+@traced()
+async def approve(
+    db: AsyncSession,
+    deployment_id: int,
+    *,
+    approver: str,
+    comment: Optional[str] = None,
+) -> dict:
+    """Record ``approver``'s approval; resume the deployment at quorum.
+
+    Approving twice is a no-op. Approving a deployment that is no longer
+    waiting is a 409.
+    """
+    deployment = await db.scalar(
+        select(Deployment).options(selectinload(Deployment.environment)).where(Deployment.id == deployment_id)
+    )
+    if not deployment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deployment not found")
+    if deployment.status != DeploymentStatus.awaiting_approval:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Deployment is {deployment.status.value}, not awaiting approval",
+        )
+    policy = await load_policy(db)
+    if not policy.allows(approver):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not an approver for production deployments")
+    if approver == deployment.triggered_by:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Cannot approve your own deployment")
+
+    inserted = await db.scalar(
+        dialect_insert(db, DeploymentApproval)
+        .values(deployment_id=deployment_id, approver=approver, comment=comment)
+        .on_conflict_do_nothing(index_elements=["deployment_id", "approver"])
+        .returning(DeploymentApproval.approver)
+    )
+    approvers = await _approvers(db, deployment_id)
+    if inserted is not None:
+        await log_action(
+            db,
+            action=AuditAction.created,
+            entity_type="deployment_approval",
+            entity_id=f"{deployment_id}:{approver}",
+            performed_by=approver,
+            metadata={"deployment_id": deployment_id, "comment": comment},
+            commit=False,
+        )
+        await changes.record_change(
+            db,
+            entity_type="deployment_approval",
+            entity_id=f"{deployment_id}:{approver}",
+            op=AuditAction.created,
+            after={"deployment_id": deployment_id, "approver": approver},
+        )
+        outbox.emit(
+            db,
+            "deployment.approval_recorded",
+            {
+                "deployment_id": deployment_id,
+                "approver": approver,
+                "approvals": len(approvers),
+                "required": policy.required,
+            },
+        )
+    quorum = len(approvers) >= policy.required
+    if quorum:
+        guardrails.validate_production_deployment(deployment, approvers, policy.required)
+    await db.commit()
+
+    result_status = deployment.status
+    if quorum and await deployment_service.resume_approved(
+        db, deployment_id, deployment.environment_id, approver, approvers=approvers
+    ):
+        result_status = DeploymentStatus.pending
+    return {
+        "deployment_id": deployment_id,
+        "status": result_status,
+        "required": policy.required,
+        "approvers": approvers,
+    }
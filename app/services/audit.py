@@ -2,12 +2,26 @@ from typing import Any, Dict
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.tracing import traced
 from app.models.models import AuditAction, AuditLog
 
 
+@traced()
 async def log_action(
-    db: AsyncSession, *, action: AuditAction, entity_type: str, entity_id: str, performed_by: str, metadata: Dict[str, Any]
+    db: AsyncSession,
+    *,
+    action: AuditAction,
+    entity_type: str,
+    entity_id: str,
+    performed_by: str,
+    metadata: Dict[str, Any],
+    commit: bool = True,
 ) -> AuditLog:
+    """Record an audit entry.
+
+    With ``commit=False`` the entry joins the caller's transaction, so a
+    mutation and its audit row land (or roll back) together.
+    """
     entry = AuditLog(
         action=action,
         entity_type=entity_type,
@@ -16,6 +30,7 @@ async def log_action(
         details=metadata,
     )
     db.add(entry)
-    await db.commit()
-    await db.refresh(entry)
+    if commit:
+        await db.commit()
+        await db.refresh(entry)
     return entry
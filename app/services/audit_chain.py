@@ -0,0 +1,330 @@
+"""Hash chain and Merkle checkpoints over ``audit_logs``.
+
+Inserts stay plain: ``log_action`` writes a row without a hash. The
+sealer (``seal_pending``; run in the app every
+``audit_seal_interval_seconds`` and by ``audit_cli maintain``) takes
+unsealed rows in id order, chains each to its predecessor as
+``sha256(prev_hash, row)`` and records the batch as an
+``AuditCheckpoint`` carrying the Merkle root of its row hashes. A batch
+never spans two months, so a checkpoint lives in one partition.
+
+Rows are hashed in the database's own text rendering of each column, so
+sealing and verification agree without re-serializing JSON or dates.
+
+``verify_chain`` checks checkpoints in parallel worker processes, each
+starting from its checkpoint's ``prev_hash``, while the parent checks
+the links between checkpoints. Altering, inserting or deleting a sealed
+row breaks its checkpoint. Rewriting the whole tail consistently is
+only caught against a copy of the head hash kept elsewhere; the sealer
+logs every checkpoint's last hash for that purpose.
+"""
+
+import asyncio
+import hashlib
+import itertools
+import logging
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import Table, Text, bindparam, cast, func, inspect, select, text, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.db import session as db_session
+from app.models.models import AuditCheckpoint, AuditLog
+from app.services.audit_partitions import HEAD_TABLE, partition_table
+
+logger = logging.getLogger(__name__)
+
+GENESIS = "0" * 64
+# Arbitrary, but fixed: only one sealer may extend the chain at a time.
+SEAL_LOCK_KEY = 0x41_55_44_43
+_PARTITION_NAME = re.compile(rf"^{HEAD_TABLE}_\d{{6}}$")
+
+
+def row_hash(prev_hash: str, fields: Sequence[str]) -> str:
+    return hashlib.sha256("\x1f".join((prev_hash, *fields)).encode()).hexdigest()
+
+
+def merkle_root(hashes: Sequence[str]) -> str:
+    level = [bytes.fromhex(value) for value in hashes] or [bytes(32)]
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.sha256(level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+    return level[0].hex()
+
+
+def _content(table: Table):
+    """Hashed columns first (positions 0-6), then the chain columns."""
+    return (
+        table.c.id,
+        cast(table.c.action, Text).label("action"),
+        table.c.entity_type,
+        table.c.entity_id,
+        table.c.performed_by,
+        func.coalesce(cast(table.c.metadata, Text), "").label("metadata"),
+        func.coalesce(cast(table.c.created_at, Text), "").label("created_at"),
+        table.c.prev_hash,
+        table.c.hash,
+        table.c.checkpoint_id,
+    )
+
+
+def _fields(row) -> Tuple[str, ...]:
+    # Positional access: this runs once per row during verification.
+    return (str(row[0]), *row[1:7])
+
+
+# -- sealing -------------------------------------------------------------
+
+
+async def seal_pending(db: AsyncSession, *, batch_size: int = 10_000) -> Optional[AuditCheckpoint]:
+    """Seal up to ``batch_size`` unsealed rows into a new checkpoint."""
+    if db.get_bind().dialect.name == "postgresql":
+        await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SEAL_LOCK_KEY})
+    head = AuditLog.__table__
+    rows = (
+        await db.execute(select(*_content(head)).where(head.c.hash.is_(None)).order_by(head.c.id).limit(batch_size))
+    ).all()
+    if not rows:
+        await db.rollback()
+        return None
+    month = rows[0].created_at[:7]
+    rows = list(itertools.takewhile(lambda row: row.created_at[:7] == month, rows))
+
+    last = await db.scalar(select(AuditCheckpoint).order_by(AuditCheckpoint.id.desc()).limit(1))
+    prev = last.last_hash if last else GENESIS
+    checkpoint = AuditCheckpoint(
+        first_id=rows[0].id,
+        last_id=rows[-1].id,
+        row_count=len(rows),
+        prev_hash=prev,
+        last_hash=prev,
+        merkle_root="",
+    )
+    db.add(checkpoint)
+    await db.flush()
+
+    hashes, params = [], []
+    for row in rows:
+        digest = row_hash(prev, _fields(row))
+        params.append({"row_id": row.id, "row_prev": prev, "row_hash": digest, "row_checkpoint": checkpoint.id})
+        hashes.append(digest)
+        prev = digest
+    await db.execute(
+        update(head)
+        .where(head.c.id == bindparam("row_id"))
+        .values(prev_hash=bindparam("row_prev"), hash=bindparam("row_hash"), checkpoint_id=bindparam("row_checkpoint")),
+        params,
+    )
+    checkpoint.last_hash = prev
+    checkpoint.merkle_root = merkle_root(hashes)
+    await db.commit()
+    logger.info(
+        "Sealed audit checkpoint %s (rows %s-%s) last_hash=%s",
+        checkpoint.id,
+        checkpoint.first_id,
+        checkpoint.last_id,
+        checkpoint.last_hash,
+    )
+    return checkpoint
+
+
+async def seal_all(db: AsyncSession, *, batch_size: int = 10_000) -> int:
+    """Seal every pending row. Returns the number of checkpoints written."""
+    count = 0
+    while await seal_pending(db, batch_size=batch_size):
+        count += 1
+    return count
+
+
+async def run_sealer(stop: asyncio.Event, *, interval: float, batch_size: int) -> None:
+    """Seal periodically until ``stop`` is set; never interrupted mid-batch."""
+    while True:
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+            return
+        except asyncio.TimeoutError:
+            pass
+        try:
+            async with db_session.db_router.primary() as db:
+                await seal_all(db, batch_size=batch_size)
+        except Exception:  # noqa: BLE001
+            logger.exception("Audit sealing failed")
+
+
+# -- verification --------------------------------------------------------
+
+
+@dataclass
+class BrokenLink:
+    checkpoint_id: int
+    row_id: Optional[int]
+    reason: str
+
+
+@dataclass
+class VerificationReport:
+    checkpoints: int
+    rows: int
+    head_hash: str
+    broken: Optional[BrokenLink] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.broken is None
+
+
+CheckpointRow = Tuple[int, int, str, str, str]  # id, row_count, prev_hash, last_hash, merkle_root
+
+
+def _check_checkpoint(checkpoint: CheckpointRow, rows) -> Tuple[int, Optional[Tuple[Optional[int], str]]]:
+    _, row_count, prev, last_hash, root = checkpoint
+    hashes = []
+    for row in rows:
+        if row[7] != prev:
+            return len(hashes), (row[0], "row does not link to its predecessor")
+        digest = row_hash(prev, _fields(row))
+        if digest != row[8]:
+            return len(hashes), (row[0], "row content does not match its hash")
+        hashes.append(digest)
+        prev = digest
+    if len(hashes) != row_count:
+        return len(hashes), (None, f"checkpoint sealed {row_count} rows, found {len(hashes)}")
+    if prev != last_hash:
+        return len(hashes), (None, "chain does not end at the checkpoint's last hash")
+    if merkle_root(hashes) != root:
+        return len(hashes), (None, "Merkle root does not match")
+    return len(hashes), None
+
+
+async def _audit_tables(conn) -> List[Table]:
+    if conn.dialect.name == "postgresql":
+        return [AuditLog.__table__]
+    names = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
+    return [AuditLog.__table__] + [partition_table(name) for name in sorted(names) if _PARTITION_NAME.match(name)]
+
+
+async def _verify_segment_async(
+    database_url: str, checkpoints: List[CheckpointRow], archived: Set[int]
+) -> Tuple[int, Optional[Tuple[int, Optional[int], str]]]:
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    verified = 0
+    try:
+        async with engine.connect() as conn:
+            tables = await _audit_tables(conn)
+            lo, hi = checkpoints[0][0], checkpoints[-1][0]
+            query = union_all(
+                *(select(*_content(table)).where(table.c.checkpoint_id.between(lo, hi)) for table in tables)
+            ).order_by(text("checkpoint_id"), text("id"))
+            # One fetch per segment; segment_rows bounds the memory.
+            rows = (await conn.execute(query)).all()
+    finally:
+        await engine.dispose()
+
+    expected = iter(checkpoints)
+    pending = next(expected, None)
+    for checkpoint_id, group in itertools.groupby(rows, key=itemgetter(9)):
+        if pending is not None and pending[0] < checkpoint_id:
+            # Every sealed row of this checkpoint is gone.
+            return verified, (pending[0], None, "checkpoint has no rows")
+        if pending is None or pending[0] != checkpoint_id:
+            if checkpoint_id in archived:
+                continue
+            return verified, (checkpoint_id, None, "rows reference an unknown checkpoint")
+        count, broken = _check_checkpoint(pending, group)
+        verified += count
+        if broken:
+            return verified, (pending[0], *broken)
+        pending = next(expected, None)
+    if pending is not None:
+        return verified, (pending[0], None, "checkpoint has no rows")
+    return verified, None
+
+
+def _verify_segment(database_url: str, checkpoints: List[CheckpointRow], archived: Set[int]):
+    return asyncio.run(_verify_segment_async(database_url, checkpoints, archived))
+
+
+def _segments(checkpoints: List[CheckpointRow], segment_rows: int) -> List[List[CheckpointRow]]:
+    segments: List[List[CheckpointRow]] = []
+    size = segment_rows
+    for checkpoint in checkpoints:
+        if size >= segment_rows:
+            segments.append([])
+            size = 0
+        segments[-1].append(checkpoint)
+        size += checkpoint[1]
+    return segments
+
+
+async def _load_checkpoints(database_url: str):
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    try:
+        async with engine.connect() as conn:
+            return (
+                await conn.execute(
+                    select(
+                        AuditCheckpoint.id,
+                        AuditCheckpoint.row_count,
+                        AuditCheckpoint.prev_hash,
+                        AuditCheckpoint.last_hash,
+                        AuditCheckpoint.merkle_root,
+                        AuditCheckpoint.archived,
+                    ).order_by(AuditCheckpoint.id)
+                )
+            ).all()
+    finally:
+        await engine.dispose()
+
+
+def verify_chain(database_url: str, *, workers: Optional[int] = None, segment_rows: int = 250_000) -> VerificationReport:
+    """Verify every sealed row; reports the first broken link in chain order.
+
+    Checkpoints are split into segments of about ``segment_rows`` rows,
+    verified in up to ``workers`` processes (default: CPU count).
+    """
+    checkpoints = asyncio.run(_load_checkpoints(database_url))
+    position: Dict[int, int] = {}
+    failures: List[BrokenLink] = []
+
+    prev = GENESIS
+    for idx, (checkpoint_id, _, prev_hash, last_hash, _, _) in enumerate(checkpoints):
+        position[checkpoint_id] = idx
+        if prev_hash != prev:
+            failures.append(BrokenLink(checkpoint_id, None, "checkpoint does not link to its predecessor"))
+            break
+        prev = last_hash
+
+    archived = {row[0] for row in checkpoints if row[5]}
+    active = [tuple(row[:5]) for row in checkpoints if not row[5]]
+    segments = _segments(active, segment_rows)
+    if len(segments) <= 1 or workers == 1:
+        results = [_verify_segment(database_url, segment, archived) for segment in segments]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(
+                pool.map(
+                    _verify_segment,
+                    itertools.repeat(database_url),
+                    segments,
+                    itertools.repeat(archived),
+                )
+            )
+
+    verified = 0
+    for count, broken in results:
+        verified += count
+        if broken:
+            failures.append(BrokenLink(*broken))
+    first = min(failures, key=lambda link: (position.get(link.checkpoint_id, len(position)), link.row_id or 0), default=None)
+    return VerificationReport(
+        checkpoints=len(checkpoints),
+        rows=verified,
+        head_hash=prev if checkpoints else GENESIS,
+        broken=first,
+    )
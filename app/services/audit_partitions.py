@@ -0,0 +1,276 @@
+"""Monthly partitions, retention and archival for ``audit_logs``.
+
+Postgres uses native RANGE partitioning on ``created_at`` (migration
+0007); ``ensure_partitions`` creates upcoming months ahead of time so
+inserts never land in the default partition, and the planner prunes
+partitions outside a query's time range.
+
+sqlite has no partitioning, so it is emulated: ``audit_logs`` is the
+head table that receives every insert, and ``roll_partitions`` moves
+closed months into ``audit_logs_YYYYMM`` tables. The sealer only reads
+the head table, so rolling seals pending rows first. ``query_audit``
+only reads the monthly tables that overlap the requested range.
+
+Retention archives a whole month to gzip-compressed CSV (header row,
+one column per field, JSON-encoded metadata) before the partition is
+detached and dropped; checkpoints covering it are marked archived so
+chain verification skips the rows but still checks the links. The
+archive is written to a temporary name and renamed, so a crash never
+leaves a dropped month without its archive.
+"""
+
+import csv
+import gzip
+import json
+import os
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import (
+    JSON,
+    Column,
+    DateTime,
+    Enum,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    func,
+    insert,
+    literal_column,
+    select,
+    text,
+    union_all,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import AuditAction, AuditCheckpoint, AuditLog
+
+HEAD_TABLE = AuditLog.__tablename__
+_PARTITION_NAME = re.compile(rf"^{HEAD_TABLE}_(\d{{4}})(\d{{2}})$")
+COLUMNS = ("id", "action", "entity_type", "entity_id", "performed_by", "metadata", "created_at")
+# Columns moved and archived along with each row.
+STORED_COLUMNS = COLUMNS + ("prev_hash", "hash", "checkpoint_id")
+
+_metadata = MetaData()
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{HEAD_TABLE}_{month:%Y%m}"
+
+
+def partition_table(name: str) -> Table:
+    """A table with the ``audit_logs`` column layout under another name."""
+    if name in _metadata.tables:
+        return _metadata.tables[name]
+    return Table(
+        name,
+        _metadata,
+        Column("id", Integer, primary_key=True),
+        Column("action", Enum(AuditAction), nullable=False),
+        Column("entity_type", String(100), nullable=False),
+        Column("entity_id", String(100), nullable=False),
+        Column("performed_by", String(255), nullable=False),
+        Column("metadata", JSON),
+        Column("created_at", DateTime, index=True),
+        Column("prev_hash", String(64)),
+        Column("hash", String(64)),
+        Column("checkpoint_id", Integer, index=True),
+    )
+
+
+def _dialect(db: AsyncSession) -> str:
+    return db.get_bind().dialect.name
+
+
+async def list_partitions(db: AsyncSession) -> List[date]:
+    """Months that have their own partition, oldest first."""
+    if _dialect(db) == "postgresql":
+        names = await db.scalars(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :parent"
+            ),
+            {"parent": HEAD_TABLE},
+        )
+    else:
+        names = await db.scalars(
+            text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :pattern"),
+            {"pattern": f"{HEAD_TABLE}_%"},
+        )
+    months = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+async def ensure_partitions(db: AsyncSession, *, now: Optional[datetime] = None, ahead: int = 2) -> None:
+    """Create partitions for the current month and ``ahead`` more (Postgres)."""
+    if _dialect(db) != "postgresql":
+        return
+    current = month_start((now or datetime.utcnow()).date())
+    for offset in range(ahead + 1):
+        month = add_months(current, offset)
+        await db.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {HEAD_TABLE} "
+                f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+            )
+        )
+    await db.commit()
+
+
+async def roll_partitions(db: AsyncSession, *, now: Optional[datetime] = None) -> List[date]:
+    """Move closed months out of the sqlite head table. Returns the months moved."""
+    if _dialect(db) == "postgresql":
+        return []
+    # audit_chain imports this module. Rows rolled unsealed would never be.
+    from app.services import audit_chain
+
+    await audit_chain.seal_all(db)
+    current = month_start((now or datetime.utcnow()).date())
+    head = AuditLog.__table__
+    oldest = await db.scalar(select(func.min(head.c.created_at)).where(head.c.created_at < current))
+    moved = []
+    month = month_start(oldest.date()) if oldest else current
+    while month < current:
+        upper = add_months(month, 1)
+        in_month = (head.c.created_at >= month) & (head.c.created_at < upper)
+        if await db.scalar(select(func.count()).select_from(head).where(in_month)):
+            table = partition_table(partition_name(month))
+            await db.run_sync(lambda session: table.create(session.connection(), checkfirst=True))
+            await db.execute(
+                insert(table).from_select(
+                    STORED_COLUMNS, select(*(head.c[name] for name in STORED_COLUMNS)).where(in_month)
+                )
+            )
+            await db.execute(head.delete().where(in_month))
+            moved.append(month)
+        month = upper
+    await db.commit()
+    return moved
+
+
+async def archive_partition(db: AsyncSession, month: date, archive_dir: str) -> str:
+    """Write one month to ``<archive_dir>/audit_logs_YYYYMM.csv.gz``."""
+    os.makedirs(archive_dir, exist_ok=True)
+    name = partition_name(month)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    table = partition_table(name)
+    result = await db.stream(select(*table.c).order_by(table.c.id))
+    with gzip.open(f"{path}.tmp", "wt", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(STORED_COLUMNS)
+        async for row in result:
+            values = row._mapping
+            writer.writerow(
+                [
+                    values["id"],
+                    values["action"].value,
+                    values["entity_type"],
+                    values["entity_id"],
+                    values["performed_by"],
+                    json.dumps(values["metadata"], sort_keys=True),
+                    values["created_at"].isoformat() if values["created_at"] else "",
+                    values["prev_hash"] or "",
+                    values["hash"] or "",
+                    values["checkpoint_id"] or "",
+                ]
+            )
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+async def apply_retention(
+    db: AsyncSession,
+    *,
+    retain_months: int,
+    archive_dir: str,
+    now: Optional[datetime] = None,
+) -> List[str]:
+    """Archive and drop partitions older than ``retain_months``. Returns archive paths."""
+    cutoff = add_months(month_start((now or datetime.utcnow()).date()), -retain_months)
+    archived = []
+    for month in await list_partitions(db):
+        if month >= cutoff:
+            break
+        archived.append(await archive_partition(db, month, archive_dir))
+        name = partition_name(month)
+        table = partition_table(name)
+        await db.execute(
+            update(AuditCheckpoint)
+            .where(AuditCheckpoint.id.in_(select(table.c.checkpoint_id).distinct()))
+            .values(archived=True)
+        )
+        if _dialect(db) == "postgresql":
+            await db.execute(text(f"ALTER TABLE {HEAD_TABLE} DETACH PARTITION {name}"))
+        await db.execute(text(f"DROP TABLE {name}"))
+        await db.commit()
+    return archived
+
+
+async def query_audit(
+    db: AsyncSession,
+    *,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    entity_type: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    limit: int = 100,
+) -> List[Dict[str, Any]]:
+    """Newest-first audit rows, reading only partitions that overlap the range."""
+    tables = [AuditLog.__table__]
+    if _dialect(db) != "postgresql":
+        # Postgres prunes partitions itself from the created_at bounds.
+        first = month_start(since.date()) if since else None
+        last = month_start(until.date()) if until else None
+        tables += [
+            partition_table(partition_name(month))
+            for month in await list_partitions(db)
+            if (first is None or month >= first) and (last is None or month <= last)
+        ]
+
+    selects = []
+    for table in tables:
+        stmt = select(*(table.c[name] for name in COLUMNS))
+        if since:
+            stmt = stmt.where(table.c.created_at >= since)
+        if until:
+            stmt = stmt.where(table.c.created_at < until)
+        if entity_type:
+            stmt = stmt.where(table.c.entity_type == entity_type)
+        if entity_id:
+            stmt = stmt.where(table.c.entity_id == entity_id)
+        selects.append(stmt)
+    query = selects[0] if len(selects) == 1 else union_all(*selects)
+    query = query.order_by(literal_column("created_at").desc(), literal_column("id").desc()).limit(limit)
+    rows = await db.execute(query)
+    return [dict(row._mapping) for row in rows]
+
+
+async def run_maintenance(
+    db: AsyncSession,
+    *,
+    retain_months: int,
+    archive_dir: str,
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """One maintenance pass: pre-create, roll, then apply retention."""
+    await ensure_partitions(db, now=now)
+    rolled = await roll_partitions(db, now=now)
+    archived = await apply_retention(db, retain_months=retain_months, archive_dir=archive_dir, now=now)
+    return {"rolled": [month.isoformat() for month in rolled], "archived": archived}
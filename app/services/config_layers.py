@@ -0,0 +1,290 @@
+"""Layered environment configs: platform, team, service, environment.
+
+An environment's rendered config is a deep merge of four layers, each
+overriding the one before it: ``config_platform_defaults``,
+``Team.config``, ``Service.config`` and ``Environment.config``. Objects
+merge key by key. Any other value replaces what it overrides, and
+``null`` removes the key.
+
+Each layer is named by the hash of its content: ``config_hash`` on
+teams, services and environments, kept up to date by their write paths.
+A render reads the three hashes in one query. Every partial merge is
+memoized under the hashes it was built from: (platform, team), then
+plus the service, then plus the environment. Editing a layer changes its
+hash, so only the merges built on it miss and are redone on their next
+read. Everything else still hits, in every worker, without invalidation
+messages. Changing a team's defaults re-merges that team's services and
+environments, lazily, and no one else's.
+
+Rendered configs pass ``GuardrailEngine.validate_config``, and so must
+the renders a layer write would produce.
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from fastapi import HTTPException, status
+from prometheus_client import Counter
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.tracing import traced
+from app.models.models import AuditAction, Environment, Service, Team
+from app.platform.guardrails import GuardrailEngine
+from app.services import changes, outbox
+from app.services.audit import log_action
+
+guardrails = GuardrailEngine()
+
+merges = Counter("config_render_merges_total", "Config layers merged on a render cache miss", ["layer"])
+
+Key = Tuple[str, ...]
+
+
+def canonical(config: Mapping[str, Any]) -> bytes:
+    return json.dumps(config, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def content_hash(config: Mapping[str, Any]) -> str:
+    return hashlib.sha256(canonical(config)).hexdigest()
+
+
+def merge(base: Mapping[str, Any], override: Mapping[str, Any]) -> Dict[str, Any]:
+    """``override`` on top of ``base``, without modifying either."""
+    out = dict(base)
+    for key, value in override.items():
+        if value is None:
+            out.pop(key, None)
+        elif isinstance(value, dict) and isinstance(out.get(key), dict):
+            out[key] = merge(out[key], value)
+        else:
+            out[key] = value
+    return out
+
+
+class RenderCache:
+    """LRU of merged configs keyed by the hashes of their layers.
+
+    Values are shared between callers and must not be modified.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._entries: "OrderedDict[Key, Any]" = OrderedDict()
+
+    def get(self, key: Key) -> Any:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Key, value: Any) -> None:
+        self._entries[key] = value
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+render_cache = RenderCache(get_settings().config_render_cache_size)
+
+
+_platform_hash: Tuple[int, str] = (0, "")
+
+
+def _platform() -> Tuple[str, Dict[str, Any]]:
+    global _platform_hash
+    defaults = get_settings().config_platform_defaults
+    if _platform_hash[0] != id(defaults):
+        _platform_hash = (id(defaults), content_hash(defaults))
+    return _platform_hash[1], defaults
+
+
+async def _content(db: AsyncSession, model, entity_id: Optional[int]) -> Dict[str, Any]:
+    if entity_id is None:
+        return {}
+    return await db.scalar(select(model.config).where(model.id == entity_id)) or {}
+
+
+async def _layer(
+    db: AsyncSession, model, entity_id: Optional[int], digest: Optional[str], parent: Tuple[Key, Dict[str, Any]]
+) -> Tuple[Key, Dict[str, Any]]:
+    """``parent`` with this layer merged in, and the key it is cached under."""
+    parent_key = parent[0]
+    if digest is not None:
+        merged = render_cache.get(parent_key + (digest,))
+        if merged is not None:
+            return parent_key + (digest,), merged
+    # Key by the content actually read: it may be newer than ``digest``,
+    # and rows written by bulk loaders have no hash at all.
+    content = await _content(db, model, entity_id)
+    return _merged(model, content_hash(content), content, parent)
+
+
+def _merged(
+    model, digest: str, content: Dict[str, Any], parent: Tuple[Key, Dict[str, Any]]
+) -> Tuple[Key, Dict[str, Any]]:
+    parent_key, parent_merged = parent
+    key = parent_key + (digest,)
+    merged = render_cache.get(key)
+    if merged is None:
+        merges.labels(model.__tablename__).inc()
+        merged = merge(parent_merged, content)
+        render_cache.put(key, merged)
+    return key, merged
+
+
+def _loaded(model, entity, parent: Tuple[Key, Dict[str, Any]]) -> Tuple[Key, Dict[str, Any]]:
+    """``_layer`` for a row the caller already holds: no query."""
+    content = (entity.config if entity is not None else None) or {}
+    digest = entity.config_hash if entity is not None else None
+    return _merged(model, digest or content_hash(content), content, parent)
+
+
+def service_layer(service: Service, team: Optional[Team]) -> Tuple[Key, Dict[str, Any]]:
+    """The layers above ``service``'s environments, merged from loaded rows."""
+    platform_hash, defaults = _platform()
+    return _loaded(Service, service, _loaded(Team, team, ((platform_hash,), defaults)))
+
+
+async def _layer_hashes(db: AsyncSession, service_id: int, environment_id: int):
+    row = (
+        await db.execute(
+            select(
+                Environment.config_hash.label("environment_hash"),
+                Service.config_hash.label("service_hash"),
+                Service.team_id,
+                Team.config_hash.label("team_hash"),
+            )
+            .join(Service, Service.id == Environment.service_id)
+            .outerjoin(Team, Team.id == Service.team_id)
+            .where(Environment.id == environment_id, Environment.service_id == service_id)
+        )
+    ).one_or_none()
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service or environment not found")
+    return row
+
+
+async def _service_layer(db: AsyncSession, service_id: int, row) -> Tuple[Key, Dict[str, Any]]:
+    platform_hash, defaults = _platform()
+    team = await _layer(db, Team, row.team_id, row.team_hash, ((platform_hash,), defaults))
+    return await _layer(db, Service, service_id, row.service_hash, team)
+
+
+@traced()
+async def render(db: AsyncSession, service_id: int, environment_id: int) -> Dict[str, Any]:
+    """The environment's rendered config, its hash and the hashes of its layers."""
+    row = await _layer_hashes(db, service_id, environment_id)
+    key, rendered = await _layer(
+        db, Environment, environment_id, row.environment_hash, await _service_layer(db, service_id, row)
+    )
+    rendered_hash = render_cache.get(key + ("rendered",))
+    if rendered_hash is None:
+        guardrails.validate_config(rendered)
+        rendered_hash = content_hash(rendered)
+        render_cache.put(key + ("rendered",), rendered_hash)
+    return {
+        "environment_id": environment_id,
+        "config": rendered,
+        "config_hash": rendered_hash,
+        "layers": dict(zip(("platform", "team", "service", "environment"), key)),
+    }
+
+
+async def check_environment(db: AsyncSession, environment: Environment, config: Dict[str, Any]) -> None:
+    """Raise unless ``environment`` would render validly with ``config`` as its layer."""
+    row = await _layer_hashes(db, environment.service_id, environment.id)
+    _key, service_merged = await _service_layer(db, environment.service_id, row)
+    guardrails.validate_config(merge(service_merged, config))
+
+
+async def bump_generations(db: AsyncSession, environments) -> None:
+    """Mark the environments matching ``environments`` due for reconciliation.
+
+    For writes that change their rendered configs. Does not commit.
+    """
+    await db.execute(
+        update(Environment)
+        .where(environments)
+        .values(generation=Environment.generation + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def check_team_move(db: AsyncSession, service: Service, team: Team) -> None:
+    """Raise unless ``service`` and its environments would render validly under ``team``."""
+    _key, service_merged = service_layer(service, team)
+    guardrails.validate_config(service_merged)
+    for config in await db.scalars(select(Environment.config).where(Environment.service_id == service.id)):
+        guardrails.validate_config(merge(service_merged, config or {}))
+
+
+async def _set_layer(
+    db: AsyncSession,
+    entity,
+    entity_type: str,
+    config: Dict[str, Any],
+    base: Dict[str, Any],
+    performed_by: str,
+    environments,
+) -> None:
+    if entity.config_hash is not None and entity.config_hash == content_hash(config):
+        return
+    guardrails.validate_config(merge(base, config))
+    before = {"config": entity.config or {}}
+    entity.config = config
+    entity.config_hash = content_hash(config)
+    await bump_generations(db, environments)
+    await log_action(
+        db,
+        action=AuditAction.updated,
+        entity_type=entity_type,
+        entity_id=str(entity.id),
+        performed_by=performed_by,
+        metadata={"config_hash": entity.config_hash},
+        commit=False,
+    )
+    await changes.record_change(
+        db,
+        entity_type=entity_type,
+        entity_id=str(entity.id),
+        op=AuditAction.updated,
+        before=before,
+        after={"config": config},
+    )
+    outbox.emit(
+        db, f"{entity_type}.config_updated", {f"{entity_type}_id": entity.id, "config_hash": entity.config_hash}
+    )
+    await db.commit()
+
+
+@traced()
+async def set_team_config(db: AsyncSession, team_id: int, config: Dict[str, Any], performed_by: str) -> Team:
+    team = await get_layer(db, Team, team_id)
+    in_team = Environment.service_id.in_(select(Service.id).where(Service.team_id == team.id))
+    await _set_layer(db, team, "team", config, _platform()[1], performed_by, in_team)
+    return team
+
+
+@traced()
+async def set_service_config(db: AsyncSession, service_id: int, config: Dict[str, Any], performed_by: str) -> Service:
+    service = await get_layer(db, Service, service_id)
+    team_hash = await db.scalar(select(Team.config_hash).where(Team.id == service.team_id))
+    platform_hash, defaults = _platform()
+    _key, team_merged = await _layer(db, Team, service.team_id, team_hash, ((platform_hash,), defaults))
+    await _set_layer(
+        db, service, "service", config, team_merged, performed_by, Environment.service_id == service.id
+    )
+    return service
+
+
+async def get_layer(db: AsyncSession, model, entity_id: int):
+    entity = await db.get(model, entity_id)
+    if not entity:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"{model.__name__} not found")
+    return entity
@@ -0,0 +1,274 @@
+"""Versioned environment configs, stored once per distinct content.
+
+A config is addressed by ``config_layers.content_hash``: the SHA-256 of
+its canonical JSON (sorted keys, no whitespace). ``config_blobs`` holds each
+distinct config once, zlib-compressed, however many environments and
+versions use it; ``environment_config_versions`` is each environment's
+history, one small row per version pointing at a hash.
+``Environment.config`` stays the working copy that reads use and
+``Environment.config_hash`` names the content it holds, so whether two
+environments, or two versions, have the same config is a string
+comparison.
+
+Writing the config an environment already has records nothing.
+Rollback appends a new version pointing at the old hash: history is
+never rewritten and no new blob is stored.
+"""
+
+import hashlib
+import json
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.tracing import traced
+from app.db.dialects import dialect_insert
+from app.models.models import AuditAction, ConfigBlob, Environment, EnvironmentConfigVersion
+from app.services import changes, config_layers, outbox
+from app.services.audit import log_action
+from app.services.config_layers import canonical
+
+# Blobs never change once written, so a hash can be cached forever.
+BLOB_CACHE_SIZE = 1024
+_blob_cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+
+async def store_blob(db: AsyncSession, config: Mapping[str, Any]) -> str:
+    """Write ``config``'s blob unless it exists; return its hash. Does not commit."""
+    raw = canonical(config)
+    digest = hashlib.sha256(raw).hexdigest()
+    await _insert_blob(db, digest, raw)
+    return digest
+
+
+def _compress(raw: bytes) -> bytes:
+    # zlib's defaults allocate 256 KiB of state per call. Configs are
+    # small: a window no bigger than the input compresses them as well.
+    window = min(15, max(9, (len(raw) - 1).bit_length()))
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, window, 4)
+    return compressor.compress(raw) + compressor.flush()
+
+
+async def _insert_blob(db: AsyncSession, digest: str, raw: bytes) -> None:
+    await db.execute(
+        dialect_insert(db, ConfigBlob)
+        .values(hash=digest, data=_compress(raw), size=len(raw))
+        .on_conflict_do_nothing(index_elements=["hash"])
+    )
+
+
+async def load_blob(db: AsyncSession, digest: str) -> Dict[str, Any]:
+    raw = _blob_cache.get(digest)
+    if raw is None:
+        data = await db.scalar(select(ConfigBlob.data).where(ConfigBlob.hash == digest))
+        if data is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Config blob not found")
+        raw = zlib.decompress(data)
+        _blob_cache[digest] = raw
+        if len(_blob_cache) > BLOB_CACHE_SIZE:
+            _blob_cache.popitem(last=False)
+    else:
+        _blob_cache.move_to_end(digest)
+    return json.loads(raw)
+
+
+def diff_configs(old: Any, new: Any, prefix: str = "") -> List[Dict[str, Any]]:
+    """Leaf-level changes from ``old`` to ``new``, recursing into objects."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        out: List[Dict[str, Any]] = []
+        for key in sorted(old.keys() | new.keys()):
+            path = f"{prefix}.{key}" if prefix else key
+            if key not in new:
+                out.append({"path": path, "op": "removed", "old": old[key], "new": None})
+            elif key not in old:
+                out.append({"path": path, "op": "added", "old": None, "new": new[key]})
+            else:
+                out.extend(diff_configs(old[key], new[key], path))
+        return out
+    if old == new:
+        return []
+    return [{"path": prefix, "op": "changed", "old": old, "new": new}]
+
+
+async def _environment(db: AsyncSession, service_id: int, environment_id: int, *, lock: bool = False) -> Environment:
+    query = select(Environment).where(Environment.id == environment_id, Environment.service_id == service_id)
+    if lock:
+        # Serializes version numbering per environment on Postgres.
+        query = query.with_for_update()
+    environment = await db.scalar(query)
+    if environment is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service or environment not found")
+    return environment
+
+
+async def _version(db: AsyncSession, environment_id: int, version: int) -> EnvironmentConfigVersion:
+    row = await db.get(EnvironmentConfigVersion, (environment_id, version))
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Config version {version} not found")
+    return row
+
+
+async def _current(db: AsyncSession, environment_id: int) -> Optional[EnvironmentConfigVersion]:
+    return await db.scalar(
+        select(EnvironmentConfigVersion)
+        .where(EnvironmentConfigVersion.environment_id == environment_id)
+        .order_by(EnvironmentConfigVersion.version.desc())
+        .limit(1)
+    )
+
+
+@traced()
+async def record_version(
+    db: AsyncSession,
+    environment: Environment,
+    config: Dict[str, Any],
+    performed_by: str,
+    *,
+    rolled_back_from: Optional[int] = None,
+) -> Optional[EnvironmentConfigVersion]:
+    """Make ``config`` the environment's next version. Does not commit.
+
+    Returns None, recording nothing, when the environment already has
+    exactly this config. ``environment`` may still be pending, as when
+    provisioning: it is then inserted with its hash in place.
+    """
+    raw = canonical(config)
+    digest = hashlib.sha256(raw).hexdigest()
+    if digest == environment.config_hash:
+        return None
+    latest = 0
+    if environment.config_hash is not None:
+        # Every hashed environment has versions; one without has none yet.
+        latest = await db.scalar(
+            select(func.max(EnvironmentConfigVersion.version)).where(
+                EnvironmentConfigVersion.environment_id == environment.id
+            )
+        )
+    environment.config = config
+    environment.config_hash = digest
+    environment.generation = (environment.generation or 0) + 1
+    await _insert_blob(db, digest, raw)
+    await db.flush()
+    row = EnvironmentConfigVersion(
+        environment_id=environment.id,
+        version=(latest or 0) + 1,
+        config_hash=digest,
+        created_by=performed_by,
+        rolled_back_from=rolled_back_from,
+    )
+    db.add(row)
+    await db.flush()
+    return row
+
+
+async def _apply(
+    db: AsyncSession,
+    environment: Environment,
+    config: Dict[str, Any],
+    performed_by: str,
+    *,
+    rolled_back_from: Optional[int] = None,
+) -> EnvironmentConfigVersion:
+    # Checked as rendered, so a layer may null out an inherited key.
+    await config_layers.check_environment(db, environment, config)
+    before = changes.snapshot(environment, changes.ENVIRONMENT_FIELDS)
+    row = await record_version(db, environment, config, performed_by, rolled_back_from=rolled_back_from)
+    if row is None:
+        current = await _current(db, environment.id)
+        await db.commit()
+        return current
+    await log_action(
+        db,
+        action=AuditAction.updated,
+        entity_type="environment",
+        entity_id=str(environment.id),
+        performed_by=performed_by,
+        metadata={"config_version": row.version, "config_hash": row.config_hash, "rolled_back_from": rolled_back_from},
+        commit=False,
+    )
+    await changes.record_change(
+        db,
+        entity_type="environment",
+        entity_id=str(environment.id),
+        op=AuditAction.updated,
+        before=before,
+        after=changes.snapshot(environment, changes.ENVIRONMENT_FIELDS),
+    )
+    outbox.emit(
+        db,
+        "environment.config_updated",
+        {
+            "environment_id": environment.id,
+            "service_id": environment.service_id,
+            "version": row.version,
+            "config_hash": row.config_hash,
+            "rolled_back_from": rolled_back_from,
+        },
+    )
+    await db.commit()
+    return row
+
+
+@traced()
+async def update_config(
+    db: AsyncSession, service_id: int, environment_id: int, config: Dict[str, Any], performed_by: str
+) -> EnvironmentConfigVersion:
+    environment = await _environment(db, service_id, environment_id, lock=True)
+    return await _apply(db, environment, config, performed_by)
+
+
+@traced()
+async def rollback(
+    db: AsyncSession, service_id: int, environment_id: int, version: int, performed_by: str
+) -> EnvironmentConfigVersion:
+    """Append a version with ``version``'s content."""
+    environment = await _environment(db, service_id, environment_id, lock=True)
+    target = await _version(db, environment.id, version)
+    config = await load_blob(db, target.config_hash)
+    return await _apply(db, environment, config, performed_by, rolled_back_from=version)
+
+
+async def list_versions(db: AsyncSession, service_id: int, environment_id: int) -> List[EnvironmentConfigVersion]:
+    await _environment(db, service_id, environment_id)
+    result = await db.execute(
+        select(EnvironmentConfigVersion)
+        .where(EnvironmentConfigVersion.environment_id == environment_id)
+        .order_by(EnvironmentConfigVersion.version.desc())
+    )
+    return list(result.scalars().all())
+
+
+async def get_version(
+    db: AsyncSession, service_id: int, environment_id: int, version: int
+) -> Tuple[EnvironmentConfigVersion, Dict[str, Any]]:
+    await _environment(db, service_id, environment_id)
+    row = await _version(db, environment_id, version)
+    return row, await load_blob(db, row.config_hash)
+
+
+@traced()
+async def diff_versions(
+    db: AsyncSession, service_id: int, environment_id: int, from_version: int, to_version: Optional[int] = None
+) -> Dict[str, Any]:
+    """Changes between two versions; ``to_version`` defaults to the current one.
+
+    Versions with the same hash are identical without reading either blob.
+    """
+    await _environment(db, service_id, environment_id)
+    old = await _version(db, environment_id, from_version)
+    new = await _current(db, environment_id) if to_version is None else await _version(db, environment_id, to_version)
+    identical = old.config_hash == new.config_hash
+    return {
+        "from_version": old.version,
+        "to_version": new.version,
+        "from_hash": old.config_hash,
+        "to_hash": new.config_hash,
+        "identical": identical,
+        "changes": [] if identical else diff_configs(
+            await load_blob(db, old.config_hash), await load_blob(db, new.config_hash)
+        ),
+    }
@@ -0,0 +1,313 @@
+"""Service dependency edges and the in-memory graph behind impact queries.
+
+``service_dependencies`` holds one row per "service depends on service"
+edge. Reads (transitive dependents/dependencies, cycles, deploy order)
+run against ``dependency_graph``, an adjacency-list cache updated in
+place by the write paths below and rebuilt from the database every
+``dependency_graph_ttl_seconds`` to pick up other workers' writes.
+
+Writes do not trust the cache: the cycle check on insert is a recursive
+query against the table, under an advisory lock on Postgres, so two
+concurrent inserts cannot close a cycle between them.
+"""
+
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.tracing import traced
+from app.db.dialects import dialect_insert
+from app.models.models import AuditAction, Service, ServiceDependency
+from app.services import changes
+from app.services.audit import log_action
+
+# Arbitrary, but fixed: serializes edge inserts on Postgres.
+EDGE_LOCK_KEY = 0x44_45_50_47
+
+_REACHES = text(
+    """
+    WITH RECURSIVE reach(id) AS (
+        SELECT depends_on_id FROM service_dependencies WHERE service_id = :start
+        UNION
+        SELECT d.depends_on_id FROM service_dependencies d JOIN reach r ON d.service_id = r.id
+    )
+    SELECT 1 FROM reach WHERE id = :target LIMIT 1
+    """
+)
+
+
+class DependencyGraph:
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        self._out: Dict[int, Set[int]] = {}  # service -> what it depends on
+        self._in: Dict[int, Set[int]] = {}  # service -> what depends on it
+        # Longest-path height above the services with no dependencies:
+        # every edge points at a strictly lower level. None = recompute.
+        self._levels: Optional[Dict[int, int]] = {}
+        self._blocked: Set[int] = set()  # on or behind a cycle; no level
+        self.version = 0
+        self.loaded_at: Optional[float] = None
+        self._cycles: Optional[Tuple[int, List[List[int]]]] = None
+
+    # -- maintenance -----------------------------------------------------
+
+    def add_edge(self, service_id: int, depends_on_id: int) -> None:
+        self._link(service_id, depends_on_id)
+        if self._blocked:
+            # Levels skip blocked services, so they cannot be raised in
+            # place; the edge may also unblock or block more of them.
+            self._levels = None
+        elif self._levels is not None:
+            self._raise_levels(service_id, depends_on_id)
+
+    def remove_edge(self, service_id: int, depends_on_id: int) -> None:
+        self._out.get(service_id, set()).discard(depends_on_id)
+        self._in.get(depends_on_id, set()).discard(service_id)
+        self.version += 1
+        # Levels stay valid (if loose) when an edge goes away, unless the
+        # edge was holding a cycle together.
+        if self._blocked:
+            self._levels = None
+
+    def load(self, edges: Iterable[Tuple[int, int]]) -> None:
+        self.clear()
+        for service_id, depends_on_id in edges:
+            self._link(service_id, depends_on_id)
+        self._levels = None
+        self._ensure_levels()
+        self.loaded_at = time.monotonic()
+
+    def _link(self, service_id: int, depends_on_id: int) -> None:
+        self._out.setdefault(service_id, set()).add(depends_on_id)
+        self._in.setdefault(depends_on_id, set()).add(service_id)
+        self.version += 1
+
+    def _raise_levels(self, service_id: int, depends_on_id: int) -> None:
+        """Restore the level invariant upward from a new edge."""
+        levels = self._levels
+        stack = [(service_id, levels.get(depends_on_id, 0) + 1)]
+        while stack:
+            node, floor = stack.pop()
+            if levels.get(node, 0) >= floor:
+                continue
+            if node == depends_on_id:
+                # The new edge closed a cycle.
+                self._levels = None
+                return
+            levels[node] = floor
+            stack.extend((dependent, floor + 1) for dependent in self._in.get(node, ()))
+
+    def _ensure_levels(self) -> Dict[int, int]:
+        if self._levels is not None:
+            return self._levels
+        # Kahn from the services with no dependencies.
+        pending = {node: len(deps) for node, deps in self._out.items()}
+        levels = {node: 0 for node in self._in if not self._out.get(node)}
+        frontier = list(levels)
+        while frontier:
+            next_frontier = []
+            for node in frontier:
+                for dependent in self._in.get(node, ()):
+                    pending[dependent] -= 1
+                    levels[dependent] = max(levels.get(dependent, 0), levels[node] + 1)
+                    if pending[dependent] == 0:
+                        next_frontier.append(dependent)
+            frontier = next_frontier
+        self._blocked = {node for node, count in pending.items() if count > 0}
+        for node in self._blocked:
+            levels.pop(node, None)
+        self._levels = levels
+        return levels
+
+    @traced()
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        ttl = get_settings().dependency_graph_ttl_seconds
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at < ttl:
+            return
+        edges = await db.execute(select(ServiceDependency.service_id, ServiceDependency.depends_on_id))
+        self.load(edges.all())
+
+    # -- queries ---------------------------------------------------------
+
+    @traced()
+    def dependencies(self, service_id: int, *, max_depth: Optional[int] = None) -> Dict[int, int]:
+        """Services ``service_id`` depends on, directly or not, with their depth."""
+        return self._walk(self._out, service_id, max_depth)
+
+    @traced()
+    def dependents(self, service_id: int, *, max_depth: Optional[int] = None) -> Dict[int, int]:
+        """Services affected if ``service_id`` goes down, with their depth."""
+        return self._walk(self._in, service_id, max_depth)
+
+    @traced()
+    def cycles(self) -> List[List[int]]:
+        """Strongly connected components that contain a cycle (Tarjan, iterative).
+
+        Every cycle lies within the services left without a level, so
+        only those are searched; an acyclic graph answers immediately.
+        """
+        self._ensure_levels()
+        if not self._blocked:
+            return []
+        if self._cycles and self._cycles[0] == self.version:
+            return self._cycles[1]
+        blocked = self._blocked
+        index: Dict[int, int] = {}
+        low: Dict[int, int] = {}
+        on_stack: Set[int] = set()
+        stack: List[int] = []
+        found: List[List[int]] = []
+        counter = 0
+        for root in sorted(blocked):
+            if root in index:
+                continue
+            work = [(root, iter(self._out.get(root, set()) & blocked))]
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, children = work[-1]
+                child = next(children, None)
+                if child is not None:
+                    if child not in index:
+                        index[child] = low[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(self._out.get(child, set()) & blocked)))
+                    elif child in on_stack:
+                        low[node] = min(low[node], index[child])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in self._out.get(node, ()):
+                        found.append(sorted(component))
+        found.sort()
+        self._cycles = (self.version, found)
+        return found
+
+    @traced()
+    def deploy_waves(self, service_ids: Iterable[int]) -> List[List[int]]:
+        """Order ``service_ids`` so dependencies deploy first.
+
+        Ordering follows transitive edges through services outside the
+        set. Services in the same wave do not depend on each other and
+        may deploy in parallel. Raises ValueError if a requested service
+        is on or depends on a cycle.
+        """
+        levels = self._ensure_levels()
+        requested = set(service_ids)
+        if requested & self._blocked:
+            raise ValueError("Dependency cycle among the requested services")
+        waves: Dict[int, List[int]] = {}
+        for node in requested:
+            waves.setdefault(levels.get(node, 0), []).append(node)
+        return [sorted(waves[level]) for level in sorted(waves)]
+
+    @staticmethod
+    def _walk(adjacency: Dict[int, Set[int]], start: int, max_depth: Optional[int]) -> Dict[int, int]:
+        # Level-synchronous BFS: set unions do the per-level work.
+        depths: Dict[int, int] = {}
+        seen = {start}
+        frontier = {start}
+        depth = 0
+        empty: Set[int] = set()
+        while frontier and (max_depth is None or depth < max_depth):
+            depth += 1
+            frontier = set().union(*(adjacency.get(node, empty) for node in frontier)) - seen
+            seen |= frontier
+            depths.update(dict.fromkeys(frontier, depth))
+        return depths
+
+
+dependency_graph = DependencyGraph()
+
+
+@traced()
+async def add_dependency(db: AsyncSession, service_id: int, depends_on_id: int, performed_by: str) -> ServiceDependency:
+    if service_id == depends_on_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A service cannot depend on itself")
+    found = await db.scalars(select(Service.id).where(Service.id.in_([service_id, depends_on_id])))
+    if len(set(found)) != 2:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
+    if db.get_bind().dialect.name == "postgresql":
+        await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": EDGE_LOCK_KEY})
+    if await db.scalar(_REACHES, {"start": depends_on_id, "target": service_id}):
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Service {depends_on_id} already depends on {service_id}; the edge would create a cycle",
+        )
+    inserted = await db.scalar(
+        dialect_insert(db, ServiceDependency)
+        .values(service_id=service_id, depends_on_id=depends_on_id)
+        .on_conflict_do_nothing(index_elements=["service_id", "depends_on_id"])
+        .returning(ServiceDependency.service_id)
+    )
+    if inserted is not None:
+        await log_action(
+            db,
+            action=AuditAction.created,
+            entity_type="service_dependency",
+            entity_id=f"{service_id}->{depends_on_id}",
+            performed_by=performed_by,
+            metadata={"service_id": service_id, "depends_on_id": depends_on_id},
+            commit=False,
+        )
+        await changes.record_change(
+            db,
+            entity_type="service_dependency",
+            entity_id=f"{service_id}->{depends_on_id}",
+            op=AuditAction.created,
+            after={"service_id": service_id, "depends_on_id": depends_on_id},
+        )
+    await db.commit()
+    dependency_graph.add_edge(service_id, depends_on_id)
+    return await db.get(ServiceDependency, (service_id, depends_on_id))
+
+
+@traced()
+async def remove_dependency(db: AsyncSession, service_id: int, depends_on_id: int, performed_by: str) -> None:
+    result = await db.execute(
+        delete(ServiceDependency).where(
+            ServiceDependency.service_id == service_id, ServiceDependency.depends_on_id == depends_on_id
+        )
+    )
+    if result.rowcount == 0:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dependency not found")
+    await log_action(
+        db,
+        action=AuditAction.deleted,
+        entity_type="service_dependency",
+        entity_id=f"{service_id}->{depends_on_id}",
+        performed_by=performed_by,
+        metadata={"service_id": service_id, "depends_on_id": depends_on_id},
+        commit=False,
+    )
+    await changes.record_change(
+        db,
+        entity_type="service_dependency",
+        entity_id=f"{service_id}->{depends_on_id}",
+        op=AuditAction.deleted,
+        before={"service_id": service_id, "depends_on_id": depends_on_id},
+    )
+    await db.commit()
+    dependency_graph.remove_edge(service_id, depends_on_id)
@@ -1,20 +1,285 @@
-import uuid
-from typing import List
+import functools
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from fastapi import BackgroundTasks, HTTPException, status
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.models import AuditAction, Deployment, DeploymentStatus, Environment, Service
-from app.platform.guardrails import GuardrailEngine
+from app.core.tracing import traced
+from app.db import session as db_session
+from app.db.dialects import dialect_insert
+from app.models.models import AuditAction, Deployment, DeploymentStatus, Environment, EnvironmentTier, Service
 from app.schemas.domain import DeploymentTriggerRequest
+from app.services import analytics, changes, executors, outbox
 from app.services.audit import log_action
-from app.services.jobs import registry, simulate_long_running
+from app.services.events import DeploymentTransitioned, event_bus
+from app.services.jobs import registry, run_job, spawn
+from app.services.scheduler import deployment_scheduler
 
 
-guardrails = GuardrailEngine()
+# Legal status transitions. Terminal states have no outgoing edges.
+TRANSITIONS = {
+    DeploymentStatus.awaiting_approval: {DeploymentStatus.pending},
+    DeploymentStatus.pending: {DeploymentStatus.running, DeploymentStatus.superseded},
+    DeploymentStatus.running: {DeploymentStatus.succeeded, DeploymentStatus.failed},
+}
 
 
+async def transition_status(
+    db: AsyncSession,
+    deployment_id: int,
+    expected: DeploymentStatus,
+    target: DeploymentStatus,
+) -> bool:
+    """Compare-and-swap a deployment from ``expected`` to ``target``.
+
+    Issues a single ``UPDATE ... WHERE status = :expected``; returns False
+    when another worker already moved the deployment on. Does not commit.
+    """
+    if target not in TRANSITIONS.get(expected, ()):
+        raise ValueError(f"Illegal deployment transition {expected.value} -> {target.value}")
+    result = await db.execute(
+        update(Deployment)
+        .where(Deployment.id == deployment_id, Deployment.status == expected)
+        .values(status=target, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+@traced()
+async def _advance(
+    db: AsyncSession,
+    deployment_id: int,
+    expected: DeploymentStatus,
+    target: DeploymentStatus,
+    performed_by: str,
+    events: Tuple[Tuple[str, Dict[str, Any]], ...] = (),
+) -> bool:
+    """CAS the deployment, then record and commit the transition.
+
+    ``events`` are extra (topic, payload) outbox events written in the same
+    transaction, so only the winner of the compare-and-swap emits them.
+    """
+    if not await transition_status(db, deployment_id, expected, target):
+        await db.rollback()
+        return False
+    if target in (DeploymentStatus.succeeded, DeploymentStatus.failed):
+        await analytics.record_outcome(db, deployment_id, target)
+    if target == DeploymentStatus.succeeded:
+        # A new version is desired state: due for reconciliation.
+        environment_id = select(Deployment.environment_id).where(Deployment.id == deployment_id).scalar_subquery()
+        await db.execute(
+            update(Environment)
+            .where(Environment.id == environment_id)
+            .values(generation=Environment.generation + 1)
+            .execution_options(synchronize_session=False)
+        )
+    await log_action(
+        db,
+        action=AuditAction.updated,
+        entity_type="deployment",
+        entity_id=str(deployment_id),
+        performed_by=performed_by,
+        metadata={"status": target.value},
+        commit=False,
+    )
+    await changes.record_change(
+        db,
+        entity_type="deployment",
+        entity_id=str(deployment_id),
+        op=AuditAction.updated,
+        before={"status": expected.value},
+        after={"status": target.value},
+    )
+    outbox.emit(
+        db,
+        f"deployment.{target.value}",
+        {"deployment_id": deployment_id, "previous": expected.value, "status": target.value},
+    )
+    for topic, payload in events:
+        outbox.emit(db, topic, payload)
+    await db.commit()
+    event_bus.publish(DeploymentTransitioned(deployment_id, expected, target, performed_by))
+    return True
+
+
+@traced()
+async def run_deployment(
+    deployment_id: int,
+    performed_by: str,
+    rollout: Optional[Callable[[], Awaitable[None]]] = None,
+) -> bool:
+    """Drive a pending deployment to a terminal state.
+
+    Runs on its own session, never the triggering request's. ``rollout``
+    does the actual work while the deployment is running; if it raises,
+    the deployment is marked failed. Returns False if the deployment was
+    no longer pending (another worker claimed it).
+    """
+    async with db_session.db_router.primary() as db:
+        if not await _advance(db, deployment_id, DeploymentStatus.pending, DeploymentStatus.running, performed_by):
+            return False
+        try:
+            if rollout is not None:
+                await rollout()
+        except Exception:
+            await _advance(db, deployment_id, DeploymentStatus.running, DeploymentStatus.failed, performed_by)
+            raise
+        await _advance(db, deployment_id, DeploymentStatus.running, DeploymentStatus.succeeded, performed_by)
+        return True
+
+
+@traced()
+async def schedule_deployment(job_id: str, deployment_id: int, environment_id: int, performed_by: str) -> None:
+    """Wait for the environment's lane, then run; or retire if superseded."""
+    if not await deployment_scheduler.acquire(environment_id, job_id):
+        async with db_session.db_router.primary() as db:
+            await _advance(db, deployment_id, DeploymentStatus.pending, DeploymentStatus.superseded, performed_by)
+        registry.update(job_id, DeploymentStatus.superseded.value, detail="A newer version was queued")
+        return
+    try:
+        rollout = functools.partial(executors.execute, job_id, deployment_id)
+        await run_job(job_id, run_deployment(deployment_id, performed_by, rollout))
+    finally:
+        deployment_scheduler.release(environment_id)
+
+
+@traced()
+async def create_deployment(
+    db: AsyncSession,
+    *,
+    service: Service,
+    environment: Environment,
+    version: str,
+    initiated_by: str,
+    performed_by: str,
+) -> Tuple[int, bool, DeploymentStatus]:
+    """Insert a deployment and commit; does not schedule it.
+
+    Prod deployments start ``awaiting_approval`` and are resumed by
+    ``app.services.approvals`` at quorum; others start ``pending``.
+    Returns ``(deployment_id, created, status)``; ``created`` is False
+    when the version was already deployed to this environment.
+    """
+    initial = (
+        DeploymentStatus.awaiting_approval if environment.tier == EnvironmentTier.prod else DeploymentStatus.pending
+    )
+
+    # Idempotency is enforced by uq_deployments_version: a concurrent or
+    # retried trigger for the same version inserts nothing and resolves
+    # to the original deployment.
+    now = datetime.utcnow()
+    deployment_id = await db.scalar(
+        dialect_insert(db, Deployment)
+        .values(
+            service_id=service.id,
+            environment_id=environment.id,
+            version=version,
+            status=initial,
+            initiated_by=initiated_by,
+            triggered_by=performed_by,
+            created_at=now,
+            updated_at=now,
+        )
+        .on_conflict_do_nothing(index_elements=["service_id", "environment_id", "version"])
+        .returning(Deployment.id)
+    )
+    if deployment_id is None:
+        existing = (
+            await db.execute(
+                select(Deployment.id, Deployment.status).where(
+                    Deployment.service_id == service.id,
+                    Deployment.environment_id == environment.id,
+                    Deployment.version == version,
+                )
+            )
+        ).one()
+        await db.rollback()
+        return existing.id, False, existing.status
+
+    await log_action(
+        db,
+        action=AuditAction.created,
+        entity_type="deployment",
+        entity_id=str(deployment_id),
+        performed_by=performed_by,
+        metadata={"version": version},
+        commit=False,
+    )
+    await changes.record_change(
+        db,
+        entity_type="deployment",
+        entity_id=str(deployment_id),
+        op=AuditAction.created,
+        after={
+            "service_id": service.id,
+            "environment_id": environment.id,
+            "version": version,
+            "status": initial.value,
+        },
+    )
+    outbox.emit(
+        db,
+        "deployment.created",
+        {
+            "deployment_id": deployment_id,
+            "service_id": service.id,
+            "environment_id": environment.id,
+            "version": version,
+            "status": initial.value,
+        },
+    )
+    if initial == DeploymentStatus.awaiting_approval:
+        outbox.emit(
+            db,
+            "deployment.approval_requested",
+            {
+                "deployment_id": deployment_id,
+                "service_id": service.id,
+                "service": service.name,
+                "environment_id": environment.id,
+                "version": version,
+                "initiated_by": initiated_by,
+            },
+        )
+    await db.commit()
+    return deployment_id, True, initial
+
+
+@traced()
+async def resume_approved(
+    db: AsyncSession, deployment_id: int, environment_id: int, performed_by: str, *, approvers: List[str]
+) -> bool:
+    """Release a deployment that reached approval quorum and schedule it.
+
+    The compare-and-swap makes concurrent quorum-reaching approvals
+    resume it once, and emit ``deployment.approval_granted`` once;
+    returns False for the losers.
+    """
+    granted = ("deployment.approval_granted", {"deployment_id": deployment_id, "approvers": approvers})
+    if not await _advance(
+        db, deployment_id, DeploymentStatus.awaiting_approval, DeploymentStatus.pending, performed_by, (granted,)
+    ):
+        return False
+    enqueue_deployment(deployment_id, environment_id, performed_by)
+    return True
+
+
+def deployment_job_id(deployment_id: int) -> str:
+    return f"deployment-{deployment_id}"
+
+
+def enqueue_deployment(deployment_id: int, environment_id: int, performed_by: str) -> str:
+    """Schedule a created deployment outside any request."""
+    job_id = deployment_job_id(deployment_id)
+    registry.create(job_id, "deployment")
+    spawn(schedule_deployment(job_id, deployment_id, environment_id, performed_by))
+    return job_id
+
+
+@traced()
 async def trigger_deployment(
     db: AsyncSession,
     *,
@@ -22,73 +287,31 @@ async def trigger_deployment(
     environment_id: int,
     payload: DeploymentTriggerRequest,
     background_tasks: BackgroundTasks,
-    approvals: List[str],
     performed_by: str,
-) -> str:
+) -> Dict[str, Any]:
     service = await db.get(Service, service_id)
     environment = await db.get(Environment, environment_id)
     if not service or not environment or environment.service_id != service.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service or environment not found")
 
-    # idempotent check: avoid duplicate version deployment per env
-    existing = await db.scalar(
-        select(Deployment).where(
-            Deployment.service_id == service.id,
-            Deployment.environment_id == environment.id,
-            Deployment.version == payload.version,
-        )
-    )
-    if existing:
-        return f"deployment-{existing.id}"  # idempotent response
-
-    deployment = Deployment(
+    deployment_id, created, initial = await create_deployment(
+        db,
         service=service,
         environment=environment,
         version=payload.version,
-        status=DeploymentStatus.pending,
         initiated_by=payload.initiated_by,
-    )
-    guardrails.validate_production_deployment(deployment, approvals)
-
-    db.add(deployment)
-    await db.commit()
-    await db.refresh(deployment)
-    job_id = f"deployment-{deployment.id}" or str(uuid.uuid4())
-    registry.create(job_id, "deployment")
-
-    async def execute():
-        deployment.status = DeploymentStatus.running
-        await db.commit()
-        await log_action(
-            db,
-            action=AuditAction.updated,
-            entity_type="deployment",
-            entity_id=str(deployment.id),
-            performed_by=performed_by,
-            metadata={"status": deployment.status.value},
-        )
-        deployment.status = DeploymentStatus.succeeded
-        await db.commit()
-        await db.refresh(deployment)
-        await log_action(
-            db,
-            action=AuditAction.updated,
-            entity_type="deployment",
-            entity_id=str(deployment.id),
-            performed_by=performed_by,
-            metadata={"status": deployment.status.value},
-        )
-
-    background_tasks.add_task(simulate_long_running, job_id, execute())
-    await log_action(
-        db,
-        action=AuditAction.created,
-        entity_type="deployment",
-        entity_id=str(deployment.id),
         performed_by=performed_by,
-        metadata={"version": payload.version},
     )
-    return job_id
+    job_id = deployment_job_id(deployment_id)
+    body = {"job_id": job_id, "deployment_id": deployment_id, "status": initial.value}
+    if not created:
+        return body  # idempotent response
+    registry.create(job_id, "deployment")
+    if initial == DeploymentStatus.awaiting_approval:
+        registry.update(job_id, initial.value, detail="Waiting for production approvals")
+    else:
+        background_tasks.add_task(schedule_deployment, job_id, deployment_id, environment.id, performed_by)
+    return body
 
 
 async def get_deployment_history(db: AsyncSession, service_id: int) -> List[Deployment]:
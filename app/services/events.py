@@ -0,0 +1,53 @@
+"""In-process domain events.
+
+Publishers call ``event_bus.publish`` after their transaction commits, so
+subscribers never see a change that later rolls back. Each subscriber
+runs as its own background task: a slow or failing subscriber never
+holds up the publisher or the other subscribers.
+
+Delivery is in-process and at-most-once; subscribers must tolerate
+duplicates and must not be the only record of anything.
+"""
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Type
+
+from app.models.models import DeploymentStatus
+from app.services.jobs import spawn
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Any], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class DeploymentTransitioned:
+    deployment_id: int
+    previous: DeploymentStatus
+    status: DeploymentStatus
+    performed_by: str
+
+
+class EventBus:
+    def __init__(self):
+        self._subscribers: Dict[Type, List[Handler]] = defaultdict(list)
+
+    def subscribe(self, event_type: Type, handler: Handler) -> None:
+        if handler not in self._subscribers[event_type]:
+            self._subscribers[event_type].append(handler)
+
+    def publish(self, event: Any) -> None:
+        for handler in self._subscribers.get(type(event), ()):
+            spawn(self._deliver(handler, event))
+
+    @staticmethod
+    async def _deliver(handler: Handler, event: Any) -> None:
+        try:
+            await handler(event)
+        except Exception:  # noqa: BLE001
+            logger.exception("Event handler %s failed for %r", getattr(handler, "__qualname__", handler), event)
+
+
+event_bus = EventBus()
@@ -0,0 +1,330 @@
+"""Deployment executors: the work a running deployment does.
+
+``execution_executor`` picks one. An executor has a ``name`` and a
+coroutine ``run(plan, progress)``: ``plan`` says what to deploy and
+``progress`` is how it reports steps into the job's status
+(``GET /api/jobs/{id}``) and learns it should stop. Shipped executors:
+
+* ``fake`` walks through ``prepare``, ``rollout`` and ``verify``,
+  waiting ``execution_fake_step_seconds`` in each; the default, for
+  local runs and tests.
+* ``subprocess`` runs ``execution_commands`` in order, one step per
+  command, e.g. ``{"build": ["make", "image"], "rollout": ["kubectl",
+  ...]}``. Arguments may use ``{service}``, ``{environment}``,
+  ``{tier}``, ``{version}`` and ``{deployment_id}``.
+* ``script`` runs ``execution_script`` with ``/bin/sh``, with the plan in
+  ``IDP_*`` environment variables. A line ``::step <name>`` on its
+  output starts a step; other lines become the current step's detail.
+
+Stopping is cooperative. Cancelling the job (``POST
+/api/jobs/{id}/cancel``) or running past ``execution_timeout_seconds``
+sets ``progress.cancelled``: the fake notices between steps and the
+process executors terminate their child's process group at once. A
+cancelled deployment fails and its job ends ``cancelled``; a timed out
+one fails with a timeout.
+
+Commands run as child processes, so CPU-heavy work never runs on the
+API's event loop, and at most ``execution_max_processes`` of them run at
+once across all deployments; the rest wait for a slot. A cancel stops
+that wait too. The timeout counts from when the executor starts, so time
+spent waiting for a slot is included.
+"""
+
+import asyncio
+import contextlib
+import os
+import signal
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import select
+
+from app.core.config import get_settings
+from app.core.tracing import traced
+from app.db import session as db_session
+from app.models.models import Deployment, Environment, Service
+from app.services.jobs import JobCancelled, registry
+
+# How long a terminated process gets to exit before it is killed.
+TERMINATE_GRACE_SECONDS = 5.0
+
+
+@dataclass(frozen=True)
+class DeploymentPlan:
+    deployment_id: int
+    service: str
+    environment: str
+    tier: str
+    version: str
+
+    def variables(self) -> Dict[str, str]:
+        return {
+            "deployment_id": str(self.deployment_id),
+            "service": self.service,
+            "environment": self.environment,
+            "tier": self.tier,
+            "version": self.version,
+        }
+
+    def env(self) -> Dict[str, str]:
+        return {f"IDP_{key.upper()}": value for key, value in self.variables().items()}
+
+
+class Progress:
+    """One job's step reporting and stop signal, handed to an executor."""
+
+    def __init__(self, job_id: str, timeout: float = 0):
+        self.job_id = job_id
+        self.cancelled = registry.get(job_id).cancel
+        self.timed_out: Optional[str] = None
+        self._timer = None
+        if timeout > 0:
+            self._timer = asyncio.get_running_loop().call_later(timeout, self._expire, timeout)
+
+    def _expire(self, timeout: float) -> None:
+        self.timed_out = f"Timed out after {timeout:g}s"
+        self.cancelled.set()
+
+    def check(self) -> None:
+        """Raise if the executor should stop."""
+        if self.timed_out:
+            raise TimeoutError(self.timed_out)
+        if self.cancelled.is_set():
+            raise JobCancelled("Cancelled")
+
+    def start(self, name: str) -> None:
+        self.check()
+        registry.step(self.job_id, name, "running")
+
+    def output(self, name: str, line: str) -> None:
+        registry.step(self.job_id, name, "running", detail=line)
+
+    def finish(self, name: str, exc: Optional[BaseException] = None) -> None:
+        if exc is None:
+            registry.step(self.job_id, name, "succeeded")
+        elif isinstance(exc, JobCancelled):
+            registry.step(self.job_id, name, "cancelled")
+        else:
+            registry.step(self.job_id, name, "failed", detail=str(exc) or type(exc).__name__)
+
+    @contextlib.contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        self.start(name)
+        try:
+            yield
+        except BaseException as exc:
+            self.finish(name, exc)
+            raise
+        self.finish(name)
+
+    def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+
+
+_slots: Optional[asyncio.Semaphore] = None
+_slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def process_slots() -> asyncio.Semaphore:
+    global _slots, _slots_loop
+    loop = asyncio.get_running_loop()
+    if _slots_loop is not loop:
+        _slots = asyncio.Semaphore(get_settings().execution_max_processes)
+        _slots_loop = loop
+    return _slots
+
+
+async def _terminate(process: asyncio.subprocess.Process) -> None:
+    # The whole group: a shell's children go too.
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(process.pid, sig)
+        try:
+            await asyncio.wait_for(process.wait(), TERMINATE_GRACE_SECONDS)
+            return
+        except asyncio.TimeoutError:
+            continue
+
+
+async def _acquire(slots: asyncio.Semaphore, progress: Progress) -> None:
+    """Take one of ``slots``, or raise if ``progress`` is cancelled first."""
+    acquiring = asyncio.ensure_future(slots.acquire())
+    stopping = asyncio.ensure_future(progress.cancelled.wait())
+    waited = False
+    try:
+        await asyncio.wait({acquiring, stopping}, return_when=asyncio.FIRST_COMPLETED)
+        waited = True
+    finally:
+        stopping.cancel()
+        acquiring.cancel()
+        # The cancel may lose to the slot being handed over.
+        await asyncio.gather(acquiring, return_exceptions=True)
+        if not waited and not acquiring.cancelled():
+            slots.release()
+    if acquiring.cancelled():
+        progress.check()
+
+
+async def run_process(
+    argv: Sequence[str], *, env: Dict[str, str], progress: Progress, on_line: Callable[[str], None]
+) -> None:
+    """Run ``argv`` in a process slot, passing it each output line.
+
+    Raises if it exits non-zero; terminates it, or stops waiting for a
+    slot, if ``progress`` is cancelled first.
+    """
+    slots = process_slots()
+    await _acquire(slots, progress)
+    try:
+        progress.check()
+        process = await asyncio.create_subprocess_exec(
+            *argv,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env={**os.environ, **env},
+            start_new_session=True,
+        )
+
+        async def pump() -> int:
+            async for line in process.stdout:
+                on_line(line.decode(errors="replace").rstrip())
+            return await process.wait()
+
+        finished = asyncio.ensure_future(pump())
+        stopping = asyncio.ensure_future(progress.cancelled.wait())
+        try:
+            await asyncio.wait({finished, stopping}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopping.cancel()
+            if process.returncode is None:
+                await _terminate(process)
+            if not finished.done():
+                finished.cancel()
+                await asyncio.gather(finished, return_exceptions=True)
+        progress.check()
+        if finished.result() != 0:
+            raise RuntimeError(f"{argv[0]} exited with status {finished.result()}")
+    finally:
+        slots.release()
+
+
+class FakeExecutor:
+    """Reports steps without running anything; for local runs and tests."""
+
+    name = "fake"
+
+    def __init__(self, steps: Sequence[str] = ("prepare", "rollout", "verify"), step_seconds: float = 0.0):
+        self.steps = list(steps)
+        self.step_seconds = step_seconds
+        self.runs: List[DeploymentPlan] = []
+        # Steps that raise, to exercise failures.
+        self.failing: Dict[str, str] = {}
+
+    async def run(self, plan: DeploymentPlan, progress: Progress) -> None:
+        self.runs.append(plan)
+        for name in self.steps:
+            with progress.step(name):
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(progress.cancelled.wait(), self.step_seconds)
+                progress.check()
+                if name in self.failing:
+                    raise RuntimeError(self.failing[name])
+
+
+class SubprocessExecutor:
+    name = "subprocess"
+
+    def __init__(self, commands: Dict[str, List[str]]):
+        self.commands = commands
+
+    async def run(self, plan: DeploymentPlan, progress: Progress) -> None:
+        variables = plan.variables()
+        for name, argv in self.commands.items():
+            with progress.step(name):
+                await run_process(
+                    [arg.format(**variables) for arg in argv],
+                    env=plan.env(),
+                    progress=progress,
+                    on_line=lambda line, name=name: progress.output(name, line),
+                )
+
+
+class ScriptExecutor:
+    name = "script"
+
+    STEP_MARKER = "::step "
+
+    def __init__(self, script: str, shell: str = "/bin/sh"):
+        self.script = script
+        self.shell = shell
+
+    async def run(self, plan: DeploymentPlan, progress: Progress) -> None:
+        current = ["script"]
+        progress.start(current[0])
+
+        def on_line(line: str) -> None:
+            if line.startswith(self.STEP_MARKER):
+                progress.finish(current[0])
+                current[0] = line[len(self.STEP_MARKER) :].strip()
+                progress.start(current[0])
+            elif line:
+                progress.output(current[0], line)
+
+        try:
+            await run_process([self.shell, self.script], env=plan.env(), progress=progress, on_line=on_line)
+        except BaseException as exc:
+            progress.finish(current[0], exc)
+            raise
+        progress.finish(current[0])
+
+
+fake_executor = FakeExecutor(step_seconds=get_settings().execution_fake_step_seconds)
+
+
+def executor_from_settings() -> Any:
+    settings = get_settings()
+    available = {
+        "fake": lambda: fake_executor,
+        "subprocess": lambda: SubprocessExecutor(settings.execution_commands),
+        "script": lambda: ScriptExecutor(settings.execution_script),
+    }
+    if settings.execution_executor not in available:
+        raise ValueError(f"Unknown deployment executor: {settings.execution_executor}")
+    return available[settings.execution_executor]()
+
+
+async def load_plan(deployment_id: int) -> DeploymentPlan:
+    async with db_session.db_router.primary() as db:
+        row = (
+            await db.execute(
+                select(
+                    Deployment.version,
+                    Service.name.label("service"),
+                    Environment.name.label("environment"),
+                    Environment.tier,
+                )
+                .join(Service, Service.id == Deployment.service_id)
+                .join(Environment, Environment.id == Deployment.environment_id)
+                .where(Deployment.id == deployment_id)
+            )
+        ).one()
+    return DeploymentPlan(
+        deployment_id=deployment_id,
+        service=row.service,
+        environment=row.environment,
+        tier=row.tier.value,
+        version=row.version,
+    )
+
+
+@traced()
+async def execute(job_id: str, deployment_id: int) -> None:
+    """Run the deployment with the configured executor, reporting into ``job_id``."""
+    executor = executor_from_settings()
+    plan = await load_plan(deployment_id)
+    progress = Progress(job_id, timeout=get_settings().execution_timeout_seconds)
+    try:
+        await executor.run(plan, progress)
+    finally:
+        progress.close()
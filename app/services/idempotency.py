@@ -0,0 +1,97 @@
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.db import session as db_session
+from app.db.dialects import dialect_insert
+from app.models.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+
+def scoped_key(principal: str, header_value: str) -> str:
+    return f"{principal}:{header_value}"
+
+
+def fingerprint(payload: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def get_cached_response(
+    db: AsyncSession, key: str, request_fingerprint: str
+) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """Return ``(status_code, body)`` stored for ``key``, if still fresh.
+
+    Reusing a key with a different request body is a client error rather
+    than a silent replay of the first response.
+    """
+    row = await db.get(IdempotencyKey, key)
+    if row is None:
+        return None
+    ttl = timedelta(seconds=get_settings().idempotency_key_ttl_seconds)
+    if row.created_at < datetime.utcnow() - ttl:
+        return None
+    if row.request_fingerprint != request_fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different request",
+        )
+    return row.status_code, row.response_body
+
+
+async def store_response(
+    db: AsyncSession, key: str, request_fingerprint: str, status_code: int, body: Dict[str, Any]
+) -> None:
+    """Remember the response for ``key``; the first writer wins."""
+    ttl = timedelta(seconds=get_settings().idempotency_key_ttl_seconds)
+    await db.execute(
+        delete(IdempotencyKey).where(
+            IdempotencyKey.key == key, IdempotencyKey.created_at < datetime.utcnow() - ttl
+        )
+    )
+    await db.execute(
+        dialect_insert(db, IdempotencyKey)
+        .values(
+            key=key,
+            request_fingerprint=request_fingerprint,
+            status_code=status_code,
+            response_body=body,
+            created_at=datetime.utcnow(),
+        )
+        .on_conflict_do_nothing(index_elements=["key"])
+    )
+    await db.commit()
+
+
+async def purge_expired(db: AsyncSession) -> int:
+    ttl = timedelta(seconds=get_settings().idempotency_key_ttl_seconds)
+    result = await db.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.created_at < datetime.utcnow() - ttl)
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def run_purger(stop: asyncio.Event, *, interval: float) -> None:
+    """Delete expired keys every ``interval`` until ``stop`` is set."""
+    while True:
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+            return
+        except asyncio.TimeoutError:
+            pass
+        try:
+            async with db_session.db_router.primary() as db:
+                purged = await purge_expired(db)
+            if purged:
+                logger.info("Purged %d expired idempotency keys", purged)
+        except Exception:  # noqa: BLE001
+            logger.exception("Idempotency key purge failed")
@@ -1,7 +1,26 @@
 import asyncio
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Coroutine, Dict, List, Optional, Set
+
+from app.core.tracing import traced
+
+# Jobs in these states can still be cancelled.
+CANCELLABLE = {"pending", "running"}
+
+
+class JobCancelled(Exception):
+    """Raised by executors that stop because their job was cancelled."""
+
+
+@dataclass
+class JobStep:
+    name: str
+    status: str
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+    # Last line of output, or why the step failed.
+    detail: Optional[str] = None
 
 
 @dataclass
@@ -12,6 +31,9 @@ class JobStatus:
     created_at: datetime = field(default_factory=datetime.utcnow)
     updated_at: datetime = field(default_factory=datetime.utcnow)
     detail: Optional[str] = None
+    steps: List[JobStep] = field(default_factory=list)
+    # Set to ask the job's executor to stop; see app.services.executors.
+    cancel: asyncio.Event = field(default_factory=asyncio.Event, repr=False, compare=False)
 
 
 class JobRegistry:
@@ -30,19 +52,65 @@ class JobRegistry:
         job.detail = detail
         return job
 
+    def step(self, job_id: str, name: str, status: str, detail: Optional[str] = None) -> JobStep:
+        """Start the step ``name`` or move it to ``status``."""
+        job = self._jobs[job_id]
+        step = job.steps[-1] if job.steps and job.steps[-1].name == name else None
+        if step is None:
+            step = JobStep(name=name, status=status)
+            job.steps.append(step)
+        step.status = status
+        if status != "running":
+            step.finished_at = datetime.utcnow()
+        if detail is not None:
+            step.detail = detail
+        job.updated_at = datetime.utcnow()
+        return step
+
+    def cancel(self, job_id: str) -> bool:
+        """Ask the job to stop; False if it is unknown or already over."""
+        job = self._jobs.get(job_id)
+        if job is None or job.status not in CANCELLABLE:
+            return False
+        job.cancel.set()
+        job.detail = "Cancellation requested"
+        job.updated_at = datetime.utcnow()
+        return True
+
     def get(self, job_id: str) -> Optional[JobStatus]:
         return self._jobs.get(job_id)
 
 
 registry = JobRegistry()
 
+# Strong references to fire-and-forget tasks; the loop only keeps weak ones.
+_background: Set[asyncio.Task] = set()
+
 
-async def simulate_long_running(job_id: str, coro):
+def spawn(coro: Coroutine) -> asyncio.Task:
+    """Run ``coro`` in the background on the current loop."""
+    task = asyncio.get_running_loop().create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+
+async def drain() -> None:
+    """Wait for spawned tasks, including any they spawn in turn."""
+    while _background:
+        await asyncio.gather(*list(_background), return_exceptions=True)
+
+
+@traced()
+async def run_job(job_id: str, coro):
+    """Await ``coro`` and record the outcome as the job's status."""
     registry.update(job_id, "running")
     try:
-        await asyncio.sleep(0.1)
         await coro
         registry.update(job_id, "succeeded")
+    except JobCancelled as exc:
+        registry.update(job_id, "cancelled", detail=str(exc))
+        raise
     except Exception as exc:  # noqa: BLE001
         registry.update(job_id, "failed", detail=str(exc))
         raise
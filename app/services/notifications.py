@@ -0,0 +1,255 @@
+"""Approval notifications, fanned out from the outbox to pluggable sinks.
+
+``record`` is the outbox consumer for ``deployment.approval_*`` events: in
+the dispatcher's transaction it only writes one ``notification_deliveries``
+row per (event, sink named in ``notification_sinks``). The notifier
+(``run_notifier``, run in the app every ``notification_poll_seconds`` and
+woken by new rows) sends them outside any transaction, the way webhooks
+are delivered: it leases due rows, hands each sink its messages in one
+call (sinks concurrently), then marks them delivered or reschedules them
+with exponential backoff, dead-lettering after ``notification_max_attempts``.
+
+A slow sink therefore holds up neither the outbox nor the other sinks,
+and a retry only goes to the sink that failed. Delivery is at-least-once;
+``event_id`` identifies a notification.
+"""
+
+import asyncio
+import logging
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import httpx
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.db import session as db_session
+from app.db.dialects import dialect_insert
+from app.models.models import NotificationDelivery, OutboxEvent, WebhookDeliveryStatus
+from app.services import outbox
+
+logger = logging.getLogger(__name__)
+
+TOPIC_PREFIX = "deployment.approval_"
+# How long leased rows are hidden from other notifiers; longer than any send.
+LEASE_SECONDS = 60.0
+
+_wakeup: Optional[asyncio.Event] = None
+
+
+def message(row) -> Dict[str, Any]:
+    return {"event_id": row.event_id, "topic": row.topic, "created_at": row.created_at.isoformat(), **row.payload}
+
+
+def wake() -> None:
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+class LogSink:
+    name = "log"
+
+    async def send(self, messages: List[Dict[str, Any]]) -> None:
+        for msg in messages:
+            logger.info("Notification %s: %s", msg["topic"], msg)
+
+
+class StubSink:
+    """Keeps messages in memory; for local runs and tests."""
+
+    name = "stub"
+
+    def __init__(self):
+        self.sent: List[Dict[str, Any]] = []
+
+    async def send(self, messages: List[Dict[str, Any]]) -> None:
+        self.sent.extend(messages)
+
+
+class WebhookSink:
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    async def send(self, messages: List[Dict[str, Any]]) -> None:
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            response = await client.post(self.url, json={"notifications": messages})
+            response.raise_for_status()
+
+
+stub_sink = StubSink()
+_sinks: Optional[List[Any]] = None
+
+
+def sinks() -> List[Any]:
+    global _sinks
+    if _sinks is None:
+        settings = get_settings()
+        available = {
+            "log": LogSink,
+            "stub": lambda: stub_sink,
+            "webhook": lambda: WebhookSink(settings.notification_webhook_url),
+        }
+        unknown = set(settings.notification_sinks) - set(available)
+        if unknown:
+            raise ValueError(f"Unknown notification sinks: {', '.join(sorted(unknown))}")
+        _sinks = [available[name]() for name in settings.notification_sinks]
+    return _sinks
+
+
+def backoff(attempts: int) -> float:
+    settings = get_settings()
+    delay = min(
+        settings.notification_backoff_base_seconds * 2 ** (attempts - 1), settings.notification_backoff_max_seconds
+    )
+    return delay * (0.5 + random.random() / 2)
+
+
+async def record(db: AsyncSession, events: List[OutboxEvent]) -> None:
+    now = datetime.utcnow()
+    rows = [
+        {"sink": sink.name, "event_id": event.id, "next_attempt_at": now, "created_at": now}
+        for event in events
+        for sink in sinks()
+    ]
+    if rows:
+        await db.execute(
+            dialect_insert(db, NotificationDelivery).on_conflict_do_nothing(index_elements=["sink", "event_id"]),
+            rows,
+        )
+        outbox.on_commit(db, wake)
+
+
+outbox.subscribe(TOPIC_PREFIX, record)
+
+
+async def _claim(db: AsyncSession, names: List[str]):
+    now = datetime.utcnow()
+    query = (
+        select(
+            NotificationDelivery.id,
+            NotificationDelivery.attempts,
+            NotificationDelivery.sink,
+            OutboxEvent.id.label("event_id"),
+            OutboxEvent.topic,
+            OutboxEvent.payload,
+            OutboxEvent.created_at,
+        )
+        .join(OutboxEvent, NotificationDelivery.event_id == OutboxEvent.id)
+        .where(
+            NotificationDelivery.status == WebhookDeliveryStatus.pending,
+            NotificationDelivery.next_attempt_at <= now,
+            NotificationDelivery.sink.in_(names),
+        )
+        .order_by(NotificationDelivery.next_attempt_at, NotificationDelivery.id)
+        .limit(get_settings().notification_claim_size)
+    )
+    if db.get_bind().dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True, of=NotificationDelivery)
+    rows = (await db.execute(query)).all()
+    if not rows:
+        await db.rollback()
+        return []
+    await db.execute(
+        update(NotificationDelivery)
+        .where(NotificationDelivery.id.in_([row.id for row in rows]))
+        .values(next_attempt_at=now + timedelta(seconds=LEASE_SECONDS))
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return rows
+
+
+async def deliver_due(db: AsyncSession) -> int:
+    """Lease, send and settle one claim's worth. Returns deliveries attempted."""
+    by_name = {sink.name: sink for sink in sinks()}
+    rows = await _claim(db, list(by_name))
+    if not rows:
+        return 0
+    by_sink = defaultdict(list)
+    for row in rows:
+        by_sink[row.sink].append(row)
+    names = list(by_sink)
+    results = await asyncio.gather(
+        *(by_name[name].send([message(row) for row in by_sink[name]]) for name in names), return_exceptions=True
+    )
+
+    settings = get_settings()
+    now = datetime.utcnow()
+    delivered: List[dict] = []
+    failed: List[dict] = []
+    for name, result in zip(names, results):
+        error = f"{type(result).__name__}: {result}" if isinstance(result, Exception) else None
+        for row in by_sink[name]:
+            attempts = row.attempts + 1
+            if error is None:
+                delivered.append({"row_id": row.id, "row_attempts": attempts})
+                continue
+            dead = attempts >= settings.notification_max_attempts
+            failed.append(
+                {
+                    "row_id": row.id,
+                    "row_attempts": attempts,
+                    "row_status": WebhookDeliveryStatus.dead if dead else WebhookDeliveryStatus.pending,
+                    "row_next": now + timedelta(seconds=backoff(attempts)),
+                    "row_error": error,
+                }
+            )
+    table = NotificationDelivery.__table__
+    if delivered:
+        await db.execute(
+            update(table)
+            .where(table.c.id == bindparam("row_id"))
+            .values(
+                status=WebhookDeliveryStatus.delivered,
+                attempts=bindparam("row_attempts"),
+                delivered_at=now,
+                last_error=None,
+            ),
+            delivered,
+        )
+    if failed:
+        await db.execute(
+            update(table)
+            .where(table.c.id == bindparam("row_id"))
+            .values(
+                status=bindparam("row_status"),
+                attempts=bindparam("row_attempts"),
+                next_attempt_at=bindparam("row_next"),
+                last_error=bindparam("row_error"),
+            ),
+            failed,
+        )
+        dead = sum(1 for row in failed if row["row_status"] == WebhookDeliveryStatus.dead)
+        if dead:
+            logger.warning("Dead-lettered %s notifications", dead)
+    await db.commit()
+    return len(rows)
+
+
+async def run_notifier(stop: asyncio.Event, *, interval: float) -> None:
+    """Send notifications until ``stop`` is set, every ``interval`` or on ``wake``."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    claim_size = get_settings().notification_claim_size
+    stopping = asyncio.ensure_future(stop.wait())
+    try:
+        while not stop.is_set():
+            woken = asyncio.ensure_future(_wakeup.wait())
+            await asyncio.wait({stopping, woken}, timeout=interval, return_when=asyncio.FIRST_COMPLETED)
+            woken.cancel()
+            _wakeup.clear()
+            try:
+                async with db_session.db_router.primary() as db:
+                    while await deliver_due(db) == claim_size and not stop.is_set():
+                        pass
+            except Exception:  # noqa: BLE001
+                logger.exception("Notification delivery failed")
+    finally:
+        stopping.cancel()
+        _wakeup = None
@@ -0,0 +1,190 @@
+"""Transactional outbox.
+
+Write paths call ``emit`` inside their own transaction, so an event
+exists if and only if the change that caused it committed. The
+dispatcher (``run_dispatcher``; started by the app every
+``outbox_poll_seconds``, and woken early by ``wake``) hands undispatched
+events in id order to the consumers subscribed to their topic, off the
+request path.
+
+Consumers run inside the dispatcher's transaction, each in a savepoint,
+so whatever a consumer writes (e.g. webhook delivery rows) commits
+together with the events being marked dispatched. A batch whose consumer
+raises has that consumer's writes rolled back and stays undispatched.
+Its events are retried after an exponential backoff with jitter
+(``outbox_backoff_base_seconds``, doubling up to
+``outbox_backoff_max_seconds``), never again in the pass that failed
+them; after ``outbox_max_attempts`` they are given up on with their last
+error recorded. Consumers with side effects outside the database must
+tolerate seeing an event twice.
+"""
+
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import event as sa_event
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.db import session as db_session
+from app.models.models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+Consumer = Callable[[AsyncSession, List[OutboxEvent]], Awaitable[None]]
+
+_consumers: List[tuple] = []  # (topic prefix, consumer)
+_wakeup: Optional[asyncio.Event] = None
+
+
+def subscribe(prefix: str, consumer: Consumer) -> None:
+    """Deliver events whose topic starts with ``prefix`` to ``consumer``."""
+    if (prefix, consumer) not in _consumers:
+        _consumers.append((prefix, consumer))
+
+
+def emit(db: AsyncSession, topic: str, payload: Dict[str, Any]) -> None:
+    """Queue an event in the caller's transaction. Does not commit.
+
+    The dispatcher is woken when that transaction commits.
+    """
+    db.add(OutboxEvent(topic=topic, payload=payload))
+    on_commit(db, wake)
+
+
+def wake() -> None:
+    """Ask the dispatcher to run now instead of at its next poll."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def on_commit(db: AsyncSession, callback: Callable[[], None]) -> None:
+    """Call ``callback`` once the session's current transaction commits."""
+    callbacks = db.info.setdefault("outbox_on_commit", [])
+    if not db.info.get("outbox_listening"):
+        sa_event.listen(db.sync_session, "after_commit", _run_on_commit)
+        sa_event.listen(db.sync_session, "after_rollback", _clear_on_commit)
+        db.info["outbox_listening"] = True
+    if callback not in callbacks:
+        callbacks.append(callback)
+
+
+def _run_on_commit(session) -> None:
+    for callback in session.info.pop("outbox_on_commit", []):
+        callback()
+
+
+def _clear_on_commit(session) -> None:
+    session.info.pop("outbox_on_commit", None)
+
+
+def backoff(attempts: int) -> float:
+    """Seconds to wait before retrying an event that failed ``attempts`` times."""
+    settings = get_settings()
+    delay = min(settings.outbox_backoff_base_seconds * 2 ** (attempts - 1), settings.outbox_backoff_max_seconds)
+    return delay * (0.5 + random.random() / 2)
+
+
+async def dispatch_pending(
+    db: AsyncSession, *, batch_size: int = 500, max_attempts: int = 5, due: Optional[datetime] = None
+) -> int:
+    """Dispatch one batch of events due before ``due`` (default: now).
+
+    A pass keeps ``due`` at its start, so an event it fails is retried
+    after that and not taken again by the same pass. Returns the number
+    of events taken.
+    """
+    due = due or datetime.utcnow()
+    query = (
+        select(OutboxEvent)
+        .where(
+            OutboxEvent.dispatched_at.is_(None),
+            or_(OutboxEvent.next_attempt_at.is_(None), OutboxEvent.next_attempt_at < due),
+        )
+        .order_by(OutboxEvent.id)
+        .limit(batch_size)
+    )
+    if db.get_bind().dialect.name == "postgresql":
+        # Several app workers may run dispatchers; each takes its own rows.
+        query = query.with_for_update(skip_locked=True)
+    events = (await db.scalars(query)).all()
+    if not events:
+        await db.rollback()
+        return 0
+
+    failed: Dict[int, str] = {}
+    for prefix, consumer in _consumers:
+        matched = [event for event in events if event.topic.startswith(prefix)]
+        if not matched:
+            continue
+        try:
+            async with db.begin_nested():
+                await consumer(db, matched)
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Outbox consumer %s failed", getattr(consumer, "__qualname__", consumer))
+            failed.update((event.id, f"{type(exc).__name__}: {exc}") for event in matched)
+
+    now = datetime.utcnow()
+    done = [event.id for event in events if event.id not in failed]
+    if done:
+        await db.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.id.in_(done))
+            .values(dispatched_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    for event in events:
+        if event.id in failed:
+            event.attempts += 1
+            event.last_error = failed[event.id]
+            if event.attempts >= max_attempts:
+                logger.error("Giving up on outbox event %s (%s): %s", event.id, event.topic, event.last_error)
+                event.dispatched_at = now
+            else:
+                event.next_attempt_at = max(now, due) + timedelta(seconds=backoff(event.attempts))
+    await db.commit()
+    return len(events)
+
+
+async def run_dispatcher(stop: asyncio.Event, *, interval: float, batch_size: int, max_attempts: int) -> None:
+    """Dispatch until ``stop`` is set, every ``interval`` or on ``wake``."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    stopping = asyncio.ensure_future(stop.wait())
+    try:
+        while not stop.is_set():
+            woken = asyncio.ensure_future(_wakeup.wait())
+            await asyncio.wait({stopping, woken}, timeout=interval, return_when=asyncio.FIRST_COMPLETED)
+            woken.cancel()
+            _wakeup.clear()
+            try:
+                async with db_session.db_router.primary() as db:
+                    due = datetime.utcnow()
+                    while (
+                        await dispatch_pending(db, batch_size=batch_size, max_attempts=max_attempts, due=due)
+                        == batch_size
+                    ):
+                        pass
+            except Exception:  # noqa: BLE001
+                logger.exception("Outbox dispatch failed")
+    finally:
+        stopping.cancel()
+        _wakeup = None
+
+
+async def dispatch_all(db: AsyncSession) -> int:
+    """Drain the outbox once; for CLIs and tests."""
+    settings = get_settings()
+    due = datetime.utcnow()
+    total = 0
+    while True:
+        taken = await dispatch_pending(
+            db, batch_size=settings.outbox_batch_size, max_attempts=settings.outbox_max_attempts, due=due
+        )
+        total += taken
+        if taken < settings.outbox_batch_size:
+            return total
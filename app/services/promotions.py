@@ -0,0 +1,319 @@
+"""Promotion pipelines: one version rolled through dev, staging and prod.
+
+A pipeline deploys its version to the service's dev environment, then
+waits. ``on_deployment_transition`` subscribes to deployment transitions
+on ``event_bus``; when the deployment for a pipeline's current tier
+succeeds, it queues the same version on the next tier (first environment
+of that tier, by id). The prod deployment waits for approval quorum like
+any other (see ``app.services.approvals``); the pipeline moves on when
+it succeeds. A guardrail refusal leaves the pipeline ``blocked``.
+
+Nothing polls: every step runs on the task that handled the previous
+deployment's event, so pipelines for many services advance concurrently.
+Events are delivered at most once per process (see
+``app.services.events``); a pipeline interrupted by a restart stays
+``running`` at its current tier.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.tracing import traced
+from app.db import session as db_session
+from app.models.models import (
+    AuditAction,
+    Deployment,
+    DeploymentStatus,
+    Environment,
+    EnvironmentTier,
+    PromotionPipeline,
+    PromotionStatus,
+    Service,
+)
+from app.schemas.domain import PromotionRead
+from app.services import changes
+from app.services import deployment as deployment_service
+from app.services.audit import log_action
+from app.services.events import DeploymentTransitioned, event_bus
+
+TIER_ORDER = [EnvironmentTier.dev, EnvironmentTier.staging, EnvironmentTier.prod]
+NEXT_TIER = dict(zip(TIER_ORDER, TIER_ORDER[1:]))
+
+# Terminal deployment outcome -> what it means for the pipeline.
+_OUTCOMES = {
+    DeploymentStatus.failed: PromotionStatus.failed,
+    DeploymentStatus.superseded: PromotionStatus.superseded,
+}
+
+PIPELINE_FIELDS = ("service_id", "version", "current_tier", "status", "detail")
+
+
+@dataclass
+class _Step:
+    """What the handlers need of a pipeline; survives session rollbacks."""
+
+    id: int
+    service_id: int
+    version: str
+    tier: EnvironmentTier
+    initiated_by: str
+
+    @classmethod
+    def of(cls, pipeline: PromotionPipeline) -> "_Step":
+        return cls(
+            pipeline.id,
+            pipeline.service_id,
+            pipeline.version,
+            pipeline.current_tier,
+            pipeline.initiated_by,
+        )
+
+
+async def _tier_environment(db: AsyncSession, service_id: int, tier: EnvironmentTier) -> Optional[Environment]:
+    return await db.scalar(
+        select(Environment)
+        .where(Environment.service_id == service_id, Environment.tier == tier)
+        .order_by(Environment.id)
+        .limit(1)
+    )
+
+
+async def _move(
+    db: AsyncSession,
+    pipeline_id: int,
+    expected_tier: EnvironmentTier,
+    performed_by: str,
+    **values,
+) -> bool:
+    """Compare-and-swap a running pipeline off ``expected_tier``; commits.
+
+    Returns False when another handler already moved it.
+    """
+    result = await db.execute(
+        update(PromotionPipeline)
+        .where(
+            PromotionPipeline.id == pipeline_id,
+            PromotionPipeline.status == PromotionStatus.running,
+            PromotionPipeline.current_tier == expected_tier,
+        )
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        return False
+    after = {key: getattr(value, "value", value) for key, value in values.items()}
+    await log_action(
+        db,
+        action=AuditAction.updated,
+        entity_type="promotion",
+        entity_id=str(pipeline_id),
+        performed_by=performed_by,
+        metadata=after,
+        commit=False,
+    )
+    await changes.record_change(
+        db,
+        entity_type="promotion",
+        entity_id=str(pipeline_id),
+        op=AuditAction.updated,
+        before={"current_tier": expected_tier.value, "status": PromotionStatus.running.value},
+        after={"current_tier": expected_tier.value, "status": PromotionStatus.running.value, **after},
+    )
+    await db.commit()
+    return True
+
+
+async def _finish(
+    db: AsyncSession,
+    step: _Step,
+    outcome: PromotionStatus,
+    performed_by: str,
+    detail: Optional[str] = None,
+) -> None:
+    await _move(db, step.id, step.tier, performed_by, status=outcome, detail=detail)
+
+
+async def _deploy_tier(db: AsyncSession, step: _Step, performed_by: str) -> None:
+    """Queue the pipeline's version on its current tier.
+
+    If the version is already deployed there (a retried start, or someone
+    deployed it by hand), act on that deployment's outcome instead.
+    """
+    while True:
+        environment = await _tier_environment(db, step.service_id, step.tier)
+        if environment is None:
+            await _finish(db, step, PromotionStatus.failed, performed_by, f"Service has no {step.tier.value} environment")
+            return
+        service = await db.get(Service, step.service_id)
+        try:
+            deployment_id, created, existing = await deployment_service.create_deployment(
+                db,
+                service=service,
+                environment=environment,
+                version=step.version,
+                initiated_by=step.initiated_by,
+                performed_by=performed_by,
+            )
+        except HTTPException as exc:
+            await db.rollback()
+            await _finish(db, step, PromotionStatus.blocked, performed_by, str(exc.detail))
+            return
+        if created:
+            if existing == DeploymentStatus.pending:
+                deployment_service.enqueue_deployment(deployment_id, environment.id, performed_by)
+            return
+        if existing in _OUTCOMES:
+            await _finish(db, step, _OUTCOMES[existing], performed_by, f"Deployment {deployment_id} {existing.value}")
+            return
+        if existing != DeploymentStatus.succeeded:
+            return  # still in flight; its transition event moves us on
+        if not await _promote(db, step, performed_by):
+            return
+
+
+async def _promote(db: AsyncSession, step: _Step, performed_by: str) -> bool:
+    """Move past a tier that succeeded. True if another tier must deploy."""
+    next_tier = NEXT_TIER.get(step.tier)
+    if next_tier is None:
+        await _finish(db, step, PromotionStatus.succeeded, performed_by)
+        return False
+    if not await _move(db, step.id, step.tier, performed_by, current_tier=next_tier):
+        return False
+    step.tier = next_tier
+    return True
+
+
+@traced()
+async def on_deployment_transition(event: DeploymentTransitioned) -> None:
+    if event.status != DeploymentStatus.succeeded and event.status not in _OUTCOMES:
+        return
+    async with db_session.db_router.primary() as db:
+        row = (
+            await db.execute(
+                select(Deployment.service_id, Deployment.version, Environment.tier)
+                .join(Environment, Deployment.environment_id == Environment.id)
+                .where(Deployment.id == event.deployment_id)
+            )
+        ).first()
+        if row is None:
+            return
+        steps = [
+            _Step.of(pipeline)
+            for pipeline in await db.scalars(
+                select(PromotionPipeline).where(
+                    PromotionPipeline.service_id == row.service_id,
+                    PromotionPipeline.version == row.version,
+                    PromotionPipeline.current_tier == row.tier,
+                    PromotionPipeline.status == PromotionStatus.running,
+                )
+            )
+        ]
+        for step in steps:
+            if event.status in _OUTCOMES:
+                await _finish(
+                    db,
+                    step,
+                    _OUTCOMES[event.status],
+                    event.performed_by,
+                    f"Deployment {event.deployment_id} {event.status.value}",
+                )
+            elif await _promote(db, step, event.performed_by):
+                await _deploy_tier(db, step, event.performed_by)
+
+
+event_bus.subscribe(DeploymentTransitioned, on_deployment_transition)
+
+
+@traced()
+async def start_pipeline(
+    db: AsyncSession,
+    *,
+    service_id: int,
+    version: str,
+    initiated_by: str,
+    performed_by: str,
+) -> PromotionPipeline:
+    """Start promoting ``version``; returns the running pipeline if one exists."""
+    service = await db.get(Service, service_id)
+    if not service:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
+    if await _tier_environment(db, service_id, EnvironmentTier.dev) is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Service has no dev environment")
+    existing = await db.scalar(
+        select(PromotionPipeline).where(
+            PromotionPipeline.service_id == service_id,
+            PromotionPipeline.version == version,
+            PromotionPipeline.status == PromotionStatus.running,
+        )
+    )
+    if existing:
+        return existing
+
+    pipeline = PromotionPipeline(
+        service_id=service_id,
+        version=version,
+        current_tier=EnvironmentTier.dev,
+        status=PromotionStatus.running,
+        initiated_by=initiated_by,
+    )
+    db.add(pipeline)
+    await db.flush()
+    await log_action(
+        db,
+        action=AuditAction.created,
+        entity_type="promotion",
+        entity_id=str(pipeline.id),
+        performed_by=performed_by,
+        metadata={"service_id": service_id, "version": version},
+        commit=False,
+    )
+    await changes.record_change(
+        db,
+        entity_type="promotion",
+        entity_id=str(pipeline.id),
+        op=AuditAction.created,
+        after=changes.snapshot(pipeline, PIPELINE_FIELDS),
+    )
+    await db.commit()
+    await _deploy_tier(db, _Step.of(pipeline), performed_by)
+    await db.refresh(pipeline)
+    return pipeline
+
+
+@traced()
+async def start_pipelines(
+    db: AsyncSession,
+    items: List[Dict],
+    *,
+    performed_by: str,
+) -> List[Dict]:
+    """Start one pipeline per item; a failing item does not stop the rest."""
+    results = []
+    for item in items:
+        try:
+            pipeline = await start_pipeline(
+                db,
+                service_id=item["service_id"],
+                version=item["version"],
+                initiated_by=item["initiated_by"],
+                performed_by=performed_by,
+            )
+        except HTTPException as exc:
+            await db.rollback()
+            results.append({"service_id": item["service_id"], "error": str(exc.detail)})
+        else:
+            # Read now: a later item's rollback expires this instance.
+            results.append({"service_id": item["service_id"], "promotion": PromotionRead.model_validate(pipeline)})
+    return results
+
+
+async def get_pipeline(db: AsyncSession, pipeline_id: int) -> PromotionPipeline:
+    pipeline = await db.get(PromotionPipeline, pipeline_id)
+    if not pipeline:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Promotion not found")
+    return pipeline
@@ -0,0 +1,161 @@
+"""Per-team resource quotas.
+
+``team_quotas`` keeps each team's service and environment counts next to
+its limits. ``reserve`` bumps the counts with one conditional UPDATE
+that only matches while the result stays within the limits, in the
+caller's transaction: the check cannot race a concurrent reserve, and
+it rolls back together with the write it guards. A team without a row
+(one the migration's backfill missed) is counted from scratch once.
+"""
+
+from typing import Dict, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.tracing import traced
+from app.db.dialects import dialect_insert
+from app.models.models import AuditAction, Environment, Service, Team, TeamQuota
+from app.services.audit import log_action
+
+
+def _limits(quota: TeamQuota) -> Dict[str, int]:
+    settings = get_settings()
+    return {
+        "services": quota.max_services if quota.max_services is not None else settings.team_max_services,
+        "environments": (
+            quota.max_environments if quota.max_environments is not None else settings.team_max_environments
+        ),
+    }
+
+
+async def _initialise(db: AsyncSession, team_id: int) -> None:
+    services = select(func.count()).select_from(Service).where(Service.team_id == team_id).scalar_subquery()
+    environments = (
+        select(func.count())
+        .select_from(Environment)
+        .join(Service, Environment.service_id == Service.id)
+        .where(Service.team_id == team_id)
+        .scalar_subquery()
+    )
+    await db.execute(
+        dialect_insert(db, TeamQuota)
+        .values(team_id=team_id, services=services, environments=environments)
+        .on_conflict_do_nothing(index_elements=["team_id"])
+    )
+
+
+async def _load(db: AsyncSession, team_id: int) -> TeamQuota:
+    query = select(TeamQuota).where(TeamQuota.team_id == team_id).execution_options(populate_existing=True)
+    quota = await db.scalar(query)
+    if quota is None:
+        await _initialise(db, team_id)
+        quota = await db.scalar(query)
+    return quota
+
+
+@traced()
+async def reserve(db: AsyncSession, team_id: int, *, services: int = 0, environments: int = 0) -> None:
+    """Count new resources against a team, or raise 403 if that would exceed its quota."""
+    settings = get_settings()
+    conditions = [TeamQuota.team_id == team_id]
+    if services:
+        conditions.append(
+            TeamQuota.services + services <= func.coalesce(TeamQuota.max_services, settings.team_max_services)
+        )
+    if environments:
+        conditions.append(
+            TeamQuota.environments + environments
+            <= func.coalesce(TeamQuota.max_environments, settings.team_max_environments)
+        )
+    statement = (
+        update(TeamQuota)
+        .where(*conditions)
+        .values(services=TeamQuota.services + services, environments=TeamQuota.environments + environments)
+        .execution_options(synchronize_session=False)
+    )
+    if (await db.execute(statement)).rowcount:
+        return
+    if await db.scalar(select(TeamQuota.team_id).where(TeamQuota.team_id == team_id)) is None:
+        await _initialise(db, team_id)
+        if (await db.execute(statement)).rowcount:
+            return
+    quota = await _load(db, team_id)
+    limits = _limits(quota)
+    resource = "services" if services and quota.services + services > limits["services"] else "environments"
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=f"Team quota exceeded: {resource} (limit {limits[resource]})",
+    )
+
+
+async def release(db: AsyncSession, team_id: int, *, services: int = 0, environments: int = 0) -> None:
+    await db.execute(
+        update(TeamQuota)
+        .where(TeamQuota.team_id == team_id)
+        .values(services=TeamQuota.services - services, environments=TeamQuota.environments - environments)
+        .execution_options(synchronize_session=False)
+    )
+
+
+@traced()
+async def move_service(db: AsyncSession, service_id: int, from_team: Optional[int], to_team: Optional[int]) -> None:
+    """Move a service and its environments from one team's usage to another's."""
+    if from_team == to_team:
+        return
+    environments = await db.scalar(
+        select(func.count()).select_from(Environment).where(Environment.service_id == service_id)
+    )
+    if to_team is not None:
+        await reserve(db, to_team, services=1, environments=environments)
+    if from_team is not None:
+        await release(db, from_team, services=1, environments=environments)
+
+
+def _read(quota: TeamQuota) -> Dict[str, int]:
+    limits = _limits(quota)
+    return {
+        "team_id": quota.team_id,
+        "services": quota.services,
+        "environments": quota.environments,
+        "max_services": limits["services"],
+        "max_environments": limits["environments"],
+    }
+
+
+async def get_quota(db: AsyncSession, team_id: int) -> Dict[str, int]:
+    if await db.get(Team, team_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Team not found")
+    quota = await _load(db, team_id)
+    await db.commit()
+    return _read(quota)
+
+
+@traced()
+async def set_limits(
+    db: AsyncSession,
+    team_id: int,
+    *,
+    max_services: Optional[int],
+    max_environments: Optional[int],
+    performed_by: str,
+) -> Dict[str, int]:
+    """Set a team's limits; ``None`` falls back to the team_max_* setting."""
+    if await db.get(Team, team_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Team not found")
+    quota = await _load(db, team_id)
+    quota.max_services = max_services
+    quota.max_environments = max_environments
+    await log_action(
+        db,
+        action=AuditAction.updated,
+        entity_type="team_quota",
+        entity_id=str(team_id),
+        performed_by=performed_by,
+        metadata={"max_services": max_services, "max_environments": max_environments},
+        commit=False,
+    )
+    await db.commit()
+    return _read(quota)
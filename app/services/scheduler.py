@@ -0,0 +1,107 @@
+"""Per-environment deployment scheduling.
+
+Each environment is a lane that runs at most one deployment at a time
+and holds at most one waiting deployment: a newer trigger supersedes the
+waiting one, since deploying a version that is about to be replaced is
+wasted work. Lanes run in parallel up to a global cap.
+"""
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+
+from app.core.config import get_settings
+
+
+class _Ticket:
+    __slots__ = ("job_id", "admitted")
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.admitted: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+@dataclass
+class _Lane:
+    running: Optional[str] = None
+    waiting: Optional[_Ticket] = None
+
+
+class DeploymentScheduler:
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max_concurrent
+        self._lanes: Dict[int, _Lane] = {}
+        # Lanes with a waiting ticket and nothing running, blocked only on
+        # the global cap, in arrival order.
+        self._ready: Deque[int] = deque()
+        self._job_lanes: Dict[str, int] = {}
+        self._active = 0
+
+    async def acquire(self, environment_id: int, job_id: str) -> bool:
+        """Wait for ``environment_id``'s turn.
+
+        Returns True once the caller may run (it must then call
+        ``release``), or False if a newer deployment superseded it.
+        """
+        lane = self._lanes.setdefault(environment_id, _Lane())
+        ticket = _Ticket(job_id)
+        if lane.waiting is not None:
+            self._job_lanes.pop(lane.waiting.job_id, None)
+            lane.waiting.admitted.set_result(False)
+        lane.waiting = ticket
+        self._job_lanes[job_id] = environment_id
+        if lane.running is None and environment_id not in self._ready:
+            self._ready.append(environment_id)
+        self._dispatch()
+        try:
+            return await ticket.admitted
+        except asyncio.CancelledError:
+            if lane.waiting is ticket:
+                lane.waiting = None
+                self._job_lanes.pop(job_id, None)
+                if lane.running is None:
+                    if environment_id in self._ready:
+                        self._ready.remove(environment_id)
+                    del self._lanes[environment_id]
+            elif not ticket.admitted.cancelled() and ticket.admitted.result():
+                # Admitted but cancelled before it could run.
+                self.release(environment_id)
+            raise
+
+    def release(self, environment_id: int) -> None:
+        lane = self._lanes[environment_id]
+        self._job_lanes.pop(lane.running, None)
+        lane.running = None
+        self._active -= 1
+        if lane.waiting is not None:
+            self._ready.append(environment_id)
+        else:
+            del self._lanes[environment_id]
+        self._dispatch()
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """0 while running, otherwise how many deployments are ahead.
+
+        None once the job has finished or been superseded.
+        """
+        environment_id = self._job_lanes.get(job_id)
+        if environment_id is None:
+            return None
+        lane = self._lanes[environment_id]
+        if lane.running == job_id:
+            return 0
+        if environment_id in self._ready:
+            return self._ready.index(environment_id) + 1
+        return 1
+
+    def _dispatch(self) -> None:
+        while self._active < self.max_concurrent and self._ready:
+            lane = self._lanes[self._ready.popleft()]
+            ticket, lane.waiting = lane.waiting, None
+            lane.running = ticket.job_id
+            self._active += 1
+            ticket.admitted.set_result(True)
+
+
+deployment_scheduler = DeploymentScheduler(get_settings().deployment_max_concurrency)
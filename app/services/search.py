@@ -0,0 +1,212 @@
+"""In-process search over services, teams and environments.
+
+An inverted index held in memory. Documents are split into terms (name
+terms weigh more than description and tag terms); each query term is
+matched against the indexed vocabulary exactly, by prefix, and fuzzily
+by trigram similarity, and the matching terms' postings are scored.
+Fuzzy matching happens over distinct terms rather than documents, so its
+cost follows the vocabulary, not the catalog size.
+
+The index is built from the database on first use and kept current by
+the write paths in ``app.services.service``; a full rebuild every
+``search_index_ttl_seconds`` picks up writes made by other workers.
+"""
+
+import bisect
+import heapq
+import re
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.models.models import Environment, Service, Team
+
+DocKey = Tuple[str, int]
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+NAME_WEIGHT = 2.0
+TEXT_WEIGHT = 1.0
+PREFIX_FACTOR = 0.75
+FUZZY_FACTOR = 0.8
+MIN_SIMILARITY = 0.35
+MAX_PREFIX_TERMS = 50
+
+
+def _terms(text: Optional[str]) -> List[str]:
+    return _WORD.findall(text.lower()) if text else []
+
+
+def _trigrams(term: str) -> Set[str]:
+    padded = f"  {term} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class SearchDocument:
+    kind: str
+    id: int
+    name: str
+    text: str = ""
+    service_id: Optional[int] = None
+    weights: Dict[str, float] = field(default_factory=dict, repr=False)
+
+    @property
+    def key(self) -> DocKey:
+        return self.kind, self.id
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    id: int
+    name: str
+    score: float
+    service_id: Optional[int] = None
+
+
+class SearchIndex:
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        self._docs: Dict[DocKey, SearchDocument] = {}
+        self._postings: Dict[str, Dict[DocKey, float]] = {}
+        self._vocab: List[str] = []
+        self._vocab_grams: Dict[str, Set[str]] = defaultdict(set)
+        self.loaded_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # -- maintenance -----------------------------------------------------
+
+    def upsert(self, doc: SearchDocument) -> None:
+        self.remove(doc.kind, doc.id)
+        doc.weights = {term: TEXT_WEIGHT for term in _terms(doc.text)}
+        doc.weights.update((term, NAME_WEIGHT) for term in _terms(doc.name))
+        for term, weight in doc.weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._vocab, term)
+                for gram in _trigrams(term):
+                    self._vocab_grams[gram].add(term)
+            postings[doc.key] = weight
+        self._docs[doc.key] = doc
+
+    def remove(self, kind: str, doc_id: int) -> None:
+        doc = self._docs.pop((kind, doc_id), None)
+        if doc is None:
+            return
+        for term in doc.weights:
+            postings = self._postings[term]
+            del postings[doc.key]
+            if not postings:
+                del self._postings[term]
+                self._vocab.pop(bisect.bisect_left(self._vocab, term))
+                for gram in _trigrams(term):
+                    self._vocab_grams[gram].discard(term)
+
+    def index_service(self, service: Service) -> None:
+        tags = " ".join(f"{key} {value}" for key, value in (service.tags or {}).items())
+        self.upsert(
+            SearchDocument("service", service.id, service.name, f"{service.description or ''} {tags}")
+        )
+
+    def index_team(self, team: Team) -> None:
+        self.upsert(SearchDocument("team", team.id, team.name, team.description or ""))
+
+    def index_environment(self, environment: Environment) -> None:
+        self.upsert(
+            SearchDocument(
+                "environment",
+                environment.id,
+                environment.name,
+                environment.tier.value,
+                service_id=environment.service_id,
+            )
+        )
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        ttl = get_settings().search_index_ttl_seconds
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at < ttl:
+            return
+        services = (await db.execute(select(Service))).scalars().all()
+        teams = (await db.execute(select(Team))).scalars().all()
+        environments = (await db.execute(select(Environment))).scalars().all()
+        self.clear()
+        for service in services:
+            self.index_service(service)
+        for team in teams:
+            self.index_team(team)
+        for environment in environments:
+            self.index_environment(environment)
+        self.loaded_at = time.monotonic()
+
+    # -- queries ---------------------------------------------------------
+
+    def search(self, query: str, *, kinds: Iterable[str] = (), limit: int = 20) -> List[SearchHit]:
+        kinds = set(kinds)
+        scores: Counter = Counter()
+        for query_term in set(_terms(query)):
+            # Per query term, each document scores its best-matching term.
+            # Strongest matches go first so the common case is one dict build.
+            best: Dict[DocKey, float] = {}
+            matches = sorted(self._match_terms(query_term).items(), key=itemgetter(1), reverse=True)
+            for term, factor in matches:
+                postings = self._postings[term]
+                if not best:
+                    best = {key: weight * factor for key, weight in postings.items()}
+                    continue
+                for key, weight in postings.items():
+                    score = weight * factor
+                    if score > best.get(key, 0.0):
+                        best[key] = score
+            scores.update(best)
+
+        candidates = scores.items()
+        if kinds:
+            candidates = [item for item in candidates if item[0][0] in kinds]
+        top = heapq.nlargest(limit, candidates, key=itemgetter(1))
+        top.sort(key=lambda item: (-item[1], self._docs[item[0]].name))
+        return [self._hit(key, score) for key, score in top]
+
+    def suggest(self, name: str, *, kind: str = "service", limit: int = 5) -> List[str]:
+        """Existing names similar to ``name``, e.g. to flag near-duplicates."""
+        return [hit.name for hit in self.search(name, kinds=[kind], limit=limit)]
+
+    def _match_terms(self, query_term: str) -> Dict[str, float]:
+        """Indexed terms matching ``query_term``, with a score factor each."""
+        matches: Dict[str, float] = {}
+        if query_term in self._postings:
+            matches[query_term] = 1.0
+        start = bisect.bisect_left(self._vocab, query_term)
+        for term in self._vocab[start : start + MAX_PREFIX_TERMS]:
+            if not term.startswith(query_term):
+                break
+            matches.setdefault(term, PREFIX_FACTOR)
+        if len(query_term) >= 3:
+            query_grams = _trigrams(query_term)
+            overlaps: Counter = Counter()
+            for gram in query_grams:
+                overlaps.update(self._vocab_grams.get(gram, ()))
+            for term, overlap in overlaps.items():
+                # A padded term of length n has n + 1 trigrams.
+                similarity = overlap / (len(query_grams) + len(term) + 1 - overlap)
+                if similarity >= MIN_SIMILARITY:
+                    matches.setdefault(term, FUZZY_FACTOR * similarity)
+        return matches
+
+    def _hit(self, key: DocKey, score: float) -> SearchHit:
+        doc = self._docs[key]
+        return SearchHit(doc.kind, doc.id, doc.name, round(score, 4), doc.service_id)
+
+
+search_index = SearchIndex()
@@ -3,36 +3,66 @@ from typing import List, Optional
 from fastapi import HTTPException, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
-from app.models.models import AuditAction, Environment, EnvironmentTier, Service, Team
+from app.core.tracing import traced
+from app.models.models import AuditAction, Environment, EnvironmentTier, Service, Team, TeamQuota
 from app.platform.guardrails import GuardrailEngine
 from app.schemas.domain import EnvironmentProvisionRequest, ServiceCreate, ServiceUpdate
+from app.services import changes, config_layers, config_versions, outbox, quotas
 from app.services.audit import log_action
+from app.services.search import search_index
+from app.services.tags import sync_service_tags
 
 
 guardrails = GuardrailEngine()
 
 
+def _emit_service_updated(db: AsyncSession, service_id: int, before: dict, after: dict) -> None:
+    delta = changes.diff(before, after)
+    if delta:
+        outbox.emit(db, "service.updated", {"service_id": service_id, "changes": delta})
+
+
+@traced()
 async def create_team(db: AsyncSession, name: str, description: Optional[str]) -> Team:
     existing = await db.scalar(select(Team).where(Team.name == name))
     if existing:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Team already exists")
-    team = Team(name=name, description=description)
+    team = Team(name=name, description=description, config={}, config_hash=config_layers.content_hash({}))
     db.add(team)
+    await db.flush()
+    db.add(TeamQuota(team_id=team.id))
+    await changes.record_change(
+        db,
+        entity_type="team",
+        entity_id=str(team.id),
+        op=AuditAction.created,
+        after=changes.snapshot(team, changes.TEAM_FIELDS),
+    )
+    outbox.emit(db, "team.created", {"team_id": team.id, **changes.snapshot(team, changes.TEAM_FIELDS)})
     await db.commit()
     await db.refresh(team)
+    search_index.index_team(team)
     return team
 
 
+@traced()
 async def register_service(db: AsyncSession, payload: ServiceCreate, performed_by: str) -> Service:
     existing = await db.scalar(select(Service).where(Service.name == payload.name))
     if existing:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Service already exists")
     guardrails.validate_service_tags(payload.tags)
-    service = Service(name=payload.name, description=payload.description, tags=payload.tags)
+    service = Service(
+        name=payload.name,
+        description=payload.description,
+        tags=payload.tags,
+        config={},
+        config_hash=config_layers.content_hash({}),
+    )
     db.add(service)
-    await db.commit()
-    await db.refresh(service)
+    await db.flush()
+    await sync_service_tags(db, service.id, service.tags)
     await log_action(
         db,
         action=AuditAction.created,
@@ -40,10 +70,25 @@ async def register_service(db: AsyncSession, payload: ServiceCreate, performed_b
         entity_id=str(service.id),
         performed_by=performed_by,
         metadata={"name": service.name},
+        commit=False,
+    )
+    await changes.record_change(
+        db,
+        entity_type="service",
+        entity_id=str(service.id),
+        op=AuditAction.created,
+        after=changes.snapshot(service, changes.SERVICE_FIELDS),
     )
+    outbox.emit(
+        db, "service.registered", {"service_id": service.id, **changes.snapshot(service, changes.SERVICE_FIELDS)}
+    )
+    await db.commit()
+    await db.refresh(service)
+    search_index.index_service(service)
     return service
 
 
+@traced()
 async def assign_service_team(
     db: AsyncSession, service_id: int, team_id: int, performed_by: str
 ) -> Service:
@@ -51,9 +96,13 @@ async def assign_service_team(
     team = await db.get(Team, team_id)
     if not service or not team:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service or team not found")
+    before = changes.snapshot(service, changes.SERVICE_FIELDS)
+    if service.team_id != team.id:
+        await config_layers.check_team_move(db, service, team)
+        await config_layers.bump_generations(db, Environment.service_id == service.id)
+    await quotas.move_service(db, service.id, service.team_id, team.id)
     service.team = team
-    await db.commit()
-    await db.refresh(service)
+    await db.flush()
     await log_action(
         db,
         action=AuditAction.updated,
@@ -61,25 +110,42 @@ async def assign_service_team(
         entity_id=str(service.id),
         performed_by=performed_by,
         metadata={"team_id": team_id},
+        commit=False,
     )
+    await changes.record_change(
+        db,
+        entity_type="service",
+        entity_id=str(service.id),
+        op=AuditAction.updated,
+        before=before,
+        after=changes.snapshot(service, changes.SERVICE_FIELDS),
+    )
+    _emit_service_updated(db, service.id, before, changes.snapshot(service, changes.SERVICE_FIELDS))
+    await db.commit()
+    await db.refresh(service)
     return service
 
 
+@traced()
 async def provision_environment(
     db: AsyncSession, service_id: int, req: EnvironmentProvisionRequest, performed_by: str
 ) -> Environment:
-    service = await db.get(Service, service_id)
+    service = await db.get(Service, service_id, options=[joinedload(Service.team)])
     if not service:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
     guardrails.validate_service_tags(service.tags)
-    guardrails.validate_environment_promotion([env.tier.value for env in service.environments], req.tier)
+    existing_tiers = await db.scalars(select(Environment.tier).where(Environment.service_id == service.id))
+    guardrails.validate_environment_promotion([tier.value for tier in existing_tiers], req.tier)
     guardrails.validate_config(req.config)
-    environment = Environment(
-        name=req.name, tier=req.tier, service=service, config=req.config
-    )
+    if service.team_id is not None:
+        await quotas.reserve(db, service.team_id, environments=1)
+    # Checked as rendered, against the service and team loaded above.
+    _key, above = config_layers.service_layer(service, service.team)
+    guardrails.validate_config(config_layers.merge(above, req.config))
+    environment = Environment(name=req.name, tier=req.tier, service=service)
     db.add(environment)
-    await db.commit()
-    await db.refresh(environment)
+    # Inserts the environment with its config, hash and first version.
+    await config_versions.record_version(db, environment, req.config, performed_by)
     await log_action(
         db,
         action=AuditAction.created,
@@ -87,7 +153,23 @@ async def provision_environment(
         entity_id=str(environment.id),
         performed_by=performed_by,
         metadata={"tier": req.tier.value},
+        commit=False,
+    )
+    await changes.record_change(
+        db,
+        entity_type="environment",
+        entity_id=str(environment.id),
+        op=AuditAction.created,
+        after=changes.snapshot(environment, changes.ENVIRONMENT_FIELDS),
+    )
+    outbox.emit(
+        db,
+        "environment.provisioned",
+        {"environment_id": environment.id, **changes.snapshot(environment, changes.ENVIRONMENT_FIELDS)},
     )
+    await db.commit()
+    await db.refresh(environment)
+    search_index.index_environment(environment)
     return environment
 
 
@@ -96,22 +178,28 @@ async def list_deployments(db: AsyncSession, service_id: int) -> List:
     return result.scalars().all()
 
 
+@traced()
 async def update_service(db: AsyncSession, service_id: int, payload: ServiceUpdate, performed_by: str) -> Service:
     service = await db.get(Service, service_id)
     if not service:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
+    before = changes.snapshot(service, changes.SERVICE_FIELDS)
     if payload.description is not None:
         service.description = payload.description
     if payload.tags is not None:
         guardrails.validate_service_tags(payload.tags)
         service.tags = payload.tags
+        await sync_service_tags(db, service.id, payload.tags)
     if payload.team_id is not None:
         team = await db.get(Team, payload.team_id)
         if not team:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Team not found")
+        if service.team_id != team.id:
+            await config_layers.check_team_move(db, service, team)
+            await config_layers.bump_generations(db, Environment.service_id == service.id)
+        await quotas.move_service(db, service.id, service.team_id, team.id)
         service.team = team
-    await db.commit()
-    await db.refresh(service)
+    await db.flush()
     await log_action(
         db,
         action=AuditAction.updated,
@@ -119,5 +207,18 @@ async def update_service(db: AsyncSession, service_id: int, payload: ServiceUpda
         entity_id=str(service.id),
         performed_by=performed_by,
         metadata={"updated": True},
+        commit=False,
+    )
+    await changes.record_change(
+        db,
+        entity_type="service",
+        entity_id=str(service.id),
+        op=AuditAction.updated,
+        before=before,
+        after=changes.snapshot(service, changes.SERVICE_FIELDS),
     )
+    _emit_service_updated(db, service.id, before, changes.snapshot(service, changes.SERVICE_FIELDS))
+    await db.commit()
+    await db.refresh(service)
+    search_index.index_service(service)
     return service
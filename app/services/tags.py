@@ -0,0 +1,63 @@
+"""Tag queries over the normalized ``service_tags`` index."""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, and_, delete, func, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import ServiceTag
+
+TagFilter = Tuple[str, str]
+
+
+def parse_tag_filters(raw: Sequence[str]) -> List[TagFilter]:
+    """Parse ``key:value`` query parameters."""
+    filters = []
+    for item in raw:
+        key, sep, value = item.partition(":")
+        if not sep or not key:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid tag filter {item!r}; expected key:value",
+            )
+        filters.append((key, value))
+    return filters
+
+
+async def sync_service_tags(db: AsyncSession, service_id: int, tags: Dict[str, str]) -> None:
+    """Rewrite the index rows for one service. Does not commit."""
+    await db.execute(delete(ServiceTag).where(ServiceTag.service_id == service_id))
+    if tags:
+        await db.execute(
+            insert(ServiceTag),
+            [{"service_id": service_id, "key": key, "value": str(value)} for key, value in tags.items()],
+        )
+
+
+def matching_service_ids(filters: Sequence[TagFilter], match: str = "all") -> Select:
+    """Select service ids matching all (AND) or any (OR) of ``filters``."""
+    clause = or_(*(and_(ServiceTag.key == key, ServiceTag.value == value) for key, value in filters))
+    stmt = select(ServiceTag.service_id).where(clause)
+    if match == "all":
+        return stmt.group_by(ServiceTag.service_id).having(func.count() == len(set(filters)))
+    return stmt.distinct()
+
+
+async def tag_facets(
+    db: AsyncSession,
+    *,
+    keys: Optional[Sequence[str]] = None,
+    filters: Sequence[TagFilter] = (),
+    match: str = "all",
+) -> Dict[str, Dict[str, int]]:
+    """Count services per tag value, optionally within a filtered set."""
+    stmt = select(ServiceTag.key, ServiceTag.value, func.count()).group_by(ServiceTag.key, ServiceTag.value)
+    if keys:
+        stmt = stmt.where(ServiceTag.key.in_(keys))
+    if filters:
+        stmt = stmt.where(ServiceTag.service_id.in_(matching_service_ids(filters, match)))
+    facets: Dict[str, Dict[str, int]] = {}
+    for key, value, count in await db.execute(stmt):
+        facets.setdefault(key, {})[value] = count
+    return facets
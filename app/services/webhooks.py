@@ -0,0 +1,400 @@
+"""Webhook delivery of outbox events.
+
+``fan_out`` is an outbox consumer for every topic: in the dispatcher's
+transaction it writes one ``webhook_deliveries`` row per (event, active
+endpoint whose ``topics`` match), so an event is owed to an endpoint
+exactly once. ``WebhookDispatcher`` (run in the app every
+``webhook_poll_seconds``, and woken by new deliveries) then:
+
+* leases due deliveries by pushing their ``next_attempt_at`` out by
+  ``webhook_lease_seconds`` (``SKIP LOCKED`` on Postgres, so workers
+  never share a row; a crashed worker's lease simply expires);
+* POSTs them per endpoint in batches of up to ``webhook_batch_size``
+  events, signed with the endpoint's secret, with at most
+  ``max_concurrency`` requests in flight per endpoint;
+* marks 2xx batches delivered and reschedules the rest with exponential
+  backoff and jitter (honouring ``Retry-After``), dead-lettering a
+  delivery after ``webhook_max_attempts``.
+
+Receivers get ``{"events": [{"id", "topic", "created_at", "payload"}]}``
+and should verify ``X-IDP-Signature: sha256=HMAC(secret, "<X-IDP-Timestamp>.<body>")``.
+Delivery is at-least-once; ``id`` is stable across retries.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import random
+import secrets
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException, status
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import Settings, get_settings
+from app.db import session as db_session
+from app.db.dialects import dialect_insert
+from app.models.models import AuditAction, OutboxEvent, WebhookDelivery, WebhookDeliveryStatus, WebhookEndpoint
+from app.services import outbox
+from app.services.audit import log_action
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = "X-IDP-Signature"
+TIMESTAMP_HEADER = "X-IDP-Timestamp"
+
+_wakeup: Optional[asyncio.Event] = None
+
+
+def sign(secret: str, timestamp: str, body: bytes) -> str:
+    digest = hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def matches(topics: List[str], topic: str) -> bool:
+    return not topics or any(topic.startswith(prefix) for prefix in topics)
+
+
+def wake() -> None:
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+# -- fan-out (outbox consumer) ------------------------------------------
+
+
+async def fan_out(db: AsyncSession, events: List[OutboxEvent]) -> None:
+    endpoints = (
+        await db.execute(select(WebhookEndpoint.id, WebhookEndpoint.topics).where(WebhookEndpoint.active.is_(True)))
+    ).all()
+    if not endpoints:
+        return
+    now = datetime.utcnow()
+    rows = [
+        {"endpoint_id": endpoint.id, "event_id": event.id, "next_attempt_at": now, "created_at": now}
+        for event in events
+        for endpoint in endpoints
+        if matches(endpoint.topics or [], event.topic)
+    ]
+    if rows:
+        await db.execute(
+            dialect_insert(db, WebhookDelivery).on_conflict_do_nothing(index_elements=["endpoint_id", "event_id"]),
+            rows,
+        )
+        outbox.on_commit(db, wake)
+
+
+outbox.subscribe("", fan_out)
+
+
+# -- delivery -----------------------------------------------------------
+
+
+class WebhookDispatcher:
+    def __init__(self, client: httpx.AsyncClient, settings: Optional[Settings] = None):
+        self.client = client
+        self.settings = settings or get_settings()
+        self._limits: Dict[int, Tuple[int, asyncio.Semaphore]] = {}
+
+    def _semaphore(self, endpoint_id: int, limit: int) -> asyncio.Semaphore:
+        cached = self._limits.get(endpoint_id)
+        if cached is None or cached[0] != limit:
+            cached = (limit, asyncio.Semaphore(limit))
+            self._limits[endpoint_id] = cached
+        return cached[1]
+
+    def backoff(self, attempts: int, retry_after: Optional[float] = None) -> float:
+        settings = self.settings
+        delay = min(settings.webhook_backoff_base_seconds * 2 ** (attempts - 1), settings.webhook_backoff_max_seconds)
+        delay *= 0.5 + random.random() / 2
+        return max(delay, retry_after or 0.0)
+
+    async def _claim(self, db: AsyncSession):
+        now = datetime.utcnow()
+        query = (
+            select(
+                WebhookDelivery.id,
+                WebhookDelivery.attempts,
+                WebhookDelivery.endpoint_id,
+                OutboxEvent.id.label("event_id"),
+                OutboxEvent.topic,
+                OutboxEvent.payload,
+                OutboxEvent.created_at,
+            )
+            .join(OutboxEvent, WebhookDelivery.event_id == OutboxEvent.id)
+            .join(WebhookEndpoint, WebhookDelivery.endpoint_id == WebhookEndpoint.id)
+            .where(
+                WebhookDelivery.status == WebhookDeliveryStatus.pending,
+                WebhookDelivery.next_attempt_at <= now,
+                WebhookEndpoint.active.is_(True),
+            )
+            .order_by(WebhookDelivery.next_attempt_at, WebhookDelivery.id)
+            .limit(self.settings.webhook_claim_size)
+        )
+        if db.get_bind().dialect.name == "postgresql":
+            query = query.with_for_update(skip_locked=True, of=WebhookDelivery)
+        rows = (await db.execute(query)).all()
+        if not rows:
+            await db.rollback()
+            return [], {}
+        await db.execute(
+            update(WebhookDelivery)
+            .where(WebhookDelivery.id.in_([row.id for row in rows]))
+            .values(next_attempt_at=now + timedelta(seconds=self.settings.webhook_lease_seconds))
+            .execution_options(synchronize_session=False)
+        )
+        endpoints = {
+            endpoint.id: endpoint
+            for endpoint in await db.scalars(
+                select(WebhookEndpoint).where(WebhookEndpoint.id.in_({row.endpoint_id for row in rows}))
+            )
+        }
+        await db.commit()
+        return rows, endpoints
+
+    async def _post(self, endpoint: WebhookEndpoint, rows) -> Tuple[list, Optional[str], Optional[float]]:
+        body = json.dumps(
+            {
+                "events": [
+                    {"id": row.event_id, "topic": row.topic, "created_at": row.created_at.isoformat(), "payload": row.payload}
+                    for row in rows
+                ]
+            },
+            separators=(",", ":"),
+            default=str,
+        ).encode()
+        timestamp = str(int(time.time()))
+        headers = {
+            "Content-Type": "application/json",
+            TIMESTAMP_HEADER: timestamp,
+            SIGNATURE_HEADER: sign(endpoint.secret, timestamp, body),
+        }
+        async with self._semaphore(endpoint.id, endpoint.max_concurrency):
+            try:
+                response = await self.client.post(
+                    endpoint.url, content=body, headers=headers, timeout=self.settings.webhook_timeout_seconds
+                )
+            except Exception as exc:  # noqa: BLE001
+                # Not only HTTPError: e.g. InvalidURL must fail this batch alone.
+                return rows, f"{type(exc).__name__}: {exc}", None
+        if response.is_success:
+            return rows, None, None
+        retry_after = response.headers.get("Retry-After")
+        return (
+            rows,
+            f"HTTP {response.status_code}",
+            float(retry_after) if retry_after and retry_after.isdigit() else None,
+        )
+
+    async def deliver_due(self, db: AsyncSession) -> int:
+        """Lease, send and settle one claim's worth. Returns deliveries attempted."""
+        rows, endpoints = await self._claim(db)
+        if not rows:
+            return 0
+        by_endpoint = defaultdict(list)
+        for row in rows:
+            if endpoints.get(row.endpoint_id) is not None and endpoints[row.endpoint_id].active:
+                by_endpoint[row.endpoint_id].append(row)
+        size = self.settings.webhook_batch_size
+        results = await asyncio.gather(
+            *(
+                self._post(endpoints[endpoint_id], chunk[i : i + size])
+                for endpoint_id, chunk in by_endpoint.items()
+                for i in range(0, len(chunk), size)
+            )
+        )
+
+        now = datetime.utcnow()
+        delivered: List[dict] = []
+        failed: List[dict] = []
+        for batch, error, retry_after in results:
+            for row in batch:
+                attempts = row.attempts + 1
+                if error is None:
+                    delivered.append({"row_id": row.id, "row_attempts": attempts})
+                    continue
+                dead = attempts >= self.settings.webhook_max_attempts
+                failed.append(
+                    {
+                        "row_id": row.id,
+                        "row_attempts": attempts,
+                        "row_status": WebhookDeliveryStatus.dead if dead else WebhookDeliveryStatus.pending,
+                        "row_next": now + timedelta(seconds=self.backoff(attempts, retry_after)),
+                        "row_error": error,
+                    }
+                )
+        table = WebhookDelivery.__table__
+        if delivered:
+            await db.execute(
+                update(table)
+                .where(table.c.id == bindparam("row_id"))
+                .values(
+                    status=WebhookDeliveryStatus.delivered,
+                    attempts=bindparam("row_attempts"),
+                    delivered_at=now,
+                    last_error=None,
+                ),
+                delivered,
+            )
+        if failed:
+            await db.execute(
+                update(table)
+                .where(table.c.id == bindparam("row_id"))
+                .values(
+                    status=bindparam("row_status"),
+                    attempts=bindparam("row_attempts"),
+                    next_attempt_at=bindparam("row_next"),
+                    last_error=bindparam("row_error"),
+                ),
+                failed,
+            )
+            dead = sum(1 for row in failed if row["row_status"] == WebhookDeliveryStatus.dead)
+            if dead:
+                logger.warning("Dead-lettered %s webhook deliveries", dead)
+        await db.commit()
+        return len(rows)
+
+
+async def run_delivery_worker(stop: asyncio.Event, *, interval: float, client: Optional[httpx.AsyncClient] = None) -> None:
+    """Deliver until ``stop`` is set, every ``interval`` or on ``wake``."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    own_client = client is None
+    client = client or httpx.AsyncClient(limits=httpx.Limits(max_connections=256, max_keepalive_connections=64))
+    dispatcher = WebhookDispatcher(client)
+    claim_size = dispatcher.settings.webhook_claim_size
+    stopping = asyncio.ensure_future(stop.wait())
+    try:
+        while not stop.is_set():
+            woken = asyncio.ensure_future(_wakeup.wait())
+            await asyncio.wait({stopping, woken}, timeout=interval, return_when=asyncio.FIRST_COMPLETED)
+            woken.cancel()
+            _wakeup.clear()
+            try:
+                async with db_session.db_router.primary() as db:
+                    while await dispatcher.deliver_due(db) == claim_size and not stop.is_set():
+                        pass
+            except Exception:  # noqa: BLE001
+                logger.exception("Webhook delivery failed")
+    finally:
+        stopping.cancel()
+        _wakeup = None
+        if own_client:
+            await client.aclose()
+
+
+# -- endpoint management ------------------------------------------------
+
+
+async def create_endpoint(
+    db: AsyncSession,
+    *,
+    url: str,
+    topics: List[str],
+    max_concurrency: int,
+    secret: Optional[str],
+    performed_by: str,
+) -> WebhookEndpoint:
+    endpoint = WebhookEndpoint(
+        url=url,
+        topics=topics,
+        max_concurrency=max_concurrency,
+        secret=secret or secrets.token_urlsafe(32),
+        created_by=performed_by,
+    )
+    db.add(endpoint)
+    await db.flush()
+    await log_action(
+        db,
+        action=AuditAction.created,
+        entity_type="webhook_endpoint",
+        entity_id=str(endpoint.id),
+        performed_by=performed_by,
+        metadata={"url": url, "topics": topics},
+        commit=False,
+    )
+    await db.commit()
+    await db.refresh(endpoint)
+    return endpoint
+
+
+async def list_endpoints(db: AsyncSession) -> List[WebhookEndpoint]:
+    return list(await db.scalars(select(WebhookEndpoint).order_by(WebhookEndpoint.id)))
+
+
+async def deactivate_endpoint(db: AsyncSession, endpoint_id: int, performed_by: str) -> None:
+    """Stop delivering to an endpoint; its delivery history is kept.
+
+    Deliveries still pending are dead-lettered, so they stop counting as
+    owed; they are not redriven while the endpoint is inactive.
+    """
+    result = await db.execute(
+        update(WebhookEndpoint)
+        .where(WebhookEndpoint.id == endpoint_id, WebhookEndpoint.active.is_(True))
+        .values(active=False)
+    )
+    if result.rowcount == 0:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Webhook endpoint not found")
+    await db.execute(
+        update(WebhookDelivery)
+        .where(WebhookDelivery.endpoint_id == endpoint_id, WebhookDelivery.status == WebhookDeliveryStatus.pending)
+        .values(status=WebhookDeliveryStatus.dead, last_error="Endpoint deactivated")
+        .execution_options(synchronize_session=False)
+    )
+    await log_action(
+        db,
+        action=AuditAction.deleted,
+        entity_type="webhook_endpoint",
+        entity_id=str(endpoint_id),
+        performed_by=performed_by,
+        metadata={},
+        commit=False,
+    )
+    await db.commit()
+
+
+async def list_deliveries(
+    db: AsyncSession,
+    endpoint_id: int,
+    *,
+    delivery_status: Optional[WebhookDeliveryStatus] = None,
+    limit: int = 100,
+) -> List[WebhookDelivery]:
+    query = select(WebhookDelivery).where(WebhookDelivery.endpoint_id == endpoint_id)
+    if delivery_status is not None:
+        query = query.where(WebhookDelivery.status == delivery_status)
+    return list(await db.scalars(query.order_by(WebhookDelivery.id.desc()).limit(limit)))
+
+
+async def redrive(db: AsyncSession, endpoint_id: int, performed_by: str) -> int:
+    """Give an endpoint's dead-lettered deliveries a fresh set of attempts."""
+    result = await db.execute(
+        update(WebhookDelivery)
+        .where(
+            WebhookDelivery.endpoint_id == endpoint_id,
+            WebhookDelivery.status == WebhookDeliveryStatus.dead,
+            WebhookDelivery.endpoint_id.in_(select(WebhookEndpoint.id).where(WebhookEndpoint.active.is_(True))),
+        )
+        .values(status=WebhookDeliveryStatus.pending, attempts=0, next_attempt_at=datetime.utcnow())
+    )
+    if result.rowcount:
+        await log_action(
+            db,
+            action=AuditAction.updated,
+            entity_type="webhook_endpoint",
+            entity_id=str(endpoint_id),
+            performed_by=performed_by,
+            metadata={"redriven": result.rowcount},
+            commit=False,
+        )
+        outbox.on_commit(db, wake)
+    await db.commit()
+    return result.rowcount
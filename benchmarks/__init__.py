@@ -0,0 +1 @@
+"""Throughput and latency benchmarks for the IDP API; see ``python -m benchmarks --help``."""
@@ -0,0 +1,159 @@
+"""Benchmark CLI.
+
+Usage:
+
+    python -m benchmarks [--scale tiny|small|medium|full] [--requests 200] [--concurrency 16]
+                         [--database-url URL] [--only NAME ...]
+                         [--baseline benchmarks/baselines/tiny.json] [--threshold 1.0]
+                         [--save-baseline PATH] [--output results.json] [--reuse]
+
+Seeds a fresh catalog (sqlite files are recreated; pass ``--reuse`` to
+keep one between runs, e.g. at full scale), runs every scenario and
+prints a table. Scenarios write, so only fresh catalogs are comparable
+with a baseline. With ``--baseline`` it exits non-zero
+when a scenario regressed past ``--threshold``. Rate limits are off
+unless ``--rate-limits`` is given: the point is to measure the handlers.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import get_settings
+from app.core.ratelimit import limiter
+from app.db import session as db_session
+from app.db.session import Base, ReplicaRouter
+from app.services.dependencies import dependency_graph
+from app.services.search import search_index
+from benchmarks import runner, seed
+from benchmarks.scenarios import SCENARIOS, load_context
+
+
+def make_engine(url: str, *, writer: bool = True):
+    if not url.startswith("sqlite"):
+        return create_async_engine(url, pool_size=20, max_overflow=20)
+    engine = create_async_engine(url, connect_args={"timeout": 60})
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def configure(dbapi_connection, _record):
+        dbapi_connection.isolation_level = None
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+    if writer:
+        # As in the tests: writers queue on the busy timeout instead of
+        # failing to upgrade a read transaction.
+        @event.listens_for(engine.sync_engine, "begin")
+        def begin_immediate(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+
+async def _main(args) -> int:
+    if args.database_url.startswith("sqlite") and not args.reuse:
+        path = args.database_url.split("///", 1)[1]
+        for stale in (path, f"{path}-wal", f"{path}-shm"):
+            if os.path.exists(stale):
+                os.remove(stale)
+    engine = make_engine(args.database_url)
+    if engine.dialect.name == "sqlite":
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    sessionmaker = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    engines = [engine]
+    replicas = []
+    if engine.dialect.name == "sqlite":
+        # GET handlers read through a second engine on the same WAL file,
+        # the way they would read from a replica, so reads don't queue
+        # behind the writers' immediate transactions.
+        engines.append(make_engine(args.database_url, writer=False))
+        replicas.append(async_sessionmaker(engines[-1], expire_on_commit=False, class_=AsyncSession))
+    db_session.db_router = ReplicaRouter(sessionmaker, replicas, sticky_seconds=0)
+    search_index.clear()
+    dependency_graph.clear()
+    if not args.rate_limits:
+        limiter._settings = get_settings().model_copy(update={"rate_limit_enabled": False})
+
+    async with sessionmaker() as db:
+        seeded = await seed.is_seeded(db)
+        if seeded and not args.reuse:
+            print("database already has a catalog; pass --reuse or point at an empty one", file=sys.stderr)
+            return 2
+        if not seeded:
+            started = time.perf_counter()
+            counts = await seed.seed(db, seed.SCALES[args.scale])
+            print(f"seeded {counts} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        ctx = await load_context(db, run=str(int(time.time())))
+
+    for counted in engines:
+        runner.count_queries(counted)
+    scenarios = [s for s in SCENARIOS if not args.only or s.name in args.only]
+    results = await runner.run_all(
+        ctx, scenarios, requests=args.requests, concurrency=args.concurrency, alloc_samples=args.alloc_samples
+    )
+    for disposed in engines:
+        await disposed.dispose()
+
+    print(runner.render(results))
+    meta = {
+        "scale": args.scale,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "backend": engine.dialect.name,
+    }
+    if args.output:
+        runner.save(results, args.output, meta)
+    if args.save_baseline:
+        runner.save(results, args.save_baseline, meta)
+    if args.baseline:
+        baseline_meta, baseline = runner.load(args.baseline)
+        if baseline_meta != meta:
+            print(f"warning: baseline was recorded with {baseline_meta}, this run is {meta}", file=sys.stderr)
+        problems = runner.compare(
+            results,
+            baseline,
+            latency_threshold=args.threshold,
+            alloc_threshold=args.alloc_threshold,
+            approximate_queries={s.name for s in scenarios if s.spawns},
+        )
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(prog="benchmarks", description="Benchmark the IDP API in-process.")
+    parser.add_argument("--scale", choices=sorted(seed.SCALES), default="small")
+    parser.add_argument("--database-url", default=None, help="Default: var/bench/<scale>.db (sqlite)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--alloc-samples", type=int, default=20, help="Requests per scenario traced for allocations")
+    parser.add_argument("--only", nargs="*", help="Run only these scenarios")
+    parser.add_argument("--baseline", help="Fail on regressions against this results file")
+    parser.add_argument("--threshold", type=float, default=1.0, help="Allowed p50 regression (1.0 = twice as slow)")
+    parser.add_argument("--alloc-threshold", type=float, default=0.25, help="Allowed allocation regression")
+    parser.add_argument("--save-baseline", help="Write results as a new baseline")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--reuse", action="store_true", help="Benchmark an existing catalog instead of reseeding")
+    parser.add_argument("--rate-limits", action="store_true", help="Keep write rate limits on")
+    parser.add_argument("--log-level", default="WARNING", help="Per-request INFO logs would dominate the timings")
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(args.log_level)
+    if args.database_url is None:
+        os.makedirs("var/bench", exist_ok=True)
+        args.database_url = f"sqlite+aiosqlite:///var/bench/{args.scale}.db"
+    return asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Logging overhead per request: synchronous handler vs the queue pipeline.
+
+Usage:
+
+    python -m benchmarks.log_overhead [--requests 2000] [--concurrency 50]
+                                      [--records 10] [--stall-ms 2]
+
+Simulated requests run on one event loop. Each sets a request id and
+logs ``--records`` INFO lines, yielding to the loop between them. The
+table shows the time per request spent inside logging calls, and how
+long the whole run took, for each pipeline writing to:
+
+* ``devnull``: a sink that never blocks;
+* ``stalled``: a sink whose writes take ``--stall-ms``, like a stdout
+  pipe whose reader has fallen behind.
+
+A synchronous handler stalls the loop, and so every request on it. The
+queue pipeline only costs the caller the filter and ``put_nowait``; the
+stall is paid by the listener thread.
+"""
+
+import argparse
+import asyncio
+import io
+import logging
+import os
+import queue
+import statistics
+import time
+from logging.handlers import QueueListener
+from typing import Dict, List, Tuple
+
+from app.core.logging import DebugSamplingFilter, JsonFormatter, NonBlockingQueueHandler, RequestIdFilter
+from app.core.request_context import set_request_id
+
+
+class StalledStream(io.TextIOBase):
+    def __init__(self, stall: float):
+        self.stall = stall
+
+    def write(self, text: str) -> int:
+        time.sleep(self.stall)
+        return len(text)
+
+
+def _sync_pipeline(stream) -> Tuple[logging.Handler, None]:
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(RequestIdFilter())
+    return handler, None
+
+
+def _queue_pipeline(stream) -> Tuple[logging.Handler, QueueListener]:
+    console = logging.StreamHandler(stream)
+    console.setFormatter(JsonFormatter())
+    records: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=100_000)
+    handler = NonBlockingQueueHandler(records)
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(DebugSamplingFilter(1.0))
+    listener = QueueListener(records, console)
+    listener.start()
+    return handler, listener
+
+
+async def _drive(logger: logging.Logger, *, requests: int, concurrency: int, records: int) -> List[float]:
+    per_request: List[float] = []
+    pending = iter(range(requests))
+
+    async def worker():
+        for i in pending:
+            set_request_id(f"bench-{i}")
+            spent = 0.0
+            for n in range(records):
+                started = time.perf_counter()
+                logger.info("request %s step %s", i, n, extra={"step": n})
+                spent += time.perf_counter() - started
+                await asyncio.sleep(0)
+            per_request.append(spent)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return per_request
+
+
+def run(*, requests: int, concurrency: int, records: int, stall_ms: float) -> List[Dict]:
+    results = []
+    for sink_name in ("devnull", "stalled"):
+        for pipeline_name, build in (("sync", _sync_pipeline), ("queue", _queue_pipeline)):
+            stream = open(os.devnull, "w") if sink_name == "devnull" else StalledStream(stall_ms / 1000)
+            handler, listener = build(stream)
+            logger = logging.getLogger(f"benchmarks.log_overhead.{sink_name}.{pipeline_name}")
+            logger.handlers = [handler]
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            started = time.perf_counter()
+            per_request = asyncio.run(
+                _drive(logger, requests=requests, concurrency=concurrency, records=records)
+            )
+            elapsed = time.perf_counter() - started
+            if listener is not None:
+                listener.stop()
+            stream.close()
+            ordered = sorted(per_request)
+            results.append(
+                {
+                    "sink": sink_name,
+                    "pipeline": pipeline_name,
+                    "p50_us": round(statistics.median(ordered) * 1e6, 1),
+                    "p99_us": round(ordered[int(len(ordered) * 0.99) - 1] * 1e6, 1),
+                    "run_s": round(elapsed, 3),
+                }
+            )
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="benchmarks.log_overhead", description=__doc__.split("\n")[0])
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--records", type=int, default=10, help="Log lines per request")
+    parser.add_argument("--stall-ms", type=float, default=2.0, help="Write latency of the stalled sink")
+    args = parser.parse_args(argv)
+    results = run(requests=args.requests, concurrency=args.concurrency, records=args.records, stall_ms=args.stall_ms)
+    print(f"{'sink':8} {'pipeline':8} {'p50 us/req':>11} {'p99 us/req':>11} {'run s':>8}")
+    for r in results:
+        print(f"{r['sink']:8} {r['pipeline']:8} {r['p50_us']:>11} {r['p99_us']:>11} {r['run_s']:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
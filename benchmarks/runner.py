@@ -0,0 +1,233 @@
+"""Drive scenarios through the app in-process and compare with a baseline.
+
+Requests go through ``httpx.ASGITransport`` straight into the FastAPI
+app, so the numbers cover routing, auth, validation, the service layer
+and the database, but not a network or server. Per scenario:
+
+* latency p50/p95/p99 and throughput, with ``concurrency`` requests in
+  flight;
+* SQL statements per request, counted on the engine against a context
+  variable that each request's tasks inherit;
+* peak Python allocation per request (``tracemalloc``), measured on the
+  first few requests of the scenario, sent one at a time and left out of
+  the latencies so tracing does not skew them.
+
+Background work a scenario starts (deployments, promotions) is drained
+before the next scenario begins.
+"""
+
+import asyncio
+import contextvars
+import json
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Collection, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.security import Role, create_access_token
+from app.main import app
+from app.services.jobs import drain
+from benchmarks.scenarios import Context, Scenario
+
+_queries: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar("bench_queries", default=None)
+
+
+@dataclass
+class Result:
+    name: str
+    requests: int
+    errors: int
+    rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    queries_per_request: float
+    alloc_kib_per_request: float
+
+
+def count_queries(engine: AsyncEngine) -> None:
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count(*_args):
+        counter = _queries.get()
+        if counter is not None:
+            counter[0] += 1
+
+
+def _percentile(samples: Sequence[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Runner:
+    def __init__(self, ctx: Context, *, requests: int, concurrency: int, alloc_samples: int = 20):
+        self.ctx = ctx
+        self.requests = requests
+        self.concurrency = concurrency
+        self.alloc_samples = alloc_samples
+        self._tokens: Dict[str, str] = {}
+
+    def _headers(self, user: str) -> Dict[str, str]:
+        if user not in self._tokens:
+            self._tokens[user] = create_access_token(user, Role.PLATFORM_ADMIN, team_id=1)
+        return {"Authorization": f"Bearer {self._tokens[user]}"}
+
+    async def _send(self, client: httpx.AsyncClient, scenario: Scenario, i: int) -> httpx.Response:
+        body = scenario.body(self.ctx, i) if scenario.body else None
+        response = await client.request(
+            scenario.method, scenario.path(self.ctx, i), json=body, headers=self._headers(scenario.user)
+        )
+        if scenario.record and response.is_success:
+            scenario.record(self.ctx, i, response.json())
+        return response
+
+    async def run(self, client: httpx.AsyncClient, scenario: Scenario) -> Result:
+        total = min(self.requests, scenario.max_requests or self.requests)
+        # The first few requests run one at a time under tracemalloc; the
+        # rest are timed. Every request index is used once, so writes that
+        # target "the i-th row created earlier" never repeat.
+        sampled = min(self.alloc_samples, max(1, total // 4))
+        alloc_kib = await self._allocations(client, scenario, range(sampled))
+        latencies: List[float] = []
+        queries: List[int] = []
+        errors = 0
+        pending = iter(range(sampled, total))
+
+        async def worker():
+            nonlocal errors
+            for i in pending:
+                counter = [0]
+                token = _queries.set(counter)
+                started = time.perf_counter()
+                try:
+                    response = await self._send(client, scenario, i)
+                    if response.status_code >= 400 and response.status_code != scenario.expect:
+                        errors += 1
+                except Exception:  # noqa: BLE001
+                    errors += 1
+                finally:
+                    latencies.append(time.perf_counter() - started)
+                    queries.append(counter[0])
+                    _queries.reset(token)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(max(1, min(self.concurrency, total - sampled)))))
+        elapsed = time.perf_counter() - started
+        await drain()
+
+        return Result(
+            name=scenario.name,
+            requests=len(latencies),
+            errors=errors,
+            rps=round(len(latencies) / elapsed, 1),
+            p50_ms=round(_percentile(latencies, 50) * 1000, 2),
+            p95_ms=round(_percentile(latencies, 95) * 1000, 2),
+            p99_ms=round(_percentile(latencies, 99) * 1000, 2),
+            queries_per_request=round(statistics.fmean(queries), 2),
+            alloc_kib_per_request=alloc_kib,
+        )
+
+    async def _allocations(self, client: httpx.AsyncClient, scenario: Scenario, indexes: range) -> float:
+        peaks = []
+        tracemalloc.start()
+        try:
+            for i in indexes:
+                baseline, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                await self._send(client, scenario, i)
+                _, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - baseline)
+        finally:
+            tracemalloc.stop()
+        await drain()
+        return round(statistics.median(peaks) / 1024, 1)
+
+
+async def run_all(
+    ctx: Context, scenarios: Sequence[Scenario], *, requests: int, concurrency: int, alloc_samples: int = 20
+) -> List[Result]:
+    runner = Runner(ctx, requests=requests, concurrency=concurrency, alloc_samples=alloc_samples)
+    transport = httpx.ASGITransport(app=app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for scenario in scenarios:
+            results.append(await runner.run(client, scenario))
+    return results
+
+
+# -- baselines ------------------------------------------------------------
+
+
+def save(results: Sequence[Result], path: str, meta: Dict) -> None:
+    with open(path, "w") as handle:
+        json.dump({"meta": meta, "results": {r.name: asdict(r) for r in results}}, handle, indent=2, sort_keys=True)
+        handle.write("\n")
+
+
+def load(path: str) -> Tuple[Dict, Dict[str, Dict]]:
+    """(meta, results by scenario) from a file written by ``save``."""
+    with open(path) as handle:
+        data = json.load(handle)
+    return data["meta"], data["results"]
+
+
+def compare(
+    results: Sequence[Result],
+    baseline: Dict[str, Dict],
+    *,
+    latency_threshold: float = 1.0,
+    alloc_threshold: float = 0.25,
+    min_latency_ms: float = 25.0,
+    query_slack: float = 0.5,
+    approximate_queries: Collection[str] = (),
+) -> List[str]:
+    """Regressions against ``baseline``, as human-readable lines.
+
+    Queries per request are deterministic and fail on any increase beyond
+    ``query_slack``, except for ``approximate_queries``: scenarios whose
+    spawned background work is partly counted against the request, which
+    get ``alloc_threshold`` instead. Allocation fails past
+    ``alloc_threshold`` (a fraction). Timings are noisy, so latency gates
+    on p50 only (p95 on a contended writer is mostly lock scheduling),
+    past ``latency_threshold`` and ``min_latency_ms`` of absolute slowdown.
+    """
+    problems = []
+    for result in results:
+        base = baseline.get(result.name)
+        if base is None:
+            continue
+        if result.errors > base["errors"]:
+            problems.append(f"{result.name}: {result.errors} errors (baseline {base['errors']})")
+        slower = result.p50_ms - base["p50_ms"]
+        if result.p50_ms > base["p50_ms"] * (1 + latency_threshold) and slower > min_latency_ms:
+            problems.append(f"{result.name}: p50 {result.p50_ms} ms vs {base['p50_ms']} ms")
+        allowed_queries = (
+            base["queries_per_request"] * (1 + alloc_threshold)
+            if result.name in approximate_queries
+            else base["queries_per_request"] + query_slack
+        )
+        if result.queries_per_request > allowed_queries:
+            problems.append(
+                f"{result.name}: {result.queries_per_request} queries/request vs {base['queries_per_request']}"
+            )
+        if result.alloc_kib_per_request > base["alloc_kib_per_request"] * (1 + alloc_threshold) + 1:
+            problems.append(
+                f"{result.name}: {result.alloc_kib_per_request} KiB/request vs {base['alloc_kib_per_request']}"
+            )
+    return problems
+
+
+def render(results: Sequence[Result]) -> str:
+    header = f"{'scenario':32} {'reqs':>5} {'err':>4} {'rps':>8} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'q/req':>6} {'KiB/req':>8}"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        lines.append(
+            f"{r.name:32} {r.requests:>5} {r.errors:>4} {r.rps:>8} {r.p50_ms:>8} {r.p95_ms:>8} {r.p99_ms:>8}"
+            f" {r.queries_per_request:>6} {r.alloc_kib_per_request:>8}"
+        )
+    return "\n".join(lines)
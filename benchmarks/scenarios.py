@@ -0,0 +1,282 @@
+"""One scenario per endpoint in ``app/api/routes.py``.
+
+Scenarios run in order, each for the same number of requests, so a
+write scenario can hand the ids it created (``Context.created``) to the
+ones after it: services registered by ``register_service`` get the
+environments, dependencies and team moves that follow. Request ``i`` of
+a scenario picks its target from the seeded sample with ``Context.pick``.
+
+``/api/changes/stream`` is left out: it is a long-lived SSE tail, not a
+request/response endpoint.
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import Environment, EnvironmentTier, Service, Team
+
+SAMPLE_SIZE = 2_000
+
+
+@dataclass
+class Context:
+    run: str
+    teams: List[int]
+    services: List[int]
+    environments: Dict[tuple, int]  # (service_id, tier) -> environment id
+    created: Dict[str, List[Any]] = field(default_factory=lambda: defaultdict(list))
+
+    @staticmethod
+    def pick(items: Sequence[Any], i: int) -> Any:
+        return items[i % len(items)]
+
+    def service(self, i: int) -> int:
+        return self.pick(self.services, i)
+
+    def environment(self, i: int, tier: EnvironmentTier) -> int:
+        return self.environments[(self.service(i), tier)]
+
+
+async def load_context(db: AsyncSession, run: str) -> Context:
+    teams = list(await db.scalars(select(Team.id).order_by(Team.id).limit(SAMPLE_SIZE)))
+    # Seeded services only: skip ones earlier runs registered.
+    services = list(
+        await db.scalars(
+            select(Service.id).where(Service.name.like("svc-%")).order_by(Service.id).limit(SAMPLE_SIZE)
+        )
+    )
+    rows = await db.execute(
+        select(Environment.service_id, Environment.tier, Environment.id).where(Environment.service_id.in_(services))
+    )
+    return Context(
+        run=run,
+        teams=teams,
+        services=services,
+        environments={(service_id, tier): env_id for service_id, tier, env_id in rows},
+    )
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: Callable[[Context, int], str]
+    body: Optional[Callable[[Context, int], Any]] = None
+    user: str = "bench"
+    # Cap for endpoints that return the whole catalog.
+    max_requests: Optional[int] = None
+    # Called with each request index and response body, to stash ids for
+    # later scenarios.
+    record: Optional[Callable[[Context, int, Any], None]] = None
+    # Starts background work, some of whose queries land on the request.
+    spawns: bool = False
+    # An error status the endpoint is meant to answer with, not counted.
+    expect: Optional[int] = None
+
+
+def _stash(key: str, field_name: Optional[str] = "id"):
+    def record(ctx: Context, i: int, body: Any) -> None:
+        ctx.created[key].append(body[field_name] if field_name else body)
+
+    return record
+
+
+def _created(key: str):
+    def get(ctx: Context, i: int) -> Any:
+        return ctx.pick(ctx.created[key], i)
+
+    return get
+
+
+_service = _created("services")
+_environment = _created("environments")  # (service id, environment id)
+_deployment = _created("deployments")
+_prod_deployment = _created("prod_deployments")
+_promotion = _created("promotions")
+_webhook = _created("webhooks")
+_TAGS = {"owner": "bench", "data_sensitivity": "internal", "language": "go"}
+
+
+def _stash_environment(ctx: Context, i: int, body: Any) -> None:
+    # Environment responses don't name their service; request i's does.
+    ctx.created["environments"].append((_service(ctx, i), body["id"]))
+
+
+def _environment_config(suffix: str = ""):
+    def path(ctx: Context, i: int) -> str:
+        service_id, environment_id = _environment(ctx, i)
+        return f"/api/services/{service_id}/environments/{environment_id}/config{suffix}"
+
+    return path
+
+
+SCENARIOS: List[Scenario] = [
+    # Teams and quotas
+    Scenario("create_team", "POST", lambda c, i: "/api/teams", lambda c, i: {"name": f"bench-{c.run}-team-{i}"}),
+    Scenario("list_teams", "GET", lambda c, i: "/api/teams", max_requests=20),
+    Scenario("get_team_quota", "GET", lambda c, i: f"/api/teams/{c.pick(c.teams, i)}/quota"),
+    Scenario(
+        "set_team_quota",
+        "PUT",
+        lambda c, i: f"/api/teams/{c.pick(c.teams, i)}/quota",
+        lambda c, i: {"max_services": 1_000, "max_environments": 3_000},
+    ),
+    Scenario(
+        "set_team_config",
+        "PUT",
+        lambda c, i: f"/api/teams/{c.pick(c.teams, i)}/config",
+        lambda c, i: {"config": {"region": "eu-west-1", "labels": {"run": c.run}}},
+    ),
+    Scenario("get_team_config", "GET", lambda c, i: f"/api/teams/{c.pick(c.teams, i)}/config"),
+    # Catalog writes
+    Scenario(
+        "register_service",
+        "POST",
+        lambda c, i: "/api/services",
+        lambda c, i: {"name": f"bench-{c.run}-svc-{i}", "tags": _TAGS},
+        record=_stash("services"),
+    ),
+    Scenario(
+        "update_service",
+        "PATCH",
+        lambda c, i: f"/api/services/{_service(c, i)}",
+        lambda c, i: {"description": f"updated by bench {c.run}"},
+    ),
+    Scenario("assign_team", "POST", lambda c, i: f"/api/services/{_service(c, i)}/team?team_id={c.pick(c.teams, i)}"),
+    Scenario(
+        "set_service_config",
+        "PUT",
+        lambda c, i: f"/api/services/{_service(c, i)}/config",
+        lambda c, i: {"config": {"labels": {"service": f"bench-{c.run}-svc-{i}"}}},
+    ),
+    Scenario("get_service_config", "GET", lambda c, i: f"/api/services/{_service(c, i)}/config"),
+    Scenario(
+        "provision_environment",
+        "POST",
+        lambda c, i: f"/api/services/{_service(c, i)}/environments",
+        lambda c, i: {"name": "dev", "tier": "dev"},
+        record=_stash_environment,
+    ),
+    # Environment configs: provisioning wrote version 1.
+    Scenario(
+        "update_environment_config",
+        "PUT",
+        _environment_config(),
+        lambda c, i: {"config": {"replicas": 2, "release": f"bench-{c.run}-{i}"}},
+    ),
+    Scenario("rollback_environment_config", "POST", _environment_config("/rollback"), lambda c, i: {"version": 1}),
+    Scenario("list_config_versions", "GET", _environment_config("/versions")),
+    Scenario("get_config_version", "GET", _environment_config("/versions/2")),
+    Scenario("diff_config_versions", "GET", _environment_config("/diff?from=2")),
+    Scenario("render_environment_config", "GET", _environment_config("/rendered")),
+    Scenario(
+        "add_dependency",
+        "POST",
+        lambda c, i: f"/api/services/{_service(c, i)}/dependencies",
+        lambda c, i: {"depends_on_id": c.service(i)},
+    ),
+    # Catalog reads
+    Scenario("list_dependencies", "GET", lambda c, i: f"/api/services/{c.service(i)}/dependencies"),
+    Scenario("list_dependents", "GET", lambda c, i: f"/api/services/{c.service(i)}/dependents?max_depth=2"),
+    Scenario("dependency_cycles", "GET", lambda c, i: "/api/dependencies/cycles", max_requests=20),
+    Scenario(
+        "deploy_order",
+        "GET",
+        lambda c, i: f"/api/dependencies/deploy-order?service_id={c.service(i)}&service_id={c.service(i + 7)}",
+    ),
+    Scenario(
+        "remove_dependency",
+        "DELETE",
+        lambda c, i: f"/api/services/{_service(c, i)}/dependencies/{c.service(i)}",
+    ),
+    Scenario("list_services", "GET", lambda c, i: "/api/services", max_requests=5),
+    Scenario("list_services_fast", "GET", lambda c, i: "/api/services?fields=", max_requests=5),
+    Scenario("list_services_ids", "GET", lambda c, i: "/api/services?fields=id,name", max_requests=5),
+    Scenario(
+        "list_services_by_tag",
+        "GET",
+        lambda c, i: f"/api/services?tag=owner:team-{c.pick(c.teams, i):05d}&tag=language:go",
+    ),
+    Scenario("service_tag_facets", "GET", lambda c, i: "/api/services/facets?key=language&key=data_sensitivity"),
+    Scenario("search_catalog", "GET", lambda c, i: f"/api/search?q=svc-{c.service(i):06d}"),
+    Scenario("list_envs", "GET", lambda c, i: f"/api/services/{c.service(i)}/environments"),
+    # Deployments
+    Scenario(
+        "trigger_deployment",
+        "POST",
+        lambda c, i: f"/api/services/{c.service(i)}/environments/{c.environment(i, EnvironmentTier.dev)}/deployments",
+        lambda c, i: {"version": f"bench-{c.run}-{i}", "initiated_by": "bench"},
+        record=_stash("deployments", None),
+        spawns=True,
+    ),
+    Scenario("get_job", "GET", lambda c, i: f"/api/jobs/{_deployment(c, i)['job_id']}"),
+    # Finished by now: measures the lookup and the refusal.
+    Scenario("cancel_job", "POST", lambda c, i: f"/api/jobs/{_deployment(c, i)['job_id']}/cancel", expect=409),
+    Scenario("list_deployment_history", "GET", lambda c, i: f"/api/services/{c.service(i)}/deployments"),
+    Scenario(
+        "list_deployment_history_fast",
+        "GET",
+        lambda c, i: f"/api/services/{c.service(i)}/deployments?fields=id,version,status,created_at",
+    ),
+    Scenario(
+        "trigger_prod_deployment",
+        "POST",
+        lambda c, i: f"/api/services/{c.service(i)}/environments/{c.environment(i, EnvironmentTier.prod)}/deployments",
+        lambda c, i: {"version": f"bench-{c.run}-{i}", "initiated_by": "bench"},
+        record=_stash("prod_deployments", "deployment_id"),
+    ),
+    Scenario(
+        "get_deployment_approvals", "GET", lambda c, i: f"/api/deployments/{_prod_deployment(c, i)}/approvals"
+    ),
+    Scenario(
+        "approve_deployment",
+        "POST",
+        lambda c, i: f"/api/deployments/{_prod_deployment(c, i)}/approvals",
+        lambda c, i: {"comment": "bench"},
+        user="reviewer",
+        spawns=True,
+    ),
+    Scenario(
+        "start_promotion",
+        "POST",
+        lambda c, i: f"/api/services/{c.service(i + SAMPLE_SIZE // 2)}/promotions",
+        lambda c, i: {"version": f"bench-{c.run}-promo-{i}", "initiated_by": "bench"},
+        record=_stash("promotions"),
+        spawns=True,
+    ),
+    Scenario("get_promotion", "GET", lambda c, i: f"/api/promotions/{_promotion(c, i)}"),
+    Scenario(
+        "start_promotions",
+        "POST",
+        lambda c, i: "/api/promotions",
+        lambda c, i: {
+            "items": [
+                {"service_id": c.service(5 * i + k), "version": f"bench-{c.run}-batch-{i}", "initiated_by": "bench"}
+                for k in range(5)
+            ]
+        },
+        spawns=True,
+    ),
+    # Reporting
+    Scenario("deployment_analytics", "GET", lambda c, i: "/api/analytics/deployments?group_by=team&bucket=week"),
+    Scenario("deployment_analytics_by_tier", "GET", lambda c, i: "/api/analytics/deployments?group_by=tier&bucket=day"),
+    Scenario("get_audit_logs", "GET", lambda c, i: "/api/audit?limit=100"),
+    Scenario("list_changes", "GET", lambda c, i: f"/api/changes?after={i}&limit=100"),
+    Scenario("metrics", "GET", lambda c, i: "/api/metrics", max_requests=50),
+    # Webhooks
+    Scenario(
+        "create_webhook",
+        "POST",
+        lambda c, i: "/api/webhooks",
+        lambda c, i: {"url": f"http://bench.invalid/{c.run}/{i}", "topics": ["deployment."]},
+        record=_stash("webhooks"),
+    ),
+    Scenario("list_webhooks", "GET", lambda c, i: "/api/webhooks", max_requests=50),
+    Scenario("list_webhook_deliveries", "GET", lambda c, i: f"/api/webhooks/{_webhook(c, i)}/deliveries"),
+    Scenario("redrive_webhook_deliveries", "POST", lambda c, i: f"/api/webhooks/{_webhook(c, i)}/deliveries/redrive"),
+    Scenario("delete_webhook", "DELETE", lambda c, i: f"/api/webhooks/{_webhook(c, i)}"),
+]
@@ -0,0 +1,204 @@
+"""Bulk-seed a realistic catalog for benchmarking.
+
+Rows go in through Core ``executemany`` in chunks, bypassing the
+service layer (which would take hours at full scale). Every service
+gets dev/staging/prod environments, tags, up to three dependencies on
+older services and a share of the deployment history; ``team_quotas``
+and ``deployment_rollups`` are filled in to match, as the write paths
+would have left them.
+"""
+
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import (
+    Deployment,
+    DeploymentRollup,
+    DeploymentStatus,
+    Environment,
+    EnvironmentTier,
+    Service,
+    ServiceDependency,
+    ServiceTag,
+    Team,
+    TeamQuota,
+)
+
+TIERS = (EnvironmentTier.dev, EnvironmentTier.staging, EnvironmentTier.prod)
+SENSITIVITY = ("public", "internal", "confidential")
+LANGUAGES = ("python", "go", "java", "node", "rust")
+
+
+@dataclass(frozen=True)
+class Scale:
+    teams: int
+    services: int
+    deployments: int
+
+
+SCALES: Dict[str, Scale] = {
+    "tiny": Scale(teams=10, services=100, deployments=1_000),
+    "small": Scale(teams=100, services=1_000, deployments=10_000),
+    "medium": Scale(teams=1_000, services=10_000, deployments=100_000),
+    "full": Scale(teams=10_000, services=100_000, deployments=1_000_000),
+}
+
+
+def _chunks(rows: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    chunk: List[dict] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def _insert(db: AsyncSession, model, rows: Iterator[dict], chunk_size: int = 10_000) -> int:
+    total = 0
+    for chunk in _chunks(rows, chunk_size):
+        await db.execute(insert(model), chunk)
+        total += len(chunk)
+    await db.commit()
+    return total
+
+
+async def is_seeded(db: AsyncSession) -> bool:
+    return bool(await db.scalar(select(func.count()).select_from(Service)))
+
+
+async def seed(db: AsyncSession, scale: Scale, *, rng_seed: int = 7) -> Dict[str, int]:
+    """Seed an empty database. Ids are assigned densely from 1."""
+    rng = random.Random(rng_seed)
+    now = datetime.utcnow()
+    team_of = [1 + service % scale.teams for service in range(scale.services)]
+
+    await _insert(
+        db,
+        Team,
+        ({"id": t, "name": f"team-{t:05d}", "description": f"Team {t}", "created_at": now} for t in range(1, scale.teams + 1)),
+    )
+
+    def services():
+        for index in range(scale.services):
+            service_id = index + 1
+            yield {
+                "id": service_id,
+                "name": f"svc-{service_id:06d}",
+                "description": f"Service {service_id} owned by team {team_of[index]}",
+                "team_id": team_of[index],
+                "config": {},
+                "tags": _tags(service_id, team_of[index]),
+                "created_at": now,
+            }
+
+    await _insert(db, Service, services())
+    await _insert(
+        db,
+        ServiceTag,
+        (
+            {"service_id": s + 1, "key": key, "value": value}
+            for s in range(scale.services)
+            for key, value in _tags(s + 1, team_of[s]).items()
+        ),
+    )
+    await _insert(
+        db,
+        Environment,
+        (
+            {
+                "id": s * len(TIERS) + offset + 1,
+                "name": tier.value,
+                "tier": tier,
+                "service_id": s + 1,
+                "config": {},
+                "created_at": now,
+            }
+            for s in range(scale.services)
+            for offset, tier in enumerate(TIERS)
+        ),
+    )
+
+    def dependencies():
+        for service_id in range(2, scale.services + 1):
+            for depends_on in {rng.randint(max(1, service_id - 500), service_id - 1) for _ in range(rng.randint(0, 3))}:
+                yield {"service_id": service_id, "depends_on_id": depends_on, "created_at": now}
+
+    await _insert(db, ServiceDependency, dependencies())
+
+    rollups: Dict[Tuple, List[float]] = {}
+
+    def deployments():
+        for n in range(scale.deployments):
+            service_index = rng.randrange(scale.services)
+            offset = rng.choices(range(len(TIERS)), weights=(6, 3, 1))[0]
+            created = now - timedelta(days=rng.uniform(0, 90))
+            status = DeploymentStatus.failed if rng.random() < 0.08 else DeploymentStatus.succeeded
+            lead_time = rng.uniform(30, 1800)
+            key = (created.date(), service_index + 1, TIERS[offset])
+            counters = rollups.setdefault(key, [0, 0, 0.0])
+            if status == DeploymentStatus.succeeded:
+                counters[0] += 1
+                counters[2] += lead_time
+            else:
+                counters[1] += 1
+            yield {
+                "service_id": service_index + 1,
+                "environment_id": service_index * len(TIERS) + offset + 1,
+                "version": f"1.{n}",
+                "status": status,
+                "initiated_by": "ci",
+                "triggered_by": "seed",
+                "created_at": created,
+                "updated_at": created + timedelta(seconds=lead_time),
+            }
+
+    await _insert(db, Deployment, deployments())
+    await _insert(
+        db,
+        DeploymentRollup,
+        (
+            {
+                "bucket": bucket,
+                "service_id": service_id,
+                "tier": tier,
+                "succeeded": succeeded,
+                "failed": failed,
+                "lead_time_seconds": lead_time,
+            }
+            for (bucket, service_id, tier), (succeeded, failed, lead_time) in rollups.items()
+        ),
+    )
+    services_per_team: Dict[int, int] = {}
+    for team in team_of:
+        services_per_team[team] = services_per_team.get(team, 0) + 1
+    await _insert(
+        db,
+        TeamQuota,
+        (
+            {"team_id": team, "services": count, "environments": count * len(TIERS)}
+            for team, count in services_per_team.items()
+        ),
+    )
+    if db.get_bind().dialect.name == "postgresql":
+        # Explicit ids leave the serial sequences behind.
+        for table in ("teams", "services", "environments", "deployments"):
+            await db.execute(
+                text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))")
+            )
+        await db.commit()
+    return {"teams": scale.teams, "services": scale.services, "deployments": scale.deployments}
+
+
+def _tags(service_id: int, team_id: int) -> Dict[str, str]:
+    return {
+        "owner": f"team-{team_id:05d}",
+        "data_sensitivity": SENSITIVITY[service_id % len(SENSITIVITY)],
+        "language": LANGUAGES[service_id % len(LANGUAGES)],
+    }
@@ -0,0 +1,79 @@
+"""Audit log maintenance CLI.
+
+Usage:
+
+    python src/audit_cli.py maintain [--retain-months 12] [--archive-dir var/audit-archive]
+    python src/audit_cli.py verify [--workers 8]
+
+``maintain`` seals pending rows into the hash chain, pre-creates
+upcoming monthly partitions (Postgres), rolls closed months out of the
+head table (sqlite), then archives and drops partitions older than the
+retention window. Run it from cron; every step is idempotent.
+
+``verify`` re-checks the hash chain across worker processes and exits
+non-zero at the first broken link.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from dataclasses import asdict
+from typing import Optional
+
+# Allow running as `python src/audit_cli.py` by ensuring the repo root
+# (parent of this src/ dir) is on sys.path so the `app` package imports.
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from app.core.config import get_settings  # noqa: E402
+from app.db import session as db_session  # noqa: E402
+from app.services import audit_chain, audit_partitions  # noqa: E402
+
+
+async def _maintain(retain_months: int, archive_dir: str, batch_size: int) -> dict:
+    async with db_session.db_router.primary() as db:
+        sealed = await audit_chain.seal_all(db, batch_size=batch_size)
+        report = await audit_partitions.run_maintenance(
+            db, retain_months=retain_months, archive_dir=archive_dir
+        )
+    return {"sealed_checkpoints": sealed, **report}
+
+
+def main(argv: Optional[list] = None) -> int:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(prog="audit-cli", description="Audit log maintenance.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    maintain = commands.add_parser("maintain", help="Create, roll and retire audit partitions")
+    maintain.add_argument("--retain-months", type=int, default=settings.audit_retention_months)
+    maintain.add_argument("--archive-dir", default=settings.audit_archive_dir)
+
+    verify = commands.add_parser("verify", help="Verify the audit hash chain")
+    verify.add_argument("--database-url", default=settings.database_url)
+    verify.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    verify.add_argument("--segment-rows", type=int, default=250_000)
+    args = parser.parse_args(argv)
+
+    if args.command == "maintain":
+        report = asyncio.run(
+            _maintain(args.retain_months, args.archive_dir, settings.audit_seal_batch_size)
+        )
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+        return 0
+
+    result = audit_chain.verify_chain(
+        args.database_url, workers=args.workers, segment_rows=args.segment_rows
+    )
+    json.dump({"ok": result.ok, **asdict(result)}, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write("\n")
+    return 0 if result.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.core.ratelimit import limiter
+from app.core.security import Role, create_access_token
+from app.db import session as db_session
+from app.db.session import Base, ReplicaRouter
+from app.main import app
+from app.models import models  # noqa: F401
+from app.services.config_layers import render_cache
+from app.services.dependencies import dependency_graph
+from app.services.search import search_index
+
+
+def make_sessionmaker(path) -> async_sessionmaker:
+    """File-backed sqlite database with the full schema created.
+
+    NullPool keeps aiosqlite connections from outliving the event loop
+    that opened them (TestClient and asyncio.run each use their own).
+    Transactions start with BEGIN IMMEDIATE: sqlite refuses to upgrade a
+    read transaction to a write under contention (instant "database is
+    locked"), whereas an immediate begin waits on the busy timeout.
+    """
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path}", poolclass=NullPool, connect_args={"timeout": 30}
+    )
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def disable_pysqlite_transactions(dbapi_connection, _record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    async def create_schema():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_schema())
+    return async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+
+def auth_headers(username="tester", role=Role.PLATFORM_ADMIN, team_id=1):
+    token = create_access_token(username, role, team_id=team_id)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def wait_until(predicate, timeout=15):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def primary(tmp_path) -> async_sessionmaker:
+    return make_sessionmaker(tmp_path / "primary.db")
+
+
+@pytest.fixture
+def db_router(primary, monkeypatch) -> ReplicaRouter:
+    router = ReplicaRouter(primary)
+    monkeypatch.setattr(db_session, "db_router", router)
+    search_index.clear()
+    dependency_graph.clear()
+    render_cache.clear()
+    limiter.local.clear()
+    return router
+
+
+@pytest.fixture
+def client(db_router):
+    with TestClient(app) as test_client:
+        yield test_client
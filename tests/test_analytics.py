@@ -0,0 +1,107 @@
+import asyncio
+from datetime import date
+
+from sqlalchemy import func, select
+
+from app.core.security import Role
+from app.models.models import Deployment, DeploymentRollup, DeploymentStatus, Environment, EnvironmentTier, Service, Team
+from app.services import deployment as deployment_service
+from app.services.jobs import drain
+
+from conftest import auth_headers
+
+
+def seed_and_run(sessionmaker, outcomes):
+    """Create one deployment per (service, tier, ok) outcome and run it."""
+
+    async def seed():
+        ids = []
+        async with sessionmaker() as session:
+            team = Team(name="payments")
+            services = {}
+            for service_name, tier, ok in outcomes:
+                if service_name not in services:
+                    services[service_name] = Service(
+                        name=service_name, team=team, tags={"owner": "t", "data_sensitivity": "internal"}
+                    )
+                environment = Environment(name=tier.value, tier=tier, service=services[service_name])
+                deployment = Deployment(
+                    service=services[service_name],
+                    environment=environment,
+                    version=f"{len(ids)}",
+                    initiated_by="ci",
+                )
+                session.add(deployment)
+                await session.flush()
+                ids.append((deployment.id, ok))
+            await session.commit()
+        return ids
+
+    async def fail():
+        raise RuntimeError("rollout failed")
+
+    async def run_all(ids):
+        for deployment_id, ok in ids:
+            try:
+                await deployment_service.run_deployment(deployment_id, "ci", None if ok else fail)
+            except RuntimeError:
+                pass
+        await drain()  # transition event handlers
+
+    asyncio.run(run_all(asyncio.run(seed())))
+
+
+def test_rollups_aggregate_outcomes_per_group(client, primary):
+    seed_and_run(
+        primary,
+        [
+            ("billing", EnvironmentTier.dev, True),
+            ("billing", EnvironmentTier.prod, True),
+            ("billing", EnvironmentTier.prod, False),
+            ("ledger", EnvironmentTier.prod, True),
+        ],
+    )
+
+    async def rollup_rows():
+        async with primary() as session:
+            return await session.scalar(select(func.count()).select_from(DeploymentRollup))
+
+    # One row per (day, service, tier), however many deployments.
+    assert asyncio.run(rollup_rows()) == 3
+
+    res = client.get("/api/analytics/deployments?group_by=tier&bucket=day", headers=auth_headers("lead", Role.DEVELOPER))
+    assert res.status_code == 200, res.text
+    by_tier = {row["group"]: row for row in res.json()}
+    assert by_tier["prod"]["succeeded"] == 2
+    assert by_tier["prod"]["failed"] == 1
+    assert abs(by_tier["prod"]["change_failure_rate"] - 1 / 3) < 1e-9
+    assert by_tier["prod"]["mean_lead_time_seconds"] >= 0
+    assert by_tier["dev"]["deployment_frequency"] == 1
+    assert by_tier["prod"]["bucket"] == date.today().isoformat()
+
+    res = client.get("/api/analytics/deployments?group_by=team&bucket=month&tier=prod", headers=auth_headers("lead", Role.DEVELOPER))
+    [team_row] = res.json()
+    assert team_row["succeeded"] == 2 and team_row["failed"] == 1
+    assert team_row["bucket"] == date.today().replace(day=1).isoformat()
+
+
+def test_superseded_deployments_are_not_counted(client, primary):
+    async def seed():
+        async with primary() as session:
+            service = Service(name="svc", tags={"owner": "t", "data_sensitivity": "internal"})
+            environment = Environment(name="dev", tier=EnvironmentTier.dev, service=service)
+            session.add(Deployment(service=service, environment=environment, version="1", initiated_by="ci"))
+            await session.commit()
+            return (await session.scalar(select(Deployment.id)))
+
+    deployment_id = asyncio.run(seed())
+
+    async def supersede():
+        async with primary() as session:
+            await deployment_service._advance(
+                session, deployment_id, DeploymentStatus.pending, DeploymentStatus.superseded, "ci"
+            )
+        await drain()
+
+    asyncio.run(supersede())
+    assert client.get("/api/analytics/deployments", headers=auth_headers("lead", Role.DEVELOPER)).json() == []
@@ -0,0 +1,231 @@
+import asyncio
+
+from sqlalchemy import func, select, update
+
+from app.core.config import get_settings
+from app.core.security import Role
+from app.models.models import NotificationDelivery, OutboxEvent, PlatformPolicy, WebhookDeliveryStatus
+from app.services import deployment as deployment_service
+from app.services import notifications, outbox
+
+from conftest import auth_headers, wait_until
+
+
+def prod_environment(client, name):
+    service_id = client.post(
+        "/api/services",
+        json={"name": name, "tags": {"owner": "t", "data_sensitivity": "internal"}},
+        headers=auth_headers(),
+    ).json()["id"]
+    env = None
+    for tier in ("dev", "staging", "prod"):
+        env = client.post(
+            f"/api/services/{service_id}/environments", json={"name": tier, "tier": tier}, headers=auth_headers()
+        ).json()
+    return service_id, env["id"]
+
+
+def trigger(client, service_id, environment_id, version="1.0"):
+    res = client.post(
+        f"/api/services/{service_id}/environments/{environment_id}/deployments",
+        json={"version": version, "initiated_by": "ci"},
+        headers=auth_headers(),
+    )
+    assert res.status_code == 202
+    return res.json()
+
+
+def approve(client, deployment_id, username):
+    return client.post(
+        f"/api/deployments/{deployment_id}/approvals", json={"comment": "lgtm"}, headers=auth_headers(username)
+    )
+
+
+def test_two_of_three_policy_resumes_at_quorum_and_notifies(client, primary, monkeypatch):
+    stub = notifications.StubSink()
+    monkeypatch.setattr(notifications, "_sinks", [stub])
+
+    async def add_policy():
+        async with primary() as db:
+            db.add(
+                PlatformPolicy(
+                    name="production-approvals", config={"required": 2, "approvers": ["alice", "bob", "carol"]}
+                )
+            )
+            await db.commit()
+
+    asyncio.run(add_policy())
+    service_id, environment_id = prod_environment(client, "ledger")
+    body = trigger(client, service_id, environment_id)
+    deployment_id = body["deployment_id"]
+    assert body["status"] == "awaiting_approval"
+    assert client.get(f"/api/jobs/{body['job_id']}", headers=auth_headers()).json()["status"] == "awaiting_approval"
+
+    assert approve(client, deployment_id, "dave").status_code == 403
+    res = approve(client, deployment_id, "alice")
+    assert (res.status_code, res.json()["status"], res.json()["approvers"]) == (201, "awaiting_approval", ["alice"])
+    assert approve(client, deployment_id, "alice").json()["approvers"] == ["alice"]
+
+    res = approve(client, deployment_id, "bob")
+    assert res.json() == {
+        "deployment_id": deployment_id,
+        "status": "pending",
+        "required": 2,
+        "approvers": ["alice", "bob"],
+    }
+    wait_until(
+        lambda: client.get(f"/api/deployments/{deployment_id}/approvals", headers=auth_headers()).json()["status"]
+        == "succeeded"
+    )
+    assert approve(client, deployment_id, "carol").status_code == 409
+
+    wait_until(lambda: len(stub.sent) == 4)
+    assert [msg["topic"] for msg in stub.sent] == [
+        "deployment.approval_requested",
+        "deployment.approval_recorded",
+        "deployment.approval_recorded",
+        "deployment.approval_granted",
+    ]
+    assert stub.sent[0]["service"] == "ledger"
+
+
+def test_concurrent_quorum_resumes_emit_approval_granted_once(client, primary, monkeypatch):
+    enqueued = []
+    monkeypatch.setattr(deployment_service, "enqueue_deployment", lambda *args: enqueued.append(args))
+    service_id, environment_id = prod_environment(client, "billing")
+    deployment_id = trigger(client, service_id, environment_id)["deployment_id"]
+
+    async def resume(approver):
+        async with primary() as db:
+            return await deployment_service.resume_approved(
+                db, deployment_id, environment_id, approver, approvers=["alice", "bob"]
+            )
+
+    async def run():
+        resumed = await asyncio.gather(resume("alice"), resume("bob"))
+        async with primary() as db:
+            granted = await db.scalar(
+                select(func.count()).where(OutboxEvent.topic == "deployment.approval_granted")
+            )
+        return sorted(resumed), granted
+
+    assert asyncio.run(run()) == ([False, True], 1)
+    assert len(enqueued) == 1
+
+
+class DownSink:
+    name = "down"
+
+    def __init__(self):
+        self.up = False
+        self.sent = []
+
+    async def send(self, messages):
+        if not self.up:
+            raise RuntimeError("sink down")
+        self.sent.extend(messages)
+
+
+def test_a_failing_sink_is_retried_alone_outside_the_outbox(primary, db_router, monkeypatch):
+    stub, down = notifications.StubSink(), DownSink()
+    monkeypatch.setattr(notifications, "_sinks", [stub, down])
+
+    async def run():
+        async with primary() as db:
+            outbox.emit(db, "deployment.approval_requested", {"deployment_id": 1})
+            await db.commit()
+            # The outbox only records what is owed; nothing is sent in its transaction.
+            assert await outbox.dispatch_all(db) == 1
+            assert (stub.sent, await db.scalar(select(func.count()).select_from(NotificationDelivery))) == ([], 2)
+
+            assert await notifications.deliver_due(db) == 2
+            rows = {row.sink: row for row in await db.scalars(select(NotificationDelivery))}
+            assert rows["stub"].status == WebhookDeliveryStatus.delivered
+            assert (rows["down"].status, rows["down"].attempts) == (WebhookDeliveryStatus.pending, 1)
+            assert rows["down"].last_error == "RuntimeError: sink down"
+            created_at = rows["down"].created_at
+            assert await notifications.deliver_due(db) == 0
+
+            down.up = True
+            await db.execute(update(NotificationDelivery).values(next_attempt_at=created_at))
+            await db.commit()
+            assert await notifications.deliver_due(db) == 1
+            event = await db.get(OutboxEvent, 1)
+            return event.dispatched_at
+
+    assert asyncio.run(run()) is not None
+    assert [len(stub.sent), len(down.sent)] == [1, 1]
+    assert down.sent[0]["event_id"] == stub.sent[0]["event_id"] == 1
+
+
+def test_triggering_admin_cannot_approve_their_own_deployment(client):
+    service_id, environment_id = prod_environment(client, "payments")
+    deployment_id = trigger(client, service_id, environment_id)["deployment_id"]
+
+    assert approve(client, deployment_id, "tester").status_code == 403
+    res = client.post(
+        f"/api/deployments/{deployment_id}/approvals",
+        json={},
+        headers=auth_headers("dev-1", Role.DEVELOPER),
+    )
+    assert res.status_code == 403
+    assert approve(client, deployment_id, "reviewer").json()["status"] == "pending"
+
+
+def test_failing_consumer_is_retried_then_given_up(primary, db_router, monkeypatch):
+    monkeypatch.setattr(outbox, "_consumers", [])
+    monkeypatch.setattr(get_settings(), "outbox_backoff_base_seconds", 0)
+    seen = []
+
+    async def flaky(_db, events):
+        seen.extend(event.id for event in events)
+        raise RuntimeError("receiver down")
+
+    outbox.subscribe("test.", flaky)
+
+    async def run():
+        async with primary() as db:
+            outbox.emit(db, "test.ping", {"n": 1})
+            outbox.emit(db, "other.ping", {"n": 2})
+            await db.commit()
+            for _ in range(3):
+                await outbox.dispatch_pending(db, max_attempts=2)
+            return (await db.execute(select(OutboxEvent.topic, OutboxEvent.attempts, OutboxEvent.last_error))).all()
+
+    rows = asyncio.run(run())
+    # Two attempts, then given up; the event nobody consumes is dispatched once.
+    assert seen == [1, 1]
+    assert rows == [("test.ping", 2, "RuntimeError: receiver down"), ("other.ping", 0, None)]
+
+
+def test_failed_events_back_off_instead_of_being_retaken_in_the_pass(primary, db_router, monkeypatch):
+    monkeypatch.setattr(outbox, "_consumers", [])
+    monkeypatch.setattr(get_settings(), "outbox_batch_size", 2)
+    seen = []
+
+    async def sink_down(_db, events):
+        seen.extend(event.id for event in events)
+        raise RuntimeError("sink down")
+
+    outbox.subscribe("test.notify", sink_down)
+
+    async def run():
+        async with primary() as db:
+            outbox.emit(db, "test.notify", {})
+            for n in range(5):
+                outbox.emit(db, "test.other", {"n": n})
+            await db.commit()
+            # Full batches keep the pass going; the failed event is not taken again.
+            assert await outbox.dispatch_all(db) == 6
+            assert await outbox.dispatch_all(db) == 0
+            row = await db.get(OutboxEvent, 1)
+            assert (row.attempts, row.dispatched_at) == (1, None) and row.next_attempt_at is not None
+            assert await db.scalar(select(func.count()).where(OutboxEvent.dispatched_at.is_(None))) == 1
+            # Once due again it is retried.
+            await db.execute(update(OutboxEvent).values(next_attempt_at=row.created_at))
+            await db.commit()
+            assert await outbox.dispatch_all(db) == 1
+
+    asyncio.run(run())
+    assert seen == [1, 1]
+
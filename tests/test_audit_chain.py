@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app.models.models import AuditAction, AuditLog
+from app.services import audit_chain, audit_partitions
+
+
+def database_url(sessionmaker):
+    return sessionmaker.kw["bind"].url.render_as_string(hide_password=False)
+
+
+def seed_and_seal(sessionmaker, stamps, batch_size=3):
+    async def run():
+        async with sessionmaker() as session:
+            for idx, stamp in enumerate(stamps):
+                session.add(
+                    AuditLog(
+                        action=AuditAction.updated,
+                        entity_type="service",
+                        entity_id=str(idx),
+                        performed_by="ci",
+                        details={"n": idx},
+                        created_at=stamp,
+                    )
+                )
+            await session.commit()
+            return await audit_chain.seal_all(session, batch_size=batch_size)
+
+    return asyncio.run(run())
+
+
+def execute(sessionmaker, sql):
+    async def run():
+        async with sessionmaker() as session:
+            await session.execute(text(sql))
+            await session.commit()
+
+    asyncio.run(run())
+
+
+def test_merkle_root_of_odd_level_duplicates_last():
+    a, b, c = (audit_chain.row_hash(audit_chain.GENESIS, [str(n)]) for n in range(3))
+    assert audit_chain.merkle_root([a, b, c]) == audit_chain.merkle_root([a, b, c, c])
+    assert audit_chain.merkle_root([a, b]) != audit_chain.merkle_root([b, a])
+
+
+def test_sealed_chain_verifies_across_partitions_and_workers(primary):
+    stamps = [datetime(2026, 9, day) for day in range(1, 6)] + [datetime(2026, 10, day) for day in range(1, 5)]
+    # Batches never cross a month: 3 + 2 in September, 3 + 1 in October.
+    assert seed_and_seal(primary, stamps) == 4
+
+    async def roll():
+        async with primary() as db:
+            return await audit_partitions.roll_partitions(db, now=datetime(2026, 10, 19))
+
+    assert len(asyncio.run(roll())) == 1
+    report = audit_chain.verify_chain(database_url(primary), workers=2, segment_rows=3)
+    assert report.ok, report.broken
+    assert (report.checkpoints, report.rows) == (4, 9)
+    assert report.head_hash != audit_chain.GENESIS
+
+
+def test_tampered_row_is_the_first_broken_link(primary):
+    seed_and_seal(primary, [datetime(2026, 10, day) for day in range(1, 8)])
+    execute(primary, "UPDATE audit_logs SET performed_by = 'mallory' WHERE id = 5")
+    execute(primary, "UPDATE audit_logs SET metadata = '{\"n\": 99}' WHERE id = 6")
+
+    report = audit_chain.verify_chain(database_url(primary), workers=1)
+    assert (report.broken.row_id, report.broken.reason) == (5, "row content does not match its hash")
+
+
+def test_deleted_row_breaks_the_link_after_it(primary):
+    seed_and_seal(primary, [datetime(2026, 10, day) for day in range(1, 8)])
+    execute(primary, "DELETE FROM audit_logs WHERE id = 2")
+
+    report = audit_chain.verify_chain(database_url(primary), workers=1)
+    assert (report.broken.row_id, report.broken.reason) == (3, "row does not link to its predecessor")
+
+
+def test_rewritten_checkpoint_breaks_the_checkpoint_chain(primary):
+    seed_and_seal(primary, [datetime(2026, 10, day) for day in range(1, 8)])
+    execute(primary, "UPDATE audit_checkpoints SET prev_hash = last_hash WHERE id = 2")
+
+    report = audit_chain.verify_chain(database_url(primary), workers=1)
+    assert report.broken.checkpoint_id == 2
+
+
+def test_rolling_seals_pending_rows_first(primary):
+    seed_and_seal(primary, [datetime(2026, 9, day) for day in range(1, 4)])
+    # batch_size=0 seals nothing: these two are still pending when the roll runs.
+    seed_and_seal(primary, [datetime(2026, 9, 20), datetime(2026, 10, 1)], batch_size=0)
+
+    async def roll():
+        async with primary() as db:
+            return await audit_partitions.roll_partitions(db, now=datetime(2026, 10, 19))
+
+    assert len(asyncio.run(roll())) == 1
+    report = audit_chain.verify_chain(database_url(primary), workers=1)
+    assert report.ok, report.broken
+    assert report.rows == 5
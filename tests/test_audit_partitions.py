@@ -0,0 +1,82 @@
+import asyncio
+import csv
+import gzip
+import json
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from app.models.models import AuditAction, AuditLog
+from app.services import audit_partitions
+
+from conftest import auth_headers
+
+NOW = datetime(2026, 10, 19, 12, 0)
+
+
+def seed(sessionmaker, stamps):
+    async def run():
+        async with sessionmaker() as session:
+            for idx, stamp in enumerate(stamps):
+                session.add(
+                    AuditLog(
+                        action=AuditAction.updated,
+                        entity_type="service",
+                        entity_id=str(idx),
+                        performed_by="ci",
+                        details={"n": idx},
+                        created_at=stamp,
+                    )
+                )
+            await session.commit()
+
+    asyncio.run(run())
+
+
+def test_roll_moves_closed_months_and_queries_route(client, primary):
+    seed(primary, [datetime(2026, 8, 3), datetime(2026, 9, 1), datetime(2026, 9, 30), datetime(2026, 10, 2)])
+
+    async def roll_and_query():
+        async with primary() as db:
+            moved = await audit_partitions.roll_partitions(db, now=NOW)
+            head_rows = await db.scalar(select(func.count()).select_from(AuditLog))
+            months = await audit_partitions.list_partitions(db)
+            september = await audit_partitions.query_audit(
+                db, since=datetime(2026, 9, 1), until=datetime(2026, 10, 1)
+            )
+            everything = await audit_partitions.query_audit(db)
+            return moved, head_rows, months, september, everything
+
+    moved, head_rows, months, september, everything = asyncio.run(roll_and_query())
+    assert [m.isoformat() for m in moved] == ["2026-08-01", "2026-09-01"]
+    assert [m.isoformat() for m in months] == ["2026-08-01", "2026-09-01"]
+    assert head_rows == 1
+    assert [row["entity_id"] for row in september] == ["2", "1"]
+    assert [row["entity_id"] for row in everything] == ["3", "2", "1", "0"]
+
+    res = client.get(
+        "/api/audit?since=2026-08-01T00:00:00&until=2026-09-01T00:00:00", headers=auth_headers("admin")
+    )
+    assert res.status_code == 200, res.text
+    assert [(row["entity_id"], row["metadata"]) for row in res.json()] == [("0", {"n": 0})]
+
+
+def test_retention_archives_then_drops(primary, tmp_path):
+    seed(primary, [datetime(2025, 1, 5), datetime(2025, 1, 6), datetime(2026, 9, 9)])
+
+    async def maintain():
+        async with primary() as db:
+            report = await audit_partitions.run_maintenance(
+                db, retain_months=3, archive_dir=str(tmp_path / "archive"), now=NOW
+            )
+            return report, await audit_partitions.list_partitions(db)
+
+    report, remaining = asyncio.run(maintain())
+    assert report["rolled"] == ["2025-01-01", "2026-09-01"]
+    assert [m.isoformat() for m in remaining] == ["2026-09-01"]
+    [path] = report["archived"]
+    with gzip.open(path, "rt", newline="") as handle:
+        rows = list(csv.DictReader(handle))
+    assert [row["entity_id"] for row in rows] == ["0", "1"]
+    assert json.loads(rows[1]["metadata"]) == {"n": 1}
+    assert rows[0]["created_at"] == "2025-01-05T00:00:00"
@@ -0,0 +1,38 @@
+import asyncio
+
+from benchmarks import runner, seed
+from benchmarks.scenarios import SCENARIOS, load_context
+from app.services.jobs import drain
+
+
+def test_benchmark_suite_runs_and_flags_regressions(primary, db_router):
+    scenarios = {s.name: s for s in SCENARIOS}
+    picked = [scenarios[name] for name in ("register_service", "provision_environment", "list_envs", "get_job")]
+    picked.insert(3, scenarios["trigger_deployment"])
+
+    async def run():
+        async with primary() as db:
+            counts = await seed.seed(db, seed.Scale(teams=3, services=12, deployments=50))
+            ctx = await load_context(db, run="t")
+        runner.count_queries(primary.kw["bind"])
+        results = await runner.run_all(ctx, picked, requests=8, concurrency=4, alloc_samples=2)
+        await drain()
+        return counts, ctx, results
+
+    counts, ctx, results = asyncio.run(run())
+
+    assert counts == {"teams": 3, "services": 12, "deployments": 50}
+    assert len(ctx.services) == 12 and len(ctx.created["services"]) == 8
+    by_name = {r.name: r for r in results}
+    assert [r.errors for r in results] == [0] * len(results)
+    assert by_name["register_service"].requests == 6
+    assert by_name["register_service"].queries_per_request > by_name["list_envs"].queries_per_request > 0
+    assert by_name["get_job"].queries_per_request == 0
+    assert all(r.p50_ms <= r.p95_ms <= r.p99_ms and r.alloc_kib_per_request > 0 for r in results)
+
+    baseline = {r.name: runner.asdict(r) for r in results}
+    assert runner.compare(results, baseline) == []
+    baseline["list_envs"].update(queries_per_request=by_name["list_envs"].queries_per_request - 1)
+    baseline["get_job"].update(p50_ms=by_name["get_job"].p50_ms / 10)
+    problems = runner.compare(results, baseline, min_latency_ms=0)
+    assert [p.split(":")[0] for p in problems] == ["list_envs", "get_job"]
@@ -0,0 +1,68 @@
+import asyncio
+
+from app.services import changes
+
+from conftest import auth_headers
+
+
+def test_diff_keeps_changed_fields_only():
+    before = {"name": "pay", "tags": {"owner": "a"}, "team_id": None}
+    after = {"name": "pay", "tags": {"owner": "b"}, "team_id": 3}
+    assert changes.diff(before, after) == {"tags": [{"owner": "a"}, {"owner": "b"}], "team_id": [None, 3]}
+    assert changes.diff({}, {"name": "pay"}) == {"name": [None, "pay"]}
+
+
+def test_feed_is_sequenced_and_compact(client):
+    headers = auth_headers()
+    service_id = client.post(
+        "/api/services",
+        json={"name": "pay-api", "tags": {"owner": "payments", "data_sensitivity": "internal"}},
+        headers=headers,
+    ).json()["id"]
+    client.patch(
+        f"/api/services/{service_id}",
+        json={"description": "card payments", "tags": {"owner": "payments", "data_sensitivity": "internal"}},
+        headers=headers,
+    )
+    # A no-op update is not a change.
+    client.patch(f"/api/services/{service_id}", json={"description": "card payments"}, headers=headers)
+    client.post(f"/api/services/{service_id}/environments", json={"name": "dev", "tier": "dev"}, headers=headers)
+
+    feed = client.get("/api/changes", headers=headers).json()
+    assert [(c["entity_type"], c["op"]) for c in feed] == [
+        ("service", "created"),
+        ("service", "updated"),
+        ("environment", "created"),
+    ]
+    seqs = [c["seq"] for c in feed]
+    assert seqs == sorted(seqs) and len(set(seqs)) == 3
+    assert feed[1]["diff"] == {"description": [None, "card payments"]}
+    assert feed[2]["diff"]["tier"] == [None, "dev"]
+
+    rest = client.get(f"/api/changes?after={seqs[0]}&limit=1", headers=headers).json()
+    assert [c["seq"] for c in rest] == [seqs[1]]
+    envs = client.get("/api/changes?entity_type=environment", headers=headers).json()
+    assert [c["seq"] for c in envs] == [seqs[2]]
+
+
+def test_stream_yields_frames_from_cursor(client):
+    headers = auth_headers()
+    for name in ("a-api", "b-api"):
+        client.post(
+            "/api/services",
+            json={"name": name, "tags": {"owner": "t", "data_sensitivity": "internal"}},
+            headers=headers,
+        )
+    first_seq = client.get("/api/changes", headers=headers).json()[0]["seq"]
+
+    async def take(count):
+        frames = []
+        async for frame in changes.stream_changes(first_seq, poll_interval=0.01, heartbeat_interval=0.01):
+            frames.append(frame)
+            if len(frames) == count:
+                return frames
+
+    data_frame, keepalive = asyncio.run(take(2))
+    assert data_frame.startswith(f"id: {first_seq + 1}\nevent: change\n")
+    assert '"b-api"' in data_frame
+    assert keepalive == ": keepalive\n\n"
@@ -0,0 +1,124 @@
+import asyncio
+
+from sqlalchemy import update
+
+from app.core.config import get_settings
+from app.services import config_layers
+from app.models.models import Team
+from app.services.config_layers import merge
+
+from conftest import auth_headers
+
+TAGS = {"owner": "t", "data_sensitivity": "internal"}
+
+
+def service_in_team(client, name, team_id, env_config):
+    service_id = client.post("/api/services", json={"name": name, "tags": TAGS}, headers=auth_headers()).json()["id"]
+    client.post(f"/api/services/{service_id}/team", params={"team_id": team_id}, headers=auth_headers())
+    env = client.post(
+        f"/api/services/{service_id}/environments",
+        json={"name": "dev", "tier": "dev", "config": env_config},
+        headers=auth_headers(),
+    ).json()
+    return service_id, env["id"]
+
+
+def rendered(client, service_id, environment_id):
+    res = client.get(f"/api/services/{service_id}/environments/{environment_id}/config/rendered", headers=auth_headers())
+    assert res.status_code == 200, res.text
+    return res.json()
+
+
+def merge_count():
+    return sum(
+        config_layers.merges.labels(layer)._value.get() for layer in ("teams", "services", "environments")
+    )
+
+
+def test_layers_merge_in_order(client, monkeypatch):
+    monkeypatch.setattr(get_settings(), "config_platform_defaults", {"log_level": "info", "replicas": 1})
+    team = client.post("/api/teams", json={"name": "payments"}, headers=auth_headers()).json()["id"]
+    service_id, env_id = service_in_team(client, "billing", team, {"replicas": 3, "debug": None})
+
+    res = client.put(
+        f"/api/teams/{team}/config",
+        json={"config": {"resources": {"cpu": "250m", "memory": "512Mi"}, "debug": True}},
+        headers=auth_headers(),
+    )
+    assert res.status_code == 200
+    client.put(
+        f"/api/services/{service_id}/config", json={"config": {"resources": {"memory": "1Gi"}}}, headers=auth_headers()
+    )
+    assert client.get(f"/api/services/{service_id}/config", headers=auth_headers()).json()["config"] == {
+        "resources": {"memory": "1Gi"}
+    }
+
+    body = rendered(client, service_id, env_id)
+    assert body["config"] == {"log_level": "info", "replicas": 3, "resources": {"cpu": "250m", "memory": "1Gi"}}
+    assert body["layers"]["team"] == config_layers.content_hash(
+        {"resources": {"cpu": "250m", "memory": "512Mi"}, "debug": True}
+    )
+    assert body["config_hash"] == config_layers.content_hash(body["config"])
+
+
+def test_a_team_change_re_renders_only_that_team(client):
+    payments = client.post("/api/teams", json={"name": "payments"}, headers=auth_headers()).json()["id"]
+    search = client.post("/api/teams", json={"name": "search"}, headers=auth_headers()).json()["id"]
+    billing = service_in_team(client, "billing", payments, {"replicas": 2})
+    indexer = service_in_team(client, "indexer", search, {"replicas": 5})
+    rendered(client, *billing)
+    rendered(client, *indexer)
+
+    before = merge_count()
+    rendered(client, *billing)
+    rendered(client, *indexer)
+    assert merge_count() == before
+
+    client.put(f"/api/teams/{payments}/config", json={"config": {"region": "eu"}}, headers=auth_headers())
+    assert rendered(client, *indexer)["config"] == {"replicas": 5}
+    assert merge_count() == before
+    assert rendered(client, *billing)["config"] == {"region": "eu", "replicas": 2}
+    assert merge_count() == before + 3
+
+
+def test_guardrails_apply_to_the_rendered_config(client, monkeypatch):
+    team = client.post("/api/teams", json={"name": "payments"}, headers=auth_headers()).json()["id"]
+    service_id, env_id = service_in_team(client, "billing", team, {})
+    refused = client.put(f"/api/teams/{team}/config", json={"config": {"Token": "x"}}, headers=auth_headers())
+    assert refused.status_code == 400
+
+    monkeypatch.setattr(get_settings(), "config_platform_defaults", {"secret": "x"})
+    res = client.get(f"/api/services/{service_id}/environments/{env_id}/config/rendered", headers=auth_headers())
+    assert res.status_code == 400
+    assert "Restricted configuration key: secret" in res.json()["error"]["message"]
+    # An environment layer can drop the inherited key.
+    res = client.put(
+        f"/api/services/{service_id}/environments/{env_id}/config", json={"config": {"secret": None}}, headers=auth_headers()
+    )
+    assert res.status_code == 200
+    assert rendered(client, service_id, env_id)["config"] == {}
+
+
+def test_moving_a_service_checks_the_new_team_layer(client, primary):
+    clean = client.post("/api/teams", json={"name": "payments"}, headers=auth_headers()).json()["id"]
+    loaded = client.post("/api/teams", json={"name": "imported"}, headers=auth_headers()).json()["id"]
+    service_id, env_id = service_in_team(client, "billing", clean, {"replicas": 2})
+
+    async def bulk_load():
+        # As a bulk loader would: no write path, no validation, no hash.
+        async with primary() as db:
+            await db.execute(update(Team).where(Team.id == loaded).values(config={"token": "x"}, config_hash=None))
+            await db.commit()
+
+    asyncio.run(bulk_load())
+    moved = client.post(f"/api/services/{service_id}/team", params={"team_id": loaded}, headers=auth_headers())
+    assert moved.status_code == 400
+    patched = client.patch(f"/api/services/{service_id}", json={"team_id": loaded}, headers=auth_headers())
+    assert patched.status_code == 400
+    assert rendered(client, service_id, env_id)["config"] == {"replicas": 2}
+
+
+def test_merge_replaces_non_objects_and_drops_nulls():
+    base = {"a": {"b": 1, "c": 2}, "d": [1], "e": 1}
+    assert merge(base, {"a": {"c": None, "f": 3}, "d": [2], "e": None}) == {"a": {"b": 1, "f": 3}, "d": [2]}
+    assert base == {"a": {"b": 1, "c": 2}, "d": [1], "e": 1}
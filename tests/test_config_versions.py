@@ -0,0 +1,90 @@
+import asyncio
+
+from sqlalchemy import func, select
+
+from app.models.models import ConfigBlob, OutboxEvent
+from app.services.config_layers import content_hash
+from app.services.config_versions import diff_configs
+
+from conftest import auth_headers
+
+
+def environment(client, service_name, config):
+    service_id = client.post(
+        "/api/services",
+        json={"name": service_name, "tags": {"owner": "t", "data_sensitivity": "internal"}},
+        headers=auth_headers(),
+    ).json()["id"]
+    env = client.post(
+        f"/api/services/{service_id}/environments",
+        json={"name": "dev", "tier": "dev", "config": config},
+        headers=auth_headers(),
+    ).json()
+    return service_id, env
+
+
+def test_versions_are_recorded_deduplicated_and_diffed(client, primary):
+    base = {"replicas": 2, "resources": {"cpu": "500m", "memory": "1Gi"}}
+    billing, env = environment(client, "billing", base)
+    _, other = environment(client, "ledger", {"resources": {"memory": "1Gi", "cpu": "500m"}, "replicas": 2})
+    assert env["config_hash"] == other["config_hash"] == content_hash(base)
+
+    path = f"/api/services/{billing}/environments/{env['id']}/config"
+    bigger = {"replicas": 4, "resources": {"cpu": "500m", "memory": "2Gi"}, "region": "eu"}
+    res = client.put(path, json={"config": bigger}, headers=auth_headers())
+    assert res.status_code == 200
+    assert res.json()["version"] == 2
+    # Same content again: no new version.
+    assert client.put(path, json={"config": bigger}, headers=auth_headers()).json()["version"] == 2
+
+    versions = client.get(f"{path}/versions", headers=auth_headers()).json()
+    assert [v["version"] for v in versions] == [2, 1]
+    assert client.get(f"{path}/versions/1", headers=auth_headers()).json()["config"] == base
+
+    diff = client.get(f"{path}/diff", params={"from": 1}, headers=auth_headers()).json()
+    assert diff["to_version"] == 2 and not diff["identical"]
+    assert diff["changes"] == [
+        {"path": "region", "op": "added", "old": None, "new": "eu"},
+        {"path": "replicas", "op": "changed", "old": 2, "new": 4},
+        {"path": "resources.memory", "op": "changed", "old": "1Gi", "new": "2Gi"},
+    ]
+
+    async def blob_count():
+        async with primary() as db:
+            return await db.scalar(select(func.count()).select_from(ConfigBlob))
+
+    # Two environments and three versions share two blobs.
+    assert asyncio.run(blob_count()) == 2
+
+
+def test_rollback_appends_a_version_with_the_old_content(client, primary):
+    service_id, env = environment(client, "billing", {"replicas": 1})
+    path = f"/api/services/{service_id}/environments/{env['id']}/config"
+    client.put(path, json={"config": {"replicas": 3}}, headers=auth_headers())
+
+    res = client.post(f"{path}/rollback", json={"version": 1}, headers=auth_headers())
+    assert res.status_code == 200
+    assert res.json()["version"] == 3 and res.json()["rolled_back_from"] == 1
+    assert res.json()["config_hash"] == env["config_hash"]
+    current = client.get(f"/api/services/{service_id}/environments", headers=auth_headers()).json()[0]
+    assert current["config"] == {"replicas": 1}
+    assert client.get(f"{path}/diff", params={"from": 1, "to": 3}, headers=auth_headers()).json()["identical"]
+
+    assert client.post(f"{path}/rollback", json={"version": 9}, headers=auth_headers()).status_code == 404
+    refused = client.put(path, json={"config": {"password": "x"}}, headers=auth_headers())
+    assert refused.status_code == 400
+
+    async def topics():
+        async with primary() as db:
+            return (await db.scalars(select(OutboxEvent.topic).where(OutboxEvent.topic.like("environment.config%")))).all()
+
+    assert asyncio.run(topics()) == ["environment.config_updated", "environment.config_updated"]
+
+
+def test_diff_configs_recurses_into_objects():
+    assert diff_configs({"a": {"b": 1, "c": [1]}}, {"a": {"c": [2]}, "d": None}) == [
+        {"path": "a.b", "op": "removed", "old": 1, "new": None},
+        {"path": "a.c", "op": "changed", "old": [1], "new": [2]},
+        {"path": "d", "op": "added", "old": None, "new": None},
+    ]
+    assert diff_configs({"a": 1}, {"a": {"b": 1}}) == [{"path": "a", "op": "changed", "old": 1, "new": {"b": 1}}]
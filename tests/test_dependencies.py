@@ -0,0 +1,91 @@
+import random
+
+from app.services.dependencies import DependencyGraph
+
+from conftest import auth_headers
+
+
+def register(client, name):
+    res = client.post(
+        "/api/services",
+        json={"name": name, "tags": {"owner": "t", "data_sensitivity": "internal"}},
+        headers=auth_headers(),
+    )
+    return res.json()["id"]
+
+
+def depend(client, service_id, depends_on_id):
+    return client.post(
+        f"/api/services/{service_id}/dependencies", json={"depends_on_id": depends_on_id}, headers=auth_headers()
+    )
+
+
+def test_impact_analysis_and_cycle_rejection(client):
+    db, billing, checkout, web = (register(client, name) for name in ("billing-db", "billing", "checkout", "web"))
+    for service_id, depends_on_id in ((billing, db), (checkout, billing), (web, checkout)):
+        assert depend(client, service_id, depends_on_id).status_code == 201
+
+    res = client.get(f"/api/services/{db}/dependents", headers=auth_headers())
+    assert res.json() == [
+        {"service_id": billing, "depth": 1},
+        {"service_id": checkout, "depth": 2},
+        {"service_id": web, "depth": 3},
+    ]
+    res = client.get(f"/api/services/{web}/dependencies?max_depth=1", headers=auth_headers())
+    assert res.json() == [{"service_id": checkout, "depth": 1}]
+
+    assert depend(client, db, web).status_code == 409
+    assert depend(client, db, db).status_code == 400
+    assert client.get("/api/dependencies/cycles", headers=auth_headers()).json() == []
+
+    res = client.get(f"/api/dependencies/deploy-order?service_id={web}&service_id={db}", headers=auth_headers())
+    assert res.json() == {"waves": [[db], [web]]}
+
+    res = client.delete(f"/api/services/{checkout}/dependencies/{billing}", headers=auth_headers())
+    assert res.status_code == 204
+    assert client.get(f"/api/services/{db}/dependents", headers=auth_headers()).json() == [
+        {"service_id": billing, "depth": 1}
+    ]
+    changes = client.get("/api/changes?entity_type=service_dependency", headers=auth_headers()).json()
+    assert [change["op"] for change in changes] == ["created"] * 3 + ["deleted"]
+
+
+def test_cycles_and_waves_on_a_preloaded_graph():
+    graph = DependencyGraph()
+    graph.load([(1, 2), (2, 3), (3, 1), (4, 4), (5, 1), (6, 7)])
+    assert graph.cycles() == [[1, 2, 3], [4]]
+    assert graph.deploy_waves([6, 7]) == [[7], [6]]
+    try:
+        graph.deploy_waves([5])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("cycle not detected")
+
+
+def test_waves_stay_ordered_while_a_cycle_exists():
+    graph = DependencyGraph()
+    graph.load([(1, 2), (2, 1), (10, 11)])
+    graph.add_edge(12, 10)
+    graph.add_edge(11, 13)
+    assert graph.deploy_waves([10, 11, 12, 13]) == [[13], [11], [10], [12]]
+
+
+def test_large_graph_queries():
+    rng = random.Random(7)
+    nodes = 50_000
+    # Edges only point at lower ids, so the graph is acyclic.
+    edges = {(node, rng.randrange(node)) for node in range(1, nodes) for _ in range(3)}
+    graph = DependencyGraph()
+    graph.load(edges)
+
+    assert len(graph.dependents(0)) == nodes - 1
+    assert graph.cycles() == []
+    requested = rng.sample(range(nodes), 200)
+    waves = graph.deploy_waves(requested)
+    assert sorted(node for wave in waves for node in wave) == sorted(requested)
+    position = {node: idx for idx, wave in enumerate(waves) for node in wave}
+    for node in requested:
+        for dependency in graph.dependencies(node):
+            if dependency in position:
+                assert position[dependency] < position[node]
@@ -0,0 +1,213 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from app.core.config import get_settings
+from app.core.ratelimit import limiter
+from app.main import app
+from app.models.models import AuditLog, Deployment, DeploymentStatus, Environment, EnvironmentTier, IdempotencyKey, Service
+from app.services import deployment as deployment_service
+from app.services import idempotency
+from app.services.jobs import drain
+
+from conftest import auth_headers
+
+
+def seed_deployment(sessionmaker, status=DeploymentStatus.pending) -> int:
+    async def seed():
+        async with sessionmaker() as session:
+            service = Service(name="svc", tags={"owner": "t", "data_sensitivity": "internal"})
+            environment = Environment(name="dev", tier=EnvironmentTier.dev, service=service)
+            deployment = Deployment(
+                service=service, environment=environment, version="1.0", status=status, initiated_by="ci"
+            )
+            session.add(deployment)
+            await session.commit()
+            return deployment.id
+
+    return asyncio.run(seed())
+
+
+def load_status(sessionmaker, deployment_id: int) -> DeploymentStatus:
+    async def load():
+        async with sessionmaker() as session:
+            return await session.scalar(select(Deployment.status).where(Deployment.id == deployment_id))
+
+    return asyncio.run(load())
+
+
+def test_transition_is_compare_and_swap(primary):
+    deployment_id = seed_deployment(primary)
+
+    async def swap_twice():
+        async with primary() as db:
+            first = await deployment_service.transition_status(
+                db, deployment_id, DeploymentStatus.pending, DeploymentStatus.running
+            )
+            second = await deployment_service.transition_status(
+                db, deployment_id, DeploymentStatus.pending, DeploymentStatus.running
+            )
+            await db.commit()
+            return first, second
+
+    assert asyncio.run(swap_twice()) == (True, False)
+    assert load_status(primary, deployment_id) == DeploymentStatus.running
+
+
+def test_illegal_transition_rejected(primary):
+    deployment_id = seed_deployment(primary)
+
+    async def skip_running():
+        async with primary() as db:
+            await deployment_service.transition_status(
+                db, deployment_id, DeploymentStatus.pending, DeploymentStatus.succeeded
+            )
+
+    with pytest.raises(ValueError):
+        asyncio.run(skip_running())
+
+
+def test_concurrent_workers_run_deployment_once(primary, db_router):
+    deployment_id = seed_deployment(primary)
+    runs = []
+
+    async def rollout():
+        runs.append(deployment_id)
+
+    async def race():
+        results = await asyncio.gather(
+            *(deployment_service.run_deployment(deployment_id, "worker", rollout) for _ in range(5))
+        )
+        await drain()  # transition event handlers
+        return results
+
+    results = asyncio.run(race())
+    assert sorted(results) == [False, False, False, False, True]
+    assert runs == [deployment_id]
+    assert load_status(primary, deployment_id) == DeploymentStatus.succeeded
+
+
+def test_failed_rollout_marks_deployment_failed(primary, db_router):
+    deployment_id = seed_deployment(primary)
+
+    async def rollout():
+        raise RuntimeError("boom")
+
+    async def run():
+        try:
+            await deployment_service.run_deployment(deployment_id, "worker", rollout)
+        finally:
+            await drain()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
+    assert load_status(primary, deployment_id) == DeploymentStatus.failed
+
+    async def audit_statuses():
+        async with primary() as session:
+            rows = await session.scalars(select(AuditLog).where(AuditLog.entity_id == str(deployment_id)))
+            return [row.details["status"] for row in rows]
+
+    assert asyncio.run(audit_statuses()) == ["running", "failed"]
+
+
+def test_triggered_deployment_runs_to_success(client):
+    headers = auth_headers()
+    service = client.post(
+        "/api/services",
+        json={"name": "billing", "tags": {"owner": "t", "data_sensitivity": "internal"}},
+        headers=headers,
+    ).json()
+    environment = client.post(
+        f"/api/services/{service['id']}/environments", json={"name": "dev", "tier": "dev"}, headers=headers
+    ).json()
+
+    res = client.post(
+        f"/api/services/{service['id']}/environments/{environment['id']}/deployments",
+        json={"version": "1.0", "initiated_by": "ci"},
+        headers=headers,
+    )
+    assert res.status_code == 202, res.text
+
+    history = client.get(f"/api/services/{service['id']}/deployments", headers=headers).json()
+    assert [d["status"] for d in history] == ["succeeded"]
+
+
+def seed_environment(client, headers, name="billing"):
+    service = client.post(
+        "/api/services",
+        json={"name": name, "tags": {"owner": "t", "data_sensitivity": "internal"}},
+        headers=headers,
+    ).json()
+    environment = client.post(
+        f"/api/services/{service['id']}/environments", json={"name": "dev", "tier": "dev"}, headers=headers
+    ).json()
+    return service["id"], environment["id"]
+
+
+def test_concurrent_identical_triggers_create_one_deployment(client, monkeypatch):
+    # A 200-request burst is past the write rate limit; this is about dedupe.
+    monkeypatch.setattr(limiter, "_settings", get_settings().model_copy(update={"rate_limit_enabled": False}))
+    headers = auth_headers()
+    service_id, environment_id = seed_environment(client, headers)
+    url = f"/api/services/{service_id}/environments/{environment_id}/deployments"
+
+    async def fire():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(
+                *(http.post(url, json={"version": "2.0", "initiated_by": "ci"}, headers=headers) for _ in range(200))
+            )
+
+    responses = asyncio.run(fire())
+    assert {res.status_code for res in responses} == {202}
+    assert len({res.json()["job_id"] for res in responses}) == 1
+
+    history = client.get(f"/api/services/{service_id}/deployments", headers=headers).json()
+    assert len(history) == 1
+
+
+def test_idempotency_key_replays_original_response(client):
+    headers = auth_headers()
+    service_id, environment_id = seed_environment(client, headers)
+    url = f"/api/services/{service_id}/environments/{environment_id}/deployments"
+    keyed = {**headers, "Idempotency-Key": "ci-run-42"}
+
+    first = client.post(url, json={"version": "3.0", "initiated_by": "ci"}, headers=keyed)
+    replay = client.post(url, json={"version": "3.0", "initiated_by": "ci"}, headers=keyed)
+    assert first.status_code == replay.status_code == 202
+    assert replay.json() == first.json()
+    assert replay.headers["Idempotent-Replayed"] == "true"
+
+    mismatch = client.post(url, json={"version": "3.1", "initiated_by": "ci"}, headers=keyed)
+    assert mismatch.status_code == 422
+
+
+def test_expired_idempotency_keys_are_purged_in_the_background(primary, db_router):
+    ttl = timedelta(seconds=get_settings().idempotency_key_ttl_seconds)
+
+    async def run():
+        async with primary() as db:
+            for key, age in (("old", ttl * 2), ("fresh", timedelta(0))):
+                db.add(
+                    IdempotencyKey(
+                        key=key,
+                        request_fingerprint="f",
+                        status_code=202,
+                        response_body={},
+                        created_at=datetime.utcnow() - age,
+                    )
+                )
+            await db.commit()
+        stop = asyncio.Event()
+        purger = asyncio.ensure_future(idempotency.run_purger(stop, interval=0.01))
+        await asyncio.sleep(0.1)
+        stop.set()
+        await purger
+        async with primary() as db:
+            return list(await db.scalars(select(IdempotencyKey.key)))
+
+    assert asyncio.run(run()) == ["fresh"]
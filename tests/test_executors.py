@@ -0,0 +1,188 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.config import get_settings
+from app.models.models import Deployment, DeploymentStatus, Environment, EnvironmentTier, Service
+from app.services import deployment as deployment_service
+from app.services import executors
+from app.services.executors import ScriptExecutor, SubprocessExecutor, fake_executor
+from app.services.jobs import JobCancelled, drain, registry, run_job
+
+from conftest import auth_headers
+
+TAGS = {"owner": "t", "data_sensitivity": "internal"}
+
+
+def seed_deployment(sessionmaker, name="billing") -> int:
+    async def seed():
+        async with sessionmaker() as session:
+            service = Service(name=name, tags=TAGS)
+            environment = Environment(name="dev", tier=EnvironmentTier.dev, service=service)
+            deployment = Deployment(
+                service=service,
+                environment=environment,
+                version="1.4.0",
+                status=DeploymentStatus.pending,
+                initiated_by="ci",
+            )
+            session.add(deployment)
+            await session.commit()
+            return deployment.id
+
+    return asyncio.run(seed())
+
+
+def use(monkeypatch, executor):
+    monkeypatch.setattr(executors, "executor_from_settings", lambda: executor)
+
+
+def steps(job_id):
+    return [(step.name, step.status, step.detail) for step in registry.get(job_id).steps]
+
+
+def test_fake_steps_are_reported_on_the_job(client, monkeypatch):
+    monkeypatch.setattr(fake_executor, "failing", {"verify": "smoke tests failed"})
+    service_id = client.post(
+        "/api/services", json={"name": "billing", "tags": TAGS}, headers=auth_headers()
+    ).json()["id"]
+    env_id = client.post(
+        f"/api/services/{service_id}/environments", json={"name": "dev", "tier": "dev"}, headers=auth_headers()
+    ).json()["id"]
+    url = f"/api/services/{service_id}/environments/{env_id}/deployments"
+    job_id = client.post(url, json={"version": "1.0", "initiated_by": "ci"}, headers=auth_headers()).json()["job_id"]
+
+    job = client.get(f"/api/jobs/{job_id}", headers=auth_headers()).json()
+    assert job["status"] == "failed" and job["detail"] == "smoke tests failed"
+    assert [(s["name"], s["status"]) for s in job["steps"]] == [
+        ("prepare", "succeeded"),
+        ("rollout", "succeeded"),
+        ("verify", "failed"),
+    ]
+    assert all(s["finished_at"] >= s["started_at"] for s in job["steps"])
+    history = client.get(f"/api/services/{service_id}/deployments", headers=auth_headers()).json()
+    assert history[0]["status"] == "failed"
+    # Over: nothing left to cancel.
+    assert client.post(f"/api/jobs/{job_id}/cancel", headers=auth_headers()).status_code == 409
+    assert client.post("/api/jobs/nope/cancel", headers=auth_headers()).status_code == 404
+    registry.create("queued", "deployment")
+    res = client.post("/api/jobs/queued/cancel", headers=auth_headers())
+    assert res.status_code == 202 and res.json()["detail"] == "Cancellation requested"
+    assert registry.get("queued").cancel.is_set()
+
+
+async def run(deployment_id, job_id="job"):
+    registry.create(job_id, "deployment")
+    rollout = deployment_service.run_deployment(
+        deployment_id, "worker", lambda: executors.execute(job_id, deployment_id)
+    )
+    try:
+        await run_job(job_id, rollout)
+    finally:
+        await drain()  # transition event handlers
+
+
+def test_script_steps_and_output(primary, db_router, monkeypatch, tmp_path):
+    script = tmp_path / "deploy.sh"
+    script.write_text(
+        'echo "::step build"\n'
+        'echo "building $IDP_SERVICE $IDP_VERSION for $IDP_ENVIRONMENT"\n'
+        'echo "::step rollout"\n'
+        'echo "rolled out"\n'
+    )
+    use(monkeypatch, ScriptExecutor(str(script)))
+    deployment_id = seed_deployment(primary)
+
+    asyncio.run(run(deployment_id))
+    assert registry.get("job").status == "succeeded"
+    assert steps("job") == [
+        ("script", "succeeded", None),
+        ("build", "succeeded", "building billing 1.4.0 for dev"),
+        ("rollout", "succeeded", "rolled out"),
+    ]
+
+
+def test_failing_command_fails_its_step(primary, db_router, monkeypatch):
+    use(monkeypatch, SubprocessExecutor({"check": ["echo", "{service}@{version}"], "rollout": ["false"]}))
+    deployment_id = seed_deployment(primary)
+
+    with pytest.raises(RuntimeError, match="false exited with status 1"):
+        asyncio.run(run(deployment_id))
+    assert steps("job") == [
+        ("check", "succeeded", "billing@1.4.0"),
+        ("rollout", "failed", "false exited with status 1"),
+    ]
+
+
+def test_cancel_terminates_the_process(primary, db_router, monkeypatch, tmp_path):
+    script = tmp_path / "deploy.sh"
+    script.write_text('echo "::step rollout"\nsleep 30\n')
+    use(monkeypatch, ScriptExecutor(str(script)))
+    deployment_id = seed_deployment(primary)
+
+    async def cancel_while_running():
+        task = asyncio.ensure_future(run(deployment_id))
+        while steps("job")[-1:] != [("rollout", "running", None)]:
+            await asyncio.sleep(0.01)
+        assert registry.get("job").status == "running"
+        assert registry.cancel("job")
+        started = time.monotonic()
+        with pytest.raises(JobCancelled):
+            await task
+        return time.monotonic() - started
+
+    assert asyncio.run(cancel_while_running()) < 5
+    assert registry.get("job").status == "cancelled"
+    assert steps("job")[-1] == ("rollout", "cancelled", None)
+
+
+def test_timeout_stops_and_fails_the_deployment(primary, db_router, monkeypatch):
+    monkeypatch.setattr(get_settings(), "execution_timeout_seconds", 0.2)
+    use(monkeypatch, SubprocessExecutor({"rollout": ["sleep", "30"]}))
+    deployment_id = seed_deployment(primary)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(run(deployment_id))
+    assert registry.get("job").status == "failed"
+    assert steps("job") == [("rollout", "failed", "Timed out after 0.2s")]
+
+
+def test_processes_are_bounded(primary, db_router, monkeypatch, tmp_path):
+    monkeypatch.setattr(get_settings(), "execution_max_processes", 1)
+    log = tmp_path / "log"
+    command = f"echo start >> {log}; sleep 0.1; echo end >> {log}"
+    use(monkeypatch, SubprocessExecutor({"rollout": ["sh", "-c", command]}))
+    deployment_ids = [seed_deployment(primary, f"svc{n}") for n in range(3)]
+
+    async def run_all():
+        await asyncio.gather(*(run(d, f"job-{d}") for d in deployment_ids))
+
+    asyncio.run(run_all())
+    assert log.read_text().split() == ["start", "end"] * 3
+
+
+def test_cancel_stops_waiting_for_a_slot(primary, db_router, monkeypatch):
+    monkeypatch.setattr(get_settings(), "execution_max_processes", 1)
+    use(monkeypatch, SubprocessExecutor({"rollout": ["sh", "-c", "echo started; sleep 30"]}))
+    running, queued = (seed_deployment(primary, f"svc{n}") for n in range(2))
+
+    async def cancel_queued():
+        first = asyncio.ensure_future(run(running, "running"))
+        while registry.get("running") is None or steps("running") != [("rollout", "running", "started")]:
+            await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(run(queued, "queued"))
+        while registry.get("queued") is None or steps("queued") != [("rollout", "running", None)]:
+            await asyncio.sleep(0.01)
+        assert registry.cancel("queued")
+        with pytest.raises(JobCancelled):
+            await asyncio.wait_for(second, 5)
+        assert not first.done()
+        registry.cancel("running")
+        with pytest.raises(JobCancelled):
+            await first
+        # The slot was handed back, not leaked to the cancelled waiter.
+        assert executors.process_slots()._value == 1
+
+    asyncio.run(cancel_queued())
+    assert steps("queued") == [("rollout", "cancelled", None)]
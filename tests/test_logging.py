@@ -0,0 +1,83 @@
+import io
+import json
+import logging
+import queue
+from logging.handlers import QueueListener
+
+from app.core import logging as app_logging
+from app.core.logging import DebugSamplingFilter, JsonFormatter, NonBlockingQueueHandler, RequestIdFilter
+from app.core.request_context import set_request_id
+
+
+def pipeline(name, *, maxsize=100, sample_rate=1.0, listen=True):
+    stream = io.StringIO()
+    console = logging.StreamHandler(stream)
+    console.setFormatter(JsonFormatter())
+    records = queue.Queue(maxsize=maxsize)
+    handler = NonBlockingQueueHandler(records)
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(DebugSamplingFilter(sample_rate))
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    listener = QueueListener(records, console)
+    if listen:
+        listener.start()
+    return logger, listener, stream
+
+
+def lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_are_json_with_request_id_extra_fields_and_tracebacks():
+    logger, listener, stream = pipeline("test.json")
+    set_request_id("req-1")
+    logger.info('quoted "%s" and a \\ backslash', "value", extra={"deployment_id": 7})
+    try:
+        raise ValueError("bad")
+    except ValueError:
+        logger.exception("failed\non two lines")
+    set_request_id("-")
+    listener.stop()
+
+    info, error = lines(stream)
+    assert info["message"] == 'quoted "value" and a \\ backslash'
+    assert info["request_id"] == "req-1" and info["deployment_id"] == 7
+    assert info["level"] == "INFO" and info["logger"] == "test.json"
+    assert error["message"] == "failed\non two lines"
+    assert error["exception"].startswith("Traceback") and "ValueError: bad" in error["exception"]
+
+
+def test_debug_records_are_sampled_per_request():
+    logger, listener, stream = pipeline("test.sampled", sample_rate=0.5)
+    kept = dropped = None
+    for i in range(50):
+        request_id = f"req-{i}"
+        if DebugSamplingFilter(0.5).filter(logging.makeLogRecord({"levelno": logging.DEBUG, "request_id": request_id})):
+            kept = kept or request_id
+        else:
+            dropped = dropped or request_id
+    for request_id in (kept, dropped):
+        set_request_id(request_id)
+        logger.debug("one")
+        logger.debug("two")
+        logger.warning("always")
+    set_request_id("-")
+    listener.stop()
+
+    assert [(r["request_id"], r["message"]) for r in lines(stream)] == [
+        (kept, "one"),
+        (kept, "two"),
+        (kept, "always"),
+        (dropped, "always"),
+    ]
+
+
+def test_full_queue_drops_instead_of_blocking():
+    logger, _listener, _stream = pipeline("test.full", maxsize=2, listen=False)
+    before = app_logging.dropped_records._value.get()
+    for i in range(5):
+        logger.info("record %s", i)
+    assert app_logging.dropped_records._value.get() - before == 3
@@ -0,0 +1,88 @@
+import time
+from types import SimpleNamespace
+
+from app.core.profiling import phase_of, profiler
+from app.core.security import Role
+from app.platform.guardrails import GuardrailEngine
+
+from conftest import auth_headers
+
+TAGS = {"owner": "t", "data_sensitivity": "internal"}
+
+
+def test_profiled_request_records_stacks_and_phases(client, monkeypatch):
+    admin = auth_headers()
+    monkeypatch.setattr(profiler, "interval", 0.001)
+    monkeypatch.setattr(profiler, "enabled", False)
+    monkeypatch.setattr(profiler, "sample_rate", 0.0)
+    profiler.clear()
+    original = GuardrailEngine.validate_service_tags
+
+    def slow_validate(self, tags):
+        time.sleep(0.03)
+        return original(self, tags)
+
+    monkeypatch.setattr(GuardrailEngine, "validate_service_tags", slow_validate)
+
+    # Off: the header is ignored.
+    res = client.post("/api/services", json={"name": "off", "tags": TAGS}, headers={**admin, "X-IDP-Profile": "1"})
+    assert res.status_code == 201
+    assert client.get("/api/admin/profiles", headers=admin).json() == []
+
+    res = client.put("/api/admin/profiling", json={"enabled": True, "sample_rate": 0.0}, headers=admin)
+    assert res.json() == {"enabled": True, "sample_rate": 0.0}
+    # On with a zero sample rate: only requests that ask are profiled.
+    client.post("/api/services", json={"name": "unsampled", "tags": TAGS}, headers=admin)
+    res = client.post(
+        "/api/services",
+        json={"name": "sampled", "tags": TAGS},
+        headers={**admin, "X-IDP-Profile": "1", "X-Request-ID": "req-profiled"},
+    )
+    assert res.status_code == 201
+
+    summaries = client.get("/api/admin/profiles", headers=admin).json()
+    assert [s["request_id"] for s in summaries] == ["req-profiled"]
+    summary = client.get("/api/admin/profiles/req-profiled", headers=admin).json()
+    assert summary["method"] == "POST" and summary["path"] == "/api/services"
+    assert summary["status_code"] == 201 and summary["samples"] > 0
+    # The slow stub lives here, not in app.platform.guardrails, so it is "app".
+    assert summary["phases_ms"]["app"] >= 15 and summary["phases_ms"]["db"] > 0
+    assert sum(summary["phases_ms"].values()) <= summary["duration_ms"] + 0.1
+
+    stacks = client.get("/api/admin/profiles/req-profiled/collapsed", headers=admin).text
+    assert any(
+        "app.api.routes:register_service;" in line and "test_profiling:slow_validate" in line
+        for line in stacks.splitlines()
+    )
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks.splitlines())
+    assert client.get("/api/admin/profiles/missing", headers=admin).status_code == 404
+    profiler.clear()
+
+
+def frame(module, function):
+    return SimpleNamespace(f_globals={"__name__": module}, f_code=SimpleNamespace(co_name=function))
+
+
+def test_phase_is_decided_by_the_outermost_matching_frame():
+    route = frame("app.api.routes", "register_service")
+    query = frame("sqlalchemy.ext.asyncio.session", "execute")
+
+    assert phase_of([route, frame("app.services.service", "register_service")]) == "app"
+    assert phase_of([route, query]) == "db"
+    assert phase_of([route, frame("app.services.audit", "log_action"), query]) == "audit"
+    assert phase_of([route, frame("app.platform.guardrails", "validate_config")]) == "guardrails"
+    assert phase_of([frame("fastapi.routing", "serialize_response"), frame("pydantic.main", "model_dump")]) == (
+        "serialization"
+    )
+
+
+def test_profiling_admin_endpoints_require_platform_admin(client, monkeypatch):
+    monkeypatch.setattr(profiler, "enabled", False)
+    developer = auth_headers("dev", Role.DEVELOPER)
+
+    assert client.get("/api/admin/profiling", headers=developer).status_code == 403
+    res = client.put("/api/admin/profiling", json={"enabled": True, "sample_rate": 1}, headers=developer)
+    assert res.status_code == 403
+    assert profiler.enabled is False
+    res = client.put("/api/admin/profiling", json={"enabled": True, "sample_rate": 2}, headers=auth_headers())
+    assert res.status_code == 422
@@ -0,0 +1,86 @@
+import pytest
+
+from app.api.middleware import brotli, negotiate_encoding
+
+from conftest import auth_headers
+
+TAGS = {"owner": "payments", "data_sensitivity": "internal"}
+
+
+def seed(client, headers):
+    ids = []
+    for name in ("billing", "ledger"):
+        res = client.post("/api/services", json={"name": name, "description": 'say "hi"', "tags": TAGS}, headers=headers)
+        ids.append(res.json()["id"])
+    environment = client.post(
+        f"/api/services/{ids[0]}/environments", json={"name": "dev", "tier": "dev"}, headers=headers
+    ).json()
+    for version in ("1.0", "1.1"):
+        res = client.post(
+            f"/api/services/{ids[0]}/environments/{environment['id']}/deployments",
+            json={"version": version, "initiated_by": "ci"},
+            headers=headers,
+        )
+        assert res.status_code == 202
+    return ids
+
+
+def test_fields_fast_path_matches_the_response_model(client):
+    headers = auth_headers()
+    billing, _ledger = seed(client, headers)
+
+    for path in ("/api/services", f"/api/services/{billing}/deployments"):
+        full = client.get(path, headers=headers).json()
+        fast = client.get(path, params={"fields": ""}, headers=headers)
+        assert fast.headers["content-type"] == "application/json"
+        assert fast.json() == full
+
+    res = client.get("/api/services", params={"fields": "id,name,name", "tag": "owner:payments"}, headers=headers)
+    assert res.json() == [{"id": billing, "name": "billing"}, {"id": _ledger, "name": "ledger"}]
+    res = client.get(f"/api/services/{billing}/deployments", params={"fields": "version,status"}, headers=headers)
+    assert res.json() == [{"version": "1.0", "status": "succeeded"}, {"version": "1.1", "status": "succeeded"}]
+
+
+def test_unknown_fields_are_rejected(client):
+    res = client.get("/api/services", params={"fields": "id,config"}, headers=auth_headers())
+    assert res.status_code == 400
+    assert res.json()["error"]["message"].startswith("Unknown fields: config")
+
+
+def test_environment_fields_and_compressed_catalog(client):
+    headers = auth_headers()
+    billing, _ledger = seed(client, headers)
+    res = client.get(f"/api/services/{billing}/environments", params={"fields": "name,tier"}, headers=headers)
+    assert res.json() == [{"name": "dev", "tier": "dev"}]
+
+    for i in range(20):
+        client.post("/api/services", json={"name": f"svc-{i}", "description": "x" * 40, "tags": TAGS}, headers=headers)
+    plain = client.get("/api/services", headers={**headers, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    gzipped = client.get("/api/services", headers={**headers, "Accept-Encoding": "gzip"})
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in gzipped.headers["vary"]
+    assert int(gzipped.headers["content-length"]) < len(plain.content) / 5
+    assert gzipped.json() == plain.json()
+
+    small = client.get(f"/api/services/{billing}", headers={**headers, "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+
+def test_brotli_is_preferred_when_accepted(client):
+    pytest.importorskip("brotli")
+    headers = auth_headers()
+    for i in range(20):
+        client.post("/api/services", json={"name": f"svc-{i}", "description": "x" * 40, "tags": TAGS}, headers=headers)
+    res = client.get("/api/services", headers={**headers, "Accept-Encoding": "gzip, br"})
+    assert res.headers["content-encoding"] == "br"
+    assert len(res.json()) == 20
+
+
+def test_negotiate_encoding_honours_q_values():
+    assert negotiate_encoding("") is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0, *") == ("br" if brotli else None)
+    assert negotiate_encoding("br;q=0.5, gzip") == "gzip"
+    assert negotiate_encoding("*;q=0") is None
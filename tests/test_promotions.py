@@ -0,0 +1,96 @@
+import time
+
+from conftest import auth_headers
+
+
+def service_with_tiers(client, name, tiers=("dev", "staging", "prod")):
+    res = client.post(
+        "/api/services",
+        json={"name": name, "tags": {"owner": "t", "data_sensitivity": "internal"}},
+        headers=auth_headers(),
+    )
+    service_id = res.json()["id"]
+    for tier in tiers:
+        res = client.post(
+            f"/api/services/{service_id}/environments", json={"name": tier, "tier": tier}, headers=auth_headers()
+        )
+        assert res.status_code == 201
+    return service_id
+
+
+def wait_for(client, promotion_id, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        promotion = client.get(f"/api/promotions/{promotion_id}", headers=auth_headers()).json()
+        if promotion["status"] != "running":
+            return promotion
+        time.sleep(0.05)
+    raise AssertionError(f"promotion {promotion_id} still running: {promotion}")
+
+
+def deployments_by_tier(client, service_id):
+    envs = {
+        env["id"]: env["tier"]
+        for env in client.get(f"/api/services/{service_id}/environments", headers=auth_headers()).json()
+    }
+    history = client.get(f"/api/services/{service_id}/deployments", headers=auth_headers()).json()
+    return {envs[d["environment_id"]]: d for d in history}
+
+
+def approve_prod(client, service_id, timeout=15):
+    """Wait for the pipeline's prod deployment, then approve it."""
+    deadline = time.monotonic() + timeout
+    while (prod := deployments_by_tier(client, service_id).get("prod")) is None:
+        assert time.monotonic() < deadline, "prod deployment never created"
+        time.sleep(0.05)
+    assert prod["status"] == "awaiting_approval"
+    res = client.post(
+        f"/api/deployments/{prod['id']}/approvals", json={}, headers=auth_headers(username="reviewer")
+    )
+    assert res.status_code == 201
+
+
+def test_approved_promotion_rolls_through_every_tier(client):
+    service_id = service_with_tiers(client, "checkout")
+    res = client.post(
+        f"/api/services/{service_id}/promotions",
+        json={"version": "1.4.0", "initiated_by": "ci"},
+        headers=auth_headers(),
+    )
+    assert res.status_code == 202
+    assert (res.json()["current_tier"], res.json()["status"]) == ("dev", "running")
+
+    # Dev and staging roll out on their own; prod waits for an approver.
+    approve_prod(client, service_id)
+    promotion = client.get(f"/api/promotions/{res.json()['id']}", headers=auth_headers()).json()
+    assert (promotion["current_tier"], promotion["status"]) == ("prod", "running")
+
+    promotion = wait_for(client, res.json()["id"])
+    assert (promotion["current_tier"], promotion["status"]) == ("prod", "succeeded")
+    statuses = {tier: d["status"] for tier, d in deployments_by_tier(client, service_id).items()}
+    assert statuses == {"dev": "succeeded", "staging": "succeeded", "prod": "succeeded"}
+
+
+def test_bulk_promotion_fans_out_and_reports_per_service(client):
+    service_ids = [service_with_tiers(client, f"svc-{idx}") for idx in range(5)]
+    no_dev = service_with_tiers(client, "no-dev", tiers=())
+    items = [{"service_id": sid, "version": "3.1.0", "initiated_by": "ci"} for sid in [*service_ids, no_dev]]
+
+    res = client.post("/api/promotions", json={"items": items}, headers=auth_headers())
+    assert res.status_code == 202
+    results = res.json()
+    assert results[-1] == {"service_id": no_dev, "promotion": None, "error": "Service has no dev environment"}
+    for service_id in service_ids:
+        approve_prod(client, service_id)
+    for result in results[:-1]:
+        assert wait_for(client, result["promotion"]["id"])["status"] == "succeeded"
+
+    # Restarting a finished version starts a new pipeline that finds every
+    # tier already deployed and completes without new deployments.
+    again = client.post(
+        f"/api/services/{service_ids[0]}/promotions",
+        json={"version": "3.1.0", "initiated_by": "ci"},
+        headers=auth_headers(),
+    ).json()
+    assert (again["current_tier"], again["status"]) == ("prod", "succeeded")
+    assert len(client.get(f"/api/services/{service_ids[0]}/deployments", headers=auth_headers()).json()) == 3
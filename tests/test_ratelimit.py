@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from app.core.config import get_settings
+from app.core.ratelimit import Limit, MemoryBuckets, RateLimiter, RedisBuckets, limiter, parse_limit
+from app.core.security import Role
+
+from conftest import auth_headers
+
+
+def limits(monkeypatch, **update):
+    monkeypatch.setattr(limiter, "_settings", get_settings().model_copy(update=update))
+
+
+class FakeRedis:
+    """Runs the take script's semantics in-process, like a Redis shared by workers."""
+
+    def __init__(self, clock):
+        self.buckets = MemoryBuckets(clock=clock)
+        self.down = False
+
+    def register_script(self, _script):
+        async def run(keys, args):
+            if self.down:
+                raise ConnectionError("redis down")
+            cost, rest = args[0], args[1:]
+            buckets = [
+                (key, Limit(rate=rest[2 * i], capacity=rest[2 * i + 1])) for i, key in enumerate(keys)
+            ]
+            return str(self.buckets.take(buckets, cost))
+
+        return run
+
+
+def test_buckets_refill_and_take_from_all_or_none():
+    now = [0.0]
+    buckets = MemoryBuckets(clock=lambda: now[0])
+    user, team = ("u", parse_limit("2/s")), ("t", parse_limit("3/s"))
+
+    assert parse_limit("600/m") == Limit(capacity=600, rate=10)
+    with pytest.raises(ValueError):
+        parse_limit("10/d")
+
+    assert buckets.take([user, team]) == 0
+    assert buckets.take([user, team]) == 0
+    assert buckets.take([user, team]) == pytest.approx(0.5)
+    # The user bucket was empty, so the team bucket kept its token.
+    assert buckets.take([team]) == 0
+    assert buckets.take([team]) == pytest.approx(1 / 3)
+
+    now[0] = 0.5
+    assert buckets.take([user]) == 0
+    assert buckets.take([user]) == pytest.approx(0.5)
+
+
+def test_write_routes_are_limited_per_user_and_team(client, monkeypatch):
+    limits(monkeypatch, rate_limit_routes={"create_team": {"user": "2/m", "team": "3/m"}})
+
+    def create(name, username, team_id=1):
+        return client.post("/api/teams", json={"name": name}, headers=auth_headers(username, team_id=team_id))
+
+    assert [create(f"a{n}", "alice").status_code for n in range(3)] == [200, 200, 429]
+    res = create("a3", "alice")
+    assert 1 <= int(res.headers["Retry-After"]) <= 30
+    assert create("b0", "bob").status_code == 200
+    # alice and bob have spent team 1's three tokens between them.
+    assert create("b1", "bob").status_code == 429
+    assert create("c0", "carol", team_id=2).status_code == 200
+    # Other routes and reads have their own buckets.
+    assert client.get("/api/teams", headers=auth_headers("alice")).status_code == 200
+    assert client.post(
+        "/api/services", json={"name": "svc", "tags": {"owner": "t", "data_sensitivity": "internal"}},
+        headers=auth_headers("alice"),
+    ).status_code == 201
+
+
+def test_shared_store_limits_across_workers_and_falls_back_when_down():
+    now = [0.0]
+    store = FakeRedis(clock=lambda: now[0])
+    settings = get_settings().model_copy(update={"rate_limit_routes": {"deploy": {"user": "2/m", "team": "10/m"}}})
+    workers = [RateLimiter(settings, shared=RedisBuckets(store)) for _ in range(2)]
+    user = type("User", (), {"username": "ci", "team_id": 7})()
+
+    async def attempts(limiter_, n):
+        codes = []
+        for _ in range(n):
+            try:
+                await limiter_.check("deploy", user)
+                codes.append(200)
+            except Exception as exc:  # noqa: BLE001
+                codes.append(exc.status_code)
+        return codes
+
+    assert asyncio.run(attempts(workers[0], 1)) + asyncio.run(attempts(workers[1], 2)) == [200, 200, 429]
+    store.down = True
+    # Without the store each worker limits on its own.
+    assert asyncio.run(attempts(workers[1], 3)) == [200, 200, 429]
+
+
+def test_team_quotas_are_enforced_from_counters(client):
+    admin = auth_headers()
+    team_id = client.post("/api/teams", json={"name": "payments"}, headers=admin).json()["id"]
+    other_id = client.post("/api/teams", json={"name": "search"}, headers=admin).json()["id"]
+    res = client.put(f"/api/teams/{team_id}/quota", json={"max_environments": 2}, headers=admin)
+    assert res.json() == {
+        "team_id": team_id,
+        "services": 0,
+        "environments": 0,
+        "max_services": get_settings().team_max_services,
+        "max_environments": 2,
+    }
+    developer = auth_headers("dev", role=Role.DEVELOPER)
+    assert client.put(f"/api/teams/{team_id}/quota", json={}, headers=developer).status_code == 403
+
+    service_id = client.post(
+        "/api/services", json={"name": "ledger", "tags": {"owner": "t", "data_sensitivity": "internal"}}, headers=admin
+    ).json()["id"]
+    url = f"/api/services/{service_id}/environments"
+    assert client.post(url, json={"name": "dev", "tier": "dev"}, headers=admin).status_code == 201
+    assert client.post(f"/api/services/{service_id}/team?team_id={team_id}", headers=admin).status_code == 200
+    assert client.post(url, json={"name": "staging", "tier": "staging"}, headers=admin).status_code == 201
+    res = client.post(url, json={"name": "prod", "tier": "prod"}, headers=admin)
+    assert (res.status_code, res.json()["error"]["message"]) == (403, "Team quota exceeded: environments (limit 2)")
+
+    client.put(f"/api/teams/{other_id}/quota", json={"max_services": 0}, headers=admin)
+    res = client.patch(f"/api/services/{service_id}", json={"team_id": other_id}, headers=admin)
+    assert (res.status_code, res.json()["error"]["message"]) == (403, "Team quota exceeded: services (limit 0)")
+
+    client.put(f"/api/teams/{other_id}/quota", json={}, headers=admin)
+    assert client.patch(f"/api/services/{service_id}", json={"team_id": other_id}, headers=admin).status_code == 200
+    assert client.get(f"/api/teams/{team_id}/quota", headers=admin).json()["environments"] == 0
+    moved = client.get(f"/api/teams/{other_id}/quota", headers=admin).json()
+    assert (moved["services"], moved["environments"]) == (1, 2)
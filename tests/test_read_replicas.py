@@ -0,0 +1,95 @@
+"""Read-replica routing, using two sqlite files as primary and replica.
+
+The "replica" is a separate database that never receives the primary's
+writes, so which one served a GET is visible in the response body.
+"""
+
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db import session as db_session
+from app.db.session import ReplicaRouter
+from app.main import app
+from app.models.models import Service
+
+from conftest import auth_headers, make_sessionmaker
+
+
+def seed_service(sessionmaker, name: str) -> None:
+    async def seed():
+        async with sessionmaker() as session:
+            session.add(Service(name=name, tags={"owner": "t", "data_sensitivity": "internal"}))
+            await session.commit()
+
+    asyncio.run(seed())
+
+
+def service_names(client, username: str):
+    res = client.get("/api/services", headers=auth_headers(username))
+    assert res.status_code == 200, res.text
+    return {svc["name"] for svc in res.json()}
+
+
+@pytest.fixture
+def replica(tmp_path):
+    replica = make_sessionmaker(tmp_path / "replica.db")
+    seed_service(replica, "from-replica")
+    return replica
+
+
+def install_router(monkeypatch, primary, replicas, **kwargs) -> ReplicaRouter:
+    router = ReplicaRouter(primary, replicas, **kwargs)
+    monkeypatch.setattr(db_session, "db_router", router)
+    return router
+
+
+def test_reads_go_to_replica(monkeypatch, primary, replica):
+    install_router(monkeypatch, primary, [replica])
+    seed_service(primary, "from-primary")
+    with TestClient(app) as client:
+        assert service_names(client, "reader") == {"from-replica"}
+
+
+def test_writer_reads_own_writes_until_pin_expires(monkeypatch, primary, replica):
+    install_router(monkeypatch, primary, [replica], sticky_seconds=0.3)
+    payload = {"name": "new-svc", "tags": {"owner": "t", "data_sensitivity": "internal"}}
+    with TestClient(app) as client:
+        res = client.post("/api/services", json=payload, headers=auth_headers("writer"))
+        assert res.status_code == 201, res.text
+
+        assert service_names(client, "writer") == {"new-svc"}
+        assert service_names(client, "someone-else") == {"from-replica"}
+
+        time.sleep(0.35)
+        assert service_names(client, "writer") == {"from-replica"}
+
+
+def test_config_reads_go_to_replica(monkeypatch, primary, replica):
+    install_router(monkeypatch, primary, [replica])
+    with TestClient(app) as client:
+        # Only the replica has the service.
+        res = client.get("/api/services/1/config", headers=auth_headers("reader"))
+        assert res.status_code == 200 and res.json()["config"] == {}
+
+
+def test_round_robin_across_replicas(monkeypatch, tmp_path, primary, replica):
+    second = make_sessionmaker(tmp_path / "replica-2.db")
+    seed_service(second, "from-replica-2")
+    install_router(monkeypatch, primary, [replica, second])
+    with TestClient(app) as client:
+        seen = [service_names(client, "reader") for _ in range(4)]
+    assert seen == [{"from-replica"}, {"from-replica-2"}] * 2
+
+
+def test_unhealthy_replica_falls_back_to_primary(monkeypatch, tmp_path, primary):
+    broken = make_sessionmaker(tmp_path / "broken.db")
+    (tmp_path / "broken.db").unlink()
+    (tmp_path / "broken.db").mkdir()  # sqlite cannot open a directory
+    router = install_router(monkeypatch, primary, [broken])
+    seed_service(primary, "from-primary")
+    with TestClient(app) as client:
+        assert service_names(client, "reader") == {"from-primary"}
+    assert router._healthy == [False]
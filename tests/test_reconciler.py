@@ -0,0 +1,206 @@
+import asyncio
+
+from sqlalchemy import select
+
+from app.models.models import Deployment, DeploymentStatus, Environment, EnvironmentTier, Service
+from app.platform.reconciler import MemoryProvider, Reconciler, WorkQueue, drift, object_key
+from app.services import deployment as deployment_service
+from app.services.jobs import drain
+
+from conftest import auth_headers
+
+TAGS = {"owner": "t", "data_sensitivity": "internal"}
+
+
+def make_reconciler(provider=None, **queue):
+    options = {"rate": "1000/s", "backoff_base": 0.01, "backoff_max": 0.05} | queue
+    return Reconciler(provider or MemoryProvider(), WorkQueue(**options), batch_size=2)
+
+
+async def drain_queue(reconciler):
+    """Process until the queue is empty and nothing is backing off."""
+    while len(reconciler.queue):
+        await reconciler.process_one()
+
+
+def seed(primary, count):
+    async def run():
+        async with primary() as db:
+            service = Service(name="svc", tags=TAGS)
+            db.add_all(Environment(name=f"env{i}", tier=EnvironmentTier.dev, service=service) for i in range(count))
+            await db.commit()
+            return service.id, (await db.scalars(select(Environment.id).order_by(Environment.id))).all()
+
+    return asyncio.run(run())
+
+
+def generations(primary):
+    async def run():
+        async with primary() as db:
+            rows = await db.execute(select(Environment.id, Environment.generation, Environment.observed_generation))
+            return {row.id: (row.generation, row.observed_generation) for row in rows}
+
+    return asyncio.run(run())
+
+
+def test_only_changed_generations_are_reconciled(primary, db_router):
+    service_id, ids = seed(primary, 5)
+    reconciler = make_reconciler()
+
+    async def poll():
+        queued = await reconciler.enqueue_changed()
+        await drain_queue(reconciler)
+        return queued
+
+    assert asyncio.run(poll()) == 5
+    assert sorted(reconciler.provider.applied) == sorted(object_key(i) for i in ids)
+    assert all(generation == observed for generation, observed in generations(primary).values())
+    # Nothing changed: the next poll finds nothing.
+    assert asyncio.run(poll()) == 0
+
+    async def deploy():
+        async with primary() as db:
+            deployment = Deployment(
+                service_id=service_id,
+                environment_id=ids[2],
+                version="2.0",
+                status=DeploymentStatus.pending,
+                initiated_by="ci",
+            )
+            db.add(deployment)
+            await db.commit()
+        await deployment_service.run_deployment(deployment.id, "worker", None)
+        await drain()
+
+    asyncio.run(deploy())
+    assert asyncio.run(poll()) == 1
+    assert reconciler.provider.objects[object_key(ids[2])]["version"] == "2.0"
+    assert len(reconciler.provider.applied) == 6
+
+
+def test_layer_changes_mark_their_environments(client, primary, db_router):
+    team = client.post("/api/teams", json={"name": "payments"}, headers=auth_headers()).json()["id"]
+    service_id = client.post(
+        "/api/services", json={"name": "billing", "tags": TAGS}, headers=auth_headers()
+    ).json()["id"]
+    client.post(f"/api/services/{service_id}/team", params={"team_id": team}, headers=auth_headers())
+    env = client.post(
+        f"/api/services/{service_id}/environments",
+        json={"name": "dev", "tier": "dev", "config": {}},
+        headers=auth_headers(),
+    ).json()
+    other = client.post("/api/services", json={"name": "ledger", "tags": TAGS}, headers=auth_headers()).json()["id"]
+    client.post(f"/api/services/{other}/environments", json={"name": "dev", "tier": "dev"}, headers=auth_headers())
+
+    reconciler = make_reconciler()
+
+    async def poll():
+        queued = await reconciler.enqueue_changed()
+        await drain_queue(reconciler)
+        return queued
+
+    assert asyncio.run(poll()) == 2
+    client.put(f"/api/teams/{team}/config", json={"config": {"region": "eu"}}, headers=auth_headers())
+    assert asyncio.run(poll()) == 1
+    assert reconciler.provider.objects[object_key(env["id"])]["config"] == {"region": "eu"}
+    # Same content again: no new generation.
+    client.put(f"/api/teams/{team}/config", json={"config": {"region": "eu"}}, headers=auth_headers())
+    assert asyncio.run(poll()) == 0
+
+    # Moving the service changes its team layer.
+    search = client.post("/api/teams", json={"name": "search"}, headers=auth_headers()).json()["id"]
+    client.post(f"/api/services/{service_id}/team", params={"team_id": search}, headers=auth_headers())
+    assert asyncio.run(poll()) == 1
+    assert reconciler.provider.objects[object_key(env["id"])]["config"] == {}
+    client.patch(f"/api/services/{service_id}", json={"team_id": team}, headers=auth_headers())
+    assert asyncio.run(poll()) == 1
+    assert reconciler.provider.objects[object_key(env["id"])]["config"] == {"region": "eu"}
+
+
+def test_resync_repairs_drift_without_reapplying_the_rest(primary, db_router):
+    _service_id, ids = seed(primary, 3)
+    reconciler = make_reconciler()
+
+    async def run(enqueue):
+        await enqueue()
+        await drain_queue(reconciler)
+
+    asyncio.run(run(reconciler.enqueue_changed))
+    reconciler.provider.objects[object_key(ids[1])]["fingerprint"] = "edited by hand"
+    reconciler.provider.applied.clear()
+    before = drift._value.get()
+
+    asyncio.run(run(reconciler.enqueue_all))
+    assert reconciler.provider.applied == [object_key(ids[1])]
+    assert drift._value.get() == before + 1
+
+
+def test_failures_back_off_per_environment(primary, db_router):
+    _service_id, ids = seed(primary, 2)
+    provider = MemoryProvider()
+    provider.failing.add(object_key(ids[0]))
+    reconciler = make_reconciler(provider)
+
+    async def run():
+        await reconciler.enqueue_changed()
+        await reconciler.process_one()
+        await reconciler.process_one()
+        assert reconciler.queue.failures(ids[0]) == 1
+        assert object_key(ids[1]) in provider.objects
+        await reconciler.process_one()
+        assert reconciler.queue.failures(ids[0]) == 2
+        provider.failing.clear()
+        await drain_queue(reconciler)
+
+    asyncio.run(run())
+    assert reconciler.queue.failures(ids[0]) == 0
+    assert generations(primary)[ids[0]] == (1, 1)
+
+
+def test_polls_do_not_cut_a_backoff_short(primary, db_router):
+    _service_id, ids = seed(primary, 1)
+    provider = MemoryProvider()
+    provider.failing.add(object_key(ids[0]))
+    reconciler = make_reconciler(provider, backoff_base=300, backoff_max=300)
+
+    async def run():
+        await reconciler.enqueue_changed()
+        await reconciler.process_one()
+        assert reconciler.queue.failures(ids[0]) == 1
+        # Still unobserved, so the next poll finds it again.
+        assert await reconciler.enqueue_changed() == 1
+        getting = asyncio.ensure_future(reconciler.queue.get())
+        await asyncio.sleep(0.05)
+        assert not getting.done()
+        getting.cancel()
+
+    asyncio.run(run())
+
+
+def test_queue_deduplicates_and_rate_limits():
+    now = [0.0]
+    queue = WorkQueue(rate="2/s", backoff_base=1, backoff_max=4, clock=lambda: now[0])
+
+    async def run():
+        for key in (1, 2, 1, 3):
+            queue.add(key)
+        assert len(queue) == 3
+        assert [await queue.get(), await queue.get()] == [1, 2]
+        # Re-added while processing: handed out again only after done().
+        queue.add(1)
+        now[0] += 0.5
+        assert await queue.get() == 3
+        queue.done(1)
+        now[0] += 0.5
+        assert await queue.get() == 1
+        # The bucket is empty: the next get waits for a token.
+        queue.add(4)
+        waiting = asyncio.ensure_future(queue.get())
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        waiting.cancel()
+
+    asyncio.run(run())
+    assert [queue.add_rate_limited(9) for _ in range(4)] == [1, 2, 4, 4]
+    queue.forget(9)
+    assert queue.failures(9) == 0
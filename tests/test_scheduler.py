@@ -0,0 +1,106 @@
+import asyncio
+
+import httpx
+
+from app.main import app
+from app.services.jobs import drain
+from app.services.scheduler import DeploymentScheduler
+
+from conftest import auth_headers
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_serializes_each_environment_and_coalesces_waiting_versions():
+    async def scenario():
+        scheduler = DeploymentScheduler(max_concurrent=4)
+        first = asyncio.ensure_future(scheduler.acquire(1, "v1"))
+        second = asyncio.ensure_future(scheduler.acquire(1, "v2"))
+        await settle()
+        third = asyncio.ensure_future(scheduler.acquire(1, "v3"))
+        await settle()
+
+        assert await first is True
+        assert await second is False  # superseded by v3 before it ran
+        assert not third.done()
+        assert scheduler.queue_position("v1") == 0
+        assert scheduler.queue_position("v2") is None
+        assert scheduler.queue_position("v3") == 1
+
+        scheduler.release(1)
+        assert await third is True
+        scheduler.release(1)
+        assert scheduler.queue_position("v3") is None
+
+    asyncio.run(scenario())
+
+
+def test_global_cap_limits_parallel_environments():
+    async def scenario():
+        scheduler = DeploymentScheduler(max_concurrent=2)
+        tasks = {env: asyncio.ensure_future(scheduler.acquire(env, f"job-{env}")) for env in (1, 2, 3, 4)}
+        await settle()
+
+        assert [env for env, task in tasks.items() if task.done()] == [1, 2]
+        assert scheduler.queue_position("job-3") == 1
+        assert scheduler.queue_position("job-4") == 2
+
+        scheduler.release(2)
+        await settle()
+        assert tasks[3].done() and not tasks[4].done()
+        assert scheduler.queue_position("job-4") == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_frees_its_place():
+    async def scenario():
+        scheduler = DeploymentScheduler(max_concurrent=1)
+        assert await scheduler.acquire(1, "a")
+        waiter = asyncio.ensure_future(scheduler.acquire(2, "b"))
+        await settle()
+        waiter.cancel()
+        await settle()
+        assert scheduler.queue_position("b") is None
+        scheduler.release(1)
+        assert await scheduler.acquire(3, "c")
+
+    asyncio.run(scenario())
+
+
+def test_burst_of_versions_skips_superseded_ones(client):
+    headers = auth_headers()
+    service = client.post(
+        "/api/services",
+        json={"name": "billing", "tags": {"owner": "t", "data_sensitivity": "internal"}},
+        headers=headers,
+    ).json()
+    environment = client.post(
+        f"/api/services/{service['id']}/environments", json={"name": "dev", "tier": "dev"}, headers=headers
+    ).json()
+    url = f"/api/services/{service['id']}/environments/{environment['id']}/deployments"
+
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            responses = await asyncio.gather(
+                *(http.post(url, json={"version": f"1.{n}", "initiated_by": "ci"}, headers=headers) for n in range(6))
+            )
+        await drain()  # transition event handlers
+        return responses
+
+    responses = asyncio.run(burst())
+    assert {res.status_code for res in responses} == {202}
+
+    history = client.get(f"/api/services/{service['id']}/deployments", headers=headers).json()
+    statuses = [d["status"] for d in history]
+    # Exact counts depend on arrival timing; the newest trigger always
+    # runs and anything that queued behind a newer one never does.
+    assert set(statuses) == {"succeeded", "superseded"}
+
+    job = client.get(f"/api/jobs/{responses[0].json()['job_id']}", headers=headers).json()
+    assert job["status"] in {"succeeded", "superseded"}
+    assert job["queue_position"] is None
@@ -0,0 +1,57 @@
+from app.services.search import SearchDocument, SearchIndex
+
+from conftest import auth_headers
+
+
+def build_index():
+    index = SearchIndex()
+    index.upsert(SearchDocument("service", 1, "payments-api", "card payments owner payments"))
+    index.upsert(SearchDocument("service", 2, "ledger", "double entry bookkeeping owner finance"))
+    index.upsert(SearchDocument("team", 1, "payments", "Payments team"))
+    index.upsert(SearchDocument("environment", 1, "payments-api-prod", "prod", service_id=1))
+    return index
+
+
+def test_exact_name_ranks_first():
+    hits = build_index().search("ledger")
+    assert (hits[0].kind, hits[0].id) == ("service", 2)
+
+
+def test_fuzzy_match_tolerates_typos():
+    hits = build_index().search("paymnets-api")
+    assert hits[0].name == "payments-api"
+
+
+def test_prefix_match_and_kind_filter():
+    index = build_index()
+    assert [hit.name for hit in index.search("led")] == ["ledger"]
+    assert [hit.name for hit in index.search("pay", kinds=["team"])] == ["payments"]
+
+
+def test_description_and_tag_terms_are_searchable():
+    assert [hit.name for hit in build_index().search("bookkeeping")] == ["ledger"]
+
+
+def test_upsert_replaces_and_remove_forgets():
+    index = build_index()
+    index.upsert(SearchDocument("service", 2, "general-ledger", ""))
+    assert index.search("bookkeeping") == []
+    assert index.search("general")[0].name == "general-ledger"
+    index.remove("service", 2)
+    assert all(hit.id != 2 or hit.kind != "service" for hit in index.search("ledger"))
+    assert index.suggest("paymnts") == ["payments-api"]
+
+
+def test_search_endpoint_sees_writes(client):
+    headers = auth_headers()
+    client.post(
+        "/api/services",
+        json={"name": "permit-api", "description": "permit issuing", "tags": {"owner": "permits", "data_sensitivity": "internal"}},
+        headers=headers,
+    )
+    assert client.get("/api/search?q=permit", headers=headers).json()[0]["name"] == "permit-api"
+
+    service_id = client.get("/api/services", headers=headers).json()[0]["id"]
+    client.post(f"/api/services/{service_id}/environments", json={"name": "permit-dev", "tier": "dev"}, headers=headers)
+    hits = client.get("/api/search?q=permit-dev&kind=environment", headers=headers).json()
+    assert [(hit["name"], hit["service_id"]) for hit in hits] == [("permit-dev", service_id)]
@@ -0,0 +1,60 @@
+from conftest import auth_headers
+
+
+def register(client, name, **tags):
+    res = client.post(
+        "/api/services",
+        json={"name": name, "tags": {"data_sensitivity": "internal", **tags}},
+        headers=auth_headers(),
+    )
+    assert res.status_code == 201, res.text
+    return res.json()["id"]
+
+
+def names(client, query):
+    res = client.get(f"/api/services?{query}", headers=auth_headers())
+    assert res.status_code == 200, res.text
+    return {svc["name"] for svc in res.json()}
+
+
+def test_tag_filters_and_or(client):
+    register(client, "pay-api", owner="payments", data_sensitivity="confidential")
+    register(client, "pay-batch", owner="payments")
+    register(client, "ledger", owner="finance", data_sensitivity="confidential")
+
+    assert names(client, "tag=owner:payments") == {"pay-api", "pay-batch"}
+    assert names(client, "tag=owner:payments&tag=data_sensitivity:confidential") == {"pay-api"}
+    assert names(client, "tag=owner:payments&tag=owner:finance&match=any") == {"pay-api", "pay-batch", "ledger"}
+    assert names(client, "tag=owner:nobody") == set()
+
+
+def test_tag_index_follows_updates(client):
+    service_id = register(client, "pay-api", owner="payments")
+    res = client.patch(
+        f"/api/services/{service_id}",
+        json={"tags": {"owner": "finance", "data_sensitivity": "public"}},
+        headers=auth_headers(),
+    )
+    assert res.status_code == 200, res.text
+    assert names(client, "tag=owner:payments") == set()
+    assert names(client, "tag=owner:finance&tag=data_sensitivity:public") == {"pay-api"}
+
+
+def test_facet_counts(client):
+    register(client, "pay-api", owner="payments", data_sensitivity="confidential")
+    register(client, "pay-batch", owner="payments")
+    register(client, "ledger", owner="finance", data_sensitivity="confidential")
+
+    res = client.get("/api/services/facets?key=owner&key=data_sensitivity", headers=auth_headers())
+    assert res.json() == {
+        "owner": {"payments": 2, "finance": 1},
+        "data_sensitivity": {"confidential": 2, "internal": 1},
+    }
+
+    res = client.get("/api/services/facets?key=owner&tag=data_sensitivity:confidential", headers=auth_headers())
+    assert res.json() == {"owner": {"payments": 1, "finance": 1}}
+
+
+def test_malformed_tag_filter_rejected(client):
+    res = client.get("/api/services?tag=owner", headers=auth_headers())
+    assert res.status_code == 400
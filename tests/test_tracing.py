@@ -0,0 +1,131 @@
+import json
+import threading
+
+from app.core import tracing
+from app.core.tracing import BatchExporter, FileExporter, Span, parse_traceparent, tracer
+
+from conftest import auth_headers
+
+TAGS = {"owner": "t", "data_sensitivity": "internal"}
+REMOTE_TRACE = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+class Collector:
+    def __init__(self):
+        self.spans = []
+
+    def submit(self, span):
+        self.spans.append(span)
+
+    def shutdown(self):
+        pass
+
+
+def test_deployment_trigger_is_traced_from_route_to_background_job(client, primary, monkeypatch):
+    collector = Collector()
+    monkeypatch.setattr(tracer, "enabled", True)
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+    monkeypatch.setattr(tracer, "exporter", collector)
+    tracing.instrument_engine(primary.kw["bind"])
+    headers = auth_headers()
+    service = client.post("/api/services", json={"name": "billing", "tags": TAGS}, headers=headers).json()
+    environment = client.post(
+        f"/api/services/{service['id']}/environments", json={"name": "dev", "tier": "dev"}, headers=headers
+    ).json()
+    collector.spans.clear()
+
+    res = client.post(
+        f"/api/services/{service['id']}/environments/{environment['id']}/deployments",
+        json={"version": "1.0", "initiated_by": "ci"},
+        headers={**headers, "traceparent": f"00-{REMOTE_TRACE}-00f067aa0ba902b7-01"},
+    )
+    assert res.status_code == 202
+
+    spans = collector.spans
+    by_id = {s.span_id: s for s in spans}
+    assert {s.trace_id for s in spans} == {REMOTE_TRACE}
+    (server,) = [s for s in spans if s.kind == "server"]
+    assert server.name == "POST /api/services/{service_id}/environments/{environment_id}/deployments"
+    assert server.parent_id == "00f067aa0ba902b7" and server.attributes["http.status_code"] == 202
+    assert res.headers["traceparent"] == server.traceparent
+
+    def ancestors(span):
+        while span.parent_id in by_id:
+            span = by_id[span.parent_id]
+            yield span.name
+
+    names = [s.name for s in spans]
+    for expected in (
+        "services.deployment.trigger_deployment",
+        "services.deployment.create_deployment",
+        "services.audit.log_action",
+        "services.deployment.schedule_deployment",
+        "services.deployment.run_deployment",
+        "services.jobs.run_job",
+        "services.executors.execute",
+    ):
+        assert expected in names
+    # The request commits once; the background run commits per transition.
+    commits = [s for s in spans if s.name == "db.commit"]
+    assert [next(ancestors(s)) for s in commits].count("services.deployment.create_deployment") == 1
+    assert [next(ancestors(s)) for s in commits].count("services.deployment._advance") == 2
+    assert all(s.end_ns >= s.start_ns and s.error is None for s in spans)
+    insert = next(s for s in spans if s.name == "db INSERT" and "deployments" in s.attributes["db.statement"])
+    assert list(ancestors(insert))[:2] == [
+        "services.deployment.create_deployment",
+        "services.deployment.trigger_deployment",
+    ]
+    job = next(s for s in spans if s.name == "services.deployment.schedule_deployment")
+    assert server.name in ancestors(job)
+
+
+def test_unsampled_traces_record_nothing(client, monkeypatch):
+    collector = Collector()
+    monkeypatch.setattr(tracer, "enabled", True)
+    monkeypatch.setattr(tracer, "sample_rate", 0.0)
+    monkeypatch.setattr(tracer, "exporter", collector)
+
+    res = client.post("/api/services", json={"name": "billing", "tags": TAGS}, headers=auth_headers())
+    assert res.status_code == 201 and "traceparent" not in res.headers
+    # A caller's sampling decision wins over ours.
+    client.get("/api/teams", headers={**auth_headers(), "traceparent": f"00-{REMOTE_TRACE}-00f067aa0ba902b7-00"})
+    assert collector.spans == []
+    client.get("/api/teams", headers={**auth_headers(), "traceparent": f"00-{REMOTE_TRACE}-00f067aa0ba902b7-01"})
+    assert [s.name for s in collector.spans] == ["GET /api/teams"]
+
+    assert parse_traceparent("00-00000000000000000000000000000000-00f067aa0ba902b7-01") is None
+    assert parse_traceparent("garbage") is None
+
+
+def test_batch_exporter_writes_otlp_lines_and_drops_when_full(tmp_path):
+    path = tmp_path / "traces" / "spans.jsonl"
+    batches = []
+
+    def export(spans):
+        batches.append(len(spans))
+        FileExporter(str(path))(spans)
+
+    def span(i):
+        return Span(
+            name=f"op-{i}", trace_id=REMOTE_TRACE, span_id=f"{i:016x}", parent_id=None, end_ns=1, attributes={"i": i}
+        )
+
+    exporter = BatchExporter(export, batch_size=2, queue_size=3, interval=0.05)
+    gate = threading.Event()
+    blocked = BatchExporter(lambda spans: gate.wait(), batch_size=1, queue_size=1, interval=0.05)
+    dropped = tracing.dropped_spans._value.get()
+    for i in range(5):
+        blocked.submit(span(i))
+    assert tracing.dropped_spans._value.get() > dropped
+    gate.set()
+    blocked.shutdown()
+
+    for i in range(3):
+        exporter.submit(span(i))
+    exporter.shutdown()
+
+    assert sorted(batches) == [1, 2]
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["name"] for line in lines] == ["op-0", "op-1", "op-2"]
+    assert lines[0]["attributes"] == [{"key": "i", "value": {"intValue": "0"}}]
+    assert lines[0]["status"] == {"code": 1} and "parentSpanId" not in lines[0]
@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import hmac
+import json
+from datetime import datetime
+
+import httpx
+from fastapi.testclient import TestClient
+from sqlalchemy import select, update
+
+from app.core.config import get_settings
+from app.core.security import Role
+from app import main
+from app.main import app
+from app.models.models import WebhookDelivery, WebhookDeliveryStatus
+from app.services import outbox, webhooks
+
+from conftest import auth_headers, wait_until
+
+
+class Receiver:
+    """Stub webhook receiver that checks signatures and tracks concurrency."""
+
+    def __init__(self, secret, status_code=200):
+        self.secret = secret
+        self.status_code = status_code
+        self.batches = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = request.content
+        timestamp = request.headers[webhooks.TIMESTAMP_HEADER]
+        expected = hmac.new(self.secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+        assert request.headers[webhooks.SIGNATURE_HEADER] == f"sha256={expected}"
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        if self.status_code >= 300:
+            return httpx.Response(self.status_code)
+        self.batches.append((str(request.url), json.loads(body)["events"]))
+        return httpx.Response(self.status_code)
+
+
+def test_events_are_fanned_out_and_delivered_signed_in_batches(primary, db_router):
+    secret = "s" * 32
+    receiver = Receiver(secret)
+
+    async def run():
+        async with primary() as db:
+            endpoint = await webhooks.create_endpoint(
+                db, url="http://all.test/hook", topics=[], max_concurrency=3, secret=secret, performed_by="tester"
+            )
+            await webhooks.create_endpoint(
+                db, url="http://deploys.test/hook", topics=["deployment."], max_concurrency=2, secret=secret,
+                performed_by="tester",
+            )
+            endpoint_id = endpoint.id
+            for n in range(1500):
+                outbox.emit(db, "deployment.succeeded" if n % 3 == 0 else "service.updated", {"n": n})
+            await db.commit()
+            await outbox.dispatch_all(db)
+            # Dispatching again must not owe an event twice.
+            await outbox.dispatch_all(db)
+
+            async with httpx.AsyncClient(transport=httpx.MockTransport(receiver)) as client:
+                dispatcher = webhooks.WebhookDispatcher(client)
+                while await dispatcher.deliver_due(db):
+                    pass
+            pending = await db.scalar(
+                select(WebhookDelivery.id).where(WebhookDelivery.status != WebhookDeliveryStatus.delivered)
+            )
+            return endpoint_id, pending
+
+    endpoint_id, pending = asyncio.run(run())
+
+    assert pending is None
+    received = {}
+    for url, events in receiver.batches:
+        assert len(events) <= get_settings().webhook_batch_size
+        received.setdefault(url, []).extend(events)
+    assert sorted(e["payload"]["n"] for e in received["http://all.test/hook"]) == list(range(1500))
+    assert sorted(e["payload"]["n"] for e in received["http://deploys.test/hook"]) == list(range(0, 1500, 3))
+    assert {e["topic"] for e in received["http://deploys.test/hook"]} == {"deployment.succeeded"}
+    assert 1 < receiver.peak <= 5
+    assert endpoint_id == 1
+
+
+def test_failing_endpoint_backs_off_then_dead_letters_and_redrives(primary, db_router, monkeypatch):
+    # Drive delivery by hand; the app's worker would race the assertions.
+    monkeypatch.setattr(main.settings, "webhook_poll_seconds", 0)
+    client = TestClient(app)
+    secret = "k" * 32
+    res = client.post(
+        "/api/webhooks", json={"url": "http://down.test/hook", "secret": secret}, headers=auth_headers()
+    )
+    assert res.status_code == 201 and res.json()["secret"] == secret
+    endpoint_id = res.json()["id"]
+    assert "secret" not in client.get("/api/webhooks", headers=auth_headers()).json()[0]
+    assert client.get("/api/webhooks", headers=auth_headers("dev", Role.DEVELOPER)).status_code == 403
+
+    receiver = Receiver(secret, status_code=503)
+    settings = get_settings().model_copy(update={"webhook_max_attempts": 3})
+
+    async def emit():
+        async with primary() as db:
+            outbox.emit(db, "test.ping", {})
+            await db.commit()
+            await outbox.dispatch_all(db)
+
+    async def attempt():
+        """One delivery pass; returns how far out the retry was scheduled, at most and at least."""
+        async with primary() as db, httpx.AsyncClient(transport=httpx.MockTransport(receiver)) as http:
+            before = datetime.utcnow()
+            await webhooks.WebhookDispatcher(http, settings).deliver_due(db)
+            after = datetime.utcnow()
+            due = await db.scalar(select(WebhookDelivery.next_attempt_at))
+            # Make it due again without waiting out the backoff.
+            await db.execute(update(WebhookDelivery).values(next_attempt_at=datetime.utcnow()))
+            await db.commit()
+            return (due - before).total_seconds(), (due - after).total_seconds()
+
+    asyncio.run(emit())
+    delays = [asyncio.run(attempt()) for _ in range(3)]
+    assert delays[0][0] >= 0.5 and delays[0][1] <= 1.0
+    assert delays[1][0] >= 1.0 and delays[1][1] <= 2.0
+
+    dead = client.get(f"/api/webhooks/{endpoint_id}/deliveries?status=dead", headers=auth_headers()).json()
+    assert [(d["attempts"], d["last_error"]) for d in dead] == [(3, "HTTP 503")]
+
+    receiver.status_code = 200
+    res = client.post(f"/api/webhooks/{endpoint_id}/deliveries/redrive", headers=auth_headers())
+    assert res.json() == {"redriven": 1}
+    asyncio.run(attempt())
+    delivered = client.get(f"/api/webhooks/{endpoint_id}/deliveries", headers=auth_headers()).json()
+    assert [(d["status"], d["attempts"], d["last_error"]) for d in delivered] == [("delivered", 1, None)]
+    assert len(receiver.batches) == 1
+
+
+def test_catalog_and_deployment_writes_reach_webhooks(db_router, monkeypatch):
+    receiver = Receiver("r" * 32)
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        webhooks.httpx, "AsyncClient", lambda **kwargs: real_client(transport=httpx.MockTransport(receiver))
+    )
+
+    def topics():
+        return [event["topic"] for _, events in receiver.batches for event in events]
+
+    with TestClient(app) as client:
+        res = client.post(
+            "/api/webhooks",
+            json={"url": "http://receiver.test/hook", "secret": receiver.secret, "topics": ["service.", "deployment."]},
+            headers=auth_headers(),
+        )
+        assert res.status_code == 201
+        service_id = client.post(
+            "/api/services",
+            json={"name": "hooked", "tags": {"owner": "t", "data_sensitivity": "internal"}},
+            headers=auth_headers(),
+        ).json()["id"]
+        env = client.post(
+            f"/api/services/{service_id}/environments", json={"name": "dev", "tier": "dev"}, headers=auth_headers()
+        ).json()
+        client.post(
+            f"/api/services/{service_id}/environments/{env['id']}/deployments",
+            json={"version": "1.0", "initiated_by": "ci"},
+            headers=auth_headers(),
+        )
+        wait_until(lambda: "deployment.succeeded" in topics())
+
+    assert topics()[0] == "service.registered"
+    assert "environment.provisioned" not in topics()
+    assert {"deployment.created", "deployment.running"} <= set(topics())
+
+
+def test_deactivation_settles_pending_deliveries_and_errors_stay_per_batch(primary, db_router, monkeypatch):
+    monkeypatch.setattr(main.settings, "webhook_poll_seconds", 0)
+    client = TestClient(app)
+    ids = [
+        client.post("/api/webhooks", json={"url": f"http://{host}.test/hook"}, headers=auth_headers()).json()["id"]
+        for host in ("gone", "broken", "fine")
+    ]
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "broken.test":
+            raise httpx.InvalidURL("bad host")
+        return httpx.Response(200)
+
+    async def emit_and_deliver():
+        async with primary() as db:
+            outbox.emit(db, "test.ping", {})
+            await db.commit()
+            await outbox.dispatch_all(db)
+        async with primary() as db:
+            await webhooks.deactivate_endpoint(db, ids[0], "tester")
+        async with primary() as db, httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            return await webhooks.WebhookDispatcher(http).deliver_due(db)
+
+    assert asyncio.run(emit_and_deliver()) == 2
+
+    def deliveries(endpoint_id):
+        res = client.get(f"/api/webhooks/{endpoint_id}/deliveries", headers=auth_headers()).json()
+        return [(d["status"], d["attempts"], d["last_error"]) for d in res]
+
+    assert deliveries(ids[0]) == [("dead", 0, "Endpoint deactivated")]
+    assert deliveries(ids[1]) == [("pending", 1, "InvalidURL: bad host")]
+    assert deliveries(ids[2]) == [("delivered", 1, None)]
+    assert client.post(f"/api/webhooks/{ids[0]}/deliveries/redrive", headers=auth_headers()).json() == {"redriven": 0}